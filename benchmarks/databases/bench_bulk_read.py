@@ -0,0 +1,145 @@
+"""
+Benchmark reading the metadata fields of many books - field_for book by book (taking the read lock and looking the
+field up for every value, as _get_metadata did) against fields_for (one lock, a read_column pass per field).
+
+The fields stand in for the cache fields - a one-one field (book -> value), a many-one field (book -> item id -> value)
+and a many-many field (book -> item ids -> set of values) - each with a for_book doing the same work as the real ones.
+
+Usage:
+    python benchmarks/databases/bench_bulk_read.py --books 100000 500000
+"""
+
+import argparse
+import random
+import threading
+import time
+
+from LiuXin_alpha.databases.bulk_read import FieldColumns
+from LiuXin_alpha.databases.bulk_read import read_column
+
+
+class NotInCache(Exception):
+    pass
+
+
+class OneOneField(object):
+    is_multiple = False
+    default_value = None
+
+    def __init__(self, book_col_map):
+        self.book_col_map = book_col_map
+
+    def for_book(self, book_id, default_value=None):
+        if book_id not in self.book_col_map:
+            raise NotInCache
+        return self.book_col_map.get(book_id) or default_value
+
+
+class ManyOneField(object):
+    is_multiple = False
+    default_value = None
+
+    def __init__(self, book_col_map, id_map):
+        self.book_col_map, self.id_map = book_col_map, id_map
+
+    def for_book(self, book_id, default_value=None):
+        item_id = self.book_col_map.get(book_id)
+        return default_value if item_id is None else self.id_map[item_id]
+
+
+class ManyManyField(ManyOneField):
+    is_multiple = True
+    default_value = ()
+
+    def for_book(self, book_id, default_value=None):
+        ids = self.book_col_map.get(book_id)
+        return set(self.id_map[i] for i in ids) if ids else default_value
+
+
+class Cache(object):
+    """
+    The lock and lookups field_for pays for on each call.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.composites = {}
+        self.lock = threading.RLock()
+
+    def field_for(self, name, book_id, default_value=None):
+        with self.lock:
+            if self.composites and name in self.composites:
+                return default_value
+            field = self.fields[name]
+            if field.is_multiple and default_value is None:
+                default_value = field.default_value
+            try:
+                return field.for_book(book_id, default_value=default_value)
+            except (KeyError, IndexError, NotInCache):
+                return default_value
+
+    def fields_for(self, names, book_ids, default_value=None):
+        with self.lock:
+            columns = FieldColumns(book_ids)
+            for name in names:
+                field = self.fields[name]
+                field_default = field.default_value if field.is_multiple and default_value is None else default_value
+                columns.add(
+                    name,
+                    read_column(
+                        field.for_book,
+                        columns.book_ids,
+                        default_value=field_default,
+                        errors=(KeyError, IndexError, NotInCache),
+                    ),
+                )
+            return columns
+
+
+def build(rng, count):
+    fields = {}
+    for name in ("title", "sort", "author_sort", "comments", "uuid", "path", "timestamp", "pubdate"):
+        fields[name] = OneOneField({book_id: "{} {}".format(name, book_id) for book_id in range(count)})
+    for name, items in (("publisher", 2000), ("series", max(count // 20, 1)), ("rating", 10)):
+        id_map = {item_id: "{} {}".format(name, item_id) for item_id in range(items)}
+        fields[name] = ManyOneField({book_id: rng.randrange(items) for book_id in range(0, count, 2)}, id_map)
+    for name, items, per_book in (("tags", 5000, 4), ("languages", 50, 1), ("formats", 10, 2)):
+        id_map = {item_id: "{} {}".format(name, item_id) for item_id in range(items)}
+        book_col_map = {
+            book_id: tuple(rng.sample(range(items), rng.randint(1, per_book))) for book_id in range(count)
+        }
+        fields[name] = ManyManyField(book_col_map, id_map)
+    return Cache(fields)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--books", type=int, nargs="+", default=[100000, 500000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for count in args.books:
+        rng = random.Random(args.seed)
+        cache = build(rng, count)
+        names = sorted(cache.fields)
+        # Include some books which aren't in the cache
+        book_ids = list(range(count + count // 100))
+
+        start = time.perf_counter()
+        rows = [{name: cache.field_for(name, book_id) for name in names} for book_id in book_ids]
+        old = time.perf_counter() - start
+
+        start = time.perf_counter()
+        columns = cache.fields_for(names, book_ids)
+        new = time.perf_counter() - start
+
+        assert [row for _, row in columns.rows()] == rows
+        print(
+            "{} books, {} fields: field_for {:>7.3f}s | fields_for {:>7.3f}s ({:.1f}x)".format(
+                count, len(names), old, new, old / new
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
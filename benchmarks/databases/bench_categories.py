@@ -0,0 +1,135 @@
+"""
+Benchmark Tag Browser category refreshes - rebuilding every category (as get_categories used to), against the
+CategoryEngine refreshing only the items of edited books.
+
+Each refresh after the first follows a single edit (a book's tags changed). Items are turned into a small stand-in for
+Tag in both cases - the real Tag does more work per item (tooltips), which both pay. The synthetic library is frozen
+out of the garbage collector once built - otherwise full collections over it land on random timings.
+
+Usage:
+    python benchmarks/databases/bench_categories.py --books 100000 500000
+"""
+
+import argparse
+import gc
+import random
+import time
+
+from LiuXin_alpha.databases.category_cache import CategoryEngine
+from LiuXin_alpha.databases.category_cache import CategoryRow
+from LiuXin_alpha.databases.category_cache import average_rating
+
+
+class Tag(object):
+    __slots__ = ("name", "id", "sort", "avg", "id_set", "count")
+
+    def __init__(self, name, id=None, sort=None, avg=0, id_set=None, count=0):
+        self.name, self.id, self.sort, self.avg, self.id_set, self.count = name, id, sort, avg, id_set, count
+
+
+class Table(object):
+    def __init__(self, rng, count, item_count, per_book):
+        self.id_map = {item_id: "Item {:06d}".format(item_id) for item_id in range(item_count)}
+        self.book_col_map = {}
+        self.col_book_map = {}
+        for book_id in range(count):
+            items = tuple(rng.sample(range(item_count), rng.randint(1, per_book)))
+            self.set_book(book_id, items)
+
+    def set_book(self, book_id, items):
+        for item_id in self.book_col_map.get(book_id, ()):
+            self.col_book_map[item_id].discard(book_id)
+        self.book_col_map[book_id] = items
+        for item_id in items:
+            self.col_book_map.setdefault(item_id, set()).add(book_id)
+
+
+def category_item(table, item_id, book_ids, ratings):
+    name = table.id_map[item_id].strip()
+    return name, name.lower(), average_rating(book_ids, ratings)
+
+
+def rebuild(fields, ratings, book_ids=None):
+    """
+    The old loop - every item of every field, every time.
+    """
+    categories = {}
+    for field, table in fields.items():
+        cats = categories[field] = []
+        for item_id, item_book_ids in table.col_book_map.items():
+            if book_ids is not None:
+                item_book_ids = item_book_ids.intersection(book_ids)
+            if item_book_ids:
+                name, sval, avg = category_item(table, item_id, item_book_ids, ratings)
+                cats.append(Tag(name, id=item_id, sort=sval, avg=avg, id_set=item_book_ids, count=len(item_book_ids)))
+    return categories
+
+
+def cached(engine, fields, ratings, book_ids=None):
+    categories = {}
+    for field, table in fields.items():
+
+        def make_row(item_id, item_book_ids, table=table):
+            name, sval, avg = category_item(table, item_id, item_book_ids, ratings)
+            return CategoryRow(item_id, name, sval, name.lower(), item_book_ids, avg)
+
+        categories[field] = [
+            Tag(row.name, id=row.item_id, sort=row.sort, avg=avg, id_set=ids, count=len(ids))
+            for row, ids, avg in engine.view(field, table, make_row, ratings, book_ids)
+        ]
+    return categories
+
+
+def summary(categories):
+    return {field: sorted((t.id, t.count) for t in cats) for field, cats in categories.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--books", type=int, nargs="+", default=[100000, 500000])
+    parser.add_argument("--edits", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for count in args.books:
+        rng = random.Random(args.seed)
+        fields = {
+            "tags": Table(rng, count, 5000, 4),
+            "authors": Table(rng, count, max(count // 5, 1), 2),
+            "series": Table(rng, count, max(count // 20, 1), 1),
+        }
+        ratings = {book_id: rng.randint(0, 10) for book_id in range(count)}
+        restriction = frozenset(rng.sample(range(count), count // 10))
+        engine = CategoryEngine()
+        gc.collect()
+        gc.freeze()
+        print("{} books".format(count))
+
+        for label, book_ids in (("library", None), ("restricted", restriction)):
+            start = time.perf_counter()
+            cached(engine, fields, ratings, book_ids)
+            print("  {:<10} first build {:>7.3f}s".format(label, time.perf_counter() - start))
+
+            old = new = 0.0
+            for _ in range(args.edits):
+                book_id = rng.randrange(count) if book_ids is None else rng.choice(tuple(book_ids))
+                engine.books_changed("tags", [book_id])
+                fields["tags"].set_book(book_id, tuple(rng.sample(range(5000), 2)))
+                engine.books_changed("tags", [book_id])
+
+                start = time.perf_counter()
+                expected = rebuild(fields, ratings, book_ids)
+                old += time.perf_counter() - start
+                start = time.perf_counter()
+                found = cached(engine, fields, ratings, book_ids)
+                new += time.perf_counter() - start
+                assert summary(found) == summary(expected)
+            print(
+                "  {:<10} after an edit: rebuild {:>7.3f}s | engine {:>7.3f}s".format(
+                    label, old / args.edits, new / args.edits
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark duplicate detection while importing books - scanning every title in the library for each added book (as
+has_book and find_identical_books used to), against the maintained DuplicateIndex.
+
+Each added book is checked with has_book and find_identical_books and then added - as a recursive import with
+add_duplicates=False does. Scanning is quadratic in the size of the import - so it's capped at --scan-limit books.
+
+Usage:
+    python benchmarks/databases/bench_duplicate_detection.py --books 10000 100000 1000000
+"""
+
+import argparse
+import time
+
+from LiuXin.databases.utils import fuzzy_title
+from LiuXin.utils.icu import lower as icu_lower
+
+from LiuXin_alpha.databases.duplicate_index import DuplicateIndex
+
+
+def synthetic_books(count):
+    """
+    Yield (title, authors) for count books - one in every ten a repeat of an earlier title.
+    """
+    for i in range(count):
+        book_number = i // 10 if i % 10 == 0 else i
+        yield "The Book Number {}".format(book_number), ["Author {}".format(book_number % 5000)]
+
+
+def import_scanning(books):
+    title_map, author_map = {}, {}
+    duplicates = 0
+    for book_id, (title, authors) in enumerate(books):
+        q = icu_lower(title).strip()
+        has_book = any(q == icu_lower(t) for t in title_map.values())
+        fq = fuzzy_title(title)
+        qauthors = {icu_lower(a) for a in authors}
+        identical = [
+            b for b, t in title_map.items() if author_map[b].issuperset(qauthors) and fuzzy_title(t) == fq
+        ]
+        if has_book or identical:
+            duplicates += 1
+            continue
+        title_map[book_id] = title
+        author_map[book_id] = qauthors
+    return duplicates
+
+
+def import_indexed(books):
+    index = DuplicateIndex(title_key=icu_lower, fuzzy_key=fuzzy_title, author_key=icu_lower)
+    duplicates = 0
+    for book_id, (title, authors) in enumerate(books):
+        if index.has_title(title) or index.find_identical(title, authors):
+            duplicates += 1
+            continue
+        index.add_book(book_id, title, authors)
+    return duplicates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--books", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--scan-limit", type=int, default=10000)
+    args = parser.parse_args()
+
+    for count in args.books:
+        for name, method in (("scanning", import_scanning), ("indexed", import_indexed)):
+            if name == "scanning" and count > args.scan_limit:
+                print("{:>10}: {:>8} books - skipped (over --scan-limit)".format(name, count))
+                continue
+            start = time.perf_counter()
+            duplicates = method(synthetic_books(count))
+            elapsed = time.perf_counter() - start
+            print(
+                "{:>10}: {:>8} books in {:>8.3f}s  ({:>10.0f} books/s, {} duplicates)".format(
+                    name, count, elapsed, count / elapsed, duplicates
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
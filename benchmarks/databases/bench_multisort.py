@@ -0,0 +1,92 @@
+"""
+Benchmark multi-field sorts of the library - comparator sort keys (as multisort used to sort), against the SortEngine
+with its cached rank columns.
+
+Sorts on rating (descending), series and series_index, then title - the first SortEngine sort works out and ranks
+every key, later sorts reuse them. The comparator sort is quadratic-ish in the cost of its comparisons, so it's capped
+at --cmp-limit books.
+
+Usage:
+    python benchmarks/databases/bench_multisort.py --books 100000 1000000
+"""
+
+import argparse
+import random
+import time
+from functools import cmp_to_key
+
+from LiuXin_alpha.databases.sort_keys import SortEngine
+
+
+def synthetic_fields(count, seed=0):
+    rng = random.Random(seed)
+    return {
+        "rating": {book_id: rng.randint(0, 10) for book_id in range(count)},
+        "series": {book_id: "series {:06d}".format(rng.randint(0, count // 20)) for book_id in range(count)},
+        "series_index": {book_id: float(rng.randint(1, 12)) for book_id in range(count)},
+        "sort": {book_id: "the book number {:07d}".format(rng.randint(0, count)) for book_id in range(count)},
+    }
+
+
+SORT = (("rating", False), ("series", True), ("series_index", True), ("sort", True))
+
+
+def sort_comparator(book_ids, fields):
+    funcs = [(fields[name].__getitem__, 1 if ascending else -1) for name, ascending in SORT]
+
+    def compare(a, b):
+        for func, order in funcs:
+            x, y = func(a), func(b)
+            if x != y:
+                return (-1 if x < y else 1) * order
+        return 0
+
+    return sorted(book_ids, key=cmp_to_key(compare))
+
+
+def columns_for(fields):
+    return [(name, ascending, (lambda values=fields[name]: values.__getitem__), True) for name, ascending in SORT]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--books", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--cmp-limit", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for count in args.books:
+        fields = synthetic_fields(count, seed=args.seed)
+        book_ids = list(range(count))
+        random.Random(args.seed).shuffle(book_ids)
+
+        if count <= args.cmp_limit:
+            start = time.perf_counter()
+            expected = sort_comparator(book_ids, fields)
+            print("{:>10}: {:>8} books in {:>8.3f}s".format("comparator", count, time.perf_counter() - start))
+        else:
+            expected = None
+            print("{:>10}: {:>8} books - skipped (over --cmp-limit)".format("comparator", count))
+
+        engine = SortEngine()
+        columns = columns_for(fields)
+        for label in ("first", "cached"):
+            start = time.perf_counter()
+            result = engine.sort(book_ids, columns)
+            print("{:>10}: {:>8} books in {:>8.3f}s".format(label, count, time.perf_counter() - start))
+        if expected is not None:
+            assert result == expected
+
+        # Edit a few hundred books - as set_field does - then sort again
+        rng = random.Random(args.seed)
+        edited = rng.sample(book_ids, 500)
+        for book_id in edited:
+            fields["sort"][book_id] = "an edited title {}".format(book_id)
+        engine.invalidate(("sort",), edited)
+        start = time.perf_counter()
+        engine.sort(book_ids, columns)
+        print("{:>10}: {:>8} books in {:>8.3f}s".format("edited", count, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
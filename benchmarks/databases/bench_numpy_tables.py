@@ -0,0 +1,141 @@
+"""
+Benchmark the memory and lookup cost of the cache table maps - plain dicts, against the numpy backed columnar maps.
+
+Builds the maps a synthetic library would have - title (one-to-one), series (many-to-one), authors and tags
+(many-to-many) - and measures the memory each takes (with tracemalloc - the strings are shared, so only counted
+once) and the time to look up every book, one at a time and with get_many.
+
+Usage:
+    python benchmarks/databases/bench_numpy_tables.py --books 100000 1000000
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+from collections import defaultdict
+
+from LiuXin_alpha.databases.columnar import columnar_map
+
+
+def synthetic_maps(count, seed=0):
+    """
+    The book_col_map, col_book_map and id_map of each table for a library of count books.
+    """
+    rng = random.Random(seed)
+    authors_count = max(count // 5, 1)
+    tags_count = max(count // 200, 1)
+    series_count = max(count // 20, 1)
+
+    title_map = {book_id: "The Book Number {}".format(book_id) for book_id in range(1, count + 1)}
+
+    series_book_col = {}
+    series_col_book = defaultdict(set)
+    for book_id in range(1, count + 1):
+        if rng.random() < 0.4:
+            series_id = rng.randint(1, series_count)
+            series_book_col[book_id] = series_id
+            series_col_book[series_id].add(book_id)
+
+    def many_many(item_count, most):
+        book_col = {}
+        col_book = defaultdict(set)
+        for book_id in range(1, count + 1):
+            items = tuple(rng.sample(range(1, item_count + 1), min(rng.randint(1, most), item_count)))
+            book_col[book_id] = items
+            for item_id in items:
+                col_book[item_id].add(book_id)
+        return book_col, col_book
+
+    authors_book_col, authors_col_book = many_many(authors_count, 3)
+    tags_book_col, tags_col_book = many_many(tags_count, 6)
+
+    return {
+        "title": (title_map,),
+        "series": (series_book_col, series_col_book, {i: "Series {}".format(i) for i in range(1, series_count + 1)}),
+        "authors": (authors_book_col, authors_col_book, {i: "Author {}".format(i) for i in range(1, authors_count + 1)}),
+        "tags": (tags_book_col, tags_col_book, {i: "Tag {}".format(i) for i in range(1, tags_count + 1)}),
+    }
+
+
+def copy_value(value):
+    """
+    Collections are copied - so the dict maps are charged for them. Strings are shared with the columnar maps.
+    """
+    if isinstance(value, (tuple, set, list)):
+        return type(value)(value)
+    return value
+
+
+def measure(build):
+    """
+    Bytes allocated (and still held) by build - and what it returned.
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, result
+
+
+def time_lookups(mapping, keys):
+    start = time.perf_counter()
+    for key in keys:
+        mapping.get(key)
+    single = time.perf_counter() - start
+
+    if hasattr(mapping, "get_many"):
+        start = time.perf_counter()
+        mapping.get_many(keys)
+        many = time.perf_counter() - start
+    else:
+        many = None
+    return single, many
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--books", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for count in args.books:
+        print("{} books".format(count))
+        tables = synthetic_maps(count, seed=args.seed)
+        keys = list(range(1, count + 1))
+        random.Random(args.seed).shuffle(keys)
+
+        total_dict = total_columnar = 0
+        for table, maps in tables.items():
+            for position, mapping in enumerate(maps):
+                name = "{}.{}".format(table, ("book_col_map", "col_book_map", "id_map")[position])
+                dict_bytes, plain = measure(lambda: {key: copy_value(value) for key, value in mapping.items()})
+                columnar_bytes, columnar = measure(lambda: columnar_map(mapping))
+                total_dict += dict_bytes
+                total_columnar += columnar_bytes
+
+                lookup_keys = keys if position == 0 else list(mapping)
+                dict_single, _ = time_lookups(plain, lookup_keys)
+                columnar_single, columnar_many = time_lookups(columnar, lookup_keys)
+                print(
+                    "  {:<22} dict {:>9.1f} MiB {:>7.3f}s | columnar {:>9.1f} MiB {:>7.3f}s get_many {:>7.3f}s".format(
+                        name,
+                        dict_bytes / 2**20,
+                        dict_single,
+                        columnar_bytes / 2**20,
+                        columnar_single,
+                        columnar_many if columnar_many is not None else float("nan"),
+                    )
+                )
+                del plain, columnar
+        print(
+            "  {:<22} dict {:>9.1f} MiB         | columnar {:>9.1f} MiB  ({:.1f}x smaller)".format(
+                "total", total_dict / 2**20, total_columnar / 2**20, total_dict / max(total_columnar, 1)
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark the search result cache under a mix of searches and edits - the old policy (50 entries, emptied when
+changed books * cached queries passed 50) against ResultCache (bounded by memory, dropping only the results which read
+an edited field).
+
+Each query reads one field and scans every book when it isn't cached; each edit sets a field on a few books - as
+set_field does, which also changes last_modified.
+
+Usage:
+    python benchmarks/databases/bench_result_cache.py --books 200000 --searches 5000
+"""
+
+import argparse
+import random
+import time
+
+from LiuXin_alpha.databases.result_cache import ResultCache
+
+
+FIELDS = ("tags", "series", "authors", "publisher", "rating", "languages", "title", "identifiers")
+
+
+def run_query(data, query, book_ids):
+    field, value = query
+    values = data[field]
+    return {book_id for book_id in book_ids if values[book_id] == value}
+
+
+class OldCache(object):
+    """
+    The LRUCache policy - 50 entries, patched for small edits and emptied otherwise.
+    """
+
+    LIMIT = 50
+    MAX_CACHE_UPDATE = 50
+
+    def __init__(self):
+        self.cache = ResultCache(max_bytes=2**62)
+
+    def get(self, query):
+        return self.cache.get(query)
+
+    def add(self, query, result, fields):
+        self.cache.add(query, result, fields)
+        while len(self.cache) > self.LIMIT:
+            self.cache.pop(next(iter(self.cache))[0])
+            self.cache.evictions += 1
+
+    def update(self, data, book_ids, fields):
+        if len(book_ids) * len(self.cache) <= self.MAX_CACHE_UPDATE:
+            for query, result in self.cache:
+                matches = run_query(data, query, book_ids)
+                result.difference_update(book_ids - matches)
+                result.update(matches)
+        else:
+            self.cache.clear()
+
+
+class NewCache(OldCache):
+    def __init__(self, max_bytes):
+        self.cache = ResultCache(max_bytes=max_bytes)
+
+    def add(self, query, result, fields):
+        self.cache.add(query, result, fields)
+
+    def update(self, data, book_ids, fields):
+        self.cache.invalidate(fields + ("last_modified",))
+
+
+def workload(count, searches, seed):
+    rng = random.Random(seed)
+    queries = [(rng.choice(FIELDS), rng.randint(0, 49)) for _ in range(200)]
+    # Searches favour a few common queries, with an edit every 10 searches
+    for i in range(searches):
+        yield "search", queries[min(int(rng.expovariate(1 / 20.0)), len(queries) - 1)]
+        if i % 10 == 9:
+            yield "edit", (rng.choice(FIELDS), rng.sample(range(count), rng.randint(1, 20)))
+
+
+def run(policy, data, count, args):
+    all_book_ids = range(count)
+    rng = random.Random(args.seed + 1)
+    start = time.perf_counter()
+    for kind, item in workload(count, args.searches, args.seed):
+        if kind == "search":
+            if policy.get(item) is None:
+                policy.add(item, run_query(data, item, all_book_ids), (item[0],))
+        else:
+            field, book_ids = item
+            for book_id in book_ids:
+                data[field][book_id] = rng.randint(0, 49)
+            policy.update(data, set(book_ids), (field,))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--books", type=int, default=200000)
+    parser.add_argument("--searches", type=int, default=5000)
+    parser.add_argument("--cache-mb", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for label, policy in (("old", OldCache()), ("new", NewCache(args.cache_mb * 1024 * 1024))):
+        rng = random.Random(args.seed)
+        data = {field: [rng.randint(0, 49) for _ in range(args.books)] for field in FIELDS}
+        elapsed = run(policy, data, args.books, args)
+        stats = policy.cache.stats()
+        print(
+            "{}: {:>8.3f}s  hits {:>6} misses {:>6} ({:.1%} hit rate) evictions {:>5} invalidations {:>6} "
+            "{:.1f} MiB".format(
+                label,
+                elapsed,
+                stats["hits"],
+                stats["misses"],
+                stats["hits"] / max(stats["hits"] + stats["misses"], 1),
+                stats["evictions"],
+                stats["invalidations"],
+                stats["nbytes"] / 2**20,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
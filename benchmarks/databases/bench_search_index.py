@@ -0,0 +1,131 @@
+"""
+Benchmark text searches on tags, authors and titles - scanning every value (as Parser.get_matches does without an
+index), against narrowing the candidates with a FieldIndex first.
+
+Both run the loop of Parser.get_matches - iterating (value, book_ids) over the candidates and checking each value in
+full - so the difference is the number of candidates. The check here is a plain lower() and substring test, cheaper
+than the icu calls _match makes - so the real saving is larger. Index build time is reported separately.
+
+Usage:
+    python benchmarks/databases/bench_search_index.py --books 100000 1000000
+"""
+
+import argparse
+import random
+import time
+
+from LiuXin_alpha.databases.search_index import FieldIndex
+
+
+WORDS = (
+    "dragon shadow king night river stone winter empire silent glass storm crown garden ghost iron city last "
+    "house secret blood fire moon star sea forest war song light dark lost daughter"
+).split()
+
+QUERIES = (
+    ("tags", "fantasy"),
+    ("tags", "=history"),
+    ("authors", "smith"),
+    ("authors", "=jane smith 17"),
+    ("title", "dragon"),
+    ("title", "glass crown"),
+)
+
+
+def synthetic_fields(count, seed=0):
+    """
+    Field -> item value -> book ids for the many-many fields, and book id -> title.
+    """
+    rng = random.Random(seed)
+    genres = ["Fiction.Fantasy", "Fiction.Science Fiction", "History", "Fiction.Horror", "Poetry", "Biography"]
+    tag_names = genres + ["Tag {}".format(i) for i in range(5000)]
+    surnames = ["Smith", "Jones", "Brown", "Taylor", "Wilson", "Clarke", "Walker", "Wright"]
+    author_names = [
+        "{} {} {}".format(rng.choice(["Jane", "John", "Ann", "Mark"]), rng.choice(surnames), i)
+        for i in range(max(count // 5, 1))
+    ]
+
+    tags, authors, titles = {}, {}, {}
+    for book_id in range(count):
+        for tag in rng.sample(tag_names[: 40 + count // 1000], rng.randint(1, 4)):
+            tags.setdefault(tag, set()).add(book_id)
+        for author in rng.sample(author_names, rng.randint(1, 2)):
+            authors.setdefault(author, set()).add(book_id)
+        titles[book_id] = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))).title()
+    return {"tags": tags, "authors": authors, "title": titles}
+
+
+def field_iter(field, data, candidates):
+    """
+    (value, book_ids) for the candidates - as iter_searchable_values does for many-many and one-one fields.
+    """
+    if field == "title":
+        for book_id in candidates:
+            yield data[book_id], {book_id}
+        return
+    for value, book_ids in data.items():
+        book_ids = book_ids & candidates
+        if book_ids:
+            yield value, book_ids
+
+
+def match(query, value):
+    value = value.lower()
+    if query.startswith("="):
+        return query[1:] == value
+    return query in value
+
+
+def search(field, data, query, candidates, index=None):
+    """
+    The text search loop of Parser.get_matches - narrowing the candidates with the index first, if there is one.
+    """
+    if index is not None:
+        if query.startswith("="):
+            narrowed = index.equals_candidates(query[1:])
+        else:
+            narrowed = index.contains_candidates(query)
+        if narrowed is not None:
+            candidates = candidates.intersection(narrowed)
+    matches = set()
+    for value, book_ids in field_iter(field, data, candidates):
+        if match(query, value):
+            matches |= book_ids
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--books", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for count in args.books:
+        print("{} books".format(count))
+        fields = synthetic_fields(count, seed=args.seed)
+        all_book_ids = set(range(count))
+        indexes = {}
+        for field, data in fields.items():
+            start = time.perf_counter()
+            index = indexes[field] = FieldIndex()
+            for value, book_ids in field_iter(field, data, all_book_ids):
+                index.add(value, book_ids)
+            print("  build {:<8} {:>8.3f}s  ({} values)".format(field, time.perf_counter() - start, len(index)))
+
+        for field, query in QUERIES:
+            start = time.perf_counter()
+            expected = search(field, fields[field], query, all_book_ids)
+            scanning = time.perf_counter() - start
+            start = time.perf_counter()
+            found = search(field, fields[field], query, all_book_ids, index=indexes[field])
+            indexed = time.perf_counter() - start
+            assert found == expected, (field, query)
+            print(
+                "  {:<8} {:<18} scanning {:>8.3f}s | indexed {:>8.3f}s  ({} matches)".format(
+                    field, query, scanning, indexed, len(found)
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
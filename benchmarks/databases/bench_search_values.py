@@ -0,0 +1,107 @@
+"""
+Benchmark text searches on an item field (tags) - matching as Parser.get_matches used to (intersecting every item's
+books with the candidates, then lower casing and checking its value), against SearchValues (cached folded values and
+compiled regexes, matching each item once and only mapping the matches to books).
+
+str.lower stands in for icu_lower here - which is slower, so the real saving on folding is larger.
+
+Usage:
+    python benchmarks/databases/bench_search_values.py --books 500000
+"""
+
+import argparse
+import random
+import re
+import time
+
+from LiuXin_alpha.databases.search_values import SearchValues
+from LiuXin_alpha.databases.search_values import compiled_regex
+
+
+QUERIES = ("~fantasy", "~^fiction\\.", "fantasy", "=history")
+
+
+def synthetic_tags(count, tag_count, seed=0):
+    """
+    The id_map and col_book_map of a tags table.
+    """
+    rng = random.Random(seed)
+    genres = ["Fiction.Fantasy", "Fiction.Science Fiction", "History", "Fiction.Horror", "Poetry", "Biography"]
+    names = genres + ["Tag {} Fantasy".format(i) if i % 50 == 0 else "Tag {}".format(i) for i in range(tag_count)]
+    id_map = dict(enumerate(names))
+    col_book_map = {item_id: set() for item_id in id_map}
+    for book_id in range(count):
+        for item_id in rng.sample(range(len(id_map)), rng.randint(1, 4)):
+            col_book_map[item_id].add(book_id)
+    return id_map, col_book_map
+
+
+def old_test(query):
+    """
+    The per value check _match used to make - lower casing each value, and recompiling regexes for each.
+    """
+    if query.startswith("~"):
+        query = query[1:]
+        return lambda t: re.search(query, t.lower(), re.I | re.UNICODE) is not None
+    if query.startswith("="):
+        query = query[1:]
+        return lambda t: query == t.lower()
+    return lambda t: query in t.lower()
+
+
+def new_test(query):
+    if query.startswith("~"):
+        search = compiled_regex(query[1:]).search
+        return lambda t: search(t) is not None
+    if query.startswith("="):
+        query = query[1:]
+        return lambda t: query == t
+    return lambda t: query in t
+
+
+def search_scanning(id_map, col_book_map, query, candidates):
+    """
+    The loop of Parser.get_matches over iter_searchable_values.
+    """
+    test = old_test(query)
+    matches = set()
+    empty = set()
+    for item_id, val in id_map.items():
+        book_ids = col_book_map.get(item_id, empty).intersection(candidates)
+        if book_ids and test(val):
+            matches |= book_ids
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--books", type=int, nargs="+", default=[500000])
+    parser.add_argument("--tags", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for count in args.books:
+        id_map, col_book_map = synthetic_tags(count, args.tags, seed=args.seed)
+        candidates = set(range(count))
+        search_values = SearchValues(str.lower)
+        print("{} books, {} tags".format(count, len(id_map)))
+        for query in QUERIES:
+            start = time.perf_counter()
+            expected = search_scanning(id_map, col_book_map, query, candidates)
+            scanning = time.perf_counter() - start
+
+            timings = []
+            for _ in range(2):
+                start = time.perf_counter()
+                found = search_values.matching_books("tags", id_map, col_book_map, new_test(query), candidates)
+                timings.append(time.perf_counter() - start)
+            assert found == expected, query
+            print(
+                "  tags:{:<14} scanning {:>7.3f}s | first {:>7.3f}s | cached {:>7.3f}s  ({} matches)".format(
+                    query, scanning, timings[0], timings[1], len(found)
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
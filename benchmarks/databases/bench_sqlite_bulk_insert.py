@@ -0,0 +1,74 @@
+"""
+Benchmark adding rows through the SQLite DatabaseDriver - one row at a time, as row dicts, and as a columnar batch.
+
+direct_add_simple_row_dict commits every row.
+direct_add_multiple_simple_row_dicts and direct_bulk_insert validate once and insert with executemany in a single
+transaction - the columnar batch skips building a dict per row as well.
+
+Usage:
+    python benchmarks/databases/bench_sqlite_bulk_insert.py --rows 100000
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.databasedriver import DatabaseDriver
+
+
+def build_database(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE books (book_id INTEGER PRIMARY KEY, book_title TEXT, book_uuid TEXT)")
+    conn.commit()
+    conn.close()
+
+
+def run(method, rows, single_row_limit):
+    """
+    Time adding rows with one of the insert methods.
+    :param method: "single", "row_dicts" or "columnar"
+    :param rows:
+    :param single_row_limit: Adding one row at a time is slow - cap the rows for that method
+    :return: (rows added, seconds taken)
+    """
+    with tempfile.TemporaryDirectory() as tempdir:
+        db_path = os.path.join(tempdir, "bench.db")
+        build_database(db_path)
+        driver = DatabaseDriver({"database_path": db_path}, set_conn=True)
+
+        start = time.perf_counter()
+        if method == "single":
+            rows = min(rows, single_row_limit)
+            for i in range(rows):
+                driver.direct_add_simple_row_dict({"book_title": "Title {}".format(i), "book_uuid": str(i)})
+        elif method == "row_dicts":
+            driver.direct_add_multiple_simple_row_dicts(
+                [{"book_title": "Title {}".format(i), "book_uuid": str(i)} for i in range(rows)]
+            )
+        else:
+            driver.direct_bulk_insert(
+                "books",
+                (("Title {}".format(i), str(i)) for i in range(rows)),
+                columns=("book_title", "book_uuid"),
+            )
+        elapsed = time.perf_counter() - start
+
+        driver.close()
+    return rows, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--single-row-limit", type=int, default=2000)
+    args = parser.parse_args()
+
+    for method in ("single", "row_dicts", "columnar"):
+        rows, elapsed = run(method, args.rows, args.single_row_limit)
+        print("{:>10}: {:>8} rows in {:>8.3f}s  ({:>10.0f} rows/s)".format(method, rows, elapsed, rows / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark single row lookups through the SQLite DatabaseDriver - with and without connection pooling.
+
+Without pooling every direct_* call builds a new connection (and registers all the custom functions on it).
+With pooling the connection for the calling thread is reused.
+
+Usage:
+    python benchmarks/databases/bench_sqlite_connection_pool.py --lookups 100000
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.databasedriver import DatabaseDriver
+
+
+def build_database(path, rows):
+    """
+    Build a minimal database with a single table to look rows up in.
+    :param path:
+    :param rows:
+    :return:
+    """
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE books (book_id INTEGER PRIMARY KEY, book_title TEXT)")
+    conn.executemany("INSERT INTO books (book_title) VALUES (?)", (("Title {}".format(i),) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def time_lookups(driver, lookups, rows):
+    start = time.perf_counter()
+    for i in range(lookups):
+        driver.direct_get_row_dict_from_id("books", (i % rows) + 1)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lookups", type=int, default=100000)
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        db_path = os.path.join(tempdir, "bench.db")
+        build_database(db_path, args.rows)
+
+        unpooled = DatabaseDriver({"database_path": db_path}, set_conn=False, pool_connections=False)
+        unpooled_time = time_lookups(unpooled, args.lookups, args.rows)
+
+        pooled = DatabaseDriver({"database_path": db_path}, set_conn=False, pool_connections=True)
+        pooled_time = time_lookups(pooled, args.lookups, args.rows)
+        stats = pooled.connection_pool_stats()
+        pooled.close()
+
+    print("lookups:  {}".format(args.lookups))
+    print("unpooled: {:.3f}s ({:.0f} lookups/s)".format(unpooled_time, args.lookups / unpooled_time))
+    print("pooled:   {:.3f}s ({:.0f} lookups/s)".format(pooled_time, args.lookups / pooled_time))
+    print("speedup:  {:.1f}x".format(unpooled_time / pooled_time))
+    print("pool stats:")
+    for key in sorted(stats):
+        print("    {}: {}".format(key, stats[key]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark reading a subtree and an ancestor chain from a synthetic tree table - by walking it one query per node (as
+the tree methods used to), with a single recursive CTE, and from an in memory TreeIndex.
+
+The tree has --nodes rows. Every node has --fanout children, apart from a single chain --depth nodes deep hanging off
+the root - so ancestor chains are long as well as subtrees being wide.
+
+Usage:
+    python benchmarks/databases/bench_sqlite_tree_queries.py --nodes 50000
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+from collections import deque
+from functools import partial
+
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.tree_queries import TREE_DEPTH_LIMIT
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.tree_queries import ancestors_stmt
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.tree_queries import subtree_stmt
+from LiuXin_alpha.databases.tree_index import TreeIndex
+
+
+def build_database(path, nodes, fanout, depth):
+    """
+    Write the synthetic tree.
+    :return: The id of the deepest node in the chain
+    """
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE series (series_id INTEGER PRIMARY KEY, series TEXT, series_parent INT NULL)")
+    conn.execute("CREATE INDEX series_parent_index ON series (series_parent ASC)")
+
+    rows = [(1, "Series 1", None)]
+    # The chain - each node the child of the one before
+    for node_id in range(2, depth + 2):
+        rows.append((node_id, "Series {}".format(node_id), node_id - 1))
+    # Everything else - filled in breadth first under the root
+    for node_id in range(depth + 2, nodes + 1):
+        parent_id = 1 if node_id < depth + 2 + fanout else (node_id - depth - 2) // fanout + depth + 1
+        rows.append((node_id, "Series {}".format(node_id), parent_id))
+
+    conn.executemany("INSERT INTO series VALUES (?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+    return depth + 1
+
+
+def per_node_subtree(conn, root_id):
+    found = []
+    queue = deque([root_id])
+    while queue:
+        node_id = queue.popleft()
+        found.append(node_id)
+        for (child_id,) in conn.execute("SELECT series_id FROM series WHERE series_parent = ?", (node_id,)):
+            queue.append(child_id)
+    return found
+
+
+def per_node_ancestors(conn, node_id):
+    chain = []
+    while node_id is not None:
+        chain.append(node_id)
+        node_id = conn.execute("SELECT series_parent FROM series WHERE series_id = ?", (node_id,)).fetchone()[0]
+    chain.reverse()
+    return chain
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=50000)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--depth", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        db_path = os.path.join(tempdir, "bench.db")
+        deepest_id = build_database(db_path, args.nodes, args.fanout, args.depth)
+        conn = sqlite3.connect(db_path)
+
+        subtree_sql = subtree_stmt("series", "series_id", "series_parent", ("series_id",))
+        ancestors_sql = ancestors_stmt("series", "series_id", "series_parent", ("series_id",))
+
+        def cte_subtree(root_id):
+            return [row[0] for row in conn.execute(subtree_sql, (root_id, TREE_DEPTH_LIMIT))]
+
+        def cte_ancestors(node_id):
+            return [row[0] for row in conn.execute(ancestors_sql, (node_id, TREE_DEPTH_LIMIT))]
+
+        index, build_time = timed(lambda: TreeIndex(conn.execute("SELECT series_id, series_parent FROM series")))
+
+        results = [
+            ("per node", partial(per_node_subtree, conn), partial(per_node_ancestors, conn)),
+            ("cte", cte_subtree, cte_ancestors),
+            ("index", index.subtree, index.ancestors),
+        ]
+        print("{:>10}: built in {:>8.3f}s".format("index", build_time))
+        for name, subtree, ancestors in results:
+            subtree_ids, subtree_time = timed(subtree, 1)
+            chain, chain_time = timed(ancestors, deepest_id)
+            print(
+                "{:>10}: subtree of {:>6} nodes in {:>8.3f}s  ancestors of {:>5} nodes in {:>8.4f}s".format(
+                    name, len(subtree_ids), subtree_time, len(chain), chain_time
+                )
+            )
+
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Benchmark N reader threads and one writer thread against the SQLite DatabaseDriver - for each performance profile.
+
+With the legacy (rollback journal) profile, readers hold SHARED locks which block the writer from committing - and
+the writer's locks block the readers.
+With the wal profile readers work from a snapshot and never block the writer.
+
+Usage:
+    python benchmarks/databases/bench_sqlite_wal_concurrency.py --readers 4 --seconds 5
+"""
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.databasedriver import DatabaseDriver
+
+
+def build_database(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE books (book_id INTEGER PRIMARY KEY, book_title TEXT)")
+    conn.executemany("INSERT INTO books (book_title) VALUES (?)", (("Title {}".format(i),) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def run_profile(profile, readers, seconds, rows):
+    """
+    Run the benchmark for a single profile.
+    :param profile:
+    :param readers:
+    :param seconds:
+    :param rows:
+    :return: Dictionary of results
+    """
+    with tempfile.TemporaryDirectory() as tempdir:
+        db_path = os.path.join(tempdir, "bench.db")
+        build_database(db_path, rows)
+
+        driver = DatabaseDriver({"database_path": db_path}, set_conn=True, performance_profile=profile)
+
+        stop = threading.Event()
+        counts = {"reads": 0, "writes": 0, "errors": 0}
+        counts_lock = threading.Lock()
+
+        def reader(offset):
+            reads = errors = 0
+            i = offset
+            while not stop.is_set():
+                try:
+                    driver.direct_get_row_dict_from_id("books", (i % rows) + 1)
+                    reads += 1
+                except Exception:
+                    errors += 1
+                i += readers
+            with counts_lock:
+                counts["reads"] += reads
+                counts["errors"] += errors
+
+        def writer():
+            writes = errors = 0
+            while not stop.is_set():
+                try:
+                    driver.direct_add_simple_row_dict({"book_title": "New title {}".format(writes)})
+                    writes += 1
+                except Exception:
+                    errors += 1
+            with counts_lock:
+                counts["writes"] += writes
+                counts["errors"] += errors
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+        threads.append(threading.Thread(target=writer))
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        driver.close()
+
+    counts["reads_per_second"] = counts["reads"] / seconds
+    counts["writes_per_second"] = counts["writes"] / seconds
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    for profile in ("legacy", "wal"):
+        results = run_profile(profile, args.readers, args.seconds, args.rows)
+        print(
+            "{:>7}: {:>10.0f} reads/s  {:>8.0f} writes/s  {} errors".format(
+                profile, results["reads_per_second"], results["writes_per_second"], results["errors"]
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
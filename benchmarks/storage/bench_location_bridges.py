@@ -0,0 +1,215 @@
+"""
+Benchmark the sync <-> async Location bridges - with every call crossing threads (chunk size 0, a batch of 1) against
+the chunked bridges (reads and writes a chunk at a time, listings in batches).
+
+async-over-sync is measured on the on-disk and rclone Locations (both sync-native). sync-over-async is measured on an
+async-native Location over the same stores - one whose file calls each make a worker thread hop, as an async driver's
+would.
+
+The rclone Location reads the same directory, through rclone's local backend - if rclone is installed.
+
+Usage:
+    python benchmarks/storage/bench_location_bridges.py --lines 200000 --files 5000
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from LiuXin_alpha.storage.api.location_api import AsyncNativePretendSyncLocation
+from LiuXin_alpha.storage.api.location_api import DEFAULT_BRIDGE_CHUNK_SIZE
+from LiuXin_alpha.storage.api.location_api import DEFAULT_BRIDGE_ITER_BATCH
+from LiuXin_alpha.storage.store_backend_plugins.on_disk_unmanaged_drive.on_disk_unmanaged_location import (
+    OnDiskUnmanagedStoreLocation,
+)
+from LiuXin_alpha.storage.store_backend_plugins.on_disk_unmanaged_drive.on_disk_unmanaged_storage_backend import (
+    OnDiskUnmanagedStorageBackend,
+)
+from LiuXin_alpha.storage.store_backend_plugins.rclone_http_readonly.rclone_http_location import (
+    RcloneHttpReadOnlyStoreLocation,
+)
+from LiuXin_alpha.storage.store_backend_plugins.rclone_http_readonly.rclone_http_storage_backend import (
+    RcloneBackendOptions,
+)
+from LiuXin_alpha.storage.store_backend_plugins.rclone_http_readonly.rclone_http_storage_backend import (
+    RcloneHttpReadOnlyStorageBackend,
+)
+
+
+def bridged(location_cls, chunk_size, iter_batch):
+    """A subclass of a sync-native Location with the given bridge settings."""
+    settings = dict(bridge_chunk_size=chunk_size, bridge_iter_batch=iter_batch)
+    return type(location_cls.__name__, (location_cls,), settings)
+
+
+class AsyncOverSync(AsyncNativePretendSyncLocation):
+    """
+    Async-native Location over a sync-native one - every file call is a worker thread hop.
+    """
+
+    inner_cls = None
+
+    def __init__(self, *args, store):
+        super().__init__(*args, store=store)
+        self.inner = self.inner_cls(*args, store=store)
+
+    def as_store_key(self):
+        return self.inner.as_store_key()
+
+    async def aexists(self):
+        return await self.inner.aexists()
+
+    async def ais_file(self):
+        return await self.inner.ais_file()
+
+    async def ais_dir(self):
+        return await self.inner.ais_dir()
+
+    async def astat(self):
+        return await self.inner.astat()
+
+    async def amkdir(self, mode=0o777, parents=False, exist_ok=False):
+        await self.inner.amkdir(mode, parents, exist_ok)
+
+    async def aunlink(self, missing_ok=False):
+        await self.inner.aunlink(missing_ok)
+
+    async def armdir(self):
+        await self.inner.armdir()
+
+    async def arename(self, target):
+        return await self.inner.arename(target)
+
+    async def areplace(self, target):
+        return await self.inner.areplace(target)
+
+    async def atouch(self, mode=0o666, exist_ok=True):
+        await self.inner.atouch(mode, exist_ok)
+
+    async def aiterdir(self):
+        async for p in self.inner.aiterdir():
+            yield p
+
+    async def aglob(self, pattern):
+        async for p in self.inner.aglob(pattern):
+            yield p
+
+    async def arglob(self, pattern):
+        async for p in self.inner.arglob(pattern):
+            yield p
+
+    def aopen(self, mode="r", buffering=-1, encoding=None, errors=None, newline=None):
+        return self.inner.aopen(mode, buffering, encoding, errors, newline)
+
+
+def sync_over_async(location_cls, chunk_size):
+    inner = bridged(location_cls, 0, 1)
+    return type("AsyncOverSync", (AsyncOverSync,), dict(inner_cls=inner, bridge_chunk_size=chunk_size))
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def async_lines(loc):
+    async def go():
+        async with loc.aopen("r", encoding="utf-8") as f:
+            return sum([1 async for _ in f])
+
+    return asyncio.run(go())
+
+
+def async_small_reads(loc, size=256):
+    async def go():
+        async with loc.aopen("rb") as f:
+            while await f.read(size):
+                pass
+
+    asyncio.run(go())
+
+
+def async_listing(loc):
+    async def go():
+        return sum([1 async for _ in loc.aiterdir()])
+
+    return asyncio.run(go())
+
+
+def sync_small_reads(loc, size=256):
+    with loc.open("rb") as f:
+        while f.read(size):
+            pass
+
+
+def sync_small_writes(loc, lines):
+    with loc.open("w", encoding="utf-8") as f:
+        for i in range(lines):
+            f.write("line {}\n".format(i))
+
+
+def report(label, before, after):
+    print("  {:<36} {:8.3f}s -> {:8.3f}s  ({:.1f}x)".format(label, before, after, before / after if after else 0))
+
+
+def bench_store(name, location_cls, store, args, writable):
+    print(name)
+    per_call = bridged(location_cls, 0, 1)
+    chunked = bridged(location_cls, DEFAULT_BRIDGE_CHUNK_SIZE, DEFAULT_BRIDGE_ITER_BATCH)
+    for label, fn in [
+        ("async-over-sync line iteration", lambda cls: async_lines(cls("lines.txt", store=store))),
+        ("async-over-sync read(256)", lambda cls: async_small_reads(cls("lines.txt", store=store))),
+        ("async-over-sync aiterdir", lambda cls: async_listing(cls("many", store=store))),
+    ]:
+        report(label, timed(lambda: fn(per_call)), timed(lambda: fn(chunked)))
+
+    per_call = sync_over_async(location_cls, 0)
+    chunked = sync_over_async(location_cls, DEFAULT_BRIDGE_CHUNK_SIZE)
+    report(
+        "sync-over-async read(256)",
+        timed(lambda: sync_small_reads(per_call("lines.txt", store=store))),
+        timed(lambda: sync_small_reads(chunked("lines.txt", store=store))),
+    )
+    if writable:
+        report(
+            "sync-over-async small writes",
+            timed(lambda: sync_small_writes(per_call("out.txt", store=store), args.lines)),
+            timed(lambda: sync_small_writes(chunked("out.txt", store=store), args.lines)),
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--files", type=int, default=5000)
+    parser.add_argument("--rclone-exe", default="rclone")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(root, "lines.txt"), "w", encoding="utf-8") as f:
+            for i in range(args.lines):
+                f.write("line {} of the benchmark file\n".format(i))
+        os.makedirs(os.path.join(root, "many"))
+        for i in range(args.files):
+            open(os.path.join(root, "many", "{:06}.txt".format(i)), "w").close()
+
+        bench_store("on disk", OnDiskUnmanagedStoreLocation, OnDiskUnmanagedStorageBackend(url=root), args, True)
+
+        if shutil.which(args.rclone_exe):
+            backend = RcloneHttpReadOnlyStorageBackend(
+                url=root, options=RcloneBackendOptions(rclone_exe=args.rclone_exe, listing_prefetch_tree=True)
+            )
+            bench_store("rclone", RcloneHttpReadOnlyStoreLocation, backend, args, False)
+        else:
+            print("rclone not found ({}) - skipping the rclone Location".format(args.rclone_exe))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
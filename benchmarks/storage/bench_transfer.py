@@ -0,0 +1,90 @@
+"""
+Benchmark copying a library between two on-disk stores - file_ops.ensured_copy file by file (hash, copy, hash again -
+64 bytes at a time) against the transfer engine (streamed through a large buffer, or copied by the kernel - hashed
+during the copy, a pool of workers at once).
+
+Usage:
+    python benchmarks/storage/bench_transfer.py --files 200 --size-mb 4 --workers 4
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from LiuXin_alpha.storage.store_backend_plugins.on_disk_unmanaged_drive.on_disk_unmanaged_location import (
+    OnDiskUnmanagedStoreLocation,
+)
+from LiuXin_alpha.storage.store_backend_plugins.on_disk_unmanaged_drive.on_disk_unmanaged_storage_backend import (
+    OnDiskUnmanagedStorageBackend,
+)
+from LiuXin_alpha.storage.transfer import TransferEngine, plan_tree
+from LiuXin_alpha.utils.storage.local.file_ops import ensured_copy
+
+
+def make_library(root, files, size):
+    for i in range(files):
+        folder = os.path.join(root, "Author {}".format(i % 50), "Book {}".format(i))
+        os.makedirs(folder)
+        with open(os.path.join(folder, "book.epub"), "wb") as f:
+            f.write(os.urandom(size))
+
+
+def location(root):
+    return OnDiskUnmanagedStoreLocation(store=OnDiskUnmanagedStorageBackend(url=root))
+
+
+def bench_ensured_copy(source, dest):
+    for dirpath, _, filenames in os.walk(source):
+        for name in filenames:
+            src = os.path.join(dirpath, name)
+            dst = os.path.join(dest, os.path.relpath(src, source))
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            ensured_copy(src, dst)
+
+
+def bench_engine(source, dest, **kwargs):
+    results = TransferEngine(**kwargs).transfer(plan_tree(location(source), location(dest)))
+    assert all(r.ok for r in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--size-mb", type=float, default=4)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--skip-baseline", action="store_true", help="Don't time ensured_copy - it's slow")
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 1024 * 1024)
+    total_mb = args.files * size / (1024 * 1024)
+    work = tempfile.mkdtemp()
+    try:
+        source = os.path.join(work, "source")
+        make_library(source, args.files, size)
+        print("{} files, {:.0f} MB".format(args.files, total_mb))
+
+        runs = [
+            ("transfer engine - stream", dict(workers=args.workers, zero_copy=False)),
+            ("transfer engine - zero copy", dict(workers=args.workers, zero_copy=True)),
+        ]
+        if not args.skip_baseline:
+            runs.insert(0, ("ensured_copy", None))
+        for label, kwargs in runs:
+            dest = os.path.join(work, "dest")
+            os.makedirs(dest)
+            start = time.perf_counter()
+            if kwargs is None:
+                bench_ensured_copy(source, dest)
+            else:
+                bench_engine(source, dest, **kwargs)
+            elapsed = time.perf_counter() - start
+            print("{:<30} {:8.2f}s  {:8.1f} MB/s".format(label, elapsed, total_mb / elapsed))
+            shutil.rmtree(dest)
+    finally:
+        shutil.rmtree(work)
+
+
+if __name__ == "__main__":
+    main()
@@ -281,7 +281,7 @@ def import_book_directory(db,
 
     dirpath = os.path.abspath(dirpath)
     formats = None
-    for formats in find_books_in_directory(dirpath, True, compiled_rules=compiled_rules):
+    for formats in find_books_in_directory(dirpath, True, compiled_rules=compiled_rules, single_fmt=True):
         break
 
     if not formats:
@@ -320,7 +320,7 @@ def import_book_directory_multiple(
     from LiuXin.metadata.meta import metadata_from_formats
 
     duplicates = []
-    for formats in find_books_in_directory(dirpath, False):
+    for formats in find_books_in_directory(dirpath, False, compiled_rules=compiled_rules, single_fmt=True):
         mi = metadata_from_formats(formats)
         if mi.title is None:
             continue
@@ -344,43 +344,35 @@ def recursive_import(
     callback: Optional[Callable[[str, ], None]] = None,
     added_ids: set[int] = None,
     compiled_rules: tuple[Callable[[str], bool], bool] = (),
+    workers: Optional[int] = None,
 ):
     """
     Recursively import every book in an entire directory structure.
+
+    Runs through an ImportPipeline - the tree is walked on a thread of its own, metadata is read in a pool of worker
+    processes and the books are added to the database on the calling thread.
     :param db: The database to work with
     :param root: The root of the tree to walk down
     :param single_book_per_directory: Should each book map to a single dictionary?
-    :param callback: Callback function to report progress
+    :param callback: Callback function to report progress - called with the title of each book added, and with "" after
+                     each directory. Return True for a title to skip the rest of its directory, or for "" to abort the
+                     import.
     :param added_ids: A set of the ids which have already been added to the database
     :param compiled_rules: Rules to include/exclude certain file types
+    :param workers: Processes to read metadata with - defaults to the import_workers preference
     :return:
     """
-    root = os.path.abspath(root)
-    duplicates = []
-    for dirpath in os.walk(root):
-        res = (
-            import_book_directory(
-                db,
-                dirpath[0],
-                callback=callback,
-                added_ids=added_ids,
-                compiled_rules=compiled_rules,
-            )
-            if single_book_per_directory
-            else import_book_directory_multiple(
-                db,
-                dirpath[0],
-                callback=callback,
-                added_ids=added_ids,
-                compiled_rules=compiled_rules,
-            )
-        )
-        if res is not None:
-            duplicates.extend(res)
-        if callable(callback):
-            if callback(""):
-                break
-    return duplicates
+    from LiuXin_alpha.databases.import_pipeline import ImportPipeline
+
+    pipeline = ImportPipeline(
+        db,
+        single_book_per_directory=single_book_per_directory,
+        callback=callback,
+        added_ids=added_ids,
+        compiled_rules=compiled_rules,
+        workers=workers,
+    )
+    return pipeline.run(root)
 
 
 def add_catalog(cache, path, title, dbapi=None) -> tuple[int, bool]:
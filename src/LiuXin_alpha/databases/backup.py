@@ -5,6 +5,7 @@ from __future__ import unicode_literals, division, absolute_import, print_functi
 
 import os
 import shutil
+import time
 import traceback
 import weakref
 from copy import deepcopy
@@ -13,11 +14,11 @@ from threading import Thread, Event
 from LiuXin.exceptions import LogicalError
 from LiuXin.exceptions import InputIntegrityError
 
-from LiuXin.file_formats.opf.opf2 import metadata_to_opf
-
 from LiuXin.folder_stores.file_manager import path_ok
 
-from LiuXin import prints
+from LiuXin_alpha.databases.backup_pipeline import AdaptiveThrottle, BackupEngine
+from LiuXin_alpha.preferences import preferences
+
 from LiuXin.utils.date import file_date
 from LiuXin.utils.file_ops.file_properties import get_file_hash
 from LiuXin.utils.logger import default_log
@@ -38,10 +39,18 @@ class MetadataBackup(Thread):
     """
     Continuously backup changed metadata into OPF files in the book directory.
 
-    This class runs in its own thread.
+    This class runs in its own thread. Dirtied books are backed up in batches by a BackupEngine - and an adaptive
+    throttle, rather than fixed sleeps, leaves time for the rest of the program between batches.
     """
 
-    def __init__(self, db, interval=2, scheduling_interval=0.1):
+    def __init__(self, db, interval=2, scheduling_interval=0.1, engine=None, throttle=None):
+        """
+        :param db:
+        :param interval: Seconds between checks for dirtied books while there are none
+        :param scheduling_interval: Shortest pause between batches - gives the GUI thread a chance to run
+        :param engine: BackupEngine to use - defaults to one on the db with settings from the preferences
+        :param throttle: AdaptiveThrottle to use - defaults to one with the metadata_backup_duty_cycle preference
+        """
         Thread.__init__(self)
         self.daemon = True
         self._db = weakref.ref(getattr(db, "new_api", db))
@@ -49,6 +58,13 @@ class MetadataBackup(Thread):
         self.interval = interval
         self.scheduling_interval = scheduling_interval
 
+        # The engine only holds the db while a batch is running - so the thread doesn't keep the db alive
+        self.engine = engine if engine is not None else BackupEngine(None)
+        if throttle is None:
+            duty_cycle = preferences.parse("metadata_backup_duty_cycle", "int", 50) / 100.0
+            throttle = AdaptiveThrottle(duty_cycle=duty_cycle, max_pause=interval)
+        self.throttle = throttle
+
     @property
     def db(self):
         """
@@ -70,76 +86,60 @@ class MetadataBackup(Thread):
             raise Abort()
 
     def run(self):
-        while not self.stop_running.is_set():
-            try:
-                self.wait(self.interval)
-                self.do_one()
-            except Abort:
-                break
-
-    def do_one(self):
         try:
-            book_id = self.db.get_a_dirtied_book()
-            if book_id is None:
-                return
+            while not self.stop_running.is_set():
+                try:
+                    start = time.monotonic()
+                    count = self.do_batch()
+                    if not count:
+                        self.wait(self.interval)
+                        continue
+                    pause = self.throttle.pause(time.monotonic() - start)
+                    self.wait(max(pause, self.scheduling_interval))
+                except Abort:
+                    break
+        finally:
+            self.engine.close()
+
+    def do_batch(self, book_ids=None):
+        """
+        Back up the next batch of dirtied books.
+        :param book_ids: Books to back up - defaults to the next batch from the dirtied books
+        :return: The number of books in the batch
+        """
+        self.engine.db = self.db
+        try:
+            return self.engine.backup_batch(book_ids)
         except Abort:
             raise
         except:
             # Happens during interpreter shutdown
-            return
-
-        self.wait(0)
-
-        try:
-            mi, sequence = self.db.get_metadata_for_dump(book_id)
-        except:
-            prints("Failed to get backup metadata for id:", book_id, "once")
             traceback.print_exc()
-            self.wait(self.interval)
-            try:
-                mi, sequence = self.db.get_metadata_for_dump(book_id)
-            except:
-                prints("Failed to get backup metadata for id:", book_id, "again, giving up")
-                traceback.print_exc()
-                return
-
-        if mi is None:
-            self.db.clear_dirtied(book_id, sequence)
-            return
-
-        # Give the GUI thread a chance to do something. Python threads don't
-        # have priorities, so this thread would naturally keep the processor
-        # until some scheduling event happens. The wait makes such an event
-        self.wait(self.scheduling_interval)
+            return 0
+        finally:
+            self.engine.db = None
 
+    def do_one(self):
+        """
+        Back up a single dirtied book - kept for compatibility, do_batch is much faster.
+        :return:
+        """
         try:
-            raw = metadata_to_opf(mi)
+            book_ids = self.db.get_dirtied_books(1)
+        except Abort:
+            raise
         except:
-            prints("Failed to convert to opf for id:", book_id)
-            traceback.print_exc()
-            self.db.clear_dirtied(book_id, sequence)
+            # Happens during interpreter shutdown
             return
+        if book_ids:
+            self.do_batch(book_ids)
 
-        self.wait(self.scheduling_interval)
-
-        try:
-            self.db.write_backup(book_id, raw)
-        except:
-            prints("Failed to write backup metadata for id:", book_id, "once")
-            traceback.print_exc()
-            self.wait(self.interval)
-            try:
-                self.db.write_backup(book_id, raw)
-            except:
-                prints(
-                    "Failed to write backup metadata for id:",
-                    book_id,
-                    "again, giving up",
-                )
-                traceback.print_exc()
-                return
-
-        self.db.clear_dirtied(book_id, sequence)
+    def books_per_second(self):
+        """
+        Throughput of the backup so far.
+        :return:
+        """
+        return self.engine.books_per_second()
 
     def break_cycles(self):
         # Legacy compatibility
@@ -0,0 +1,377 @@
+"""
+Batched metadata backup - writing OPF files for dirtied books many at a time.
+
+Dirtied books are taken from the cache a batch at a time (oldest first). Their OPFs are rendered (on the calling
+thread, or optionally in a pool of worker processes), written through a bounded pool of I/O threads, and the dirtied
+markers for the whole batch cleared in a single transaction. Books which couldn't be backed up are sent to the back of
+the queue. Between batches an adaptive throttle keeps the backup to a share of the wall clock time - so it runs flat out
+while it's cheap, and backs off while batches are expensive.
+
+The render pool only ever speeds things up - a book the pool can't render (it can't be pickled, or the pool broke) is
+rendered again on the calling thread. Only a book which can't be rendered there is given up on.
+"""
+
+from __future__ import print_function
+
+import os
+import pickle
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from typing import Callable, Optional
+
+from LiuXin_alpha.preferences import preferences
+from LiuXin_alpha.utils.logging import default_log
+
+
+# Dirtied books backed up at a time
+BACKUP_BATCH_SIZE = 200
+
+# Threads writing OPF files at a time
+BACKUP_IO_WORKERS = 4
+
+# Attributes which tie a Metadata object to the cache - left out when it's sent to the render pool (the ProxyMetadata
+# holds a weakref to the cache, which can't be pickled)
+UNPICKLABLE_METADATA_ATTRS = ("_proxy_metadata", "formatter", "template_cache")
+
+
+def atomic_write(path, raw):
+    """
+    Write raw to path - through a temporary file in the same directory, which is then renamed over the target. So the
+    target is always either the old file or the new one - never a partial write.
+    :param path:
+    :param raw: Bytes
+    :return:
+    """
+    dirpath = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=".", suffix=".tmp", dir=dirpath)
+    try:
+        with os.fdopen(fd, "wb") as stream:
+            stream.write(raw)
+            stream.flush()
+            os.fsync(stream.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def render_opf(mi):
+    """
+    Render the OPF for a book - run in the worker processes.
+    :param mi:
+    :return: The OPF as bytes
+    """
+    from LiuXin.file_formats.opf.opf2 import metadata_to_opf
+
+    return metadata_to_opf(mi)
+
+
+def pickle_metadata(mi):
+    """
+    Pickle a Metadata object for the render pool - without the attributes which tie it to the cache.
+    The object itself is left as it was.
+    :param mi:
+    :return: Bytes
+    """
+    state = object.__getattribute__(mi, "__dict__")
+    removed = dict((name, state.pop(name)) for name in UNPICKLABLE_METADATA_ATTRS if name in state)
+    try:
+        return pickle.dumps(mi, protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        state.update(removed)
+
+
+def render_pickled(render, payload):
+    """
+    Render the OPF for a Metadata object pickled by pickle_metadata - run in the worker processes.
+    :param render:
+    :param payload:
+    :return: The OPF as bytes
+    """
+    return render(pickle.loads(payload))
+
+
+class AdaptiveThrottle(object):
+    """
+    Works out how long to pause after each batch - so the backup takes up at most duty_cycle of the wall clock time.
+    """
+
+    def __init__(self, duty_cycle=0.5, max_pause=2.0):
+        """
+        :param duty_cycle: Fraction of the time the backup may be working - 1 never pauses
+        :param max_pause: Longest pause after a batch, in seconds
+        """
+        self.duty_cycle = min(max(duty_cycle, 0.01), 1.0)
+        self.max_pause = max_pause
+
+    def pause(self, elapsed):
+        """
+        Seconds to pause after a batch which took elapsed seconds.
+        :param elapsed:
+        :return:
+        """
+        return min(elapsed * (1.0 - self.duty_cycle) / self.duty_cycle, self.max_pause)
+
+
+class BackupEngine(object):
+    """
+    Renders and writes OPF backups for dirtied books - a batch at a time.
+    """
+
+    def __init__(
+        self,
+        db,
+        batch_size: Optional[int] = None,
+        render_workers: Optional[int] = None,
+        io_workers: Optional[int] = None,
+        render: Callable = render_opf,
+        path_for: Optional[Callable] = None,
+        backend=None,
+    ):
+        """
+        :param db: The cache to back up - must provide get_dirtied_books, get_metadata_for_dump and
+                   clear_dirtied_many. get_metadata_for_dump_many is used to read each batch, requeue_dirtied to
+                   send books which failed to the back of the queue and has_id to tell books which are still being
+                   created from deleted ones, if provided.
+        :param batch_size: Dirtied books taken at a time - defaults to the metadata_backup_batch_size preference
+        :param render_workers: Processes to render OPFs in - defaults to the metadata_backup_workers preference. 1 (the
+                               default) renders on the calling thread, without a pool - 0 for one per CPU.
+        :param io_workers: Threads to write OPFs with - defaults to the metadata_backup_io_workers preference
+        :param render: Renders the OPF for a Metadata object - must be picklable (e.g. a module level function) if
+                       render_workers > 1
+        :param path_for: If provided, called with a book id for the local path of its OPF - which is then written
+                         atomically. Otherwise each batch's folders are read with db.backup_paths_many and the OPFs
+                         written with backend.write_backup - so the I/O threads never wait on the cache's locks.
+        :param backend: Backend to write OPFs through, when path_for isn't given - defaults to db.backend
+        """
+        self.db = db
+        if batch_size is None:
+            batch_size = preferences.parse("metadata_backup_batch_size", "int", BACKUP_BATCH_SIZE)
+        self.batch_size = max(batch_size, 1)
+        if render_workers is None:
+            render_workers = preferences.parse("metadata_backup_workers", "int", 1)
+        self.render_workers = render_workers if render_workers > 0 else (os.cpu_count() or 1)
+        if io_workers is None:
+            io_workers = preferences.parse("metadata_backup_io_workers", "int", BACKUP_IO_WORKERS)
+        self.io_workers = max(io_workers, 1)
+        self.render = render
+        self.path_for = path_for
+        self._backend = backend
+
+        self._render_pool = None
+        self._io_pool = None
+
+        # Totals - for books_per_second
+        self.books_written = 0
+        self.books_failed = 0
+        self.busy_time = 0.0
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # - POOLS
+
+    def _get_render_pool(self):
+        if self._render_pool is None and self.render_workers > 1:
+            self._render_pool = ProcessPoolExecutor(max_workers=self.render_workers)
+        return self._render_pool
+
+    def _drop_render_pool(self):
+        if self._render_pool is not None:
+            self._render_pool.shutdown(wait=False, cancel_futures=True)
+            self._render_pool = None
+
+    def _get_io_pool(self):
+        if self._io_pool is None:
+            self._io_pool = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="MetadataBackupIO")
+        return self._io_pool
+
+    def close(self):
+        """
+        Shut down the worker pools - they're started again if the engine is used after this.
+        :return:
+        """
+        self._drop_render_pool()
+        if self._io_pool is not None:
+            self._io_pool.shutdown(wait=True)
+            self._io_pool = None
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # - BACKUP
+
+    def _write(self, book_id, raw, path):
+        if self.path_for is None:
+            if path is None:
+                raise ValueError("No path to write the backup for book {} to".format(book_id))
+            backend = self._backend if self._backend is not None else self.db.backend
+            backend.write_backup(path, raw)
+        else:
+            atomic_write(path, raw)
+
+    def _paths_for(self, book_ids):
+        """
+        Where to write each book's OPF - read from the cache in one go (under its read lock), before any writing starts.
+        """
+        if self.path_for is not None:
+            return {book_id: self.path_for(book_id) for book_id in book_ids}
+        return self.db.backup_paths_many(book_ids)
+
+    def _render_all(self, mis):
+        """
+        Render the OPF for each Metadata object - (raw, None) or (None, exception) for each.
+        Books the pool couldn't render are rendered again on the calling thread - so an exception is only returned for
+        a book which can't be rendered at all.
+        """
+        futures = [None] * len(mis)
+        pool = self._get_render_pool()
+        if pool is not None:
+            for i, mi in enumerate(mis):
+                try:
+                    payload = pickle_metadata(mi)
+                except Exception:
+                    continue
+                try:
+                    futures[i] = pool.submit(render_pickled, self.render, payload)
+                except Exception as e:
+                    # The pool is broken - it's started afresh for the next batch
+                    default_log.log_variables("Metadata backup render pool failed", "INFO", ("error", e))
+                    self._drop_render_pool()
+                    break
+
+        rendered = []
+        for mi, future in zip(mis, futures):
+            if future is not None:
+                try:
+                    rendered.append((future.result(), None))
+                    continue
+                except Exception as e:
+                    err_str = "Failed to render in the pool - rendering on the calling thread"
+                    default_log.log_variables(err_str, "INFO", ("error", e))
+            try:
+                rendered.append((self.render(mi), None))
+            except Exception as e:
+                rendered.append((None, e))
+        return rendered
+
+    def backup_batch(self, book_ids=None, clear=True, callback=None):
+        """
+        Back up a batch of books.
+        :param book_ids: Books to back up - defaults to the next batch_size dirtied books
+        :param clear: Clear the dirtied markers for the books which were backed up (or which have nothing to back up)
+        :param callback: Called with (book_id, mi, ok) for each book
+        :return: The number of books in the batch
+        """
+        start = time.monotonic()
+        from_queue = book_ids is None
+        if from_queue:
+            book_ids = self.db.get_dirtied_books(self.batch_size)
+        book_ids = list(book_ids)
+        if not book_ids:
+            return 0
+
+        # Read in one go if the cache can - falling back on reading book by book
+        dumped = dict()
+        dump_many = getattr(self.db, "get_metadata_for_dump_many", None)
+        if dump_many is not None:
+            try:
+                dumped = dump_many(book_ids)
+            except Exception as e:
+                err_str = "Failed to get backup metadata for the batch"
+                default_log.log_variables(err_str, "INFO", ("book_ids", book_ids), ("error", e))
+
+        # Books without metadata to write only need their markers clearing - unless they're still being created (they
+        # have no path yet), and so are left dirtied to be backed up once they have
+        has_id = getattr(self.db, "has_id", None)
+        to_clear = dict()
+        to_render = []
+        failed = []
+        waiting = []
+        for book_id in book_ids:
+            try:
+                mi, sequence = dumped[book_id] if book_id in dumped else self.db.get_metadata_for_dump(book_id)
+            except Exception as e:
+                err_str = "Failed to get backup metadata"
+                default_log.log_variables(err_str, "INFO", ("book_id", book_id), ("error", e))
+                self.books_failed += 1
+                failed.append(book_id)
+                continue
+            if mi is None:
+                if sequence is not None and has_id is not None and has_id(book_id):
+                    waiting.append(book_id)
+                else:
+                    to_clear[book_id] = sequence
+                if callback is not None:
+                    callback(book_id, mi, False)
+                continue
+            to_render.append((book_id, mi, sequence))
+
+        rendered = self._render_all([mi for _, mi, _ in to_render])
+        try:
+            paths = self._paths_for([book_id for book_id, _, _ in to_render])
+        except Exception as e:
+            err_str = "Failed to get the backup paths for the batch"
+            default_log.log_variables(err_str, "INFO", ("book_ids", book_ids), ("error", e))
+            paths = dict()
+
+        pool = self._get_io_pool()
+        writes = []
+        for (book_id, mi, sequence), (raw, error) in zip(to_render, rendered):
+            if error is not None:
+                err_str = "Failed to convert to opf"
+                default_log.log_variables(err_str, "INFO", ("book_id", book_id), ("error", error))
+                # Retrying won't help - the metadata can't be rendered
+                to_clear[book_id] = sequence
+                self.books_failed += 1
+                if callback is not None:
+                    callback(book_id, mi, False)
+                continue
+            writes.append((book_id, mi, sequence, pool.submit(self._write, book_id, raw, paths.get(book_id))))
+
+        for book_id, mi, sequence, future in writes:
+            try:
+                future.result()
+            except Exception as e:
+                # Left dirtied - so it's tried again in a later batch
+                err_str = "Failed to write backup metadata"
+                default_log.log_variables(err_str, "INFO", ("book_id", book_id), ("error", e))
+                self.books_failed += 1
+                failed.append(book_id)
+                if callback is not None:
+                    callback(book_id, mi, False)
+                continue
+            to_clear[book_id] = sequence
+            self.books_written += 1
+            if callback is not None:
+                callback(book_id, mi, True)
+
+        if clear and to_clear:
+            self.db.clear_dirtied_many(to_clear)
+
+        # Books which keep failing would otherwise head every batch taken from the queue - and starve the rest of it
+        requeue = getattr(self.db, "requeue_dirtied", None)
+        if from_queue and (failed or waiting) and requeue is not None:
+            requeue(failed + waiting)
+
+        self.busy_time += time.monotonic() - start
+        return len(book_ids)
+
+    def books_per_second(self):
+        """
+        Books backed up per second spent backing up.
+        :return:
+        """
+        return self.books_written / self.busy_time if self.busy_time > 0 else 0.0
+
+    def stats(self):
+        """
+        :return: Dictionary of written, failed, busy_time and books_per_second
+        """
+        return {
+            "written": self.books_written,
+            "failed": self.books_failed,
+            "busy_time": self.busy_time,
+            "books_per_second": self.books_per_second(),
+        }
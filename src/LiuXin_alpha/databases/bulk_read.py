@@ -0,0 +1,108 @@
+"""
+Bulk reads from the cache - the values of some fields for many books at once, laid out as a column per field.
+
+field_for answers for a single book - taking the read lock, looking the field up and checking for composites on every
+call. Code which wants a handful of fields for a lot of books (backups, embedding metadata, exports) paid that for every
+value. Here each field is read in one pass over the books, under a single read lock, by calling its for_book directly.
+The results are kept as one list per field (aligned with the book ids) rather than a dict per book.
+"""
+
+from __future__ import print_function
+
+from typing import Callable, Iterable, Optional
+
+
+def read_column(for_book: Callable, book_ids, default_value=None, errors=(KeyError, IndexError)):
+    """
+    The values of a field for the books - in book_ids order.
+    :param for_book: The for_book method of the field - called with (book_id, default_value=default_value)
+    :param book_ids:
+    :param default_value: Used for books without a value (for_book raised one of the errors)
+    :param errors: Raised by for_book for books it has no value for
+    :return: List of values
+    """
+    ans = []
+    append = ans.append
+    for book_id in book_ids:
+        try:
+            append(for_book(book_id, default_value=default_value))
+        except errors:
+            append(default_value)
+    return ans
+
+
+class FieldColumns(object):
+    """
+    The values of some fields for some books - a list for each field, aligned with book_ids.
+    """
+
+    __slots__ = ("book_ids", "columns", "_positions")
+
+    def __init__(self, book_ids: Iterable, columns: Optional[dict] = None):
+        """
+        :param book_ids:
+        :param columns: Field name -> list of values (one for each book)
+        """
+        self.book_ids = tuple(book_ids)
+        self.columns = dict()
+        self._positions = None
+        for field, column in (columns or {}).items():
+            self.add(field, column)
+
+    def __len__(self):
+        return len(self.book_ids)
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __contains__(self, field):
+        return field in self.columns
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    def __repr__(self):
+        return "FieldColumns({} books, fields={!r})".format(len(self.book_ids), sorted(self.columns))
+
+    def add(self, field: str, column):
+        """
+        Add (or replace) the column of a field.
+        """
+        column = list(column)
+        if len(column) != len(self.book_ids):
+            err_str = "Column for {!r} has {} values - expected {}"
+            raise ValueError(err_str.format(field, len(column), len(self.book_ids)))
+        self.columns[field] = column
+
+    def position(self, book_id):
+        """
+        The index of the book in the columns - KeyError if it isn't one of the books.
+        """
+        if self._positions is None:
+            self._positions = {book_id: i for i, book_id in enumerate(self.book_ids)}
+        return self._positions[book_id]
+
+    def value(self, field: str, book_id):
+        return self.columns[field][self.position(book_id)]
+
+    def row(self, book_id):
+        """
+        The values of every field for one of the books.
+        :return: Field name -> value
+        """
+        i = self.position(book_id)
+        return {field: column[i] for field, column in self.columns.items()}
+
+    def rows(self):
+        """
+        Iterate over (book_id, field name -> value) for every book - in book_ids order.
+        """
+        columns = list(self.columns.items())
+        for i, book_id in enumerate(self.book_ids):
+            yield book_id, {field: column[i] for field, column in columns}
+
+    def as_dict(self, field: str):
+        """
+        The column of a field as a book_id -> value map (as all_field_for returns).
+        """
+        return dict(zip(self.book_ids, self.columns[field]))
@@ -8,6 +8,7 @@ Performance cache for data from the library database.
 
 from __future__ import unicode_literals, division, absolute_import, print_function
 
+import heapq
 import json
 import os
 import pprint
@@ -70,18 +71,23 @@ from LiuXin.databases import SPOOL_SIZE, _get_next_series_num_for_list
 from LiuXin.databases.adaptors import get_series_values
 from LiuXin.databases.caches.calibre.fields import (
     calibre_create_field,
-    IDENTITY,
     InvalidLinkTable,
 )
 from LiuXin.databases.caches.calibre.tables.base import CalibreVirtualTable
 from LiuXin.databases.categories import get_categories
+from LiuXin_alpha.databases.backup_pipeline import BackupEngine
+from LiuXin_alpha.databases.bulk_read import FieldColumns
+from LiuXin_alpha.databases.bulk_read import read_column
+from LiuXin_alpha.databases.category_cache import CategoryEngine
+from LiuXin_alpha.databases.duplicate_index import DuplicateIndex
+from LiuXin_alpha.databases.sort_keys import SortEngine
+from LiuXin_alpha.preferences import preferences
 from LiuXin.databases.lazy import FormatMetadata, FormatsList, ProxyMetadata
 from LiuXin.utils.general_ops.python_tools import uniq
 
 from LiuXin.exceptions import NoSuchFormat
 
 from LiuXin.file_formats import check_ebook_format
-from LiuXin.file_formats.opf.opf2 import metadata_to_opf
 
 from LiuXin.metadata import string_to_authors, author_to_author_sort
 from LiuXin.metadata.book.base import calibreMetadata as Metadata
@@ -106,7 +112,6 @@ from LiuXin.databases.caches.utils import run_import_plugins
 from LiuXin.databases.caches.utils import _add_newbook_tag
 
 # Py2/Py3 compatibility layer
-from LiuXin.utils.lx_libraries.liuxin_six import six_cmp
 from LiuXin.utils.lx_libraries.liuxin_six import dict_iterkeys as iterkeys
 from LiuXin.utils.lx_libraries.liuxin_six import dict_iteritems as iteritems
 from LiuXin.utils.lx_libraries.liuxin_six import dict_itervalues as itervalues
@@ -135,6 +140,30 @@ __docformat__ = "restructuredtext en"
 
 T = TypeVar("T")
 
+# The standard fields _get_metadata reads for each book
+METADATA_FIELDS = (
+    "title",
+    "author_sort",
+    "comments",
+    "publisher",
+    "timestamp",
+    "pubdate",
+    "uuid",
+    "sort",
+    "last_modified",
+    "formats",
+    "languages",
+    "cover",
+    "tags",
+    "series",
+    "series_index",
+    "rating",
+    "identifiers",
+)
+
+# Books read at a time by embed_metadata
+BULK_READ_SIZE = 500
+
 
 class BaseCalibreCache(BaseCache):
     """
@@ -285,9 +314,22 @@ class CalibreCache(BaseCalibreCache):
     flexibility.
     """
 
+    # Fields whose sort keys change along with the field being written - None for all of them (the languages feed
+    # into the sort keys of several fields)
+    sort_key_dependents = {"title": ("sort",), "authors": ("author_sort",), "languages": None}
+
     def __init__(self, backend) -> None:
         super(CalibreCache, self).__init__(backend=backend)
 
+        # Title and author index for duplicate detection - built on first use, then kept up to date as books change
+        self._duplicate_index = None
+
+        # Ranked sort keys for each field sorted on - invalidated per field (and book) as fields are written
+        self._sort_engine = SortEngine()
+
+        # Tag browser category rows for each field - rebuilt per item as the books linked to them change
+        self._category_engine = CategoryEngine()
+
     @api
     def init(self) -> None:
         """
@@ -362,6 +404,14 @@ class CalibreCache(BaseCalibreCache):
         """
         tables = self.tables = {}
 
+        # Array backed tables use far less memory on large libraries - see caches.numpy.tables
+        if preferences.parse("numpy_tables", "bool", False):
+            from LiuXin_alpha.databases.caches.numpy.tables import numpy_create_table
+
+            create_table = numpy_create_table
+        else:
+            create_table = calibre_create_table
+
         # Initialize the inbuilt tables
         # - one_to_one_tables
         for col in (
@@ -377,19 +427,19 @@ class CalibreCache(BaseCalibreCache):
             "notes",
             "cover",
         ):
-            tables[col] = calibre_create_table(name=col, metadata=self.field_metadata[col].copy(), fsm=self.backend.fsm)
+            tables[col] = create_table(name=col, metadata=self.field_metadata[col].copy(), fsm=self.backend.fsm)
 
         # - many_to_one tables
         for col in ("series", "publisher", "subjects", "synopses", "genre"):
-            tables[col] = calibre_create_table(name=col, metadata=self.field_metadata[col].copy(), fsm=self.backend.fsm)
+            tables[col] = create_table(name=col, metadata=self.field_metadata[col].copy(), fsm=self.backend.fsm)
 
         # - one_many tables
         for col in ("comments",):
-            tables[col] = calibre_create_table(name=col, metadata=self.field_metadata[col].copy(), fsm=self.backend.fsm)
+            tables[col] = create_table(name=col, metadata=self.field_metadata[col].copy(), fsm=self.backend.fsm)
 
         # - many_many tables
         for col in ("authors", "tags", "formats", "identifiers", "languages", "rating"):
-            tables[col] = calibre_create_table(name=col, metadata=self.field_metadata[col].copy(), fsm=self.backend.fsm)
+            tables[col] = create_table(name=col, metadata=self.field_metadata[col].copy(), fsm=self.backend.fsm)
 
         # - virtual tables
         tables["size"] = calibre_create_table(
@@ -799,9 +849,15 @@ class CalibreCache(BaseCalibreCache):
             field.clear_caches(book_ids=book_ids)
 
     @write_api
-    def clear_search_caches(self, book_ids=None):
+    def clear_search_caches(self, book_ids=None, fields=None):
+        """
+        Bring the search caches up to date after a change.
+        :param book_ids: The changed books - None to clear everything
+        :param fields: The changed fields - if known, only cached searches which read them are dropped
+        :return:
+        """
         self.clear_search_cache_count += 1
-        self._search_api.update_or_clear(self, book_ids)
+        self._search_api.update_or_clear(self, book_ids, fields=fields)
 
     @read_api
     def last_modified(self):
@@ -836,6 +892,12 @@ class CalibreCache(BaseCalibreCache):
         if search_cache:
             self.unlock.clear_search_caches(book_ids)
 
+        self._sort_engine.invalidate(book_ids=book_ids or None)
+        if book_ids:
+            self._category_engine.books_changed(None, book_ids)
+        else:
+            self._category_engine.invalidate()
+
     @write_api
     def reload_from_db(self, clear_caches=True):
         """
@@ -855,20 +917,35 @@ class CalibreCache(BaseCalibreCache):
             for field in itervalues(self.fields):
                 if hasattr(field, "table"):
                     field.table.read(self.backend)  # Reread data from metadata.db
+        self._duplicate_index = None
+        self._sort_engine.invalidate()
+        self._category_engine.invalidate()
 
-    def _get_metadata(self, book_id, get_user_categories=True):  # {{{
+    def _get_metadata(self, book_id, get_user_categories=True, row=None, author_ids=None, adata=None):  # {{{
         """
         Return a calibre metadata object for the given book id
         :param book_id:
         :param get_user_categories:
+        :param row: Field name -> value for the book, as read by _metadata_columns - values are read one at a time with
+                    field_for if not provided
+        :param author_ids: The ids of the book's authors - with row
+        :param adata: Author data covering (at least) those authors - with row
         :return:
         """
         mi = Metadata(None, template_cache=self.formatter_template_cache)
 
         mi._proxy_metadata = ProxyMetadata(self, book_id, formatter=mi.formatter)
 
-        author_ids = self.unlock.field_ids_for("authors", book_id)
-        adata = self.unlock.author_data(author_ids)
+        if row is None:
+            field_for = self.unlock.field_for
+            author_ids = self.unlock.field_ids_for("authors", book_id)
+            adata = self.unlock.author_data(author_ids)
+        else:
+
+            def field_for(name, book_id, default_value=None):
+                val = row.get(name)
+                return default_value if val is None else val
+
         aut_list = [adata[i] for i in author_ids]
         aum = []
         aus = {}
@@ -878,24 +955,24 @@ class CalibreCache(BaseCalibreCache):
             aum.append(aut)
             aus[aut] = rec["sort"]
             aul[aut] = rec["link"]
-        mi.title = self.unlock.field_for("title", book_id, default_value=_("Unknown"))
+        mi.title = field_for("title", book_id, default_value=_("Unknown"))
         mi.authors = aum
-        mi.author_sort = self.unlock.field_for("author_sort", book_id, default_value=_("Unknown"))
+        mi.author_sort = field_for("author_sort", book_id, default_value=_("Unknown"))
         # Todo: Add creator sort map to LiuXin metadata
         mi.author_sort_map = aus
         # Todo: What is this? Add analogues case to LiuXin metadata
         mi.author_link_map = aul
-        mi.comments = self.unlock.field_for("comments", book_id)
-        mi.publisher = self.unlock.field_for("publisher", book_id)
+        mi.comments = field_for("comments", book_id)
+        mi.publisher = field_for("publisher", book_id)
         n = utcnow()
-        mi.timestamp = self.unlock.field_for("timestamp", book_id, default_value=n)
-        mi.pubdate = self.unlock.field_for("pubdate", book_id, default_value=n)
-        mi.uuid = self.unlock.field_for("uuid", book_id, default_value="dummy")
-        mi.title_sort = self.unlock.field_for("sort", book_id, default_value=_("Unknown"))
-        mi.last_modified = self.unlock.field_for("last_modified", book_id, default_value=n)
-        formats = self.unlock.field_for("formats", book_id)
+        mi.timestamp = field_for("timestamp", book_id, default_value=n)
+        mi.pubdate = field_for("pubdate", book_id, default_value=n)
+        mi.uuid = field_for("uuid", book_id, default_value="dummy")
+        mi.title_sort = field_for("sort", book_id, default_value=_("Unknown"))
+        mi.last_modified = field_for("last_modified", book_id, default_value=n)
+        formats = field_for("formats", book_id)
         mi.format_metadata = {}
-        mi.languages = list(self.unlock.field_for("languages", book_id, default_value=()))
+        mi.languages = list(field_for("languages", book_id, default_value=()))
         if not formats:
             good_formats = None
         else:
@@ -905,17 +982,17 @@ class CalibreCache(BaseCalibreCache):
         # These three attributes are returned by the db2 get_metadata(), however, we dont actually use them anywhere
         # other than templates, so they have been removed, to avoid unnecessary overhead. The templates all use
         # _proxy_metadata.
-        # mi.book_size   = self.unlock.field_for('size', book_id, default_value=0)
-        # mi.ondevice_col = self.unlock.field_for('ondevice', book_id, default_value='')
+        # mi.book_size   = field_for('size', book_id, default_value=0)
+        # mi.ondevice_col = field_for('ondevice', book_id, default_value='')
         # mi.db_approx_formats = formats
         mi.formats = good_formats
-        mi.has_cover = _("Yes") if self.unlock.field_for("cover", book_id, default_value=False) else ""
-        mi.tags = list(self.unlock.field_for("tags", book_id, default_value=()))
-        mi.series = self.unlock.field_for("series", book_id)
+        mi.has_cover = _("Yes") if field_for("cover", book_id, default_value=False) else ""
+        mi.tags = list(field_for("tags", book_id, default_value=()))
+        mi.series = field_for("series", book_id)
         if mi.series:
-            mi.series_index = self.unlock.field_for("series_index", book_id, default_value=1.0)
-        mi.rating = self.unlock.field_for("rating", book_id)
-        mi.set_identifiers(self.unlock.field_for("identifiers", book_id, default_value={}))
+            mi.series_index = field_for("series_index", book_id, default_value=1.0)
+        mi.rating = field_for("rating", book_id)
+        mi.set_identifiers(field_for("identifiers", book_id, default_value={}))
         # Todo: This seems to be ... well ... not even wrong
         mi.application_id = book_id
         # Todo: Check that this has been properly set for the LiuXin metadata object
@@ -926,10 +1003,10 @@ class CalibreCache(BaseCalibreCache):
             if meta["datatype"] == "composite":
                 composites.append(key)
             else:
-                val = self.unlock.field_for(key, book_id)
+                val = field_for(key, book_id)
                 if isinstance(val, tuple):
                     val = list(val)
-                extra = self.unlock.field_for(key + "_index", book_id)
+                extra = field_for(key + "_index", book_id)
                 mi.set(key, val=val, extra=extra)
         for key in composites:
             mi.set(key, val=self.unlock.composite_for(key, book_id, mi))
@@ -953,6 +1030,45 @@ class CalibreCache(BaseCalibreCache):
 
     # }}}
 
+    def _metadata_columns(self, book_ids):
+        """
+        Read everything _get_metadata needs for the books - a pass over each field, rather than a pass over the fields
+        for each book.
+        :param book_ids:
+        :return: (FieldColumns, author ids for each book, author data for all of them)
+        """
+        names = list(METADATA_FIELDS)
+        for key, meta in self.field_metadata.custom_iteritems():
+            if meta["datatype"] != "composite":
+                names.append(key)
+                if key + "_index" in self.fields:
+                    names.append(key + "_index")
+        columns = self.unlock.fields_for(names, book_ids)
+
+        af = self.fields["authors"]
+        author_ids = read_column(
+            af.ids_for_book, columns.book_ids, default_value=(), errors=(KeyError, IndexError, NotInCache)
+        )
+        wanted = set()
+        for ids in author_ids:
+            wanted.update(ids or ())
+        return columns, author_ids, self.unlock.author_data(wanted)
+
+    def _get_metadata_many(self, book_ids, get_user_categories=True):
+        """
+        Metadata objects for the books - see get_metadata_many.
+        :param book_ids:
+        :param get_user_categories:
+        :return:
+        """
+        columns, author_ids, adata = self._metadata_columns(book_ids)
+        return [
+            self._get_metadata(
+                book_id, get_user_categories=get_user_categories, row=row, author_ids=ids or (), adata=adata
+            )
+            for (book_id, row), ids in zip(columns.rows(), author_ids)
+        ]
+
     # Cache Layer API {{{
 
     @read_api
@@ -1033,6 +1149,51 @@ class CalibreCache(BaseCalibreCache):
             book_id: self.unlock.fast_field_for(field_obj, book_id, default_value=default_value) for book_id in book_ids
         }
 
+    @read_api
+    def fields_for(self, field_names, book_ids, default_value=None):
+        """
+        Same as field_for, except that it reads several fields for many books at once - the read lock is taken once,
+        and each field is read in a single pass over the books.
+        Books which are unknown, or have no value for a field, get ``default_value`` (substituted for the field default
+        for is_multiple fields - as in field_for).
+        Will KeyError if any of the names doesn't correspond to one of the known fields.
+        :param field_names: The fields to read
+        :param book_ids: The books to read them for
+        :param default_value:
+        :return: A FieldColumns - a list of values for each field, in book_ids order
+        """
+        columns = FieldColumns(book_ids)
+        book_ids = columns.book_ids
+        for name in field_names:
+            if self.composites and name in self.composites:
+                field = self.composites[name]
+                get_metadata = self.unlock.get_proxy_metadata
+                columns.add(name, [field.get_value_with_cache(book_id, get_metadata) for book_id in book_ids])
+                continue
+
+            try:
+                field = self.fields[name]
+            except KeyError:
+                err_str = "field not found in list of currently valid field"
+                err_str = default_log.log_variables(
+                    err_str,
+                    "ERROR",
+                    ("name", name),
+                    ("self.fields.keys()", self.fields.keys()),
+                )
+                raise KeyError(err_str)
+
+            field_default = default_value
+            if field.is_multiple and field_default is None:
+                field_default = field.default_value
+            columns.add(
+                name,
+                read_column(
+                    field.for_book, book_ids, default_value=field_default, errors=(KeyError, IndexError, NotInCache)
+                ),
+            )
+        return columns
+
     @read_api
     def composite_for(self, name, book_id, mi=None, default_value=""):
         """
@@ -1236,20 +1397,28 @@ class CalibreCache(BaseCalibreCache):
         """
         ans = self.field_for("formats", book_id)
         if verify_formats and ans:
+            ans = self._verified_formats(book_id, ans)
+        return ans
 
-            fmts_field = self.fields["formats"]
+    def _verified_formats(self, book_id, fmts):
+        """
+        The formats of the book which exist on disk.
+        :param book_id:
+        :param fmts: The formats of the book - as read from the formats field
+        :return:
+        """
+        fmts_field = self.fields["formats"]
 
-            def verify(fmt):
-                try:
-                    loc = loc_from_formats_field(fmts_field, book_id, fmt)
-                except Exception as e:
-                    err_str = "Error while calling formats"
-                    default_log.log_exception(err_str, e, "INFO")
-                    return False
-                return self.backend.fsm.path.exists(loc)
+        def verify(fmt):
+            try:
+                loc = loc_from_formats_field(fmts_field, book_id, fmt)
+            except Exception as e:
+                err_str = "Error while calling formats"
+                default_log.log_exception(err_str, e, "INFO")
+                return False
+            return self.backend.fsm.path.exists(loc)
 
-            ans = tuple(x for x in ans if verify(x))
-        return ans
+        return tuple(x for x in fmts if verify(x))
 
     @api
     def format(self, book_id, fmt, as_file=False, as_path=False, preserve_filename=False):
@@ -1404,6 +1573,7 @@ class CalibreCache(BaseCalibreCache):
                     book_id, fmt_priority, None, ans["size"], self.backend
                 )
                 self.fields["size"].table.update_sizes({book_id: max_size})
+                self._sort_engine.invalidate(("formats", "size"), (book_id,))
 
         return ans
 
@@ -1626,6 +1796,7 @@ class CalibreCache(BaseCalibreCache):
 
             max_size = self.fields["formats"].table.update_fmt(book_id, fmt, fname, size, self.backend)
             self.fields["size"].table.update_sizes({book_id: max_size})
+            self._sort_engine.invalidate(("formats", "size"), (book_id,))
             self.unlock.update_last_modified((book_id,))
 
         if run_hooks:
@@ -1724,6 +1895,7 @@ class CalibreCache(BaseCalibreCache):
 
         size_map = table.remove_formats(formats_map, self.backend)
         self.fields["size"].table.update_sizes(size_map)
+        self._sort_engine.invalidate(("formats", "size"), formats_map)
         self.unlock.update_last_modified(tuple(iterkeys(formats_map)))
 
     def _formats_map_preflight(self, formats_map):
@@ -1757,11 +1929,12 @@ class CalibreCache(BaseCalibreCache):
         return new_formats_map
 
     @write_api
-    def update_last_modified(self, book_ids, now=None):
+    def update_last_modified(self, book_ids, now=None, fields=None):
         """
         Updates the last modified date for the given book_ids - if :param now: is None, will default to utcnow()
         :param book_ids:
         :param now:
+        :param fields: The fields changed on the books - None if they're not known
         :return:
         """
         if book_ids:
@@ -1769,9 +1942,12 @@ class CalibreCache(BaseCalibreCache):
                 now = nowf()
             f = self.fields["last_modified"]
             f.writer.set_books({book_id: now for book_id in book_ids}, self.backend)
+            self._sort_engine.invalidate(("last_modified",), book_ids)
             if self.composites:
                 self.unlock.clear_composite_caches(book_ids)
-            self.unlock.clear_search_caches(book_ids)
+            self.unlock.clear_search_caches(
+                book_ids, fields=None if fields is None else tuple(fields) + ("last_modified",)
+            )
 
     #
     # ------------------------------------------------------------------------------------------------------------------
@@ -1802,6 +1978,32 @@ class CalibreCache(BaseCalibreCache):
 
         return mi
 
+    @api
+    def get_metadata_many(self, book_ids, get_cover=False, get_user_categories=True, cover_as_data=False):
+        """
+        Same as get_metadata - but for many books at once. The read lock is taken once and each field is read for all
+        the books in a single pass, rather than every field being looked up book by book.
+        :param book_ids: The ids of the books to retrieve metadata for
+        :param get_cover: As for get_metadata
+        :param get_user_categories: As for get_metadata
+        :param cover_as_data: As for get_metadata
+        :return: List of Metadata objects - in book_ids order
+        """
+        book_ids = list(book_ids)
+        with self.safe_read_lock:
+            mis = self._get_metadata_many(book_ids, get_user_categories=get_user_categories)
+
+        if get_cover:
+            for book_id, mi in zip(book_ids, mis):
+                if cover_as_data:
+                    cdata = self.cover(book_id)
+                    if cdata:
+                        mi.cover_data = ("jpeg", cdata)
+                else:
+                    mi.cover = self.cover(book_id, as_path=True)
+
+        return mis
+
     @read_api
     def get_proxy_metadata(self, book_id):
         """
@@ -2099,65 +2301,44 @@ class CalibreCache(BaseCalibreCache):
         """
         ids_to_sort = self.unlock.all_book_ids() if ids_to_sort is None else ids_to_sort
         get_metadata = self.unlock.get_proxy_metadata
-        lang_map = self.fields["languages"].book_value_map
         virtual_fields = virtual_fields or {}
 
         fm = {"title": "sort", "authors": "author_sort"}
 
-        def sort_key_func(field):
+        def key_func_factory(f):
+            # The sort key functions (and the lang_map) are only built if there are sort keys to work out
+            return lambda: f.sort_keys_for_books(get_metadata, self.fields["languages"].book_value_map)
+
+        def sort_columns(field, ascending):
             """
             Handle series type fields, virtual fields and the id field
             :param field:
-            :return:
+            :param ascending:
+            :return: The columns to sort on for the field - see SortEngine.sort
             """
-            idx = field + "_index"
-            is_series = idx in self.fields
+            name = fm.get(field, field)
             try:
-                func = self.fields[fm.get(field, field)].sort_keys_for_books(get_metadata, lang_map)
+                f = self.fields[name]
             except KeyError:
                 if field == "id":
-                    return IDENTITY
-                else:
-                    return virtual_fields[fm.get(field, field)].sort_keys_for_books(get_metadata, lang_map)
-            if is_series:
-                idx_func = self.fields[idx].sort_keys_for_books(get_metadata, lang_map)
+                    return [(None, ascending, None, False)]
+                return [(name, ascending, key_func_factory(virtual_fields[name]), False)]
 
-                def skf(book_id):
-                    return func(book_id), idx_func(book_id)
-
-                return skf
-            return func
+            # Composite and ondevice values can change without the field being written - so are never cached
+            cache = name not in self.composites and name != "ondevice"
+            columns = [(name, ascending, key_func_factory(f), cache)]
+            idx = field + "_index"
+            if idx in self.fields:
+                columns.append((idx, ascending, key_func_factory(self.fields[idx]), True))
+            return columns
 
         # Sort only once on any given field
         fields = uniq(fields, operator.itemgetter(0))
 
-        if len(fields) == 1:
-            return sorted(ids_to_sort, key=sort_key_func(fields[0][0]), reverse=not fields[0][1])
-        sort_key_funcs = tuple(sort_key_func(field) for field, order in fields)
-        orders = tuple(1 if order else -1 for _, order in fields)
-        lazy_obj = object()  # Lazy load the sort keys for sub-sort fields
-
-        class SortKey(object):
-
-            __slots__ = ("book_id", "sort_key")
-
-            def __init__(self, book_id):
-                self.book_id = book_id
-                # Calculate only the first sub-sort key since that will always be used
-                self.sort_key = [key(book_id) if i == 0 else lazy_obj for i, key in enumerate(sort_key_funcs)]
-
-            def __cmp__(self, other):
-                for i, (order, self_key, other_key) in enumerate(zip(orders, self.sort_key, other.sort_key)):
-                    if self_key is lazy_obj:
-                        self_key = self.sort_key[i] = sort_key_funcs[i](self.book_id)
-                    if other_key is lazy_obj:
-                        other_key = other.sort_key[i] = sort_key_funcs[i](other.book_id)
-                    ans = six_cmp(self_key, other_key)
-                    if ans != 0:
-                        return ans * order
-                return 0
-
-        return sorted(ids_to_sort, key=SortKey)
+        columns = []
+        for field, ascending in fields:
+            columns.extend(sort_columns(field, ascending))
+        return self._sort_engine.sort(ids_to_sort, columns)
 
     @read_api
     def search(self, query, restriction="", virtual_fields=None, book_ids=None):
@@ -2215,6 +2396,7 @@ class CalibreCache(BaseCalibreCache):
                 raise
             with self.write_lock:
                 self.fields[bad_field].table.fix_link_table(self.backend)
+                self._category_engine.invalidate((bad_field,))
             return self.get_categories(sort=sort, book_ids=book_ids, already_fixed=bad_field)
 
     #
@@ -2224,14 +2406,15 @@ class CalibreCache(BaseCalibreCache):
     # - DIRTY API
 
     @write_api
-    def mark_as_dirty(self, book_ids):
+    def mark_as_dirty(self, book_ids, fields=None):
         """
         Note that the following books are dirtied on the database.
         :param book_ids:
+        :param fields: The fields changed on the books - None if they're not known
         :return:
         """
         # Regardless of weather the book needs to be marked as dirty the last modification time does need to be updated
-        self.unlock.update_last_modified(book_ids)
+        self.unlock.update_last_modified(book_ids, fields=fields)
 
         try:
             already_dirtied = set(self.dirtied_cache).intersection(book_ids)
@@ -2323,7 +2506,9 @@ class CalibreCache(BaseCalibreCache):
 
         # Update the database (do this first and keep this separate - if this fails then we don't want to update the
         # cache)
+        self._category_engine.books_changed(name, book_id_to_val_map)
         dirtied = f.update(book_id_to_val_map, self.backend, allow_case_change=allow_case_change)
+        self._category_engine.books_changed(name, dirtied)
 
         if is_series and simap:
             sf = self.fields[f.name + "_index"]
@@ -2332,7 +2517,17 @@ class CalibreCache(BaseCalibreCache):
         if dirtied and update_path and do_path_update:
             self.unlock.update_path(dirtied, mark_as_dirtied=False)
 
-        self.unlock.mark_as_dirty(dirtied)
+        if name in {"title", "authors"}:
+            self._update_duplicate_index(dirtied)
+
+        dependents = self.sort_key_dependents.get(name, ())
+        changed_fields = (name, name + "_index") + (dependents or ())
+        if dirtied:
+            self._sort_engine.invalidate(None if dependents is None else changed_fields, dirtied)
+            if update_path and do_path_update:
+                changed_fields += ("path",)
+
+        self.unlock.mark_as_dirty(dirtied, fields=changed_fields)
 
         return dirtied
 
@@ -2350,6 +2545,17 @@ class CalibreCache(BaseCalibreCache):
             return random.choice(tuple(iterkeys(self.dirtied_cache)))
         return None
 
+    @read_api
+    def get_dirtied_books(self, limit=None):
+        """
+        Return the dirtied books which have been waiting longest - oldest first.
+        :param limit: Most books to return - None for all of them
+        :return:
+        """
+        if limit is None:
+            return sorted(self.dirtied_cache, key=self.dirtied_cache.get)
+        return heapq.nsmallest(limit, self.dirtied_cache, key=self.dirtied_cache.get)
+
     @read_api
     def get_metadata_for_dump(self, book_id):
         """
@@ -2380,6 +2586,40 @@ class CalibreCache(BaseCalibreCache):
                 pass
         return mi, sequence
 
+    @read_api
+    def get_metadata_for_dump_many(self, book_ids):
+        """
+        Same as get_metadata_for_dump - but for many of the dirtied books at once. Their metadata is read field by field
+        for all of them, rather than book by book.
+        :param book_ids:
+        :return: Keyed with the book id and valued with (mi, sequence) - as get_metadata_for_dump returns
+        """
+        ans = dict()
+        to_read = []
+        for book_id in book_ids:
+            sequence = self.dirtied_cache.get(book_id, None)
+            ans[book_id] = (None, sequence)
+            if sequence is not None:
+                to_read.append(book_id)
+        if not to_read:
+            return ans
+
+        # While a book is being created, the path is empty - don't bother to write the opf, it'd go to the wrong folder
+        paths = self.unlock.fields_for(("path",), to_read)["path"]
+        to_read = [book_id for book_id, path in zip(to_read, paths) if path]
+        columns, author_ids, adata = self._metadata_columns(to_read)
+        for (book_id, row), ids in zip(columns.rows(), author_ids):
+            try:
+                mi = self._get_metadata(book_id, row=row, author_ids=ids or (), adata=adata)
+            except Exception as e:
+                err_str = "Error while backing up book"
+                default_log.log_exception(err_str, e, "INFO")
+                continue
+            # Always set cover to cover.jpg - see get_metadata_for_dump
+            mi.cover = "cover.jpg"
+            ans[book_id] = (mi, ans[book_id][1])
+        return ans
+
     @write_api
     def clear_dirtied(self, book_id, sequence):
         """
@@ -2398,6 +2638,55 @@ class CalibreCache(BaseCalibreCache):
             )
             self.dirtied_cache.pop(book_id, None)
 
+    @write_api
+    def clear_dirtied_many(self, book_id_sequence_map):
+        """
+        Clear the dirtied indicators for many books at once - in a single transaction.
+        As with clear_dirtied, a book is only cleared if it hasn't been dirtied again since its sequence was read.
+        :param book_id_sequence_map: Keyed with the book id and valued with the sequence from get_metadata_for_dump
+        :return:
+        """
+        to_clear = []
+        for book_id, sequence in iteritems(book_id_sequence_map):
+            dc_sequence = self.dirtied_cache.get(book_id, None)
+            if dc_sequence is None or sequence is None or dc_sequence == sequence:
+                to_clear.append(book_id)
+        if not to_clear:
+            return
+        self.backend.executemany(
+            "DELETE FROM metadata_dirtied_books WHERE metadata_dirtied_book=?",
+            ((book_id,) for book_id in to_clear),
+        )
+        for book_id in to_clear:
+            self.dirtied_cache.pop(book_id, None)
+
+    @write_api
+    def requeue_dirtied(self, book_ids):
+        """
+        Send dirtied books to the back of the queue - with new sequence numbers - so books which can't be backed up
+        don't hold up the rest. They're still dirtied, so they'll be tried again.
+        :param book_ids:
+        :return:
+        """
+        for book_id in book_ids:
+            if book_id in self.dirtied_cache:
+                self.dirtied_cache[book_id] = self.dirtied_sequence
+                self.dirtied_sequence += 1
+
+    @read_api
+    def backup_paths_many(self, book_ids):
+        """
+        The folders the metadata backups for many books are written to - read in one go, so the backups themselves
+        can be written (with backend.write_backup) without holding any of the cache's locks.
+        :param book_ids:
+        :return: Keyed with the book id and valued with the path - books without a path are left out
+        """
+        book_ids = list(book_ids)
+        if not book_ids:
+            return dict()
+        paths = self.unlock.fields_for(("path",), book_ids)["path"]
+        return {book_id: path.replace("/", os.sep) for book_id, path in zip(book_ids, paths) if path}
+
     @write_api
     def write_backup(self, book_id, raw):
         """
@@ -2447,38 +2736,28 @@ class CalibreCache(BaseCalibreCache):
         """
         Write metadata for each record to an individual OPF file. If callback is not None, it is called once at the
         start with the number of book_ids being processed. And once for every book_id, with arguments (book_id, mi, ok).
+        OPFs are rendered and written in batches by a BackupEngine - see backup_pipeline. The metadata for each batch is
+        read in one pass with get_metadata_for_dump_many.
         :param book_ids:
         :param remove_from_dirtied:
         :param callback:
         :return:
         """
         if book_ids is None:
-            book_ids = set(self.dirtied_cache)
+            book_ids = self.unlock.get_dirtied_books()
+        book_ids = list(book_ids)
 
         if callback is not None:
             callback(len(book_ids), True, False)
 
-        for book_id in book_ids:
-            if self.unlock.field_for("path", book_id) is None:
-                if callback is not None:
-                    callback(book_id, None, False)
-                continue
-            mi, sequence = self.unlock.get_metadata_for_dump(book_id)
-            if mi is None:
-                if callback is not None:
-                    callback(book_id, mi, False)
-                continue
-            try:
-                raw = metadata_to_opf(mi)
-                self.unlock.write_backup(book_id, raw)
-                if remove_from_dirtied:
-                    self.unlock.clear_dirtied(book_id, sequence)
-            except Exception as e:
-                err_str = "Error while preforming metadata dump"
-                default_log.log_exception(err_str, e, "INFO")
-
-            if callback is not None:
-                callback(book_id, mi, True)
+        engine = BackupEngine(self.unlock, backend=self.backend)
+        try:
+            for i in range(0, len(book_ids), engine.batch_size):
+                engine.backup_batch(
+                    book_ids[i : i + engine.batch_size], clear=remove_from_dirtied, callback=callback
+                )
+        finally:
+            engine.close()
 
     #
     # ------------------------------------------------------------------------------------------------------------------
@@ -2574,12 +2853,57 @@ class CalibreCache(BaseCalibreCache):
         if title:
             if isbytestring(title):
                 title = title.decode(preferred_encoding, "replace")
-            q = icu_lower(title).strip()
-            for title in itervalues(self.fields["title"].table.book_col_map):
-                if q == icu_lower(title):
-                    return True
+            return self._get_duplicate_index().has_title(title)
         return False
 
+    def _get_duplicate_index(self):
+        """
+        The index used by has_book and find_identical_books - built from the title and authors tables the first time
+        it's needed.
+        :return:
+        """
+        if self._duplicate_index is None:
+            from LiuXin.databases.utils import fuzzy_title
+
+            index = DuplicateIndex(title_key=icu_lower, fuzzy_key=fuzzy_title, author_key=icu_lower)
+            at = self.fields["authors"].table
+            for book_id, title in iteritems(self.fields["title"].table.book_col_map):
+                index.set_title(book_id, as_unicode(title) if isbytestring(title) else title)
+            for book_id, author_ids in iteritems(at.book_col_map):
+                index.set_authors(book_id, (at.id_map[aid] for aid in author_ids))
+            self._duplicate_index = index
+        return self._duplicate_index
+
+    def _update_duplicate_index(self, book_ids):
+        """
+        Re-read the titles and authors of the given books into the duplicate index (if it's been built).
+        :param book_ids:
+        :return:
+        """
+        if self._duplicate_index is None:
+            return
+        title_map = self.fields["title"].table.book_col_map
+        at = self.fields["authors"].table
+        for book_id in book_ids:
+            self._duplicate_index.set_title(book_id, title_map.get(book_id))
+            self._duplicate_index.set_authors(book_id, (at.id_map[aid] for aid in at.book_col_map.get(book_id, ())))
+
+    def _index_new_book(self, book_id, mi):
+        """
+        Add a newly created book to the duplicate index (if it's been built) - under the title and authors which were
+        stored for it, which needn't be exactly those in the metadata it was created from.
+        :param book_id:
+        :param mi: The metadata the book was created from - only used for fields which haven't been read back yet
+        :return:
+        """
+        if self._duplicate_index is None:
+            return
+        title = self.fields["title"].table.book_col_map.get(book_id, mi.title)
+        at = self.fields["authors"].table
+        author_ids = at.book_col_map.get(book_id)
+        authors = mi.authors if author_ids is None else [at.id_map[aid] for aid in author_ids]
+        self._duplicate_index.add_book(book_id, as_unicode(title) if isbytestring(title) else title, authors)
+
     @read_api
     def has_id(self, book_id):
         """
@@ -2696,6 +3020,11 @@ class CalibreCache(BaseCalibreCache):
                 self.fields[field].table.uuid_to_id_map[val] = book_id
             self.fields[field].table.book_col_map[book_id] = val
 
+        self._index_new_book(book_id, mi)
+        self._category_engine.books_changed(None, (book_id,))
+        # Any search indexes already built don't know about the new book - nor do the cached results
+        self.unlock.clear_search_caches((book_id,))
+
         return book_id
 
     # Todo: Merge and expand with a add book from file method
@@ -2796,6 +3125,8 @@ class CalibreCache(BaseCalibreCache):
         """
         self.backend.remove_books(book_ids, permanent=permanent)
 
+        # Before the links go - so the items the books leave can be found
+        self._category_engine.books_changed(None, book_ids)
         for field in itervalues(self.fields):
             try:
                 table = field.table
@@ -2805,6 +3136,8 @@ class CalibreCache(BaseCalibreCache):
                 table.remove_books(book_ids, self.backend)
 
         self._search_api.discard_books(book_ids)
+        if self._duplicate_index is not None:
+            self._duplicate_index.discard_books(book_ids)
         self.unlock.clear_caches(book_ids=book_ids, template_cache=False, search_cache=False)
         for cc in self.cover_caches:
             cc.invalidate(book_ids)
@@ -2946,8 +3279,12 @@ class CalibreCache(BaseCalibreCache):
                     {book_id: self.unlock.fast_field_for(f, book_id) + extra for book_id in books},
                 )
 
+        self._category_engine.items_changed(field, item_id_to_new_name_map)
         if affected_books:
+            self._sort_engine.invalidate((field,), affected_books)
+            self._category_engine.books_changed(field, affected_books)
             if field == "authors":
+                self._update_duplicate_index(affected_books)
                 self.unlock.set_field(
                     "author_sort",
                     {k: " & ".join(v) for k, v in iteritems(self.unlock.author_sort_strings_for_books(affected_books))},
@@ -2963,7 +3300,7 @@ class CalibreCache(BaseCalibreCache):
                             )
                         },
                     )
-            self.unlock.mark_as_dirty(affected_books)
+            self.unlock.mark_as_dirty(affected_books, fields=(field,))
         return affected_books, id_map
 
     @write_api
@@ -2984,12 +3321,18 @@ class CalibreCache(BaseCalibreCache):
         if restrict_to_book_ids is not None and not isinstance(restrict_to_book_ids, frozenset):
             restrict_to_book_ids = frozenset(restrict_to_book_ids)
         affected_books = field.table.remove_items(item_ids, self.backend, restrict_to_book_ids=restrict_to_book_ids)
+        self._category_engine.items_changed(field.name, item_ids)
         if affected_books:
+            self._sort_engine.invalidate((field.name,), affected_books)
+            self._category_engine.books_changed(field.name, affected_books)
+            if field.name == "authors":
+                self._update_duplicate_index(affected_books)
             # Todo: This method needs to deal with how we set indexes
             if hasattr(field, "index_field"):
                 self.unlock.set_field(field.index_field.name, {bid: 1.0 for bid in affected_books})
+                self.unlock.clear_search_caches(affected_books, fields=(field.name,))
             else:
-                self.unlock.mark_as_dirty(affected_books)
+                self.unlock.mark_as_dirty(affected_books, fields=(field.name,))
         return affected_books
 
     # ------------------------------------------------------------------------------------------------------------------
@@ -3147,6 +3490,7 @@ class CalibreCache(BaseCalibreCache):
         :return:
         """
         sort_map = self.fields["authors"].table.set_sort_names(author_id_to_sort_map, self.backend)
+        self._category_engine.items_changed("authors", sort_map)
         changed_books = set()
         if update_books:
             val_map = {}
@@ -3321,45 +3665,20 @@ class CalibreCache(BaseCalibreCache):
         """
         Finds books that have a superset of the authors in mi and the same title (title is fuzzy matched). See also
         :meth:`data_for_find_identical_books`.
+        Candidates are looked up in the duplicate index - search_restriction and book_ids only narrow down the result.
         :param mi:
         :param search_restriction:
         :param book_ids:
         :return:
         """
-        from LiuXin.databases.utils import fuzzy_title
-
-        identical_book_ids = set()
-        if mi.authors:
-            try:
-                quathors = mi.authors[:20]  # Too many authors causes parsing of the search expression to fail
-                query = " and ".join('authors:"=%s"' % (a.replace('"', "")) for a in quathors)
-                qauthors = mi.authors[20:]
-            except ValueError:
-                return identical_book_ids
-
-            try:
-                book_ids = self.unlock.search(query, restriction=search_restriction, book_ids=book_ids)
-            except Exception as e:
-                err_str = "Exception while preforming search in find identical books - ignoring"
-                default_log.log_exception(err_str, e, "DEBUG")
-
-            if qauthors and book_ids:
-                matches = set()
-                qauthors = {icu_lower(x) for x in qauthors}
-                for book_id in book_ids:
-                    aut = self.unlock.field_for("authors", book_id)
-                    if aut:
-                        aut = {icu_lower(x) for x in aut}
-                        if aut.issuperset(qauthors):
-                            matches.add(book_id)
-                book_ids = matches
+        if not mi.authors:
+            return set()
 
-            for book_id in book_ids:
-                fbook_title = self.unlock.field_for("title", book_id)
-                fbook_title = fuzzy_title(fbook_title)
-                mbook_title = fuzzy_title(mi.title)
-                if fbook_title == mbook_title:
-                    identical_book_ids.add(book_id)
+        identical_book_ids = self._get_duplicate_index().find_identical(mi.title, mi.authors)
+        if identical_book_ids and search_restriction:
+            identical_book_ids &= self.unlock.search("", restriction=search_restriction, book_ids=book_ids)
+        elif book_ids is not None:
+            identical_book_ids &= set(book_ids)
         return identical_book_ids
 
     # ------------------------------------------------------------------------------------------------------------------
@@ -3556,30 +3875,44 @@ class CalibreCache(BaseCalibreCache):
             stream.seek(0, os.SEEK_END)
             return stream.tell()
 
-        for i, book_id in enumerate(book_ids):
-            fmts = field.table.book_col_map.get(book_id, ())
-            if not fmts:
-                continue
-            mi = self.get_metadata(book_id, get_cover=True, cover_as_data=True)
-            try:
-                path = self.unlock.field_for("path", book_id).replace("/", os.sep)
-            except:
+        # Metadata is read for a chunk of books at a time - rather than field by field for each book
+        book_ids = list(book_ids)
+        done = 0
+        for start in range(0, len(book_ids), BULK_READ_SIZE):
+            chunk = [
+                book_id
+                for book_id in book_ids[start : start + BULK_READ_SIZE]
+                if field.table.book_col_map.get(book_id, ())
+            ]
+            done += min(BULK_READ_SIZE, len(book_ids) - start) - len(chunk)
+            if not chunk:
                 continue
-            for fmt in fmts:
-                if only_fmts is not None and fmt.lower() not in only_fmts:
-                    continue
-                try:
-                    name = self.fields["formats"].format_fname(book_id, fmt)
-                except:
+            mis = self.get_metadata_many(chunk, get_cover=True, cover_as_data=True)
+            paths = self.unlock.fields_for(("path",), chunk)["path"]
+            for book_id, mi, path in zip(chunk, mis, paths):
+                done += 1
+                fmts = field.table.book_col_map.get(book_id, ())
+                if path is None:
                     continue
-                if name and path:
-                    new_size = self.backend.apply_to_format(book_id, path, name, fmt, partial(doit, fmt, mi))
-                    if new_size is not None:
-                        self.format_metadata_cache[book_id].get(fmt, {})["size"] = new_size
-                        max_size = self.fields["formats"].table.update_fmt(book_id, fmt, name, new_size, self.backend)
-                        self.fields["size"].table.update_sizes({book_id: max_size})
-            if report_progress is not None:
-                report_progress(i + 1, len(book_ids), mi)
+                path = path.replace("/", os.sep)
+                for fmt in fmts:
+                    if only_fmts is not None and fmt.lower() not in only_fmts:
+                        continue
+                    try:
+                        name = self.fields["formats"].format_fname(book_id, fmt)
+                    except:
+                        continue
+                    if name and path:
+                        new_size = self.backend.apply_to_format(book_id, path, name, fmt, partial(doit, fmt, mi))
+                        if new_size is not None:
+                            self.format_metadata_cache[book_id].get(fmt, {})["size"] = new_size
+                            max_size = self.fields["formats"].table.update_fmt(
+                                book_id, fmt, name, new_size, self.backend
+                            )
+                            self.fields["size"].table.update_sizes({book_id: max_size})
+                            self._sort_engine.invalidate(("formats", "size"), (book_id,))
+                if report_progress is not None:
+                    report_progress(done, len(book_ids), mi)
 
     @read_api
     def get_last_read_positions(self, book_id, fmt, user):
@@ -3649,13 +3982,16 @@ class CalibreCache(BaseCalibreCache):
             "metadata.db": dbkey,
             "total": total,
         }
-        for i, book_id in enumerate(book_ids):
+        # Titles and formats are read for every book up front - rather than looked up book by book
+        book_ids = tuple(book_ids)
+        columns = self.unlock.fields_for(("title", "formats"), book_ids)
+        for i, (book_id, title, fmts) in enumerate(zip(book_ids, columns["title"], columns["formats"])):
             if abort is not None and abort.is_set():
                 return
             if progress is not None:
-                progress(self.unlock.field_for("title", book_id), i + 1, total)
+                progress(title, i + 1, total)
             format_metadata[book_id] = {}
-            for fmt in self.unlock.formats(book_id):
+            for fmt in self._verified_formats(book_id, fmts) if fmts else ():
                 mdata = self.format_metadata(book_id, fmt)
                 key = "%s:%s:%s" % (key_prefix, book_id, fmt)
                 format_metadata[book_id][fmt] = key
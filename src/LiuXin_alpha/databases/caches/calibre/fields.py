@@ -114,6 +114,14 @@ class CalibreField(BaseField):
     # Todo: Shouldn't be able to change this manually
     complex_update = False
 
+    # True if the searchable values are exactly the items in table.id_map, linked to books through table.col_book_map -
+    # so searches can match each item once (see search_values)
+    searchable_items = False
+
+    # True if the categories are built item by item with category_item - so they can be cached per item (see
+    # category_cache)
+    cached_categories = True
+
     # Used to update the write in the table when changes are made to the writer here
     @property
     def writer(self):
@@ -192,24 +200,13 @@ class CalibreField(BaseField):
         if not self.is_many:
             return ans
 
-        id_map = self.table.id_map
-        special_sort = hasattr(self, "category_sort_value")
         for item_id, item_book_ids in iteritems(self.table.col_book_map):
 
             if book_ids is not None:
                 item_book_ids = item_book_ids.intersection(book_ids)
 
             if item_book_ids:
-                ratings = tuple(r for r in (book_rating_map.get(book_id, 0) for book_id in item_book_ids) if r > 0)
-                avg = sum(ratings) / len(ratings) if ratings else 0
-                try:
-                    name = self.category_formatter(id_map[item_id])
-                except KeyError:
-                    # db has entries in the link table without entries in the
-                    # id table, for example, see
-                    # https://bugs.launchpad.net/bugs/1218783
-                    raise InvalidLinkTable(self.name)
-                sval = self.category_sort_value(item_id, item_book_ids, lang_map) if special_sort else name
+                name, sval, avg = self.category_item(item_id, item_book_ids, book_rating_map, lang_map)
                 c = tag_class(
                     name,
                     id=item_id,
@@ -222,6 +219,28 @@ class CalibreField(BaseField):
 
         return ans
 
+    def category_item(self, item_id, item_book_ids, book_rating_map, lang_map):
+        """
+        The name, sort value and average rating of the category for an item.
+        :param item_id:
+        :param item_book_ids: The books to work the category out over
+        :param book_rating_map:
+        :param lang_map:
+        :return:
+        """
+        ratings = tuple(r for r in (book_rating_map.get(book_id, 0) for book_id in item_book_ids) if r > 0)
+        avg = sum(ratings) / len(ratings) if ratings else 0
+        try:
+            name = self.category_formatter(self.table.id_map[item_id])
+        except KeyError:
+            # db has entries in the link table without entries in the
+            # id table, for example, see
+            # https://bugs.launchpad.net/bugs/1218783
+            raise InvalidLinkTable(self.name)
+        if hasattr(self, "category_sort_value"):
+            return name, self.category_sort_value(item_id, item_book_ids, lang_map), avg
+        return name, name, avg
+
     # ------------------------------------------------------------------------------------------------------------------
     #
     # - UPDATE METHODS
@@ -769,6 +788,8 @@ class CalibreOneToManyField(BaseOneToManyField, CalibreField):
     the items linked to (e.g. comments - one book is linked to many targets).
     """
 
+    searchable_items = True
+
     def __init__(self, name, table, bools_are_tristate=False):
 
         # Set the global default for val_unique
@@ -1101,6 +1122,8 @@ class CalibreOneToManyField(BaseOneToManyField, CalibreField):
 
 # Todo: We need an index field which does something clever to keep the index data in line
 class CalibreManyToOneField(BaseManyToOneField, CalibreField):
+    searchable_items = True
+
     def __init__(self, name, table, bools_are_tristate=False):
         super(CalibreManyToOneField, self).__init__(name=name, table=table, bools_are_tristate=bools_are_tristate)
 
@@ -1265,6 +1288,8 @@ class CalibreRatingField(CalibreManyToOneField):
 
 
 class CalibreManyToManyField(BaseManyToManyField, CalibreField):
+    searchable_items = True
+
     def __init__(self, name, table, bools_are_tristate=False):
 
         super(CalibreManyToManyField, self).__init__(name=name, table=table, bools_are_tristate=bools_are_tristate)
@@ -1600,6 +1625,9 @@ class CalibreManyToManyField(BaseManyToManyField, CalibreField):
 
 
 class CalibreIdentifiersField(CalibreManyToManyField, BaseIdentifiersField, CalibreField):
+    searchable_items = False
+    cached_categories = False
+
     def for_book(self, book_id, default_value=None, compatible=True):
         ids = self.table.book_col_map[book_id]["isbn"]
         if not ids:
@@ -1800,6 +1828,9 @@ class CalibreFormatsField(CalibreManyToManyField, BaseFormatsField):
     Provides a front end to the information stored in the Formats table.
     """
 
+    searchable_items = False
+    cached_categories = False
+
     def __init__(self, *args, **kwargs):
         CalibreManyToManyField.__init__(self, *args, **kwargs)
 
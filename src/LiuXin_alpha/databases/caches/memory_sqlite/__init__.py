@@ -52,11 +52,14 @@ class Memory_SQLite_Connection(SQLite_Connection):
 
 class MemoryDatabaseDriver(DatabaseDriver):
     def __init__(self, db_metadata, db=None):
-        super(MemoryDatabaseDriver, self).__init__(db_metadata=db_metadata, db=db, set_conn=False)
+        # There's only ever the one in memory connection - so no need for a pool (or a write-ahead log)
+        super(MemoryDatabaseDriver, self).__init__(
+            db_metadata=db_metadata, db=db, set_conn=False, pool_connections=False, performance_profile="legacy"
+        )
 
         self._memory_conn = Memory_SQLite_Connection(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
 
-    def get_connection(self):
+    def get_connection(self, write=False):
         return self._memory_conn
 
     def initial_get_connection(self):
@@ -90,8 +93,6 @@ class MemoryDatabaseDriver(DatabaseDriver):
             conn.create_aggregate("pyset", 1, PySetAggregate)
             conn.create_aggregate("sortag", 1, SortAggregate)
             conn.create_aggregate("pylist", 1, PyListAggregate)
-            # The progress handler used to monitor the SQLite virtual machine must be added to the conn
-            conn.set_progress_handler(self.simple_print_progress_handler, 1)
 
         except sqlite3.OperationalError as e:
             error_message = e.message
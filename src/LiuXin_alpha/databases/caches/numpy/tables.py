@@ -1,10 +1,128 @@
 # Classes to cache data from the database for active manipulation
 
+"""
+Tables which keep their maps in numpy arrays - see LiuXin_alpha.databases.columnar.
 
-from LiuXin.databases.caches import BaseTable
+These are the calibre one-to-one, many-to-one and many-to-many tables with the dict maps swapped out for array backed
+ones once the table has been read. All the reading and updating logic is inherited - changes land in the overlay of
+each map, and are folded back into the arrays once the overlay grows past a fraction of the map.
+"""
 
+from LiuXin.databases.caches.calibre.tables import calibre_create_table
+from LiuXin.databases.caches.calibre.tables.many_many_tables import CalibreManyToManyTable
+from LiuXin.databases.caches.calibre.tables.many_one_tables import CalibreManyToOneTable
+from LiuXin.databases.caches.calibre.tables.one_one_tables import CalibreOneToOneTable
 
-class NumpyTable(BaseTable):
+from LiuXin_alpha.databases.columnar import columnar_map, _ColumnarMap
+
+
+# Fold a map's overlay back into its arrays once it holds this fraction of the keys (or COMPACT_MIN_KEYS, if larger)
+COMPACT_FRACTION = 0.05
+COMPACT_MIN_KEYS = 1024
+
+
+class NumpyTable(object):
     """
     Implementation of the table concept with everything stored (on the back end) in a numpy array.
+
+    Mixed in ahead of one of the calibre tables.
+    """
+
+    # The maps which are held in arrays
+    _columnar_maps = ("book_col_map", "col_book_map", "id_map")
+
+    def compact_maps(self, force=False):
+        """
+        Move the maps into arrays - or fold the changes made to them back into the arrays.
+        :param force: Compact every map, however few changes it has
+        :return:
+        """
+        for attr in self._columnar_maps:
+            mapping = getattr(self, attr, None)
+            if mapping is None:
+                continue
+            if not isinstance(mapping, _ColumnarMap):
+                # Replaced wholesale by the inherited code - or not yet converted
+                setattr(self, attr, columnar_map(mapping))
+            elif force or mapping.overlay_size > max(COMPACT_MIN_KEYS, len(mapping) * COMPACT_FRACTION):
+                mapping.compact()
+
+    def maps_nbytes(self):
+        """
+        Bytes held in the arrays of the maps.
+        :return:
+        """
+        total = 0
+        for attr in self._columnar_maps:
+            mapping = getattr(self, attr, None)
+            if isinstance(mapping, _ColumnarMap):
+                total += mapping.nbytes()
+        return total
+
+    def read(self, db):
+        super(NumpyTable, self).read(db)
+        self.compact_maps(force=True)
+
+    def update_cache(self, *args, **kwargs):
+        result = super(NumpyTable, self).update_cache(*args, **kwargs)
+        self.compact_maps()
+        return result
+
+    def remove_books(self, *args, **kwargs):
+        result = super(NumpyTable, self).remove_books(*args, **kwargs)
+        self.compact_maps()
+        return result
+
+    def remove_items(self, *args, **kwargs):
+        result = super(NumpyTable, self).remove_items(*args, **kwargs)
+        self.compact_maps()
+        return result
+
+    def rename_item(self, *args, **kwargs):
+        result = super(NumpyTable, self).rename_item(*args, **kwargs)
+        self.compact_maps()
+        return result
+
+
+class NumpyOneToOneTable(NumpyTable, CalibreOneToOneTable):
+    """
+    One value per book - book_col_map is a ColumnarDict with the values interned.
+    """
+
+    # col_book_map is a set of (value, book_id) pairs for these tables - not a map
+    _columnar_maps = ("book_col_map",)
+
+
+class NumpyManyToOneTable(NumpyTable, CalibreManyToOneTable):
+    """
+    One item per book - book_col_map and id_map are ColumnarDicts, col_book_map a ColumnarMultiMap.
+    """
+
+
+class NumpyManyToManyTable(NumpyTable, CalibreManyToManyTable):
+    """
+    Many items per book - book_col_map and col_book_map are ColumnarMultiMaps, id_map a ColumnarDict.
+    """
+
+
+# Only the plain tables are swapped out - the specialised tables keep their dict maps
+NUMPY_TABLE_CLASSES = {
+    CalibreOneToOneTable: NumpyOneToOneTable,
+    CalibreManyToOneTable: NumpyManyToOneTable,
+    CalibreManyToManyTable: NumpyManyToManyTable,
+}
+
+
+def numpy_create_table(name, metadata, fsm):
+    """
+    As calibre_create_table - but with the maps of the plain table types held in numpy arrays.
+    :param name: Name of the table.
+    :param metadata: Metadata from field_metadata
+    :param fsm: The folder store manager for this instance of the library
+    :return:
     """
+    table = calibre_create_table(name=name, metadata=metadata, fsm=fsm)
+    cls = NUMPY_TABLE_CLASSES.get(type(table))
+    if cls is None:
+        return table
+    return cls(name, table.metadata)
@@ -6,8 +6,8 @@ from __future__ import unicode_literals, division, absolute_import, print_functi
 import copy
 from functools import partial
 from operator import attrgetter
-from builtins import map
 
+from LiuXin.databases.caches.base_calibre.fields import InvalidLinkTable
 from LiuXin.metadata import author_to_author_sort
 
 from LiuXin.library.field_metadata import TagsIcons
@@ -22,6 +22,8 @@ from LiuXin.utils.lx_libraries.liuxin_six import dict_iterkeys as iterkeys
 
 from LiuXin.utils.lx_libraries.liuxin_six import six_unicode
 
+from LiuXin_alpha.databases.category_cache import BookValueMap, CategoryRow
+
 __license__ = "GPL v3"
 __copyright__ = "2013, Kovid Goyal <kovid at kovidgoyal.net>"
 __docformat__ = "restructuredtext en"
@@ -143,6 +145,32 @@ def create_tag_class(category, fm, icon_map):
     )
 
 
+def _book_value_map(dbcache, field):
+    return BookValueMap(dbcache.fields[field].table, missing=partial(InvalidLinkTable, field))
+
+
+def _cached_categories(engine, category, field, tag_class, book_rating_map, lang_map, book_ids, is_names, lowers):
+    """
+    The categories of a field - built from the rows the engine keeps for it.
+    :param lowers: If not None, filled with the id of each Tag -> its lower cased name
+    :return:
+    """
+
+    def make_row(item_id, item_book_ids):
+        name, sval, avg = field.category_item(item_id, item_book_ids, book_rating_map, lang_map)
+        if is_names:
+            sval = author_to_author_sort(sval)
+        return CategoryRow(item_id, name, sval, icu_lower(name), item_book_ids, avg)
+
+    cats = []
+    for row, ids, avg in engine.view(category, field.table, make_row, book_rating_map, book_ids):
+        t = tag_class(row.name, id=row.item_id, sort=row.sort, avg=avg, id_set=ids, count=len(ids))
+        cats.append(t)
+        if lowers is not None:
+            lowers[id(t)] = row.lower
+    return cats
+
+
 def clean_user_categories(dbcache):
     user_cats = dbcache.pref("user_categories", {})
     new_cats = {}
@@ -195,8 +223,25 @@ def get_categories(dbcache, sort="name", book_ids=None, icon_map=None, first_let
         raise ValueError("sort " + sort + " not a valid value")
 
     fm = dbcache.field_metadata
-    book_rating_map = dbcache.fields["rating"].book_value_map
-    lang_map = dbcache.fields["languages"].book_value_map
+    # Per item category rows - kept up to date as books change (see category_cache)
+    engine = getattr(dbcache, "_category_engine", None)
+    if engine is None:
+        book_rating_map = dbcache.fields["rating"].book_value_map
+        lang_map = dbcache.fields["languages"].book_value_map
+    else:
+        book_rating_map = _book_value_map(dbcache, "rating")
+        lang_map = _book_value_map(dbcache, "languages")
+
+    # The user categories - and the categories they take their items from
+    user_categories = clean_user_categories(dbcache).copy()
+    muc = dbcache.pref("grouped_search_make_user_categories", [])
+    gst = dbcache.pref("grouped_search_terms", {})
+    user_labels = {label for entries in user_categories.values() for name, label, ign in entries}
+    for c in gst:
+        if c in muc:
+            user_labels.update(gst[c])
+    # Category -> id of each Tag -> its lower cased name, for the cached categories the user categories need
+    tag_lowers = {}
 
     categories = {}
     book_ids = frozenset(book_ids) if book_ids else book_ids
@@ -222,20 +267,26 @@ def get_categories(dbcache, sort="name", book_ids=None, icon_map=None, first_let
             cats = dbcache.fields["tags"].get_news_category(tag_class, book_ids)
         else:
             cat = fm[category]
+            field = dbcache.fields[category]
             brm = book_rating_map
 
             if cat["datatype"] == "rating" and category != "rating":
-                brm = dbcache.fields[category].book_value_map
+                brm = field.book_value_map if engine is None else _book_value_map(dbcache, category)
 
-            cats = dbcache.fields[category].get_categories(tag_class, brm, lang_map, book_ids)
-            if (
+            is_names = bool(
                 category != "authors"
                 and cat["datatype"] == "text"
                 and cat["is_multiple"]
                 and cat["display"].get("is_names", False)
-            ):
-                for item in cats:
-                    item.sort = author_to_author_sort(item.sort)
+            )
+            if engine is not None and field.is_many and getattr(field, "cached_categories", False):
+                lowers = tag_lowers[category] = {} if category in user_labels else None
+                cats = _cached_categories(engine, category, field, tag_class, brm, lang_map, book_ids, is_names, lowers)
+            else:
+                cats = field.get_categories(tag_class, brm, lang_map, book_ids)
+                if is_names:
+                    for item in cats:
+                        item.sort = author_to_author_sort(item.sort)
 
         sort_categories(cats, sort)
         categories[category] = cats
@@ -251,19 +302,21 @@ def get_categories(dbcache, sort="name", book_ids=None, icon_map=None, first_let
                 break
 
     # User categories
-    user_categories = clean_user_categories(dbcache).copy()
     if user_categories:
         # We want to use same node in the user category as in the source
         # category. To do that, we need to find the original Tag node. There is
         # a time/space tradeoff here. By converting the tags into a map, we can
         # do the verification in the category loop much faster, at the cost of
-        # temporarily duplicating the categories lists.
+        # temporarily duplicating the categories lists. Only the categories the
+        # user categories take items from are mapped.
         taglist = {}
-        for c, items in iteritems(categories):
-            taglist[c] = dict(map(lambda t: (icu_lower(t.name), t), items))
+        for c in user_labels:
+            items = categories.get(c)
+            if items is None:
+                continue
+            lowers = tag_lowers.get(c) or {}
+            taglist[c] = {lowers.get(id(t)) or icu_lower(t.name): t for t in items}
 
-        muc = dbcache.pref("grouped_search_make_user_categories", [])
-        gst = dbcache.pref("grouped_search_terms", {})
         for c in gst:
             if c not in muc:
                 continue
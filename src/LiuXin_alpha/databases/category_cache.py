@@ -0,0 +1,290 @@
+"""
+Cached Tag Browser categories - kept up to date item by item as books change.
+
+get_categories used to work every category out from scratch on each call - formatting the name, working out the sort
+value and the average rating of every item of every field. This keeps a row for each item of each field
+    - the name, sort value and lower cased name (for matching user categories)
+    - the books linked to it (a frozenset - so it can be handed out as the id_set of a Tag)
+    - the average rating of those books
+built the first time the field is asked for. Writes mark the items of the books they touched as dirty, and only those
+rows are rebuilt on the next call. Views restricted to a set of books (virtual libraries) are served by intersecting
+the cached book sets with the restriction - the last few restrictions asked for are kept, and patched for the dirty
+items like the rows.
+
+Fields which change something about a book every category depends on (ratings feed the averages, languages the sort
+values of series) mark the book's items in every field.
+"""
+
+from __future__ import print_function
+
+import threading
+from collections import OrderedDict
+
+from typing import Callable, Iterable, Optional
+
+
+# Restricted views kept for each field (as well as the view of the whole library)
+RESTRICTED_VIEWS = 4
+
+
+class CategoryRow(object):
+    """
+    The cached category data of one item.
+    """
+
+    __slots__ = ("item_id", "name", "sort", "lower", "book_ids", "avg")
+
+    def __init__(self, item_id, name, sort, lower, book_ids, avg):
+        self.item_id = item_id
+        self.name = name
+        self.sort = sort
+        self.lower = lower
+        self.book_ids = book_ids
+        self.avg = avg
+
+    def __repr__(self):
+        return "CategoryRow({!r}, {!r}, count={})".format(self.item_id, self.name, len(self.book_ids))
+
+
+def average_rating(book_ids, book_rating_map):
+    """
+    The average of the ratings of the books - ignoring unrated books.
+    """
+    total = count = 0
+    get = book_rating_map.get
+    for book_id in book_ids:
+        r = get(book_id, 0)
+        if r and r > 0:
+            total += r
+            count += 1
+    return total / count if count else 0
+
+
+def items_of(book_col_map, book_ids):
+    """
+    The items linked to the books - book_col_map values are either an item id or a collection of them.
+    :return: Set of item ids - or None if the map holds something else (typed tables)
+    """
+    items = set()
+    get = book_col_map.get
+    for book_id in book_ids:
+        val = get(book_id)
+        if val is None:
+            continue
+        if isinstance(val, (tuple, list, set, frozenset)):
+            items.update(val)
+        elif isinstance(val, int):
+            items.add(val)
+        else:
+            return None
+    return items
+
+
+class BookValueMap(object):
+    """
+    Book id -> value of a many-one or many-many field - looked up in the table maps as it's asked for, rather than
+    building a dict for every book (as book_value_map does) on every call.
+    """
+
+    def __init__(self, table, missing: Optional[Callable] = None):
+        """
+        :param table:
+        :param missing: Called for the exception to raise if a book is linked to an item not in the id_map
+        """
+        self.table = table
+        self.missing = missing
+
+    def get(self, book_id, default=None):
+        val = self.table.book_col_map.get(book_id)
+        if val is None:
+            return default
+        id_map = self.table.id_map
+        try:
+            if isinstance(val, (tuple, list)):
+                return tuple(id_map[item_id] for item_id in val)
+            return id_map[val]
+        except KeyError:
+            if self.missing is None:
+                raise
+            raise self.missing()
+
+
+class FieldCategories(object):
+    """
+    The cached rows of a single field - and the views of them asked for.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        # Item id -> CategoryRow - None until built
+        self.rows = None
+        self.dirty = set()
+        # None (the whole library) or frozenset of book ids -> [item id -> (row, book ids, avg), items to redo]
+        self.views = OrderedDict()
+
+    def reset(self):
+        self.rows = None
+        self.dirty = set()
+        self.views.clear()
+
+    def mark_items(self, item_ids):
+        item_ids = set(item_ids)
+        if self.rows is not None:
+            self.dirty.update(item_ids)
+        for entries, pending in self.views.values():
+            pending.update(item_ids)
+
+    def mark_books(self, book_ids):
+        book_col_map = getattr(self.table, "book_col_map", None)
+        items = None if book_col_map is None else items_of(book_col_map, book_ids)
+        if items is None:
+            # Can't tell which items - rebuild them all
+            self.reset()
+            return
+        self.mark_items(items)
+
+    def refresh(self, make_row: Callable):
+        """
+        Build the rows - or rebuild any which are dirty.
+        :param make_row: Called with (item_id, frozenset of book ids) for the CategoryRow
+        :return: Item id -> CategoryRow
+        """
+        col_book_map = self.table.col_book_map
+        if self.rows is None:
+            rows = dict()
+            for item_id, book_ids in col_book_map.items():
+                if book_ids:
+                    rows[item_id] = make_row(item_id, frozenset(book_ids))
+            self.rows, self.dirty = rows, set()
+            self.views.clear()
+        elif self.dirty:
+            rows = self.rows
+            for item_id in self.dirty:
+                book_ids = col_book_map.get(item_id)
+                if book_ids:
+                    rows[item_id] = make_row(item_id, frozenset(book_ids))
+                else:
+                    rows.pop(item_id, None)
+            self.dirty = set()
+        return self.rows
+
+    @staticmethod
+    def _entry(row, key, book_rating_map):
+        ids = row.book_ids
+        if key is None or key.issuperset(ids):
+            return row, ids, row.avg
+        ids = ids.intersection(key)
+        if not ids:
+            return None
+        return row, ids, average_rating(ids, book_rating_map)
+
+    def view(self, make_row: Callable, book_rating_map, book_ids=None):
+        """
+        The rows for the field - restricted to some books, if given.
+        :param make_row:
+        :param book_rating_map: Used to average the ratings of the books in a restricted view
+        :param book_ids: The books to restrict to - None for all of them
+        :return: List of (row, book ids, avg rating) - the book ids and average for the restricted books
+        """
+        rows = self.refresh(make_row)
+        key = None if book_ids is None else (book_ids if isinstance(book_ids, frozenset) else frozenset(book_ids))
+        entry = self._entry
+        cached = self.views.get(key)
+        if cached is None:
+            entries = dict()
+            for item_id, row in rows.items():
+                e = entry(row, key, book_rating_map)
+                if e is not None:
+                    entries[item_id] = e
+            self.views[key] = [entries, set()]
+            while len(self.views) > RESTRICTED_VIEWS + 1:
+                self.views.popitem(last=False)
+        else:
+            entries, pending = cached
+            for item_id in pending:
+                row = rows.get(item_id)
+                e = None if row is None else entry(row, key, book_rating_map)
+                if e is None:
+                    entries.pop(item_id, None)
+                else:
+                    entries[item_id] = e
+            pending.clear()
+            self.views.move_to_end(key)
+        return list(entries.values())
+
+
+class CategoryEngine(object):
+    """
+    FieldCategories for every field whose categories have been asked for.
+    """
+
+    def __init__(self, shared_fields: Iterable[str] = ("rating", "languages")):
+        """
+        :param shared_fields: Fields whose changes affect the categories of every field
+        """
+        self.shared_fields = frozenset(shared_fields)
+        self._fields = dict()
+        self._lock = threading.RLock()
+
+    def __contains__(self, field):
+        return field in self._fields
+
+    def view(self, field: str, table, make_row: Callable, book_rating_map, book_ids=None):
+        """
+        The category rows for a field - see FieldCategories.view.
+        :param field:
+        :param table: The field's table - the rows are rebuilt if it has been replaced
+        :param make_row:
+        :param book_rating_map:
+        :param book_ids:
+        :return:
+        """
+        with self._lock:
+            fc = self._fields.get(field)
+            if fc is None or fc.table is not table:
+                fc = self._fields[field] = FieldCategories(table)
+            return fc.view(make_row, book_rating_map, book_ids)
+
+    def books_changed(self, field: Optional[str], book_ids):
+        """
+        Note that a field has changed for some books - call before the write (so the items the books leave are
+        marked) and after it (for the items they join).
+        :param field: None if every field may have changed
+        :param book_ids:
+        :return:
+        """
+        if not book_ids:
+            return
+        with self._lock:
+            if field is None or field in self.shared_fields:
+                targets = self._fields.values()
+            else:
+                fc = self._fields.get(field)
+                targets = () if fc is None else (fc,)
+            for fc in targets:
+                fc.mark_books(book_ids)
+
+    def items_changed(self, field: str, item_ids):
+        """
+        Note that some items of a field have changed (been renamed, removed or had their sort value changed).
+        """
+        with self._lock:
+            if field in self.shared_fields:
+                # The rating or language of every book linked to the items has changed
+                for fc in self._fields.values():
+                    fc.reset()
+                return
+            fc = self._fields.get(field)
+            if fc is not None:
+                fc.mark_items(item_ids)
+
+    def invalidate(self, fields: Optional[Iterable[str]] = None):
+        """
+        Drop the rows of some fields - or of every field if None.
+        """
+        with self._lock:
+            if fields is None:
+                self._fields.clear()
+            else:
+                for field in fields:
+                    self._fields.pop(field, None)
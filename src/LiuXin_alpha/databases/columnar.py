@@ -0,0 +1,400 @@
+"""
+Array backed replacements for the dict maps the cache tables keep - book_col_map, col_book_map and id_map.
+
+A dict of tuples or sets costs a few hundred bytes per link. These keep the same data in numpy arrays -
+    - the keys in a sorted int32/int64 array (found with a binary search)
+    - one value per key (ColumnarDict) as a code into an interned list of the distinct values
+    - many values per key (ColumnarMultiMap) CSR style - an offsets array into a single flat array of ids
+which costs a few bytes per link instead.
+
+Both behave as mutable mappings, so the table code which uses them doesn't have to change. Writes go to a small dict
+overlay on top of the arrays - and are folded back into the arrays by compact().
+"""
+
+from __future__ import print_function
+
+from collections.abc import MutableMapping
+
+import numpy as np
+
+
+_MISSING = object()
+_DELETED = object()
+
+_INT32_MIN = np.iinfo(np.int32).min
+_INT32_MAX = np.iinfo(np.int32).max
+
+
+def _is_int(value):
+    return isinstance(value, (int, np.integer))
+
+
+def _int_array(values):
+    """
+    int32 array of the values if they all fit - int64 otherwise.
+    """
+    array = np.asarray(values, dtype=np.int64)
+    if not array.size or (array.min() >= _INT32_MIN and array.max() <= _INT32_MAX):
+        return array.astype(np.int32)
+    return array
+
+
+class InternedValues(object):
+    """
+    Each distinct value stored once - and referred to by an integer code.
+    """
+
+    def __init__(self):
+        self.values = []
+        self._codes = dict()
+
+    def __len__(self):
+        return len(self.values)
+
+    def code(self, value):
+        """
+        The code for a value - adding it if it's not already known.
+        :param value:
+        :return:
+        """
+        try:
+            code = self._codes.get(value)
+        except TypeError:
+            # Unhashable - can't be shared, but can still be stored
+            self.values.append(value)
+            return len(self.values) - 1
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class _ColumnarMap(MutableMapping):
+    """
+    Common overlay handling - subclasses provide the array storage.
+
+    Writes are kept in the overlay until compact is called. Keys which aren't integers (or values which can't be put
+    in the arrays) just stay in the overlay.
+    """
+
+    def __init__(self, default_factory=None, materialize=False):
+        """
+        :param default_factory: As for a defaultdict - called to create values for missing keys looked up with []
+        :param materialize: Copy values read with [] into the overlay - for mutable values, which the caller may
+                            change in place
+        """
+        self.default_factory = default_factory
+        self.materialize = materialize
+        self._overlay = dict()
+        self._ids = np.empty(0, dtype=np.int32)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # - ARRAY STORAGE - implemented by subclasses
+
+    def _base_get(self, position):
+        raise NotImplementedError
+
+    def _build(self, items):
+        raise NotImplementedError
+
+    def _arrays(self):
+        raise NotImplementedError
+
+    # ------------------------------------------------------------------------------------------------------------------
+
+    def _position(self, key):
+        if not _is_int(key) or not len(self._ids):
+            return -1
+        if self._ids.dtype == np.int32 and not _INT32_MIN <= key <= _INT32_MAX:
+            return -1
+        # Searching with a key of the array's own type - a python int makes numpy cast the whole array
+        position = int(self._ids.searchsorted(self._ids.dtype.type(key)))
+        if position < len(self._ids) and self._ids[position] == key:
+            return position
+        return -1
+
+    def _lookup(self, key):
+        value = self._overlay.get(key, _MISSING)
+        if value is _DELETED:
+            return _MISSING
+        if value is not _MISSING:
+            return value
+        position = self._position(key)
+        if position < 0:
+            return _MISSING
+        return self._base_get(position)
+
+    def __getitem__(self, key):
+        value = self._lookup(key)
+        if value is _MISSING:
+            if self.default_factory is None:
+                raise KeyError(key)
+            value = self._overlay[key] = self.default_factory()
+        elif self.materialize and key not in self._overlay:
+            self._overlay[key] = value
+        return value
+
+    def get(self, key, default=None):
+        """
+        As for dict.get - values are not materialized, so changing them in place has no effect.
+        """
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def __setitem__(self, key, value):
+        self._overlay[key] = value
+
+    def __delitem__(self, key):
+        if self._lookup(key) is _MISSING:
+            raise KeyError(key)
+        if self._position(key) < 0:
+            del self._overlay[key]
+        else:
+            self._overlay[key] = _DELETED
+
+    def __contains__(self, key):
+        return self._lookup(key) is not _MISSING
+
+    def __iter__(self):
+        overlay = self._overlay
+        for key in self._ids.tolist():
+            if key not in overlay:
+                yield key
+        for key, value in list(overlay.items()):
+            if value is not _DELETED:
+                yield key
+
+    def __len__(self):
+        count = len(self._ids)
+        for key, value in self._overlay.items():
+            in_base = self._position(key) >= 0
+            if value is _DELETED:
+                count -= 1
+            elif not in_base:
+                count += 1
+        return count
+
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, dict(self.items()))
+
+    def copy(self):
+        """
+        A plain dict with the same contents.
+        """
+        return dict(self.items())
+
+    def clear(self):
+        self._overlay.clear()
+        self._build([])
+
+    @property
+    def overlay_size(self):
+        """
+        The number of keys currently held in the overlay - rather than the arrays.
+        """
+        return len(self._overlay)
+
+    def compact(self):
+        """
+        Fold the overlay back into the arrays.
+        Values handed out by [] (and materialized) are no longer tracked afterwards - so changing them in place won't
+        change the map.
+        :return:
+        """
+        items = list(self.items())
+        self._overlay.clear()
+        self._build(items)
+
+    def nbytes(self):
+        """
+        Bytes used by the arrays - not counting the overlay, or the interned values themselves.
+        """
+        return sum(array.nbytes for array in self._arrays())
+
+    def get_many(self, keys, default=None):
+        """
+        Values for many keys at once - with a single vectorized search of the arrays.
+        :param keys: Iterable of keys
+        :param default: Returned for keys which aren't in the map
+        :return: List of values, in the order of the keys
+        """
+        keys = list(keys)
+        results = [default] * len(keys)
+        array_keys = []
+        array_slots = []
+        for slot, key in enumerate(keys):
+            if key in self._overlay:
+                value = self._overlay[key]
+                if value is not _DELETED:
+                    results[slot] = value
+            elif _is_int(key):
+                array_keys.append(key)
+                array_slots.append(slot)
+
+        if array_keys and len(self._ids):
+            wanted = np.asarray(array_keys, dtype=np.int64)
+            if self._ids.dtype == np.int32:
+                # Keys outside the int32 range can't be in the arrays
+                in_range = (wanted >= _INT32_MIN) & (wanted <= _INT32_MAX)
+                if not in_range.all():
+                    array_slots = [slot for slot, ok in zip(array_slots, in_range.tolist()) if ok]
+                    wanted = wanted[in_range]
+                wanted = wanted.astype(np.int32)
+            positions = self._ids.searchsorted(wanted)
+            positions[positions >= len(self._ids)] = 0
+            found = self._ids[positions] == wanted
+            for slot, position, hit in zip(array_slots, positions.tolist(), found.tolist()):
+                if hit:
+                    results[slot] = self._base_get(position)
+        return results
+
+
+class ColumnarDict(_ColumnarMap):
+    """
+    Integer keys mapped to a single value each - e.g. book_id -> title or item_id -> value.
+    Values are interned - each distinct value is stored once, and each key holds an int32 code.
+    """
+
+    def __init__(self, items=(), default_factory=None, materialize=False):
+        """
+        :param items: Mapping or iterable of (key, value) pairs to start with
+        :param default_factory:
+        :param materialize:
+        """
+        super(ColumnarDict, self).__init__(default_factory=default_factory, materialize=materialize)
+        self._values = []
+        self._codes = np.empty(0, dtype=np.int32)
+        if hasattr(items, "items"):
+            items = items.items()
+        self._build(items)
+
+    def _base_get(self, position):
+        return self._values[self._codes[position]]
+
+    def _arrays(self):
+        return self._ids, self._codes
+
+    def _build(self, items):
+        keys = []
+        codes = []
+        values = InternedValues()
+        for key, value in items:
+            if _is_int(key):
+                keys.append(key)
+                codes.append(values.code(value))
+            else:
+                self._overlay[key] = value
+
+        ids = np.asarray(keys, dtype=np.int64)
+        order = np.argsort(ids, kind="stable")
+        self._ids = _int_array(ids[order])
+        self._codes = np.asarray(codes, dtype=np.int32)[order]
+        # Only the values are needed from here - changes go to the overlay until the next build
+        self._values = values.values
+
+    @property
+    def distinct_values(self):
+        """
+        The number of distinct values stored in the arrays.
+        """
+        return len(self._values)
+
+
+class ColumnarMultiMap(_ColumnarMap):
+    """
+    Integer keys mapped to a collection of integers each - e.g. book_id -> (item ids) or item_id -> {book ids}.
+    Stored CSR style - the values for the key at position i are flat[offsets[i]:offsets[i + 1]].
+    """
+
+    def __init__(self, items=(), container=tuple, default_factory=None, materialize=None):
+        """
+        :param items: Mapping or iterable of (key, collection) pairs to start with
+        :param container: Type of the collection handed back for each key - e.g. tuple, set or list
+        :param default_factory:
+        :param materialize: Defaults to True for mutable containers - so changes made in place are kept
+        """
+        if materialize is None:
+            materialize = container is not tuple and container is not frozenset
+        super(ColumnarMultiMap, self).__init__(default_factory=default_factory, materialize=materialize)
+        self.container = container
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._flat = np.empty(0, dtype=np.int32)
+        if hasattr(items, "items"):
+            items = items.items()
+        self._build(items)
+
+    def _base_get(self, position):
+        start, end = self._offsets[position], self._offsets[position + 1]
+        return self.container(self._flat[start:end].tolist())
+
+    def _arrays(self):
+        return self._ids, self._offsets, self._flat
+
+    def _build(self, items):
+        array_items = []
+        for key, values in items:
+            values = list(values)
+            if _is_int(key) and all(_is_int(value) for value in values):
+                array_items.append((key, values))
+            else:
+                self._overlay[key] = self.container(values)
+        array_items.sort(key=lambda item: item[0])
+
+        lengths = np.fromiter((len(values) for _, values in array_items), dtype=np.int64, count=len(array_items))
+        offsets = np.zeros(len(array_items) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        flat = np.fromiter(
+            (value for _, values in array_items for value in values), dtype=np.int64, count=int(offsets[-1])
+        )
+
+        self._ids = _int_array([key for key, _ in array_items])
+        self._offsets = offsets
+        self._flat = _int_array(flat)
+
+    def lengths(self, keys):
+        """
+        The number of values for each of the keys.
+        :param keys:
+        :return: List of counts - 0 for keys which aren't in the map
+        """
+        return [len(values) for values in self.get_many(keys, default=())]
+
+
+_COLLECTION_TYPES = (tuple, list, set, frozenset)
+
+
+def columnar_map(mapping):
+    """
+    An array backed copy of one of the cache maps - or the map itself, if its values can't be stored in arrays.
+        - collections of ints (e.g. col_book_map) become a ColumnarMultiMap - handing back the same collection type
+        - anything else hashable (e.g. id_map, or a one-to-one book_col_map) becomes a ColumnarDict
+    A defaultdict keeps its default_factory.
+    :param mapping:
+    :return:
+    """
+    if isinstance(mapping, _ColumnarMap):
+        return mapping
+    default_factory = getattr(mapping, "default_factory", None)
+
+    container = None
+    has_scalars = False
+    for value in mapping.values():
+        if isinstance(value, _COLLECTION_TYPES):
+            if container is None:
+                container = type(value)
+            elif container is not type(value):
+                # Mixed collection types - leave it alone
+                return mapping
+        elif isinstance(value, dict):
+            # Nested maps - e.g. from the typed tables
+            return mapping
+        else:
+            has_scalars = True
+    if container is not None and has_scalars:
+        return mapping
+    if container is None and not has_scalars and default_factory in _COLLECTION_TYPES:
+        container = default_factory
+
+    if container is not None:
+        return ColumnarMultiMap(mapping, container=container, default_factory=default_factory)
+    return ColumnarDict(mapping, default_factory=default_factory)
@@ -13,7 +13,9 @@ import pprint
 import queue as Queue
 import uuid
 from copy import deepcopy
+from itertools import groupby
 from numbers import Number
+from operator import itemgetter
 
 from LiuXin_alpha.databases.api import DatabaseAPI
 
@@ -21,6 +23,7 @@ from LiuXin_alpha.constants.paths import LiuXin_default_database
 
 from LiuXin_alpha.databases.database_driver_plugins import loadDatabaseDriver
 from LiuXin_alpha.databases.row import Row
+from LiuXin_alpha.databases.tree_index import TreeIndex
 from LiuXin_alpha.databases.maintenance_bot import Maintainer
 from LiuXin_alpha.databases.custom_columns import CustomColumnDatabaseMixin
 from LiuXin_alpha.databases.custom_columns import CustomColumnsDriverWrapperMixin
@@ -856,24 +859,28 @@ class Database(CustomColumnDatabaseMixin):
         :return:
         """
         if iterator_return:
-            if reverse or sort_column is not None:
-                raise NotImplementedError("Need to go back and work on the driver.")
-            else:
-                return self.__get_all_rows_iterator_return(table)
+            rows = self.driver_wrapper.stream_rows(table, sort_column=sort_column, reverse=reverse)
+            return (Row(row_dict=r.as_dict(), database=self) for r in rows)
         else:
             row_dicts = self.driver_wrapper.get_all_rows(table, sort_column, reverse)
             return [Row(row_dict=r, database=self) for r in row_dicts]
 
-    def __get_all_rows_iterator_return(self, table):
+    def stream_rows(self, table, columns=None, sort_column=None, reverse=False, fetch_size=None, records=True):
         """
-        Helper function to get round one of the limitations of Python 2.7 (that you can't have both a return and a
-        yield statement in the same function. Can be merged into get_all_rows after upgrading.
+        Yield lightweight, read only rows from a table - without building a Row (or a row_dict) for each of them.
+        Runs in constant memory - so suitable for full table scans.
         :param table:
+        :param columns: Only read these columns - defaults to all of them
+        :param sort_column:
+        :param reverse:
+        :param fetch_size: Rows to read from the database at a time
+        :param records: If True yield dict like records (values converted as they're read) - if False raw tuples, in
+                        column order
         :return:
         """
-        row_dict_iterator = self.driver.direct_get_row_dict_iterator(table)
-        for row_dict in row_dict_iterator:
-            yield Row(row_dict=row_dict, database=self)
+        return self.driver_wrapper.stream_rows(
+            table, columns=columns, sort_column=sort_column, reverse=reverse, fetch_size=fetch_size, records=records
+        )
 
     # Todo: Test
     def chunk_iterator(self, column, target_table=None):
@@ -887,19 +894,25 @@ class Database(CustomColumnDatabaseMixin):
         column = six_unicode(deepcopy(column))
         column_table = self.driver_wrapper.identify_table_from_column(column)
 
+        # One pass over the table, sorted on the column - rows with the same value arrive together - rather than a
+        # search for each unique value
+        sorted_rows = self.driver_wrapper.stream_rows(column_table, sort_column=column)
+        chunks = groupby(sorted_rows, key=itemgetter(column))
+
         # Iterate over the table - yield rows from the table in chunks
         if target_table is None or (target_table == column_table):
 
-            for unique_val in self.get_values_set(target_column=column, iterator_return=True):
-                yield self.search(table=column_table, column=column, search_term=unique_val)
+            for _, chunk_rows in chunks:
+                yield [Row(row_dict=r.as_dict(), database=self) for r in chunk_rows]
 
         elif target_table != column_table:
 
             # Iterate over the column. For each unique value in that column get the rows that correspond to it. Then
             # get all the rows in the other table linked to it - return them as a chunk
-            for unique_val in self.get_values_set(target_column=column, iterator_return=True):
+            for _, chunk_rows in chunks:
                 return_rows = []
-                for ct_row in self.search(table=column_table, column=column, search_term=unique_val):
+                for ct_row in chunk_rows:
+                    ct_row = Row(row_dict=ct_row.as_dict(), database=self)
                     return_rows += [
                         r for r in self.get_interlinked_rows(target_row=ct_row, secondary_table=target_table)
                     ]
@@ -1861,36 +1874,25 @@ class Database(CustomColumnDatabaseMixin):
 
     def get_all_tree_rows(self, start_row, back_iterate=True):
         """
-        if back_iterate - start from a row - walk back up the tree to the root - then  walks back down the tree - adding
-        every row it finds to the row set which it then returns.
+        if back_iterate - start from a row - walk back up the tree to the root - then return every row in the tree
+        rooted there. Otherwise return every row in the tree rooted at the start_row.
+        Both the walk up and the walk down are single (recursive) queries.
         :param start_row:
         :param back_iterate:
         :return:
         """
         row_table = start_row.table
-        row_parent_column = self.driver_wrapper.get_parent_column(row_table)
         row_id_column = self.driver_wrapper.get_id_column(row_table)
         if back_iterate:
             root_series = self.get_root_series(start_row)
         else:
             root_series = start_row
 
-        row_pool = set()
-        row_pool.add(root_series)
-        found_series = set()
-
-        while len(row_pool) != 0:
-
-            current_series = row_pool.pop()
-            current_id = current_series[row_id_column]
-
-            # finds all the series which refer to the current_series in the series_parent column
-            child_rows = self.search(table=row_table, column=row_parent_column, search_term=current_id)
-            for row in child_rows:
-                row_pool.add(row)
-
-            found_series.add(current_series)
-
+        found_series = set([root_series])
+        subtree_row_dicts = self.driver_wrapper.get_subtree_row_dicts(row_table, root_series[row_id_column])
+        # The first row is the root itself
+        for row_dict in subtree_row_dicts[1:]:
+            found_series.add(Row(row_dict=row_dict, database=self))
         return found_series
 
     def walk(self, start_row):
@@ -1903,7 +1905,7 @@ class Database(CustomColumnDatabaseMixin):
         for table_row_dict in self.driver_wrapper.walk(start_row_dict):
             yield Row(row_dict=table_row_dict, database=self)
 
-    def search_tree(self, root_row, for_ids):
+    def search_tree(self, root_row, for_ids, tree_index=None):
         """
         Search a tree looking for any of the ids in the for_ids object - if one is found which is in the object return
         True, else return False.
@@ -1911,17 +1913,43 @@ class Database(CustomColumnDatabaseMixin):
         want to find out if a folder is inside another folder.
         :param root_row: The row to start the search with
         :param for_ids: Every id in the tree will be checked against this object.
+        :param tree_index: A TreeIndex for the table (see build_tree_index) - if provided the tree is searched in
+                           memory, without touching the database
         :return:
         """
         root_row_dict = root_row.row_dict
         target_table = root_row.table
         target_table_id_col = self.driver_wrapper.get_id_column(target_table)
 
-        matched_ids = set()
-        for child_row in self.driver_wrapper.walk(start_row=root_row_dict):
-            if child_row[target_table_id_col] in for_ids:
-                matched_ids.add(child_row[target_table_id_col])
-        return matched_ids
+        if tree_index is not None:
+            tree_ids = tree_index.subtree(six_unicode(root_row_dict[target_table_id_col]))
+        else:
+            tree_ids = [
+                row_dict[target_table_id_col]
+                for row_dict in self.driver_wrapper.get_subtree_row_dicts(
+                    target_table, root_row_dict[target_table_id_col], columns=(target_table_id_col,)
+                )
+            ]
+        return set(tree_id for tree_id in tree_ids if tree_id in for_ids)
+
+    def build_tree_index(self, table):
+        """
+        Read the (id, parent) pairs of a table with a tree structure into an in memory TreeIndex.
+        The index is a snapshot - it's up to the caller to keep it up to date (or rebuild it) after changing the tree.
+        :param table:
+        :return:
+        """
+        table_id_column = self.driver_wrapper.get_id_column(table)
+        table_parent_column = self.driver_wrapper.get_parent_column(table)
+        if not table_parent_column:
+            err_str = "Given table does not have a tree structure - so can't be indexed"
+            err_str = default_log.log_variables(err_str, "ERROR", ("table", table))
+            raise InputIntegrityError(err_str)
+
+        return TreeIndex(
+            (row[table_id_column], row[table_parent_column])
+            for row in self.stream_rows(table, columns=(table_id_column, table_parent_column))
+        )
 
     #
     # ----------------------------------------------------------------------------------------------------------------------
@@ -2399,7 +2427,17 @@ class DriverWrapper(CustomColumnsDriverWrapperMixin):
         :param row_dict_list:
         :return:
         """
-        self.driver.direct_add_multiple_simple_row_dicts(row_dict_list)
+        return self.driver.direct_add_multiple_simple_row_dicts(row_dict_list)
+
+    def bulk_insert(self, table, batch, columns=None):
+        """
+        Insert a columnar batch of new rows into a table - in a single transaction.
+        :param table:
+        :param batch: Dictionary of column name keyed lists of values - or an iterable of tuples in the order of columns
+        :param columns: Column order for the tuples in an iterable batch
+        :return: List of the ids of the new rows
+        """
+        return self.driver.direct_bulk_insert(table, batch, columns=columns)
 
     # ------------------------------------------------------------------------------------------------------------------
     # - METHODS TO UPDATE THE ROW/DATABASE START HERE
@@ -2583,6 +2621,21 @@ class DriverWrapper(CustomColumnsDriverWrapperMixin):
         """
         return self.driver.direct_get_all_rows(table, sort_column, reverse)
 
+    def stream_rows(self, table, columns=None, sort_column=None, reverse=False, fetch_size=None, records=True):
+        """
+        Yield the rows of a table - fetch_size at a time from a dedicated cursor.
+        :param table:
+        :param columns:
+        :param sort_column:
+        :param reverse:
+        :param fetch_size:
+        :param records: Yield dict like records if True - tuples if False
+        :return:
+        """
+        return self.driver.direct_stream_rows(
+            table, columns=columns, sort_column=sort_column, reverse=reverse, fetch_size=fetch_size, records=records
+        )
+
     def search(self, table, column, search_term):
         """
         Searches a specified column in a table by the given search term. Returns all rows which match that term.
@@ -2727,7 +2780,7 @@ class DriverWrapper(CustomColumnsDriverWrapperMixin):
     # Todo: Needs to throw an error when used on a table without a tree structure
     def get_linear_row_list(self, start_row):
         """
-        Takes a starting row. Iterates up the tree, making an index of rows as it goes.
+        Takes a starting row. Reads the rows above it in the tree, in one query.
         Starts from the highest entry, then proceeds down.
         .......... -> grandparent_series -> parent_series -> series
         :param start_row:
@@ -2736,36 +2789,34 @@ class DriverWrapper(CustomColumnsDriverWrapperMixin):
         table = self.identify_table_from_row_dict(start_row)
         table_parent_column = self.get_parent_column(table)
 
-        linear_rows = []
-        current_row = start_row
         try:
             current_parent_id = start_row[table_parent_column]
-            if six_unicode(current_parent_id).lower() == "none" or current_parent_id is None:
-                linear_rows.append(start_row)
-                return linear_rows
         except KeyError:
-            linear_rows.append(start_row)
-            return linear_rows
+            return [start_row]
+        if current_parent_id is None or six_unicode(current_parent_id).lower() == "none":
+            return [start_row]
 
-        while six_unicode(current_parent_id).upper() != "NONE" and current_parent_id is not None:
-            # extracting the current parent id
-            try:
-                current_parent_id = current_row[table_parent_column]
-                if current_parent_id == "NONE":
-                    linear_rows = [current_row] + linear_rows
-                    return linear_rows
-            except KeyError:
-                linear_rows = [current_row] + linear_rows
-                return linear_rows
-
-            linear_rows = [current_row] + linear_rows
-
-            if six_unicode(current_parent_id).lower() != "none" and current_parent_id is not None:
-                current_row = self.get_row_from_id(table=table, row_id=current_parent_id)
-            else:
-                break
+        return self.get_ancestor_row_dicts(table, current_parent_id) + [start_row]
 
-        return linear_rows
+    def get_ancestor_row_dicts(self, table, row_id, columns=None):
+        """
+        Returns the chain of rows from the root of the tree down to the given row.
+        :param table:
+        :param row_id:
+        :param columns: Only read these columns - defaults to all of them
+        :return:
+        """
+        return self.driver.direct_get_ancestor_row_dicts(table, row_id, columns=columns)
+
+    def get_subtree_row_dicts(self, table, row_id, columns=None):
+        """
+        Returns the given row and every row beneath it in the tree - breadth first.
+        :param table:
+        :param row_id:
+        :param columns: Only read these columns - defaults to all of them
+        :return:
+        """
+        return self.driver.direct_get_subtree_row_dicts(table, row_id, columns=columns)
 
     # Todo: Again, should error when called on a table which does not have a tree structure
     def set_tree_ids(self, table):
@@ -2808,26 +2859,13 @@ class DriverWrapper(CustomColumnsDriverWrapperMixin):
             )
             raise InputIntegrityError(err_str)
 
-        return self._walk(start_row, table, table_id_col, table_parent_col)
-
-    def _walk(self, start_row, table, table_id_col, table_parent_col):
-        # Load the ids pool with the ids of parent rows - search for them in the parent column and yield those rows
-        # If a row has no children (not referenced in any parent column) then it's a leaf row and we're done for that
-        # branch
-        ids_pool = set()
-        ids_pool.add(int(start_row[table_id_col]))
+        return self._walk(start_row, table, table_id_col)
 
-        # Start the walk by yielding the start row - then working through the ids pool - take each id from it, find all
-        # the children, yield them and add their ids for recursion on down. Continue until all rows have been yielded.
+    def _walk(self, start_row, table, table_id_col):
+        # The whole subtree is read in one query - starting with the start row, which is yielded as passed in
         yield start_row
-        while ids_pool:
-
-            working_id = ids_pool.pop()
-            working_children = self.search(table=table, column=table_parent_col, search_term=working_id)
-
-            for child_row in working_children:
-                ids_pool.add(int(child_row[table_id_col]))
-                yield child_row
+        for child_row in self.get_subtree_row_dicts(table, start_row[table_id_col])[1:]:
+            yield child_row
 
     # ------------------------------------------------------------------------------------------------------------------
     # - METHODS TO DEAL WITH TRIGGERS START HERE
@@ -2934,6 +2972,21 @@ class DriverWrapper(CustomColumnsDriverWrapperMixin):
             )
             raise ValueError(err_str)
 
+    def execute_batch(self, statements):
+        """
+        Run a series of executemany statements in a single transaction.
+        :param statements: Iterable of (sql, values) tuples
+        :return:
+        """
+        return self.driver.direct_execute_batch(statements)
+
+    def write_transaction(self):
+        """
+        Context manager - yields the write connection with a transaction open on it. Commits on exit, rolls back on error.
+        :return:
+        """
+        return self.driver.write_transaction()
+
     def executescript(self, sqlscript):
         """
         Execute an SQL script on the database.
@@ -0,0 +1,122 @@
+"""
+Bulk inserts for the SQLite DatabaseDriver.
+
+Rows are inserted chunk_size at a time with executemany - so an iterator over a very large source need never be held in
+memory at once. The ids of the new rows are worked out from MAX(rowid) before and after each chunk, rather than read
+back row by row.
+
+Malformed batches raise ValueError - the driver turns them into InputIntegrityErrors.
+"""
+
+from __future__ import print_function
+
+from itertools import islice
+
+
+# Rows per executemany - bounds the memory used when inserting from an iterator
+BULK_INSERT_CHUNK_SIZE = 10000
+
+
+def batch_rows(batch, columns=None):
+    """
+    The columns and rows of a batch.
+    :param batch: Either a dictionary keyed with column names and valued with equal length lists of values, or an
+                  iterable of tuples of values - in the order given by columns.
+    :param columns: The column order of the tuples in batch. Must not be given if batch is a dictionary.
+    :return columns, rows: A tuple of the column names - and an iterable of tuples of values
+    """
+    if isinstance(batch, dict):
+        if columns is not None:
+            raise ValueError("columns cannot be given with a dictionary batch - they are its keys")
+        columns = tuple(batch.keys())
+        column_lengths = set(len(batch[col]) for col in columns)
+        if len(column_lengths) > 1:
+            raise ValueError("Columns in the batch have different lengths - {}".format(sorted(column_lengths)))
+        return columns, zip(*[batch[col] for col in columns])
+
+    if columns is None:
+        raise ValueError("columns must be given with an iterable batch")
+    return tuple(columns), batch
+
+
+def row_dict_values(row_dicts, columns, id_column):
+    """
+    The values of each of a list of row dicts - in the order given by columns.
+    Every row must have exactly the given columns (plus, optionally, "table" and an id column which is None).
+    :param row_dicts:
+    :param columns:
+    :param id_column: The id column of the table - ids can't be set by an insert, so it must be None (or missing)
+    :return: Generator of tuples of values
+    """
+    column_count = len(columns)
+    for row_dict in row_dicts:
+        row_dict.pop("table", None)
+        if row_dict.get(id_column) is not None:
+            raise ValueError("Cannot update a row using this method!")
+        extra_cols = len(row_dict) - column_count - (1 if id_column in row_dict else 0)
+        try:
+            row_values = tuple(row_dict[col] for col in columns)
+        except KeyError:
+            raise ValueError("Rows with different column names.")
+        if extra_cols != 0:
+            raise ValueError("Rows with different column names.")
+        yield row_values
+
+
+def insert_stmt(table, columns):
+    """
+    Statement inserting a row with the given columns.
+    :param table:
+    :param columns:
+    :return:
+    """
+    return "INSERT INTO `{}` ({}) VALUES ({})".format(table, ", ".join(columns), ", ".join("?" for _ in columns))
+
+
+def insert_chunk(conn, table, stmt, chunk):
+    """
+    Insert a chunk of rows and return their ids.
+    Must be called with a write transaction open - so nothing else can insert into the table in the meantime, and
+    SQLite hands out rowids sequentially from the current maximum.
+    :param conn:
+    :param table:
+    :param stmt:
+    :param chunk: List of tuples of values
+    :return: List of the ids of the new rows - in the order the rows were given
+    """
+    max_stmt = "SELECT MAX(rowid) FROM `{}`".format(table)
+    max_before = conn.execute(max_stmt).fetchone()[0] or 0
+    conn.executemany(stmt, chunk)
+    max_after = conn.execute(max_stmt).fetchone()[0] or 0
+
+    if max_after - max_before == len(chunk):
+        return list(range(max_before + 1, max_after + 1))
+
+    # Not contiguous from the old maximum (e.g. AUTOINCREMENT tables carry on from the highest id ever used) - but
+    # every new row still has a rowid above it - read them back
+    id_stmt = "SELECT rowid FROM `{}` WHERE rowid > ? ORDER BY rowid".format(table)
+    return [row[0] for row in conn.execute(id_stmt, (max_before,))]
+
+
+def insert_rows(conn, table, columns, rows, chunk_size=BULK_INSERT_CHUNK_SIZE):
+    """
+    Insert rows chunk_size at a time - see insert_chunk for the transaction this must be called in.
+    :param conn:
+    :param table:
+    :param columns:
+    :param rows: Iterable of tuples of values - in the order given by columns
+    :param chunk_size: Rows per executemany
+    :return: List of the ids of the new rows - in the order the rows were given
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    stmt = insert_stmt(table, columns)
+    column_count = len(columns)
+
+    rows = iter(rows)
+    new_ids = []
+    for chunk in iter(lambda: list(islice(rows, chunk_size)), []):
+        if any(len(row) != column_count for row in chunk):
+            raise ValueError("Cannot bulk insert - a row did not match the columns {}".format(columns))
+        new_ids.extend(insert_chunk(conn, table, stmt, chunk))
+    return new_ids
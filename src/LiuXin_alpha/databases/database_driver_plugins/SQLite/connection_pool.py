@@ -0,0 +1,225 @@
+"""
+Connection pooling for the SQLite DatabaseDriver.
+
+Opening an SQLite connection is cheap - but the driver registers a couple of dozen adapters, aggregates, collations and
+functions on every connection and then checks for foreign key support.
+Doing that for every direct_* call dominated bulk operations.
+
+The pool keeps
+ - one long-lived connection per thread - used for reads (and for the legacy paths which commit for themselves)
+ - a single, dedicated writer connection - checked out under a lock, so only one thread writes at a time
+
+Connections are set up once, by the factory the pool is given, and then reused until the pool is closed.
+"""
+
+from __future__ import print_function
+
+import threading
+import time
+
+
+class ConnectionPoolStats(object):
+    """
+    Counters for a connection pool - so the cost of checking connections in and out can be monitored.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+        # Number of connections which have been opened (and had functions, collations e.t.c. registered on them)
+        self.connections_opened = 0
+        # Number of connections which have been really closed
+        self.connections_closed = 0
+
+        self.read_checkouts = 0
+        self.write_checkouts = 0
+
+        # Time spent waiting in checkout (including building a new connection if one was needed) - in seconds
+        self.checkout_time_total = 0.0
+        self.checkout_time_max = 0.0
+
+    def record_checkout(self, write, elapsed):
+        """
+        Record that a connection has been checked out of the pool.
+        :param write: Was the writer connection checked out?
+        :param elapsed: How long did the checkout take (seconds)
+        :return:
+        """
+        with self._lock:
+            if write:
+                self.write_checkouts += 1
+            else:
+                self.read_checkouts += 1
+            self.checkout_time_total += elapsed
+            if elapsed > self.checkout_time_max:
+                self.checkout_time_max = elapsed
+
+    def record_open(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def record_close(self):
+        with self._lock:
+            self.connections_closed += 1
+
+    def as_dict(self):
+        """
+        Return a snapshot of the counters as a dictionary.
+        :return:
+        """
+        with self._lock:
+            checkouts = self.read_checkouts + self.write_checkouts
+            return {
+                "connections_opened": self.connections_opened,
+                "connections_closed": self.connections_closed,
+                "read_checkouts": self.read_checkouts,
+                "write_checkouts": self.write_checkouts,
+                "checkout_time_total": self.checkout_time_total,
+                "checkout_time_max": self.checkout_time_max,
+                "checkout_time_mean": (self.checkout_time_total / checkouts) if checkouts else 0.0,
+            }
+
+
+class SQLiteConnectionPool(object):
+    """
+    Hands out long-lived connections to an SQLite database.
+
+    Connections handed out by the pool have a `pool` attribute set - their close method should hand them back here
+    instead of actually closing them (see SQLite_Connection.close).
+    """
+
+    def __init__(self, factory, writer_release_hook=None):
+        """
+        :param factory: Callable taking no arguments - returns a new, fully set up, connection to the database.
+                        Connections from the factory will be used across threads, so they should be opened with
+                        check_same_thread=False. The pool makes sure that only one thread uses each one at a time.
+        :param writer_release_hook: Called with the writer connection every time it's finally released - while the
+                                    releasing thread still holds it. Used for housekeeping (e.g. WAL checkpoints).
+        """
+        self._factory = factory
+        self._writer_release_hook = writer_release_hook
+
+        # Guards the reader map and the writer connection itself (not checkouts of the writer)
+        self._lock = threading.Lock()
+
+        # Keyed with the thread ident and valued with the reader connection for that thread
+        self._readers = dict()
+
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._writer_owner = None
+        self._writer_depth = 0
+
+        self.stats = ConnectionPoolStats()
+
+    @property
+    def size(self):
+        """
+        The number of connections currently held open by the pool.
+        :return:
+        """
+        with self._lock:
+            return len(self._readers) + (1 if self._writer is not None else 0)
+
+    def _open(self, role):
+        conn = self._factory()
+        conn.pool = self
+        conn.pool_role = role
+        self.stats.record_open()
+        return conn
+
+    def _really_close(self, conn):
+        conn.pool = None
+        try:
+            conn.close()
+        finally:
+            self.stats.record_close()
+
+    def _prune_dead_readers(self):
+        """
+        Close the reader connections of threads which have exited.
+        Must be called with self._lock held.
+        :return:
+        """
+        live_idents = set(t.ident for t in threading.enumerate())
+        for ident in [i for i in self._readers if i not in live_idents]:
+            self._really_close(self._readers.pop(ident))
+
+    def checkout(self, write=False):
+        """
+        Get a connection from the pool.
+        :param write: If True, the dedicated writer connection is returned - the calling thread holds it until it's
+                      closed (released). Writer checkouts are reentrant within a thread.
+                      If False, the reader connection for the calling thread is returned.
+        :return:
+        """
+        start = time.perf_counter()
+
+        if write:
+            self._writer_lock.acquire()
+            try:
+                with self._lock:
+                    if self._writer is None:
+                        self._writer = self._open("write")
+                    conn = self._writer
+            except Exception:
+                self._writer_lock.release()
+                raise
+            self._writer_owner = threading.current_thread().ident
+            self._writer_depth += 1
+        else:
+            ident = threading.current_thread().ident
+            with self._lock:
+                conn = self._readers.get(ident)
+                if conn is None:
+                    self._prune_dead_readers()
+                    conn = self._open("read")
+                    self._readers[ident] = conn
+
+        self.stats.record_checkout(write, time.perf_counter() - start)
+        return conn
+
+    def release(self, conn):
+        """
+        Return a connection to the pool.
+        Reader connections just stay with their thread.
+        Releasing the writer from a thread which doesn't hold it (or releasing it more times than it was checked out)
+        is a no-op - legacy code paths sometimes close a connection more than once.
+        A transaction still open on the writer when it's finally released is rolled back - as closing a connection
+        would - so it can't leak into whatever the next thread to check out the writer does.
+        :param conn:
+        :return:
+        """
+        if getattr(conn, "pool_role", None) != "write":
+            return
+
+        if self._writer_owner != threading.current_thread().ident or self._writer_depth <= 0:
+            return
+
+        try:
+            if self._writer_depth == 1:
+                if conn.in_transaction:
+                    conn.rollback()
+                if self._writer_release_hook is not None:
+                    self._writer_release_hook(conn)
+        finally:
+            self._writer_depth -= 1
+            if self._writer_depth == 0:
+                self._writer_owner = None
+            self._writer_lock.release()
+
+    def close_all(self):
+        """
+        Actually close every connection in the pool.
+        The pool can still be used afterwards - new connections will be opened as needed.
+        :return:
+        """
+        with self._writer_lock:
+            with self._lock:
+                for conn in self._readers.values():
+                    self._really_close(conn)
+                self._readers = dict()
+
+                if self._writer is not None:
+                    self._really_close(self._writer)
+                    self._writer = None
@@ -14,8 +14,11 @@ import random
 import re
 import shutil
 import sqlite3
+import threading
+import time
 import uuid
 from contextlib import closing
+from contextlib import contextmanager
 from copy import deepcopy
 from functools import partial
 
@@ -46,7 +49,6 @@ from LiuXin.exceptions import DatabaseIntegrityError
 from LiuXin.folder_stores.file_manager.LX_name_manip import authors_str_to_sort_str
 from LiuXin.folder_stores.file_manager import path_ok
 
-from LiuXin.databases.maintenance_bot import run_ta_updates
 from LiuXin.databases.backup import backup_local_file
 
 from LiuXin.preferences import preferences
@@ -67,6 +69,24 @@ from LiuXin.utils.filenames import atomic_rename
 from LiuXin.metadata import author_to_author_sort, title_sort
 
 from LiuXin.databases.drivers.SQLite.utility_mixins import SQLiteTableLinkingMixin
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.bulk_insert import BULK_INSERT_CHUNK_SIZE
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.bulk_insert import batch_rows
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.bulk_insert import insert_rows
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.bulk_insert import row_dict_values
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.connection_pool import SQLiteConnectionPool
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.instrumentation import ConnectionInstrument
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.instrumentation import InstrumentedConnectionMixin
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.instrumentation import statement_stats
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.pragmas import build_performance_profile
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.streaming import DEFAULT_FETCH_SIZE
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.streaming import RowHeader
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.streaming import stream_cursor
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.streaming import stream_keyset
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.titles_aggregate import update_titles_aggregate
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.tree_queries import TREE_DEPTH_LIMIT
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.tree_queries import ancestors_stmt
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.tree_queries import roots_stmt
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.tree_queries import subtree_stmt
 
 # Py2/Py3 compatibility layer
 from LiuXin.utils.lx_libraries.liuxin_six import six_unicode
@@ -74,6 +94,30 @@ from LiuXin.utils.lx_libraries.liuxin_six import six_unicode
 from past.builtins import basestring
 
 
+# Per-connection prepared statement cache (the sqlite3 default is 128) - connections are long-lived, and the macros
+# issue the same statements against a lot of different tables
+STATEMENT_CACHE_SIZE = 512
+
+# direct_execute runs statements starting with these on the reader connection - everything else goes to the writer
+READ_STATEMENT_PREFIXES = ("SELECT", "EXPLAIN")
+
+
+def _row_dict_value(value):
+    """
+    Values in row_dicts are unicode - apart from sets (read from PYSET columns).
+    :param value:
+    :return:
+    """
+    if isinstance(value, set):
+        return value
+    return force_unicode(value)
+
+
+# Savepoint nested write_transaction blocks run in - the name can be reused, each release or rollback acts on the
+# innermost savepoint with it
+WRITE_SAVEPOINT = "liuxin_write_transaction"
+
+
 class Connection(apsw.Connection):
 
     BUSY_TIMEOUT = 10000  # milliseconds
@@ -145,6 +189,20 @@ class DummyMaintenanceBot(object):
 
 
 class SQLite_Connection(sqlite3.Connection):
+
+    # Set by the SQLiteConnectionPool if this connection belongs to one
+    pool = None
+
+    def close(self):
+        """
+        Pooled connections are handed back to their pool - anything else is actually closed.
+        :return:
+        """
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            sqlite3.Connection.close(self)
+
     def get(self, *args, **kw):
         """
         Helper method for retrieving results from a database.
@@ -189,6 +247,14 @@ class SQLite_Connection(sqlite3.Connection):
         return ans.fetchall()
 
 
+class InstrumentedSQLite_Connection(InstrumentedConnectionMixin, SQLite_Connection):
+    """
+    Connection which records per-statement costs to the statement stats registry.
+    """
+
+    pass
+
+
 # Any method starting with the word direct is intended to be directly exposed to the outside world.
 # Ideally only these should be present (this is intended to contain only the bare minimum required to interact with the
 # actual, on disk database.
@@ -199,7 +265,15 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
     Represents a collection of all the methods needed to interface with an actual database.
     """
 
-    def __init__(self, db_metadata, db=None, set_conn=True, dirty_records_queue=None):
+    def __init__(
+        self,
+        db_metadata,
+        db=None,
+        set_conn=True,
+        dirty_records_queue=None,
+        pool_connections=None,
+        performance_profile=None,
+    ):
         """
         Initializing the class with db_metadata. Which is an object assumed to have a dictionary like interface which
         provides all the necessary fields to connect to a database of the given type.
@@ -207,6 +281,9 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         :param db_metadata:
         :param db: The database this process is driving. Hopefully infinite recursion will not result.
         :param set_conn: Set the globally used connection for the class
+        :param pool_connections: Reuse long-lived connections - if None, falls back on the preference
+        :param performance_profile: Name of the set of PRAGMAs to apply to connections ("wal" or "legacy") - if None,
+                                    falls back on the preference
         :return:
         """
         self.db_metadata = db_metadata
@@ -224,9 +301,14 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         # locations are loaded from the DatabasePing object
         self.locations = None
 
-        # Used to keep track of the number of instructions executed on this database, so database activity can be
-        # monitored
-        self.event_count = 0
+        # Per-statement instrumentation (VM instructions, wall time and rows returned for each statement) is off by
+        # default - it costs a python callback every sample_interval VM instructions
+        if preferences.parse("sql_instrumentation", "bool", False):
+            self.instrumentation_sample_interval = preferences.parse(
+                "sql_instrumentation_sample_interval", "int", 1000
+            )
+        else:
+            self.instrumentation_sample_interval = None
 
         # Some tables shouldn't be touched - these are the helper tables
         self.helper_tables = [
@@ -239,12 +321,45 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
 
         # The maintenance bot allows the behavior of the database to be customized with python code.
         self.maintainer_callback = DummyMaintenanceBot()
+        # Titles whose titles_aggregate row needs recomputing - used when there's no maintenance bot to queue them for
+        self._pending_ta_updates = set()
+        self._pending_ta_lock = threading.Lock()
 
         # Parse some of the preference values which affect the behavior of the database
+        if performance_profile is None:
+            performance_profile = preferences.parse("performance_profile", "str", "wal")
+        try:
+            self.performance_profile = build_performance_profile(
+                performance_profile,
+                cache_size=preferences.parse("sqlite_cache_size", "int", -65536),
+                mmap_size=preferences.parse("sqlite_mmap_size", "int", 268435456),
+                checkpoint_interval=preferences.parse("wal_checkpoint_interval", "int", 300),
+            )
+        except ValueError as e:
+            err_str = "Unable to build the performance profile for the database.\n"
+            err_str = default_log.log_exception(err_str, e, "ERROR", ("performance_profile", performance_profile))
+            raise DatabaseDriverError(err_str)
+        self._last_checkpoint = time.monotonic()
+
+        # Rows read at a time by the streaming read methods
+        self.stream_fetch_size = preferences.parse("stream_fetch_size", "int", DEFAULT_FETCH_SIZE)
+
+        # Long-lived connections are reused - rather than being built (and having all the functions registered) for
+        # every call
+        if pool_connections is None:
+            pool_connections = preferences.parse("pool_connections", "bool", True)
+        if pool_connections:
+            self._pool = SQLiteConnectionPool(
+                factory=partial(self._open_connection, check_same_thread=False),
+                writer_release_hook=self._writer_housekeeping,
+            )
+        else:
+            self._pool = None
 
         # Store a connection to be used for locking
         if set_conn:
             self.conn = self.get_connection()
+            self.verify_performance_profile()
         else:
             self.conn = None
 
@@ -265,9 +380,15 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         """
         scratch_folder = get_scratch_folder()
         scratch_db_path = os.path.join(scratch_folder, "scratch.db")
+        # Anything still in the write-ahead log would be left behind by the copy
+        self.direct_wal_checkpoint(mode="TRUNCATE")
         shutil.copyfile(src=self.database_path, dst=scratch_db_path)
         self.database_path = scratch_db_path
 
+        # Pooled connections are still pointed at the old database
+        if self._pool is not None:
+            self._pool.close_all()
+
     def _zero_prop_cache(self):
         """
         Zero any cached properties - used when significant changes have.may have been made to the database.
@@ -290,7 +411,10 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         Shutdown the connection to the database - but leave the drive class in existence so it can be re-opened.
         :return:
         """
-        self.conn.close()
+        if self._pool is not None:
+            self._pool.close_all()
+        else:
+            self.conn.close()
 
     def refresh(self):
         """
@@ -305,6 +429,8 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         Re-opes the connection to the database.
         :return:
         """
+        if self._pool is not None:
+            self._pool.close_all()
         self.conn = self.get_connection()
 
     def direct_backup(self, path=None):
@@ -313,9 +439,13 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         :param path: The path to backup the database to - if none is provided, autogenerated
         :return:
         """
-        # Acquire a conn object - use it to lock the DatabasePing
-        conn = self.get_connection()
-        with conn:
+        # Acquire the writer - use it to lock the DatabasePing
+        # In WAL mode, committed transactions may still be in the log - fold them into the database file before the
+        # copy
+        conn = self.get_connection(write=True)
+        try:
+            if self.performance_profile.is_wal:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
 
             # Preform the backup
             backup_status = backup_local_file(self.database_path, override_path=path)
@@ -336,6 +466,8 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
                     ("database_backup_path", backup_status),
                 )
                 raise DatabaseDriverError(wrn_str)
+        finally:
+            conn.close()
 
     def direct_self_delete(self):
         """
@@ -353,9 +485,16 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
                 default_log.error(err_str)
                 raise DatabaseDriverError(err_str)
 
-            # Remove the database file
+            # Remove the database file - the pooled connections all hold it open
+            if self._pool is not None:
+                self._pool.close_all()
             os.remove(self.database_path)
 
+            # As well as the write-ahead log and the shared memory index - if they're still around
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(self.database_path + suffix):
+                    os.remove(self.database_path + suffix)
+
             # Check that the delete has gone through i.e. the path no longer exists.
             if os.path.exists(self.database_path):
                 err_str = "DatabasePing cannot be deleted - process failed silently.\n"
@@ -365,34 +504,62 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         # With the database gone the caches should also be emptied
         self._zero_prop_cache()
 
-    def simple_print_progress_handler(self):
+    def set_instrumentation(self, sample_interval=1000):
         """
-        The most basic progress handler - prints the number of events every hundred million events.
+        Turn per-statement instrumentation on (or off, if sample_interval is None).
+        Only affects connections opened after the call - so the pool is emptied.
+        :param sample_interval: Charge VM instructions to the running statement every sample_interval instructions
         :return:
         """
-        if self.event_count % 100000000 == 0:
-            LiuXin_print(self.event_count)
-            self.event_count += 1
-        else:
-            self.event_count += 1
+        self.instrumentation_sample_interval = sample_interval
+        if self._pool is not None:
+            self._pool.close_all()
+
+    @staticmethod
+    def statement_stats():
+        """
+        Returns the registry which instrumented connections report to - call dump or format_report on it.
+        :return:
+        """
+        return statement_stats
 
     def direct_run_ta_update(self, ta_row_id):
         """
-        Runs the separate worker process which updates the titles_aggregate table after the basic update has occured.
+        Have the titles_aggregate row for the title recomputed.
+        If a maintenance bot is attached, the title is queued for it - dirtied titles are coalesced and recomputed in
+        batches, on the bot's thread, in a single transaction.
+        Otherwise the title is recomputed synchronously - as soon as the write which dirtied it has committed. (This is
+        called by TA_UPDATE - from triggers, part way through a statement - so it can't be done here).
         :param ta_row_id:
         :return:
         """
-        if preferences["run_ta_update_after_each_change"] == "true":
-            run_ta_updates(
-                [
-                    ta_row_id,
-                ],
-                self,
-            )
-        elif preferences["run_ta_update_after_each_change"] == "false":
-            pass
+        if preferences["run_ta_update_after_each_change"] != "true":
+            return
+        if isinstance(self.maintainer_callback, DummyMaintenanceBot):
+            with self._pending_ta_lock:
+                self._pending_ta_updates.add(ta_row_id)
         else:
-            pass
+            self.maintainer_callback.dirty_record("titles_aggregate", ta_row_id)
+
+    def _flush_ta_updates(self, conn):
+        """
+        Recompute the titles_aggregate rows dirtied while no maintenance bot was attached.
+        Called with the writer once a write has committed - the rows are recomputed in a transaction of their own.
+        :param conn: The writer connection
+        :return:
+        """
+        with self._pending_ta_lock:
+            if not self._pending_ta_updates:
+                return
+            title_ids, self._pending_ta_updates = self._pending_ta_updates, set()
+        try:
+            update_titles_aggregate(conn, sorted(title_ids))
+        except sqlite3.Error as e:
+            conn.rollback()
+            err_str = "Unable to recompute titles_aggregate after a write"
+            default_log.log_exception(err_str, e, "ERROR", ("title_ids", title_ids))
+        else:
+            conn.commit()
 
     # ----------------------------------------------------------------------------------------------------------------------
     #
@@ -401,39 +568,62 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
     # ----------------------------------------------------------------------------------------------------------------------
 
     # Internal, implementation dependant method. Should not be exposed to the outside
-    def get_connection(self):
+    def get_connection(self, write=False):
         """
-        Method which creates a connection with foreign key support. Returns a connection.
+        Returns a connection to the database, with foreign key support and all the custom functions registered.
+
+        If connection pooling is on (the default) then connections are long-lived - each thread gets a reader
+        connection of its own, and there's a single writer connection which can only be checked out by one thread at
+        a time. Calling close on a pooled connection hands it back to the pool.
+        Write methods which check out the writer MUST close it (in a finally block) - or no other thread can write.
+        :param write: Check out the dedicated writer connection
         :return conn: A connection to the database
         """
-        # Todo: Should only have to do all this once? Surely?
-        # Registering converter and adaptor to deal with columns containing sets
-        sqlite3.register_adapter(set, py_set_adapter)
-        sqlite3.register_converter("PYSET", py_set_converter)
+        if self._pool is None:
+            return self._open_connection()
+        return self._pool.checkout(write=write)
 
-        # Registering converter and adaptor to deal with columns containing lists
-        sqlite3.register_adapter(list, py_list_adapter)
-        sqlite3.register_converter("PYLIST", py_list_converter)
+    def connection_pool_stats(self):
+        """
+        Returns a dictionary of the counters for the connection pool (or None if connections are not being pooled).
+        :return:
+        """
+        if self._pool is None:
+            return None
+        stats = self._pool.stats.as_dict()
+        stats["pool_size"] = self._pool.size
+        return stats
 
-        # Registering converter and adapter to deal with columns containing dictionaries
-        sqlite3.register_adapter(dict, py_dict_adapter)
-        sqlite3.register_converter("PYDICT", py_dict_converter)
+    def _open_connection(self, check_same_thread=True):
+        """
+        Method which creates a new connection with foreign key support. Returns the connection.
+        Expensive - registers all the adapters, functions, collations and aggregates. Use get_connection instead.
+        :param check_same_thread: Passed through to sqlite3 - pooled connections are used from different threads (one
+                                  at a time).
+        :return conn: A connection to the database
+        """
+        register_sqlite_types()
 
-        # The built in date adaptor chokes when passed a u'None' - replacing it with home brew until can properly
-        # sanitize database inputs
-        sqlite3.register_converter("DATE", py_date_converter)
-        # Enable callbacks in case of error within added functions
-        sqlite3.enable_callback_tracebacks(True)
+        if self.instrumentation_sample_interval is not None:
+            connection_factory = InstrumentedSQLite_Connection
+        else:
+            connection_factory = SQLite_Connection
 
         try:
-            conn = SQLite_Connection(self.database_path, detect_types=sqlite3.PARSE_DECLTYPES)
+            conn = connection_factory(
+                self.database_path,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+                check_same_thread=check_same_thread,
+                cached_statements=STATEMENT_CACHE_SIZE,
+            )
 
             # Aggregator allows sets of unicode to be stored directly as the result of queries
             conn.create_aggregate("pyset", 1, PySetAggregate)
             conn.create_aggregate("sortag", 1, SortAggregate)
             conn.create_aggregate("pylist", 1, PyListAggregate)
-            # The progress handler used to monitor the SQLite virtual machine must be added to the conn
-            conn.set_progress_handler(self.simple_print_progress_handler, 1)
+            # The progress handler used to monitor the SQLite virtual machine - only installed if instrumenting
+            if self.instrumentation_sample_interval is not None:
+                ConnectionInstrument(sample_interval=self.instrumentation_sample_interval).install(conn)
 
         except sqlite3.OperationalError as e:
             error_message = e.message
@@ -452,6 +642,9 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         if test != (1,):
             default_log.warn("Warning - foreign key support not enabled.")
 
+        # journal_mode, synchronous, cache_size e.t.c.
+        self.performance_profile.apply(conn)
+
         # Adds regex search support to the connection
         def regexp(expr, item):
             reg = re.compile(expr)
@@ -472,9 +665,11 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
 
         # More generally, add a function which will callback to the maintenance bot to tell it that particular row in
         # a table has changed and might need attention
-        conn.create_function("DIRTY_RECORD", 2, self.maintainer_callback.dirty_record)
-        conn.create_function("DIRTY_INTERLINK_RECORD", 4, self.maintainer_callback.dirty_interlink_record)
-        conn.create_function("NEW_DIRTY_RECORD", 2, self.maintainer_callback.new_dirty_record)
+        # Connections are long-lived and the maintenance bot is set after the driver is created - so look it up on
+        # every call, rather than binding the current one to the connection
+        conn.create_function("DIRTY_RECORD", 2, self._maintainer_dirty_record)
+        conn.create_function("DIRTY_INTERLINK_RECORD", 4, self._maintainer_dirty_interlink_record)
+        conn.create_function("NEW_DIRTY_RECORD", 2, self._maintainer_new_dirty_record)
 
         # calibre - functions included here for compatibility
         conn.create_function("title_sort", 1, title_sort)
@@ -504,6 +699,78 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
 
         return conn
 
+    def verify_performance_profile(self, conn=None):
+        """
+        Check that the PRAGMAs from the performance profile have actually been applied - warns if they haven't.
+        (e.g. WAL mode can't be used on some network filesystems, and mmap_size is capped at compile time).
+        :param conn:
+        :return: Dictionary of mismatches - keyed with the pragma and valued with a tuple of (expected, actual)
+        """
+        if conn is None:
+            conn = self.get_connection()
+        mismatches = self.performance_profile.verify(conn)
+        if mismatches:
+            wrn_str = "Unable to apply the full database performance profile.\n"
+            default_log.log_variables(
+                wrn_str,
+                "WARNING",
+                ("performance_profile", self.performance_profile.name),
+                ("database_path", self.database_path),
+                ("mismatches", mismatches),
+            )
+        return mismatches
+
+    def direct_wal_checkpoint(self, mode="PASSIVE"):
+        """
+        Checkpoint the write-ahead log into the database file.
+        Does nothing if the database is not in WAL mode.
+        :param mode: "PASSIVE", "FULL", "RESTART" or "TRUNCATE"
+        :return: The (busy, log pages, checkpointed pages) tuple from SQLite - or None if not in WAL mode
+        """
+        if not self.performance_profile.is_wal:
+            return None
+
+        mode = mode.upper()
+        if mode not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+            raise InputIntegrityError("Unknown wal_checkpoint mode: {}".format(mode))
+
+        conn = self.get_connection(write=True)
+        try:
+            result = conn.execute("PRAGMA wal_checkpoint({})".format(mode)).fetchone()
+        finally:
+            conn.close()
+        self._last_checkpoint = time.monotonic()
+        return result
+
+    def _writer_housekeeping(self, conn):
+        """
+        Called by the connection pool every time the writer is released.
+        Runs a passive checkpoint of the write-ahead log if it's been longer than the checkpoint interval - so there's no
+        need for a separate thread and an idle database costs nothing.
+        :param conn:
+        :return:
+        """
+        interval = self.performance_profile.checkpoint_interval
+        if not interval or not self.performance_profile.is_wal:
+            return
+        if time.monotonic() - self._last_checkpoint < interval:
+            return
+
+        self._last_checkpoint = time.monotonic()
+        try:
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+        except sqlite3.OperationalError as e:
+            default_log.log_exception("Periodic wal_checkpoint failed.\n", e, "WARNING")
+
+    def _maintainer_dirty_record(self, table, row_id):
+        return self.maintainer_callback.dirty_record(table, row_id)
+
+    def _maintainer_dirty_interlink_record(self, update_type, table1, table2, table1_id, table2_id):
+        return self.maintainer_callback.dirty_interlink_record(update_type, table1, table2, table1_id, table2_id)
+
+    def _maintainer_new_dirty_record(self, table, row_id):
+        return self.maintainer_callback.new_dirty_record(table, row_id)
+
     def last_modified(self):
         """
         Return last modified time as a UTC datetime object
@@ -518,7 +785,8 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         Be careful. There are no safeguards.
         :return:
         """
-        conn = self.get_connection()
+        # Hold the writer for the session - statements are committed as they're entered
+        conn = self.get_connection(write=True)
         cur = conn.cursor()
 
         input_buffer = ""
@@ -531,29 +799,31 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         LiuXin_print("Enter your SQL commands to execute in sqlite3.")
         LiuXin_print("Enter a blank line to exit.")
 
-        while True:
-            line = user_input()
-            if line == "":
-                break
-            input_buffer += line
-            if sqlite3.complete_statement(input_buffer):
-                try:
-                    input_buffer = input_buffer.strip()
-                    cur.execute(input_buffer)
-                    conn.commit()
-
-                    if input_buffer.lstrip().upper().startswith("SELECT"):
-                        print(cur.fetchall())
-                except sqlite3.Error as e:
-                    print("An error occurred:", e.args[0])
-                input_buffer = ""
+        try:
+            while True:
+                line = user_input()
+                if line == "":
+                    break
+                input_buffer += line
+                if sqlite3.complete_statement(input_buffer):
+                    try:
+                        input_buffer = input_buffer.strip()
+                        cur.execute(input_buffer)
+                        conn.commit()
+
+                        if input_buffer.lstrip().upper().startswith("SELECT"):
+                            print(cur.fetchall())
+                    except sqlite3.Error as e:
+                        conn.rollback()
+                        print("An error occurred:", e.args[0])
+                    input_buffer = ""
+        finally:
+            conn.close()
 
         # Certain cached constants may have changed - thus invalidating some of them to force renew next time a call is
         # made to them
         self._zero_prop_cache()
 
-        conn.close()
-
     # Todo: This should be something like "execute sql script" - to distinguish it from the execute method in the conn
     def executescript(self, script):
         """
@@ -562,21 +832,18 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         :param script: This will be executed directly on the database.
         :return:
         """
-        conn = self.get_connection()
-        conn.executescript(script)
-        conn.close()
+        with self._write_connection() as conn:
+            conn.executescript(script)
 
     def execute_sql(self, sql, parameters=None):
         """
-        Execute the given sql using a new conn, which will be closed after the execution.
+        Execute the given sql on the writer connection - committed before the writer is released.
         :param sql:
         :param parameters:
         :return:
         """
-        conn = self.get_connection()
-        last_row_id = conn.execute(sql, parameters).lastrowid
-        conn.commit()
-        return last_row_id
+        with self._write_connection() as conn:
+            return conn.execute(sql, parameters).lastrowid
 
     def sql_dump(self):
         """
@@ -644,10 +911,8 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         if not os.path.exists(os.path.dirname(self.database_path)):
             os.makedirs(os.path.dirname(self.database_path))
 
-        conn = self.get_connection()
-        create_new_database(conn)
-        conn.commit()
-        conn.close()
+        with self._write_connection() as conn:
+            create_new_database(conn)
 
     #
     # ----------------------------------------------------------------------------------------------------------------------
@@ -901,136 +1166,105 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
 
         stmt = "INSERT into `{}` ({}) VALUES ({})".format(target_table, column_placeholders, values_placeholders)
 
-        conn = self.get_connection()
-        c = conn.cursor()
+        with self._write_connection() as conn:
+            c = conn.cursor()
 
-        if VERBOSE_DEBUG:
-            LiuXin_debug_print("add_simple_row about to execute SQL code.")
-            LiuXin_debug_print(stmt, " on ", target_table, " with values ", values)
+            if VERBOSE_DEBUG:
+                LiuXin_debug_print("add_simple_row about to execute SQL code.")
+                LiuXin_debug_print(stmt, " on ", target_table, " with values ", values)
 
-        try:
-            c.execute(stmt, values)
-        except sqlite3.OperationalError as e:
-            err_str = "sqlite3.OperationalError."
-            err_str = default_log.log_exception(
-                err_str,
-                e,
-                "ERROR",
-                ("row_dict", row_dict),
-                ("target_table", target_table),
-                ("stmt", stmt),
-            )
-            raise DatabaseDriverError(err_str)
-        except sqlite3.IntegrityError as e:
-            err_str = "sqlite3.IntegrityError."
-            err_str = default_log.log_exception(
-                err_str,
-                e,
-                "ERROR",
-                ("row_dict", row_dict),
-                ("target_table", target_table),
-                ("table_sqlite", self.get_table_sqlite(table=target_table, conn=conn)),
-            )
-            raise DatabaseIntegrityError(err_str)
-        finally:
-            conn.commit()
-            conn.close()
+            try:
+                c.execute(stmt, values)
+            except sqlite3.OperationalError as e:
+                err_str = "sqlite3.OperationalError."
+                err_str = default_log.log_exception(
+                    err_str,
+                    e,
+                    "ERROR",
+                    ("row_dict", row_dict),
+                    ("target_table", target_table),
+                    ("stmt", stmt),
+                )
+                raise DatabaseDriverError(err_str)
+            except sqlite3.IntegrityError as e:
+                err_str = "sqlite3.IntegrityError."
+                err_str = default_log.log_exception(
+                    err_str,
+                    e,
+                    "ERROR",
+                    ("row_dict", row_dict),
+                    ("target_table", target_table),
+                    ("table_sqlite", self.get_table_sqlite(table=target_table, conn=conn)),
+                )
+                raise DatabaseIntegrityError(err_str)
 
     def direct_add_multiple_simple_row_dicts(self, row_dict_list):
         """
         Takes an index of new rows in the form of dictionaries. Adds them to the database.
+        All the rows must have the same keys (and so be from the same table). Their ids must be None (or missing) - this
+        method adds rows, it can't update them.
         :param row_dict_list: Takes a list of simple rows
+        :return: List of the ids of the new rows - in the order the rows were given
         """
         if len(row_dict_list) == 0:
-            return True
+            return []
 
-        # Gets a reference element. Errors will be thrown if every row doesn;t match this one.
+        # Gets a reference element. Errors will be thrown if every row doesn't match this one.
         reference_row_dict = row_dict_list[0]
         target_table = self.__identify_table_from_row(reference_row_dict)
+        table_id_col = self.direct_get_id_column(target_table)
+        columns = tuple(col for col in reference_row_dict.keys() if col not in ("table", table_id_col))
 
-        # TODO: re-write add_multiple_simple_rows to handle multiple different types of row
-        for row in row_dict_list:
-            if target_table != self.__identify_table_from_row(row):
-                raise InputIntegrityError("Rows from different tables.")
-
-        # TODO: extend the method to deal with this
-        for statement in row_dict_list:
-            # Check that we're dealing with rows of the same type
-            if set([rk for rk in reference_row_dict.keys()]) != set([rk for rk in statement.keys()]):
-                raise InputIntegrityError("Rows with different column names.")
-
-            table_id_col = self.direct_get_id_column(target_table)
-
-            if table_id_col in statement and statement[table_id_col] is not None:
-                raise InputIntegrityError("Cannot update a row using this method!")
-
-        for i in range(len(row_dict_list)):
-            if "table" in row_dict_list[i].keys():
-                del row_dict_list[i]["table"]
-
-        # With all those checks run we should have a nice, consistent set of dictionaries to insert into target_table
-        reference_row_dict = row_dict_list[0]
-
-        values_placeholders = ""
-        for i in range(len(reference_row_dict)):
-            values_placeholders += "?,"
-
-        values_placeholders = values_placeholders[:-1]
-
-        # building the list of values
-        column_list_string = ""
-
-        column_headings = reference_row_dict.keys()
-
-        for i in range(len(reference_row_dict)):
-            if column_headings[i] != "table":
-                column_list_string += force_unicode(column_headings[i]) + ","
-
-        column_list_string = column_list_string[:-1]
-
-        stmt = "INSERT into `{}` ({}) VALUES ({})".format(target_table, column_list_string, values_placeholders)
-
-        values = []
-
-        for statement in row_dict_list:
-            values.append(statement.values())
+        # Rows with the same columns as the reference row must be from the same table - extract the values in the
+        # reference column order (the rows might have been built with their keys in different orders)
+        return self.direct_bulk_insert(
+            target_table, row_dict_values(row_dict_list, columns, table_id_col), columns=columns
+        )
 
-        conn = self.get_connection()
-        c = conn.cursor()
+    def direct_bulk_insert(self, target_table, batch, columns=None, chunk_size=BULK_INSERT_CHUNK_SIZE):
+        """
+        Insert a columnar batch of new rows into a table.
+        The table and columns are validated once - the rows are then inserted chunk_size at a time, with executemany, in
+        a single transaction (so either all the rows are added or none of them are).
+        :param target_table:
+        :param batch: Either a dictionary keyed with column names and valued with equal length lists of values, or an
+                      iterable of tuples of values - in the order given by columns. Iterables are consumed a chunk at a
+                      time - so a generator over a very large source need never be held in memory at once.
+        :param columns: The column order of the tuples in batch. Must not be given if batch is a dictionary.
+        :param chunk_size: Rows per executemany
+        :return: List of the ids of the new rows - in the order the rows were given
+        """
+        try:
+            columns, rows = batch_rows(batch, columns)
+        except ValueError as e:
+            err_str = "Cannot bulk insert - bad batch"
+            err_str = default_log.log_exception(err_str, e, "ERROR", ("target_table", target_table))
+            raise InputIntegrityError(err_str)
 
-        info_str = "add_multiple_simple_rows about to execute SQL code."
-        default_log.log_variables(info_str, "INFO", ("target_table", target_table), ("values", values))
+        # Validate once - rather than per row
+        if not self.validate_existing_table_name(target_table):
+            raise InputIntegrityError("table {} not found".format(target_table))
+        table_columns = set(self.direct_get_column_headings(target_table))
+        unknown_columns = [col for col in columns if col not in table_columns]
+        if unknown_columns or not columns:
+            err_str = "Cannot bulk insert - columns are not valid for the table"
+            err_str = default_log.log_variables(
+                err_str, "ERROR", ("target_table", target_table), ("unknown_columns", unknown_columns)
+            )
+            raise InputIntegrityError(err_str)
+        if self.direct_get_id_column(target_table) in columns:
+            raise InputIntegrityError("Cannot set row ids using this method!")
 
         try:
-            c.executemany(stmt, values)
-        except sqlite3.OperationalError as e:
-            err_str = "sqlite3.OperationalError."
-            err_str = default_log.log_exception(
-                err_str,
-                e,
-                "ERROR",
-                ("row_dict_list", row_dict_list),
-                ("target_table", target_table),
-                ("stmt", stmt),
-                ("values", values),
-            )
-            raise DatabaseDriverError(err_str)
-        except sqlite3.IntegrityError as e:
-            err_str = "sqlite3.IntegrityError."
+            with self.write_transaction() as conn:
+                return insert_rows(conn, target_table, columns, rows, chunk_size=chunk_size)
+        except ValueError as e:
+            # A row which doesn't match the columns - the transaction has been rolled back
+            err_str = "Cannot bulk insert - bad row"
             err_str = default_log.log_exception(
-                err_str,
-                e,
-                "ERROR",
-                ("row_dict_list", row_dict_list),
-                ("target_table", target_table),
-                ("table_sqlite", self.get_table_sqlite(table=target_table, conn=conn)),
-                ("stmt", stmt),
-                ("values", values),
+                err_str, e, "ERROR", ("target_table", target_table), ("columns", columns)
             )
-            raise DatabaseIntegrityError(err_str)
-        finally:
-            conn.commit()
-            conn.close()
+            raise InputIntegrityError(err_str)
 
     # ----------------------------------------------------------------------------------------------------------------------
     #
@@ -1053,40 +1287,33 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
             err_str = default_log.log_variables(err_str, "ERROR", ("target_table", target_table), ("row_ids", row_ids))
             raise InputIntegrityError(err_str)
 
-        conn = self.get_connection()
         target_table_id_column = self._get_id_column(target_table)
         stmt = "DELETE FROM {} WHERE {} = ?;".format(target_table, target_table_id_column)
-        try:
-            conn.executemany(stmt, row_ids)
-        except sqlite3.OperationalError as e:
-            err_str = "Operational error on table.\n"
-            err_str = default_log.log_exception(
-                err_str,
-                e,
-                "ERROR",
-                ("target_table", target_table),
-                ("row_ids", row_ids),
-                ("stmt", stmt),
-            )
-            conn.commit()
-            conn.close()
-            raise DatabaseDriverError(err_str)
-        except sqlite3.IntegrityError as e:
-            err_str = "IntegrityError on table."
-            err_str = default_log.log_exception(
-                err_str,
-                e,
-                "ERROR",
-                ("target_table", target_table),
-                ("row_ids", row_ids),
-                ("stmt", stmt),
-            )
-            conn.commit()
-            conn.close()
-            raise DatabaseIntegrityError(err_str)
-        finally:
-            conn.commit()
-            conn.close()
+        with self._write_connection() as conn:
+            try:
+                conn.executemany(stmt, row_ids)
+            except sqlite3.OperationalError as e:
+                err_str = "Operational error on table.\n"
+                err_str = default_log.log_exception(
+                    err_str,
+                    e,
+                    "ERROR",
+                    ("target_table", target_table),
+                    ("row_ids", row_ids),
+                    ("stmt", stmt),
+                )
+                raise DatabaseDriverError(err_str)
+            except sqlite3.IntegrityError as e:
+                err_str = "IntegrityError on table."
+                err_str = default_log.log_exception(
+                    err_str,
+                    e,
+                    "ERROR",
+                    ("target_table", target_table),
+                    ("row_ids", row_ids),
+                    ("stmt", stmt),
+                )
+                raise DatabaseIntegrityError(err_str)
 
         # Todo: Add checking that the delete has gone through
         return True
@@ -1112,45 +1339,38 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
             )
             raise InputIntegrityError(err_str)
 
-        conn = self.get_connection()
-        stmt = "DELETE FROM {} WHERE {} = ?;".format(target_table, column)
-        try:
-            if not many:
-                conn.execute(stmt, (value,))
-            else:
-                value = tuple([(str(v),) for v in value])
-                conn.executemany(stmt, value)
-        except sqlite3.OperationalError as e:
-            err_str = "Operational error on table.\n"
-            err_str = default_log.log_exception(
-                err_str,
-                e,
-                "ERROR",
-                ("target_table", target_table),
-                ("column", column),
-                ("value", value),
-                ("stmt", stmt),
-            )
-            conn.commit()
-            conn.close()
-            raise DatabaseDriverError(err_str)
-        except sqlite3.IntegrityError as e:
-            err_str = "IntegrityError on table.\n"
-            err_str = default_log.log_exception(
-                err_str,
-                e,
-                "ERROR",
-                ("target_table", target_table),
-                ("column", column),
-                ("value", value),
-                ("stmt", stmt),
-            )
-            conn.commit()
-            conn.close()
-            raise DatabaseIntegrityError(err_str)
-        finally:
-            conn.commit()
-            conn.close()
+        with self._write_connection() as conn:
+            stmt = "DELETE FROM {} WHERE {} = ?;".format(target_table, column)
+            try:
+                if not many:
+                    conn.execute(stmt, (value,))
+                else:
+                    value = tuple([(str(v),) for v in value])
+                    conn.executemany(stmt, value)
+            except sqlite3.OperationalError as e:
+                err_str = "Operational error on table.\n"
+                err_str = default_log.log_exception(
+                    err_str,
+                    e,
+                    "ERROR",
+                    ("target_table", target_table),
+                    ("column", column),
+                    ("value", value),
+                    ("stmt", stmt),
+                )
+                raise DatabaseDriverError(err_str)
+            except sqlite3.IntegrityError as e:
+                err_str = "IntegrityError on table.\n"
+                err_str = default_log.log_exception(
+                    err_str,
+                    e,
+                    "ERROR",
+                    ("target_table", target_table),
+                    ("column", column),
+                    ("value", value),
+                    ("stmt", stmt),
+                )
+                raise DatabaseIntegrityError(err_str)
 
         # Todo: Add checking that the delete has gone through
         return True
@@ -1178,39 +1398,35 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
             err_str = default_log.log_variables(err_str, "ERROR", ("target_table", target_table), ("row_id", row_id))
             raise InputIntegrityError(err_str)
 
-        conn = self.get_connection()
         target_table_id_column = self._get_id_column(target_table)
         stmt = "DELETE FROM {} WHERE {} = ?;".format(target_table, target_table_id_column)
+        with self._write_connection() as conn:
 
-        try:
-            conn.execute(stmt, (row_id,))
-        except sqlite3.OperationalError as e:
-            err_str = "Operational error on table."
-            err_str = default_log.log_exception(
-                err_str,
-                e,
-                "ERROR",
-                ("target_table", target_table),
-                ("row_id", row_id),
-                ("stmt", stmt),
-            )
-            conn.commit()
-            raise DatabaseDriverError(err_str)
-        except sqlite3.IntegrityError as e:
-            err_str = "IntegrityError on table.\n"
-            err_str = default_log.log_exception(
-                err_str,
-                e,
-                "ERROR",
-                ("target_table", target_table),
-                ("row_id", row_id),
-                ("stmt", stmt),
-            )
-            default_log.log_exception(message=err_str, exception=e, level="ERROR")
-            conn.commit()
-            raise DatabaseIntegrityError(err_str)
-        finally:
-            conn.commit()
+            try:
+                conn.execute(stmt, (row_id,))
+            except sqlite3.OperationalError as e:
+                err_str = "Operational error on table."
+                err_str = default_log.log_exception(
+                    err_str,
+                    e,
+                    "ERROR",
+                    ("target_table", target_table),
+                    ("row_id", row_id),
+                    ("stmt", stmt),
+                )
+                raise DatabaseDriverError(err_str)
+            except sqlite3.IntegrityError as e:
+                err_str = "IntegrityError on table.\n"
+                err_str = default_log.log_exception(
+                    err_str,
+                    e,
+                    "ERROR",
+                    ("target_table", target_table),
+                    ("row_id", row_id),
+                    ("stmt", stmt),
+                )
+                default_log.log_exception(message=err_str, exception=e, level="ERROR")
+                raise DatabaseIntegrityError(err_str)
 
         # Todo: Add checking that the delete has gone through
         return True
@@ -1229,15 +1445,12 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
 
         # Lock the database (to stop anything being assigned into the space that has just been freed by the delete
         # between the delete and the check) - clear the table - check that there are actually no rows in the table
-        conn = self.get_connection()
-
         row_count = None
         try:
-            with conn:
+            with self._write_connection() as conn:
                 # Delete the row
                 stmt = "DELETE FROM {};".format(target_table)
                 conn.execute(stmt)
-                conn.commit()
 
                 # Check to see if there are actually any rows left in the table
                 stmt = "SELECT COUNT(*) FROM {};".format(target_table)
@@ -1257,9 +1470,6 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
             err_str = default_log.log_exception(err_str, e, "ERROR", ("target_table", target_table))
             raise DatabaseIntegrityError(err_str)
 
-        finally:
-            conn.close()
-
         if row_count == 0:
             return True
         else:
@@ -1379,110 +1589,84 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
     def direct_get_all_rows(self, table, sort_column=None, reverse=False):
         """
         Returns all rows from a given table in the database in the form of an index of row_dicts.
-        Should only be used with small tables. Otherwise the memory cost is prohibitive.
+        Should only be used with small tables. Otherwise the memory cost is prohibitive - use direct_stream_rows.
         :param table: Yield the rows from this table
         :param sort_column: Sort the rows by the values in this column
         :param reverse: Should the order of the rows be reversed?
         :return:
         """
-        conn = self.get_connection()
-        c = conn.cursor()
+        return [row.as_dict() for row in self.direct_stream_rows(table, sort_column=sort_column, reverse=reverse)]
+
+    def direct_stream_rows(self, table, columns=None, sort_column=None, reverse=False, fetch_size=None, records=True):
+        """
+        Yields the rows of a table - reading fetch_size at a time from a cursor dedicated to the stream, so even full
+        table scans run in constant memory.
+        :param table: Yield the rows from this table
+        :param columns: Only read these columns - defaults to all of them
+        :param sort_column: Sort the rows by the values in this column
+        :param reverse: Should the order of the rows be reversed?
+        :param fetch_size: Rows to read at a time - defaults to the stream_fetch_size preference
+        :param records: If True rows are yielded as StreamedRows - dict like, with values converted to unicode (as in
+                        row_dicts) only when they're read. If False as plain tuples of the raw values, in column order.
+        :return:
+        """
         table = force_unicode(table)
-        headings = self.direct_get_column_headings(table)
 
         # checks that you're requesting data from an existing table
         if not self.validate_existing_table_name(table):
-            err_str = "table name passed into direct_get_all_rows failed validation.\n"
+            err_str = "table name passed into direct_stream_rows failed validation.\n"
             err_str = default_log.log_variables(err_str, "ERROR", ("table", table))
             raise InputIntegrityError(err_str)
 
+        headings = self.direct_get_column_headings(table)
+        if columns is None:
+            columns = tuple(headings)
+        else:
+            columns = tuple(columns)
+            unknown_columns = [col for col in columns if col not in headings]
+            if unknown_columns:
+                err_str = "table and columns are not consistent.\n"
+                err_str = default_log.log_variables(
+                    err_str, "ERROR", ("table", table), ("unknown_columns", unknown_columns)
+                )
+                raise InputIntegrityError(err_str)
+
         # Check that the sort_column is in the requested table
         if sort_column not in headings and sort_column is not None:
             err_str = "table and sort_column are not consistent.\n"
             err_str = default_log.log_variables(err_str, "ERROR", ("table", table), ("sort_column", sort_column))
             raise InputIntegrityError(err_str)
 
-        if sort_column is None:
-            stmt = "SELECT * FROM {};".format(table)
-        else:
-            if not reverse:
-                stmt = "SELECT * FROM {} ORDER BY {} ASC;".format(table, sort_column)
-            else:
-                stmt = "SELECT * FROM {} ORDER BY {} DESC".format(table, sort_column)
-
-        results = []
-        for row in c.execute(stmt):
-            this_row = dict()
-            for i in range(len(headings)):
-                if not isinstance(row[i], set):
-                    this_row[headings[i]] = force_unicode(row[i])
-                else:
-                    this_row[headings[i]] = row[i]
-            results.append(this_row)
+        fetch_size = fetch_size if fetch_size is not None else self.stream_fetch_size
+        header = RowHeader(columns, convert=_row_dict_value) if records else None
+
+        # Without WAL a cursor held open on the reader would block the writer - page through the table by id instead,
+        # letting go of the connection between pages
+        if sort_column is None and not self.performance_profile.is_wal:
+            return stream_keyset(
+                self.get_connection,
+                table,
+                self._get_id_column(table),
+                columns,
+                fetch_size=fetch_size,
+                header=header,
+            )
 
-        conn.close()
-        return results
+        stmt = "SELECT {} FROM {}".format(", ".join(columns), table)
+        if sort_column is not None:
+            stmt += " ORDER BY {} {}".format(sort_column, "DESC" if reverse else "ASC")
+        return stream_cursor(self.get_connection(), stmt, fetch_size=fetch_size, header=header)
 
     def direct_get_row_dict_iterator(self, table, sort_column=None, reverse=False):
         """
         Provides an iterator which returns all the rows in a specified table in the form of row_dicts. Ordered by id
+        (unless a sort_column is given).
         :param table: Get an iterator for all the rows in this table.
         :param sort_column: The column the table should be sorted by
         :param reverse: Should the order of the rows be reversed?
         :return:
         """
-        table = force_unicode(table)
-        table_id_column = self._get_id_column(table)
-        headings = self.direct_get_column_headings(table)
-
-        # checks that you're requesting data from an existing table
-        if not self.validate_existing_table_name(table):
-            err_str = "table name passed into direct_get_all_rows failed validation."
-            err_str = default_log.log_variables(err_str, "ERROR", ("table", table))
-            raise InputIntegrityError(err_str)
-
-        # Check that the sort_column comes from the table
-        if sort_column is not None:
-            if sort_column not in headings:
-                err_str = "requested sort_column is not in the requested table.\n"
-                err_str = default_log.log_variables(err_str, "ERROR", ("table", table), ("sort_column", sort_column))
-                raise InputIntegrityError(err_str)
-
-        start_id_value = 0
-        if sort_column is None:
-
-            # reads data from the database in 10 row chunks - then closing the connection. Should leave the database
-            # unlocked for most of the time
-            while True:
-
-                conn = self.get_connection()
-                c = conn.cursor()
-                this_stmt = "SELECT * FROM {} WHERE {} > {} ORDER BY {} LIMIT 10;".format(
-                    table, table_id_column, start_id_value, table_id_column
-                )
-                c.execute(this_stmt)
-                current_rows = deepcopy(c.fetchall())
-                conn.close()
-
-                if not current_rows:
-                    conn.close()
-                    break
-                for row in current_rows:
-                    this_row = dict()
-                    for i in range(len(headings)):
-                        if not isinstance(row[i], set):
-                            this_row[headings[i]] = force_unicode(row[i])
-                        else:
-                            this_row[headings[i]] = row[i]
-                    yield this_row
-                    start_id_value = this_row[table_id_column]
-
-        else:
-
-            # Sort the table by the sort_column and then by the id? Don't have a good solution for this yet (due to
-            # concern that the sort order will change while the update is running
-            # Do something with timestamps
-            raise NotImplementedError("Cannot currently cope with this combination")
+        return (row.as_dict() for row in self.direct_stream_rows(table, sort_column=sort_column, reverse=reverse))
 
     def direct_get_unique_values_set(self, target_column):
         """
@@ -1751,9 +1935,8 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
             stmt = "UPDATE {} SET {}=? WHERE {}=?".format(target_table, field, table_id_col)
 
             # Executing the statement and the sequence together
-            conn = self.get_connection()
-            conn.executemany(stmt, sequence)
-            conn.commit()
+            with self._write_connection() as conn:
+                conn.executemany(stmt, sequence)
 
         elif mode == "many":
 
@@ -1819,58 +2002,51 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
 
         stmt = "UPDATE {} SET {} WHERE {} = ?".format(target_table, column_list, row_id)
 
-        conn = self.get_connection()
-        c = conn.cursor()
+        with self._write_connection() as conn:
+            c = conn.cursor()
 
-        # info_str = "Command about to be executed on the database.\n"
-        # info_str += "stmt: " + stmt + "\n"
-        # info_str += "values: " + unicode(values) + "\n"
-        # info_str += "target_row_id: " + unicode(target_row_id) + "\n"
-        # info_str += "row_dict: " + unicode(row_dict) + "\n"
-        # default_log.info(info_str)
+            # info_str = "Command about to be executed on the database.\n"
+            # info_str += "stmt: " + stmt + "\n"
+            # info_str += "values: " + unicode(values) + "\n"
+            # info_str += "target_row_id: " + unicode(target_row_id) + "\n"
+            # info_str += "row_dict: " + unicode(row_dict) + "\n"
+            # default_log.info(info_str)
 
-        try:
-            c.execute(stmt, values)
-            conn.commit()
-            conn.close()
-        except sqlite3.InterfaceError as e:
-            err_str = "Unable to update - InterfaceError.\n"
-            err_str = default_log.log_exception(
-                err_str,
-                e,
-                "ERROR",
-                ("stmt", stmt),
-                ("values", values),
-                ("row_dict", row_dict),
-            )
-            conn.close()
-            raise DatabaseDriverError(err_str)
-        except sqlite3.OperationalError as e:
-            err_str = "Unable to update - OperationalError.\n"
-            err_str = default_log.log_exception(
-                err_str,
-                e,
-                "ERROR",
-                ("stmt", stmt),
-                ("values", values),
-                ("row_dict", row_dict),
-            )
-            conn.close()
-            raise DatabaseDriverError(err_str)
-        except sqlite3.IntegrityError as e:
-            conn.commit()
-            conn.close()
-            err_str = "Unable to update - IntegrityError.\n"
-            err_str = default_log.log_exception(
-                err_str,
-                e,
-                "ERROR",
-                ("stmt", stmt),
-                ("values", values),
-                ("row_dict", row_dict),
-            )
-            conn.close()
-            raise DatabaseIntegrityError(err_str)
+            try:
+                c.execute(stmt, values)
+            except sqlite3.InterfaceError as e:
+                err_str = "Unable to update - InterfaceError.\n"
+                err_str = default_log.log_exception(
+                    err_str,
+                    e,
+                    "ERROR",
+                    ("stmt", stmt),
+                    ("values", values),
+                    ("row_dict", row_dict),
+                )
+                raise DatabaseDriverError(err_str)
+            except sqlite3.OperationalError as e:
+                err_str = "Unable to update - OperationalError.\n"
+                err_str = default_log.log_exception(
+                    err_str,
+                    e,
+                    "ERROR",
+                    ("stmt", stmt),
+                    ("values", values),
+                    ("row_dict", row_dict),
+                )
+                raise DatabaseDriverError(err_str)
+            except sqlite3.IntegrityError as e:
+                err_str = "Unable to update - IntegrityError.\n"
+                err_str = default_log.log_exception(
+                    err_str,
+                    e,
+                    "ERROR",
+                    ("stmt", stmt),
+                    ("values", values),
+                    ("row_dict", row_dict),
+                )
+                raise DatabaseIntegrityError(err_str)
 
     # A copy of a function a level up, at database level - implemented here as well to make recursion loops less likely
     def __identify_table_from_row(self, row_dict):
@@ -2185,13 +2361,9 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         :return:
         """
 
-        conn = self.get_connection()
-        c = conn.cursor()
-
         stmt = "DELETE FROM new_books WHERE new_book_group_id = ?"
-        c.execute(stmt, group_id)
-        conn.commit()
-        conn.close()
+        with self._write_connection() as conn:
+            conn.execute(stmt, group_id)
 
     def direct_get_row_count(self, table):
         """
@@ -2250,16 +2422,14 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         else:
             new_force_value = force_value
 
-        conn = self.get_connection()
         test_val = self.direct_get_db_unique_id()
         if test_val is not None:
 
             stmt = (
                 "UPDATE `database_metadata` SET `database_metadata_unique_id` = ? " "WHERE `database_metadata_id` = 1"
             )
-            conn.execute(stmt, (new_force_value,))
-            conn.commit()
-            conn.close()
+            with self._write_connection() as conn:
+                conn.execute(stmt, (new_force_value,))
             actual_value = self.direct_get_db_unique_id()
             if actual_value != new_force_value:
                 err_str = "Attempt to change database_metadata_unique_id failed.\n"
@@ -2271,9 +2441,8 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         else:
 
             stmt = "INSERT into `database_metadata` (`database_metadata_unique_id`) VALUES (?)"
-            conn.execute(stmt, (new_force_value,))
-            conn.commit()
-            conn.close()
+            with self._write_connection() as conn:
+                conn.execute(stmt, (new_force_value,))
             actual_value = self.direct_get_db_unique_id()
             if actual_value != new_force_value:
                 err_str = "Attempt to change database_metadata_unique_id failed.\n"
@@ -2344,41 +2513,25 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
 
         final_stmt = stmt + " AND ".join(final_search_terms)
 
-        conn = self.get_connection()
-        c = conn.cursor()
         headings = self.direct_get_column_headings(target_table)
         if not iterator_return:
-            all_results = []
-            for row in c.execute(final_stmt):
-                this_row = dict()
-                for i in range(len(headings)):
-                    this_row[headings[i]] = force_unicode(row[i])
-                all_results.append(this_row)
-                conn.close()
-            return all_results
+            return list(self.iterator_return(final_stmt, headings))
         else:
             return self.iterator_return(final_stmt, headings)
 
-    def iterator_return(self, stmt, headings):
+    def iterator_return(self, stmt, headings, fetch_size=None):
         """
-        Python version <3.3 does not allow 'return' with argument inside generators. Thus hiving it off to a separate
-        method.
+        Stream the results of a statement as row_dicts - from a cursor dedicated to the stream.
+        The connection is released when the iterator is exhausted (or closed).
         :param stmt: stmt to be executed on the table.
         :param headings: Headings for the results of the statement
+        :param fetch_size: Rows to read at a time - defaults to the stream_fetch_size preference
         :return:
         """
-        conn = self.get_connection()
-        c = conn.cursor()
-        for row in c.execute(stmt):
-            this_row = dict()
-            for i in range(len(headings)):
-                this_row[headings[i]] = force_unicode(row[i])
-                yield this_row
-            else:
-                # Finally, when the generator is exhausted, terminating the connection properly
-                # Todo: Test this happens
-                default_log.info("Connection has closed!")
-                conn.close()
+        fetch_size = fetch_size if fetch_size is not None else self.stream_fetch_size
+        header = RowHeader(headings, convert=force_unicode)
+        rows = stream_cursor(self.get_connection(), stmt, fetch_size=fetch_size, header=header)
+        return (row.as_dict() for row in rows)
 
     # ----------------------------------------------------------------------------------------------------------------------
     #
@@ -2495,7 +2648,6 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         :return:
         """
         target_table = deepcopy(target_table)
-        conn = self.get_connection()
         target_table_id_column = self._get_id_column(target_table)
         target_table_full_column = self.get_full_column_name(target_table)
         if target_table_full_column is None:
@@ -2518,8 +2670,8 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
             )
 
             try:
-                conn.execute(final_stmt, (agg_value, row_id))
-                conn.commit()
+                with self._write_connection() as conn:
+                    conn.execute(final_stmt, (agg_value, row_id))
             except sqlite3.OperationalError as e:
                 err_str = "Unable to complete operation.\n"
                 err_str = default_log.log_exception(err_str, e, "ERROR", ("final_stmt", final_stmt), ("row", row))
@@ -2570,11 +2722,11 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         else:
             return None
 
-    # Todo: This is absolutely, hideously, heinously inefficient
     def direct_set_tree_ids(self, table):
         """
         Every tree in a tree like structure should have a unique id assigned to every row in that tree.
         This function ensures that.
+        The root of every row is found with a single recursive query - and the tree ids written in one transaction.
         :param table:
         :return:
         """
@@ -2584,24 +2736,26 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         if table_tree_id_column is None:
             err_str = "Cannot set_tree_ids - there doesn't seem to be a tree id for this table - {}".format(table)
             raise InputIntegrityError(err_str)
+        table_parent_column = self._get_tree_parent_column(table)
         table_display_column = self.get_display_column(table)
+
         conn = self.get_connection()
+        try:
+            roots = conn.execute(
+                roots_stmt(table, table_id_column, table_parent_column, (table_display_column,)), (TREE_DEPTH_LIMIT,)
+            ).fetchall()
+        finally:
+            conn.close()
 
         stmt = "UPDATE {} SET {} = ? WHERE {} = ?".format(table, table_tree_id_column, table_id_column)
-        final_stmt = stmt
-
-        for row in self.direct_get_row_dict_iterator(table):
-
-            row_id = row[table_id_column]
-
-            root_series = self.get_root_series(row)
-            root_phash = "{}_{}".format(root_series[table_id_column], root_series[table_display_column])
-            conn.execute(final_stmt, (root_phash, row_id))
-            conn.commit()
-
-        else:
+        tree_ids = (
+            ("{}_{}".format(force_unicode(root_id), force_unicode(root_display)), row_id)
+            for row_id, root_id, root_display in roots
+        )
+        with self.write_transaction() as conn:
+            conn.executemany(stmt, tree_ids)
 
-            return True
+        return True
 
     def get_tree_id_column(self, target_table):
         """
@@ -2649,35 +2803,83 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
 
     def get_all_tree_rows(self, start_row):
         """
-        Starts from a series. Walks up the series tree, and then walks back down, collecting all references in one set.
-        This is going to take a number of database operations.
+        Starts from a series. Finds the root of its tree, and then returns every row in the tree - in one list, root
+        first and then breadth first down the tree.
         :param start_row:
         :return:
         """
         row_table = self.__identify_table_from_row(start_row)
-        row_parent_column = self.__get_parent_column_name(row_table)
         root_series = self.get_root_series(start_row)
+        return self.direct_get_subtree_row_dicts(row_table, root_series[self._get_id_column(row_table)])
+
+    def direct_get_ancestor_row_dicts(self, table, row_id, columns=None):
+        """
+        Returns the ancestor chain of a row, read with a single recursive query.
+        .......... -> grandparent_series -> parent_series -> series
+        :param table: A table with a tree structure (a "_parent" column)
+        :param row_id: The chain ends with this row
+        :param columns: Only read these columns - defaults to all of them
+        :return: List of row_dicts - root first. Empty if there is no row with the given id.
+        """
+        return self._get_tree_row_dicts(ancestors_stmt, table, row_id, columns)
 
-        row_pool = [root_series]
+    def direct_get_subtree_row_dicts(self, table, row_id, columns=None):
+        """
+        Returns the subtree rooted at a row - the row itself and every row beneath it - read with a single recursive
+        query.
+        :param table: A table with a tree structure (a "_parent" column)
+        :param row_id: The row at the top of the subtree
+        :param columns: Only read these columns - defaults to all of them
+        :return: List of row_dicts - the row first, then breadth first down the tree. Empty if there is no row with the
+                 given id.
+        """
+        return self._get_tree_row_dicts(subtree_stmt, table, row_id, columns)
 
-        found_series = []
+    def _get_tree_row_dicts(self, stmt_factory, table, row_id, columns):
+        """
+        Run one of the tree_queries statements - returning the rows as row_dicts.
+        :param stmt_factory:
+        :param table:
+        :param row_id:
+        :param columns:
+        :return:
+        """
+        table = force_unicode(table)
+        parent_column = self._get_tree_parent_column(table)
 
-        # the series pool contains the series which we're currently working with as with walk down the series tree
-        # series in the series pool haven't had all their children series found yet
-        # once a series has had all it's children series found it's transferred to found series
-        while len(row_pool) != 0:
+        headings = self.direct_get_column_headings(table)
+        columns = tuple(headings) if columns is None else tuple(columns)
+        unknown_columns = [col for col in columns if col not in headings]
+        if unknown_columns:
+            err_str = "table and columns are not consistent.\n"
+            err_str = default_log.log_variables(err_str, "ERROR", ("table", table), ("unknown_columns", unknown_columns))
+            raise InputIntegrityError(err_str)
 
-            current_series = row_pool.pop()
-            current_id = current_series["series_id"]
-            # finds all the series which refer to the current_series in the series_parent column
-            child_rows = self.direct_search_table(table=row_table, column=row_parent_column, search_term=current_id)
-            for row in child_rows:
-                if row not in row_pool:
-                    row_pool.append(row)
-            if current_series not in found_series:
-                found_series.append(current_series)
+        stmt = stmt_factory(table, self._get_id_column(table), parent_column, columns)
+        header = RowHeader(columns, convert=_row_dict_value)
+        return [
+            row.as_dict()
+            for row in stream_cursor(
+                self.get_connection(),
+                stmt,
+                (row_id, TREE_DEPTH_LIMIT),
+                fetch_size=self.stream_fetch_size,
+                header=header,
+            )
+        ]
 
-        return found_series
+    def _get_tree_parent_column(self, table):
+        """
+        The parent column of a table with a tree structure - raising InputIntegrityError if the table doesn't have one.
+        :param table:
+        :return:
+        """
+        parent_column = self.__get_parent_column_name(table)
+        if not parent_column:
+            err_str = "Given table does not have a tree structure"
+            err_str = default_log.log_variables(err_str, "ERROR", ("table", table))
+            raise InputIntegrityError(err_str)
+        return parent_column
 
     # ----------------------------------------------------------------------------------------------------------------------
     #
@@ -2736,17 +2938,10 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
         Takes a list of triggers by name - drops all of them from the DatabasePing.
         :return:
         """
-        conn = self.get_connection()
         stmt = "DROP TRIGGER {};"
-        try:
-            for trigger in triggers:
-                current_stmt = stmt.format(trigger)
-                conn.execute(current_stmt)
-                conn.commit()
-            conn.close()
-        except sqlite3.OperationalError:
-            conn.close()
-            raise
+        for trigger in triggers:
+            with self._write_connection() as conn:
+                conn.execute(stmt.format(trigger))
         return True
 
     # ----------------------------------------------------------------------------------------------------------------------
@@ -2902,57 +3097,25 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
 
     def __get_linear_row_index(self, start_row):
         """
-        Takes a starting row. Iterates up the tree building an index of all the rows_dicts as it goes.
+        Takes a starting row. Reads the chain of rows above it from the tree in one query.
         :param start_row: A Row that the method will iterate back from
         :return tree_row_index: An index of all the Rows in the tree forwards e.g.
         .......... -> grandparent_series -> parent_series -> series
         """
-        start_row_dict = start_row
-        row_table = self.__identify_table_from_row(start_row_dict)
+        row_table = self.__identify_table_from_row(start_row)
         row_parent_column = self.__get_parent_column_name(row_table)
-        linear_index = []
-        current_row = start_row_dict
-        try:
-            current_parent = start_row_dict[row_parent_column]
-            if current_parent is None:
-                linear_index.append(start_row)
-                return linear_index
-
-            elif isinstance(current_parent, int):
-                pass
-
-            elif force_unicode(current_parent).upper() == "NONE":
-                linear_index.append(start_row)
-                return linear_index
+        if not row_parent_column:
+            return [start_row]
 
+        try:
+            current_parent = start_row[row_parent_column]
         except KeyError:
-            linear_index.append(start_row)
-            return linear_index
-
-        while force_unicode(six_unicode(current_parent)).upper() != "NONE":
-            # extracting the current parent id
-            try:
-                current_parent = current_row[row_parent_column]
-                if current_parent == "NONE":
-                    linear_index = [current_row] + linear_index
-                    return linear_index
-            except KeyError:
-                linear_index = [current_row] + linear_index
-                return linear_index
+            return [start_row]
+        if current_parent is None or force_unicode(current_parent).upper() == "NONE":
+            return [start_row]
 
-            linear_index = [current_row] + linear_index
-            if current_parent != "None" and current_parent is not None:
-                current_row = self.direct_get_row_dict_from_id(table=row_table, row_id=current_parent)
-            else:
-                return linear_index
-
-        # If the program ever reaches this point something has gone badly wrong
-        if VERBOSE_DEBUG:
-            err_str = "get_linear_row_string has failed.\n"
-            err_str += "start_row: " + repr(start_row_dict) + "\n"
-            raise DatabaseIntegrityError(err_str)
-        else:
-            raise DatabaseIntegrityError
+        # The start_row itself is kept as it was passed in - it may hold values which have not been written out yet
+        return self.direct_get_ancestor_row_dicts(row_table, current_parent) + [start_row]
 
     # We assume that the row has an element ending with "_parent". This (it is hoped) is a pointer backwards up the tree
     # to the row above it.
@@ -3076,23 +3239,20 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
     def direct_execute(self, sql, values=None):
         """
         Execute SQL directly on the database.
+        Queries run on the reader connection for this thread - anything else on the writer, in its own transaction (or
+        in the write_transaction this thread is already in).
         :param sql: SQL code to execute on the database
         :param values: The values to execute with the code.
         """
         if isinstance(values, int):
             values = (force_unicode(values),)
+        args = (sql,) if values is None else (sql, values)
 
-        conn = self.get_connection()
         try:
-            with conn as c:
-                if values is not None:
-                    query_results = c.execute(sql, values)
-                    c.commit()
-                    return query_results
-                else:
-                    query_results = c.execute(sql)
-                    c.commit()
-                    return query_results
+            if sql.lstrip().upper().startswith(READ_STATEMENT_PREFIXES):
+                return self.get_connection().execute(*args)
+            with self._write_connection() as conn:
+                return conn.execute(*args)
         except sqlite3.OperationalError as e:
             err_str = "Attempting to execute that SQL caused an operational error."
             err_str = default_log.log_exception(err_str, e, "ERROR", ("sql", sql), ("values", values))
@@ -3106,8 +3266,6 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
             err_str = default_log.log_exception(err_str, e, "ERROR", ("sql", sql), ("values", values))
             raise DatabaseDriverError(err_str)
         finally:
-            conn.commit()
-            self.conn.commit()
             self.refresh()
 
     def execute_sql(self, sql, values=None):
@@ -3143,9 +3301,8 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
             values = tuple(new_values)
 
         # Todo: Theoretically possibly to fool the database into doing manifestly stupid shit here by feeding in the
-        conn = self.get_connection()
         try:
-            with conn as c:
+            with self._write_connection() as c:
                 if values is not None:
                     try:
                         c.executemany(sql, values)
@@ -3163,24 +3320,113 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
             err_str = default_log.log_exception(err_str, e, "ERROR", ("sql", sql), ("values", values))
             raise DatabaseDriverError(err_str)
 
-        conn.commit()
+    @contextmanager
+    def write_transaction(self):
+        """
+        Check out the writer connection and hold a single transaction open on it for the duration of the with block.
+        e.g.
+            with driver.write_transaction() as conn:
+                conn.executemany(stmt_1, values_1)
+                conn.executemany(stmt_2, values_2)
+        Commits if the block completes - rolls back if it raises - so either all the statements are applied or none are.
+        Transactions nest - if the writer is already in a transaction (on this thread) the outermost block commits. Nested
+        blocks run in a savepoint - so a nested block which raises is rolled back on its own, and the enclosing
+        transaction can carry on.
+        :return:
+        """
+        conn = self.get_connection(write=True)
+        outermost = not conn.in_transaction
+        try:
+            if outermost:
+                # IMMEDIATE - take the write lock now, rather than on the first write
+                conn.execute("BEGIN IMMEDIATE")
+            else:
+                conn.execute("SAVEPOINT {};".format(WRITE_SAVEPOINT))
+            yield conn
+            if outermost:
+                conn.commit()
+                self._flush_ta_updates(conn)
+            else:
+                conn.execute("RELEASE {};".format(WRITE_SAVEPOINT))
+        except sqlite3.IntegrityError as e:
+            self._rollback_write(conn, outermost)
+            err_str = "sqlite3.IntegrityError during write transaction - transaction rolled back."
+            err_str = default_log.log_exception(err_str, e, "ERROR", ("database_path", self.database_path))
+            raise DatabaseIntegrityError(err_str)
+        except sqlite3.Error as e:
+            self._rollback_write(conn, outermost)
+            err_str = "sqlite3.Error during write transaction - transaction rolled back."
+            err_str = default_log.log_exception(err_str, e, "ERROR", ("database_path", self.database_path))
+            raise DatabaseDriverError(err_str)
+        except Exception:
+            self._rollback_write(conn, outermost)
+            raise
+        finally:
+            conn.close()
+
+    def _rollback_write(self, conn, outermost):
+        """
+        Roll back a write_transaction block - the whole transaction if it's the outermost block, otherwise just its
+        savepoint.
+        :param conn:
+        :param outermost:
+        :return:
+        """
+        if outermost:
+            conn.rollback()
+        else:
+            conn.execute("ROLLBACK TO {};".format(WRITE_SAVEPOINT))
+            conn.execute("RELEASE {};".format(WRITE_SAVEPOINT))
+
+    @contextmanager
+    def _write_connection(self):
+        """
+        Check out the writer connection for one of the direct_* write methods - which do their own error handling.
+        Commits if the block completes and rolls back if it raises - before the writer is released, so a failed write
+        never leaves a transaction open on the (long-lived) writer.
+        If this thread is already inside write_transaction, that transaction is left for it to commit or roll back.
+        :return:
+        """
+        conn = self.get_connection(write=True)
+        outermost = not conn.in_transaction
+        try:
+            yield conn
+        except BaseException:
+            if outermost:
+                conn.rollback()
+            raise
+        else:
+            if outermost:
+                conn.commit()
+                self._flush_ta_updates(conn)
+        finally:
+            conn.close()
+
+    def direct_execute_batch(self, statements):
+        """
+        Run a series of executemany statements in a single transaction on the writer connection.
+        Unlike direct_executemany, the values are not transformed - they must be an iterable of tuples.
+        :param statements: Iterable of (sql, values) tuples - run in the order given
+        :return:
+        """
+        with self.write_transaction() as conn:
+            for sql, values in statements:
+                conn.executemany(sql, values)
 
     def direct_executescript(self, sqlscript):
         """
-        Execute a script on the database
+        Execute a script on the database - on the writer connection.
+        Like sqlite3's executescript, commits any transaction already open on the writer before the script is run.
         :param sqlscript: A series of statements to execute. Seperated by ;
         """
-        conn = self.get_connection()
         try:
-            with conn as c:
-                c.executescript(sqlscript)
-                c.commit()
+            with self._write_connection() as conn:
+                conn.executescript(sqlscript)
         except Exception as e:
             err_str = "Executing a script has failed"
             err_str = default_log.log_exception(err_str, e, "ERROR", ("sql_script", sqlscript))
             raise DatabaseDriverError(err_str)
         finally:
-            conn.commit()
             self.refresh()
 
     # ----------------------------------------------------------------------------------------------------------------------
@@ -3201,6 +3447,40 @@ class DatabaseDriver(SQLiteCustomColumnsDriverMixin, SQLiteTableLinkingMixin):
 # HELPER FUNCTIONS WHICH DO NOT NEED THE DATABASE TO WORK START HERE
 # ----------------------------------------------------------------------------------------------------------------------
 
+_SQLITE_TYPES_REGISTERED = False
+
+
+def register_sqlite_types():
+    """
+    Register the adapters and converters the database needs with the sqlite3 module.
+    These are global to the module - so only have to be done once per process.
+    :return:
+    """
+    global _SQLITE_TYPES_REGISTERED
+    if _SQLITE_TYPES_REGISTERED:
+        return
+
+    # Registering converter and adaptor to deal with columns containing sets
+    sqlite3.register_adapter(set, py_set_adapter)
+    sqlite3.register_converter("PYSET", py_set_converter)
+
+    # Registering converter and adaptor to deal with columns containing lists
+    sqlite3.register_adapter(list, py_list_adapter)
+    sqlite3.register_converter("PYLIST", py_list_converter)
+
+    # Registering converter and adapter to deal with columns containing dictionaries
+    sqlite3.register_adapter(dict, py_dict_adapter)
+    sqlite3.register_converter("PYDICT", py_dict_converter)
+
+    # The built in date adaptor chokes when passed a u'None' - replacing it with home brew until can properly
+    # sanitize database inputs
+    sqlite3.register_converter("DATE", py_date_converter)
+    # Enable callbacks in case of error within added functions
+    sqlite3.enable_callback_tracebacks(True)
+
+    _SQLITE_TYPES_REGISTERED = True
+
+
 # Helper functions which allow direct use of sets a column of a table
 
 
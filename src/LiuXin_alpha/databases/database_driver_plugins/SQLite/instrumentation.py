@@ -0,0 +1,237 @@
+"""
+Instrumentation for statements run through the SQLite DatabaseDriver.
+
+Off by default - installing a progress handler at all costs a Python callback every N SQLite VM instructions.
+When enabled, every statement run on an instrumented connection is recorded against its normalized SQL text (literals
+replaced by ?, whitespace collapsed) in a process wide registry -
+ - executions - number of times the statement was run
+ - vm_ops - VM instructions executed (sampled - so accurate to within sample_interval per execution)
+ - wall_time - time spent in execute and in fetching rows
+ - rows - number of rows returned
+So slow statements can be found with
+    print(statement_stats.format_report())
+"""
+
+from __future__ import print_function
+
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?![\w.])")
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """
+    Reduce an SQL statement to a form which groups together statements which only differ by their values.
+    :param sql:
+    :return:
+    """
+    sql = _STRING_LITERAL_RE.sub("?", sql)
+    sql = _NUMBER_LITERAL_RE.sub("?", sql)
+    sql = _PLACEHOLDER_LIST_RE.sub("(?, ...)", sql)
+    sql = _WHITESPACE_RE.sub(" ", sql)
+    return sql.strip().rstrip(";").strip()
+
+
+class StatementStats(object):
+    """
+    Counters for a single normalized statement.
+    """
+
+    __slots__ = ("sql", "executions", "vm_ops", "wall_time", "rows")
+
+    def __init__(self, sql):
+        self.sql = sql
+        self.executions = 0
+        self.vm_ops = 0
+        self.wall_time = 0.0
+        self.rows = 0
+
+    def as_dict(self):
+        return {
+            "sql": self.sql,
+            "executions": self.executions,
+            "vm_ops": self.vm_ops,
+            "wall_time": self.wall_time,
+            "mean_wall_time": (self.wall_time / self.executions) if self.executions else 0.0,
+            "rows": self.rows,
+        }
+
+
+class StatementStatsRegistry(object):
+    """
+    Collects StatementStats - keyed off the normalized SQL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = dict()
+
+    def statement(self, sql):
+        """
+        Record that the given statement has started executing - returns the StatementStats to record its costs against.
+        :param sql:
+        :return:
+        """
+        key = normalize_sql(sql)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = StatementStats(key)
+            stats.executions += 1
+        return stats
+
+    def add(self, stats, vm_ops=0, wall_time=0.0, rows=0):
+        with self._lock:
+            stats.vm_ops += vm_ops
+            stats.wall_time += wall_time
+            stats.rows += rows
+
+    def reset(self):
+        with self._lock:
+            self._stats = dict()
+
+    def dump(self, sort_by="wall_time"):
+        """
+        Return a list of dictionaries - one per normalized statement - most expensive first.
+        :param sort_by: The counter to sort on
+        :return:
+        """
+        with self._lock:
+            entries = [stats.as_dict() for stats in self._stats.values()]
+        return sorted(entries, key=lambda entry: entry[sort_by], reverse=True)
+
+    def format_report(self, limit=20, sort_by="wall_time"):
+        """
+        Return a human readable table of the most expensive statements.
+        :param limit:
+        :param sort_by:
+        :return:
+        """
+        lines = ["{:>10} {:>12} {:>14} {:>10}  {}".format("executions", "wall_time", "vm_ops", "rows", "sql")]
+        for entry in self.dump(sort_by=sort_by)[:limit]:
+            lines.append(
+                "{executions:>10} {wall_time:>12.4f} {vm_ops:>14} {rows:>10}  {sql}".format(**entry)
+            )
+        return "\n".join(lines)
+
+
+# Process wide registry - all instrumented connections report here
+statement_stats = StatementStatsRegistry()
+
+
+class ConnectionInstrument(object):
+    """
+    Per-connection instrumentation state - tracks which statement is currently running on the connection, so the VM
+    instructions counted by the progress handler can be charged to it.
+    """
+
+    def __init__(self, sample_interval=1000, registry=None):
+        self.sample_interval = sample_interval
+        self.registry = registry if registry is not None else statement_stats
+        self.current = None
+
+    def progress_handler(self):
+        current = self.current
+        if current is not None:
+            self.registry.add(current, vm_ops=self.sample_interval)
+        # Returning anything other than 0 would abort the statement
+        return 0
+
+    def install(self, conn):
+        conn.instrument = self
+        conn.set_progress_handler(self.progress_handler, self.sample_interval)
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Cursor which records the cost of every statement run through it.
+    """
+
+    _lx_stats = None
+
+    def _timed(self, method, *args):
+        instrument = self.connection.instrument
+        instrument.current = self._lx_stats
+        start = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            instrument.registry.add(self._lx_stats, wall_time=time.perf_counter() - start)
+            instrument.current = None
+
+    def execute(self, sql, parameters=()):
+        self._lx_stats = self.connection.instrument.registry.statement(sql)
+        return self._timed(sqlite3.Cursor.execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._lx_stats = self.connection.instrument.registry.statement(sql)
+        return self._timed(sqlite3.Cursor.executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        self._lx_stats = self.connection.instrument.registry.statement(sql_script)
+        return self._timed(sqlite3.Cursor.executescript, sql_script)
+
+    def _fetched(self, rows):
+        if self._lx_stats is not None and rows:
+            self.connection.instrument.registry.add(self._lx_stats, rows=rows)
+
+    def __next__(self):
+        if self._lx_stats is None:
+            return sqlite3.Cursor.__next__(self)
+        row = self._timed(sqlite3.Cursor.__next__)
+        self._fetched(1)
+        return row
+
+    # Python 2 style - some of the older code still calls this
+    next = __next__
+
+    def fetchone(self):
+        if self._lx_stats is None:
+            return sqlite3.Cursor.fetchone(self)
+        row = self._timed(sqlite3.Cursor.fetchone)
+        self._fetched(0 if row is None else 1)
+        return row
+
+    def fetchmany(self, *args):
+        if self._lx_stats is None:
+            return sqlite3.Cursor.fetchmany(self, *args)
+        rows = self._timed(sqlite3.Cursor.fetchmany, *args)
+        self._fetched(len(rows))
+        return rows
+
+    def fetchall(self):
+        if self._lx_stats is None:
+            return sqlite3.Cursor.fetchall(self)
+        rows = self._timed(sqlite3.Cursor.fetchall)
+        self._fetched(len(rows))
+        return rows
+
+
+class InstrumentedConnectionMixin(object):
+    """
+    Mixin for sqlite3.Connection subclasses - routes all statements through InstrumentedCursors.
+    Only used when instrumentation is on - so there's no overhead at all when it's off.
+    """
+
+    instrument = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return sqlite3.Connection.cursor(self, factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
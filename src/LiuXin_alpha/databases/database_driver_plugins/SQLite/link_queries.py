@@ -0,0 +1,297 @@
+"""
+Batched reads and writes of link tables - many links made, broken or re-pointed with one executemany per kind of
+change, rather than several statements per link.
+
+Each function runs on a connection it's given - so several of them can share the transaction open on it. The type and
+priority columns of the link table are passed in (None if the table doesn't have one) - the macros work them out from
+the table's headings.
+"""
+
+from __future__ import print_function
+
+
+# The select_in statement always has this many placeholders - short chunks are padded out with NULLs (which match
+# nothing) - so there's only ever one statement to prepare per table
+IN_CHUNK_SIZE = 250
+
+
+def _insert_template(table, *columns):
+    return "INSERT INTO {0}({1}) VALUES ({2});".format(table, ", ".join(columns), ", ".join("?" for _ in columns))
+
+
+def _select_in_template(table, rtn_columns, cond_column):
+    placeholders = ", ".join("?" for _ in range(IN_CHUNK_SIZE))
+    return "SELECT {1} FROM {0} WHERE {2} IN ({3});".format(table, ", ".join(rtn_columns), cond_column, placeholders)
+
+
+# SQL for the generic macros - formatted with the table name followed by the columns
+STATEMENT_TEMPLATES = {
+    "delete": "DELETE FROM {0} WHERE {1} = ?;",
+    "delete_two_conditions": "DELETE FROM {0} WHERE {1} = ? AND {2} = ?;",
+    "delete_three_conditions": "DELETE FROM {0} WHERE {1} = ? AND {2} = ? AND {3} = ?;",
+    "select": "SELECT {1} FROM {0} WHERE {2} = ?;",
+    "select_two_conditions": "SELECT {1} FROM {0} WHERE {2} = ? AND {3} = ?;",
+    "select_in": _select_in_template,
+    "select_max": "SELECT MAX({1}) FROM {0};",
+    "update": "UPDATE {0} SET {1} = ? WHERE {2} = ?;",
+    "update_two_conditions": "UPDATE {0} SET {1} = ? WHERE {2} = ? AND {3} = ?;",
+    "update_two_columns_two_conditions": "UPDATE {0} SET {1} = ?, {2} = ? WHERE {3} = ? AND {4} = ?;",
+    "insert": _insert_template,
+    "insert_max_priority": "INSERT INTO {0}({1}, {2}, {3}) SELECT ?, ?, MAX({3}) FROM {0};",
+    "reprioritize": "UPDATE {0} SET {1} = (SELECT MAX({1}) + 1 FROM {0}) WHERE {2} = ? AND {3} = ?;",
+}
+
+# Statements built so far - keyed off (operation, table, columns)
+_STATEMENT_CACHE = dict()
+
+
+def statement(operation, table, *columns):
+    """
+    Return the SQL for an operation on the given table and columns - built once, so the text is identical every time
+    it's issued (and sqlite3's own prepared statement cache is hit).
+    :param operation: A key of STATEMENT_TEMPLATES
+    :param table:
+    :param columns:
+    :return:
+    """
+    key = (operation, table, columns)
+    try:
+        return _STATEMENT_CACHE[key]
+    except KeyError:
+        pass
+
+    template = STATEMENT_TEMPLATES[operation]
+    if callable(template):
+        stmt = template(table, *columns)
+    else:
+        stmt = template.format(table, *columns)
+    _STATEMENT_CACHE[key] = stmt
+    return stmt
+
+
+def unwrap_id(item_id):
+    """
+    Ids are sometimes passed wrapped in 1-tuples - ready to be used as bindings.
+    :param item_id:
+    :return:
+    """
+    if isinstance(item_id, (tuple, list)):
+        return item_id[0]
+    return item_id
+
+
+def linked_ids_many(conn, link_table, left_id_col, right_id_col, left_ids, type_col=None, type_filter=None):
+    """
+    Return the ids linked to each of the given left ids - reading IN_CHUNK_SIZE left ids per statement.
+    :param conn:
+    :param link_table:
+    :param left_id_col:
+    :param right_id_col:
+    :param left_ids:
+    :param type_col: The type column of the link table - needed if type_filter is given
+    :param type_filter: If it's specified (not None) then only links with the given type will be returned
+    :return: Dictionary keyed with the left ids and valued with sets of the right ids linked to them
+    """
+    linked_ids = dict((left_id, set()) for left_id in left_ids)
+    if not linked_ids:
+        return linked_ids
+
+    rtn_columns = (left_id_col, right_id_col)
+    if type_filter is not None:
+        rtn_columns += (type_col,)
+    stmt = statement("select_in", link_table, rtn_columns, left_id_col)
+
+    left_ids = list(linked_ids)
+    for i in range(0, len(left_ids), IN_CHUNK_SIZE):
+        chunk = left_ids[i : i + IN_CHUNK_SIZE]
+        chunk.extend([None] * (IN_CHUNK_SIZE - len(chunk)))
+        for row in conn.execute(stmt, chunk):
+            if type_filter is None or row[2] == type_filter:
+                linked_ids[row[0]].add(row[1])
+    return linked_ids
+
+
+def break_links_many(conn, link_table, link_col, remove_ids, type_col=None, link_type=None):
+    """
+    Break all the links to each of the given ids.
+    :param conn:
+    :param link_table:
+    :param link_col:
+    :param remove_ids: Iterable of ids (or of 1-tuples of ids)
+    :param type_col: The type column of the link table - needed if link_type is given
+    :param link_type: If provided, only links of this type will be broken
+    :return:
+    """
+    remove_ids = [unwrap_id(remove_id) for remove_id in remove_ids]
+    if link_type is None:
+        conn.executemany(statement("delete", link_table, link_col), [(rid,) for rid in remove_ids])
+    else:
+        stmt = statement("delete_two_conditions", link_table, link_col, type_col)
+        conn.executemany(stmt, [(rid, link_type) for rid in remove_ids])
+
+
+def break_link_pairs_many(conn, link_table, left_link_col, right_link_col, id_pairs, type_col=None, link_type=None):
+    """
+    Break the links between each of the given pairs of entities.
+    :param conn:
+    :param link_table:
+    :param left_link_col:
+    :param right_link_col:
+    :param id_pairs: Iterable of (left_id, right_id) tuples
+    :param type_col: The type column of the link table - needed if link_type is given
+    :param link_type: If provided, only links of this type will be broken - links of other types between the same
+                      entities are left alone
+    :return:
+    """
+    if link_type is None:
+        stmt = statement("delete_two_conditions", link_table, left_link_col, right_link_col)
+        conn.executemany(stmt, [tuple(id_pair) for id_pair in id_pairs])
+    else:
+        stmt = statement("delete_three_conditions", link_table, left_link_col, right_link_col, type_col)
+        conn.executemany(stmt, [tuple(id_pair) + (link_type,) for id_pair in id_pairs])
+
+
+def max_link_priority(conn, link_table, priority_col):
+    """
+    The highest priority currently in a link table - 0 if the table is empty.
+    :param conn:
+    :param link_table:
+    :param priority_col:
+    :return:
+    """
+    max_priority = conn.execute(statement("select_max", link_table, priority_col)).fetchone()[0]
+    return int(max_priority) if max_priority is not None else 0
+
+
+def link_values(left_id, right_id, priority, link_type):
+    """
+    Bindings for a link - in the order insert_links expects them.
+    :return:
+    """
+    values = [left_id, right_id]
+    if priority is not None:
+        values.append(priority)
+    if link_type is not None:
+        values.append(link_type)
+    return tuple(values)
+
+
+def insert_links(
+    conn, link_table, left_link_col, right_link_col, values, type_col=None, priority_col=None, link_type=None
+):
+    """
+    Insert links - values should be built with link_values.
+    :return:
+    """
+    columns = [left_link_col, right_link_col]
+    if priority_col is not None:
+        columns.append(priority_col)
+    if link_type is not None:
+        columns.append(type_col)
+    conn.executemany(statement("insert", link_table, *columns), values)
+
+
+def make_links_many(
+    conn, link_table, left_link_col, right_link_col, id_pairs, type_col=None, priority_col=None, link_type=None
+):
+    """
+    Link each of the given pairs of entities.
+    Pairs are linked in order - if the link table has a priority column each new link gets a priority higher than any
+    already in the table, and higher than the pair before it.
+    :param conn:
+    :param link_table:
+    :param left_link_col:
+    :param right_link_col:
+    :param id_pairs: Iterable of (left_id, right_id) tuples
+    :param type_col:
+    :param priority_col:
+    :param link_type: If provided, all the new links will be of this type
+    :return:
+    """
+    next_priority = max_link_priority(conn, link_table, priority_col) + 1 if priority_col is not None else None
+
+    values = []
+    for left_id, right_id in id_pairs:
+        values.append(link_values(left_id, right_id, next_priority, link_type))
+        if next_priority is not None:
+            next_priority += 1
+
+    insert_links(conn, link_table, left_link_col, right_link_col, values, type_col, priority_col, link_type)
+
+
+def replace_links_many(
+    conn, link_table, left_link_col, right_link_col, links, type_col=None, priority_col=None, link_type=None
+):
+    """
+    Set the entities linked to each of many left ids.
+    For each left id -
+     - right ids which are already linked (with the given type, if provided) are re-prioritized (and re-typed) -
+       preserving any other data on the link
+     - right ids which are not already linked are linked
+     - right ids which were linked (with the given type, if provided), but are no longer present, are unlinked - links
+       of other types are left alone
+    The first right id for each left id ends up with the highest priority - as if reprioritize_link and interlink_rows
+    had been called on the right ids in reverse order.
+    :param conn:
+    :param link_table:
+    :param left_link_col:
+    :param right_link_col:
+    :param links: Dictionary keyed with left ids and valued with ordered iterables of right ids
+    :param type_col:
+    :param priority_col:
+    :param link_type: If provided, all the links will be set to this type
+    :return:
+    """
+    existing_links = linked_ids_many(
+        conn, link_table, left_link_col, right_link_col, links.keys(), type_col=type_col, type_filter=link_type
+    )
+    next_priority = max_link_priority(conn, link_table, priority_col) + 1 if priority_col is not None else 0
+
+    # Priorities are handed out in the order the links would have been made one at a time - so new and existing links
+    # interleave correctly
+    reprioritize_values = []
+    new_values = []
+    excess_pairs = []
+    for left_id, right_ids in links.items():
+        right_ids = list(right_ids)
+        linked_ids = set(existing_links[left_id])
+        for right_id in reversed(right_ids):
+            priority = None
+            if priority_col is not None:
+                priority = next_priority
+                next_priority += 1
+
+            if right_id not in linked_ids:
+                new_values.append(link_values(left_id, right_id, priority, link_type))
+                linked_ids.add(right_id)
+                continue
+
+            update_value = [left_id, right_id]
+            if link_type is not None:
+                update_value.insert(0, link_type)
+            if priority is not None:
+                update_value.insert(0, priority)
+            reprioritize_values.append(tuple(update_value))
+        excess_pairs.extend((left_id, right_id) for right_id in existing_links[left_id] - set(right_ids))
+
+    if reprioritize_values:
+        if priority_col is not None and link_type is not None:
+            stmt = statement(
+                "update_two_columns_two_conditions", link_table, priority_col, type_col, left_link_col, right_link_col
+            )
+        elif priority_col is not None:
+            stmt = statement("update_two_conditions", link_table, priority_col, left_link_col, right_link_col)
+        elif link_type is not None:
+            stmt = statement("update_two_conditions", link_table, type_col, left_link_col, right_link_col)
+        else:
+            stmt = None
+        if stmt is not None:
+            conn.executemany(stmt, reprioritize_values)
+
+    if new_values:
+        insert_links(conn, link_table, left_link_col, right_link_col, new_values, type_col, priority_col, link_type)
+
+    if excess_pairs:
+        break_link_pairs_many(
+            conn, link_table, left_link_col, right_link_col, excess_pairs, type_col=type_col, link_type=link_type
+        )
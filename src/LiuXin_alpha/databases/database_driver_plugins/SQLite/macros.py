@@ -24,6 +24,8 @@ from LiuXin.utils.logger import default_log
 # Todo: This needs to be replaced with a column name factory
 from LiuXin.utils.general_ops.language_tools import plural_singular_mapper
 
+from LiuXin_alpha.databases.database_driver_plugins.SQLite import link_queries
+
 
 class SQLiteDatabaseCustomColumnMacros(object):
     def _get_cc_id_val(self, custom_column):
@@ -1229,6 +1231,39 @@ class SQLiteDatabaseMacros(BaseMacros, SQLiteDatabaseCustomColumnMacros):
         """
         super(SQLiteDatabaseMacros, self).__init__(db=db)
 
+        # Link table name keyed with a tuple of the (type column, priority column) - None if the column doesn't exist
+        self._link_column_cache = dict()
+
+    def _link_columns(self, link_table):
+        """
+        Return the type and priority columns of a link table - None for either if the link table doesn't have one.
+        :param link_table:
+        :return type_col, priority_col:
+        """
+        try:
+            return self._link_column_cache[link_table]
+        except KeyError:
+            pass
+
+        link_base_col = self.db.driver_wrapper.get_column_base(link_table)
+        headings = set(self.db.driver_wrapper.get_column_headings(link_table))
+        type_col = "{0}_type".format(link_base_col)
+        priority_col = "{0}_priority".format(link_base_col)
+        link_cols = (
+            type_col if type_col in headings else None,
+            priority_col if priority_col in headings else None,
+        )
+        self._link_column_cache[link_table] = link_cols
+        return link_cols
+
+    def _link_type_col(self, link_table):
+        """
+        The name of the type column of a link table - whether or not the table has one.
+        :param link_table:
+        :return:
+        """
+        return "{0}_type".format(self.db.driver_wrapper.get_column_base(link_table))
+
     # Todo - These should probably be semi private
     @property
     def get(self):
@@ -1344,21 +1379,33 @@ class SQLiteDatabaseMacros(BaseMacros, SQLiteDatabaseCustomColumnMacros):
         :param link_type: If provided
         :return:
         """
-        if link_type is None:
-            stmt = "DELETE FROM {0} WHERE {1} = ?;".format(link_table, link_col)
-            if isinstance(remove_id, int):
-                self.execute(stmt, (remove_id,))
-            else:
-                self.executemany(stmt, remove_id)
+        if not isinstance(remove_id, int):
+            self.break_generic_links_many(link_table, link_col, remove_id, link_type=link_type)
+        elif link_type is None:
+            self.execute(link_queries.statement("delete", link_table, link_col), (remove_id,))
         else:
-            link_table_col = self.db.driver_wrapper.get_column_base(link_table)
-            link_table_type_col = "{}_type".format(link_table_col)
-            stmt = "DELETE FROM {0} WHERE {1} = ? AND {2} = ?;".format(link_table, link_col, link_table_type_col)
-            if isinstance(remove_id, int):
-                self.execute(stmt, (remove_id, link_type))
-            else:
-                # self.executemany(stmt, remove_id)
-                raise NotImplementedError
+            link_table_type_col = "{}_type".format(self.db.driver_wrapper.get_column_base(link_table))
+            stmt = link_queries.statement("delete_two_conditions", link_table, link_col, link_table_type_col)
+            self.execute(stmt, (remove_id, link_type))
+
+    def break_generic_links_many(self, link_table, link_col, remove_ids, link_type=None, conn=None):
+        """
+        Break all the links to each of the given ids - in a single executemany. See link_queries.break_links_many.
+        :param link_table:
+        :param link_col:
+        :param remove_ids: Iterable of ids (or of 1-tuples of ids)
+        :param link_type: If provided, only links of this type will be broken
+        :param conn: Allows a connection with a transaction already open on it to be provided - if not, the links are
+                     broken in a transaction of their own.
+        :return:
+        """
+        if conn is None:
+            with self.db.driver_wrapper.write_transaction() as conn:
+                return self.break_generic_links_many(link_table, link_col, remove_ids, link_type=link_type, conn=conn)
+
+        link_queries.break_links_many(
+            conn, link_table, link_col, remove_ids, type_col=self._link_type_col(link_table), link_type=link_type
+        )
 
     def break_generic_single_link(self, link_table, left_link_col, right_link_col, left_id, right_id):
         """
@@ -1370,9 +1417,38 @@ class SQLiteDatabaseMacros(BaseMacros, SQLiteDatabaseCustomColumnMacros):
         :param right_id:
         :return:
         """
-        del_stmt = "DELETE FROM {0} WHERE {1} = ? AND {2} = ?;".format(link_table, left_link_col, right_link_col)
+        del_stmt = link_queries.statement("delete_two_conditions", link_table, left_link_col, right_link_col)
         self.execute(del_stmt, (left_id, right_id))
 
+    def break_generic_single_links_many(
+        self, link_table, left_link_col, right_link_col, id_pairs, link_type=None, conn=None
+    ):
+        """
+        Break the links between each of the given pairs of entities - in a single executemany.
+        :param link_table:
+        :param left_link_col:
+        :param right_link_col:
+        :param id_pairs: Iterable of (left_id, right_id) tuples
+        :param link_type: If provided, only links of this type are broken - links of other types between the pairs stay
+        :param conn: Allows a connection with a transaction already open on it to be provided
+        :return:
+        """
+        if conn is None:
+            with self.db.driver_wrapper.write_transaction() as conn:
+                return self.break_generic_single_links_many(
+                    link_table, left_link_col, right_link_col, id_pairs, link_type=link_type, conn=conn
+                )
+
+        link_queries.break_link_pairs_many(
+            conn,
+            link_table,
+            left_link_col,
+            right_link_col,
+            id_pairs,
+            type_col=self._link_type_col(link_table),
+            link_type=link_type,
+        )
+
     #
     # ------------------------------------------------------------------------------------------------------------------
     # ------------------------------------------------------------------------------------------------------------------
@@ -1390,13 +1466,34 @@ class SQLiteDatabaseMacros(BaseMacros, SQLiteDatabaseCustomColumnMacros):
         :param right_id:
         :return:
         """
-        stmt = (
-            "INSERT INTO {0}({1}, {2}, {3}) "
-            "SELECT ?, ?, MAX({3}) "
-            "FROM {0}".format(link_table, left_link_col, right_link_col, priority_col)
-        )
+        stmt = link_queries.statement("insert_max_priority", link_table, left_link_col, right_link_col, priority_col)
         self.execute(stmt, (left_id, right_id))
 
+    def make_generic_links_many(self, link_table, left_link_col, right_link_col, id_pairs, link_type=None, conn=None):
+        """
+        Link each of the given pairs of entities - in a single executemany.
+        Pairs are linked in order - if the link table has a priority column each new link gets a priority higher than any
+        already in the table, and higher than the pair before it. So this is equivalent to calling interlink_rows (with
+        priority="highest") on each pair in turn.
+        :param link_table:
+        :param left_link_col:
+        :param right_link_col:
+        :param id_pairs: Iterable of (left_id, right_id) tuples
+        :param link_type: If provided, all the new links will be of this type
+        :param conn: Allows a connection with a transaction already open on it to be provided
+        :return:
+        """
+        if conn is None:
+            with self.db.driver_wrapper.write_transaction() as conn:
+                return self.make_generic_links_many(
+                    link_table, left_link_col, right_link_col, id_pairs, link_type=link_type, conn=conn
+                )
+
+        type_col, priority_col = self._link_columns(link_table)
+        link_queries.make_links_many(
+            conn, link_table, left_link_col, right_link_col, id_pairs, type_col, priority_col, link_type
+        )
+
     # Todo: The interface for this macro is terrible and you should feel bad. Fix it.
     def make_generic_link_no_priority(
         self,
@@ -1406,6 +1503,7 @@ class SQLiteDatabaseMacros(BaseMacros, SQLiteDatabaseCustomColumnMacros):
         left_id=None,
         right_id=None,
         id_pairs=None,
+        conn=None,
     ):
         """
         Write a generic link without priority or anything else. Just forming the link.
@@ -1414,10 +1512,17 @@ class SQLiteDatabaseMacros(BaseMacros, SQLiteDatabaseCustomColumnMacros):
         :param right_link_col:
         :param left_id:
         :param right_id:
+        :param id_pairs:
+        :param conn: Allows a connection with a transaction already open on it to be provided
         :return:
         """
-        ins_stmt = "INSERT INTO {0}({2}, {1}) VALUES(?, ?)".format(link_table, left_link_col, right_link_col)
-        if id_pairs is None:
+        ins_stmt = link_queries.statement("insert", link_table, right_link_col, left_link_col)
+        if conn is not None:
+            if id_pairs is None:
+                conn.execute(ins_stmt, (left_id, right_id))
+            else:
+                conn.executemany(ins_stmt, id_pairs)
+        elif id_pairs is None:
             self.execute(ins_stmt, (left_id, right_id))
         else:
             self.executemany(ins_stmt, id_pairs)
@@ -1618,8 +1723,8 @@ class SQLiteDatabaseMacros(BaseMacros, SQLiteDatabaseCustomColumnMacros):
         :param table_id_col:
         :return:
         """
-        stmt = "UPDATE {0} SET {1} = ? WHERE {2} = ?;".format(table, column, table_id_col)
-        self.execute(stmt, (item_id, new_value))
+        stmt = link_queries.statement("update", table, column, table_id_col)
+        self.execute(stmt, (new_value, item_id))
 
     def update_column_in_table(self, table, column, table_id_col, item_id, new_value):
         """
@@ -1663,7 +1768,7 @@ class SQLiteDatabaseMacros(BaseMacros, SQLiteDatabaseCustomColumnMacros):
         :return:
         """
         current_values = set()
-        stmt = "SELECT {0} FROM {1} WHERE {2} = ?;".format(rtn_column, table, cond_column)
+        stmt = link_queries.statement("select", table, rtn_column, cond_column)
         try:
             for row in self.execute(stmt, (value,)):
                 current_values.add(row[0])
@@ -1909,7 +2014,7 @@ class SQLiteDatabaseMacros(BaseMacros, SQLiteDatabaseCustomColumnMacros):
                        being the other column to update
         :return:
         """
-        stmt = "UPDATE {0} SET {1} = ? WHERE {1} = ? AND {2} = ?".format(link_table, update_column, other_column)
+        stmt = link_queries.statement("update_two_conditions", link_table, update_column, update_column, other_column)
         self.executemany(stmt, values)
 
     def bulk_add_links(self, link_table, src_col, dst_col, values):
@@ -1922,7 +2027,7 @@ class SQLiteDatabaseMacros(BaseMacros, SQLiteDatabaseCustomColumnMacros):
         :param values:
         :return:
         """
-        stmt = "INSERT INTO {0}({1}, {2}) VALUES (?,?);".format(link_table, src_col, dst_col)
+        stmt = link_queries.statement("insert", link_table, src_col, dst_col)
         try:
             self.executemany(stmt, values)
         except DatabaseDriverError:
@@ -1965,9 +2070,7 @@ class SQLiteDatabaseMacros(BaseMacros, SQLiteDatabaseCustomColumnMacros):
         link_priority_col = "{0}_priority".format(link_base_col)
 
         if new_type is None:
-            stmt = "UPDATE {0} SET {1} = (SELECT MAX({1}) + 1 FROM {0})" " WHERE {2} = ? AND {3} = ?;".format(
-                link_table, link_priority_col, left_link_col, right_link_col
-            )
+            stmt = link_queries.statement("reprioritize", link_table, link_priority_col, left_link_col, right_link_col)
             self.execute(stmt, (left_id, right_id))
         else:
             # First change the priority
@@ -1982,11 +2085,35 @@ class SQLiteDatabaseMacros(BaseMacros, SQLiteDatabaseCustomColumnMacros):
             )
             # Then change the link type
             link_type_col = "{0}_type".format(link_base_col)
-            stmt = "UPDATE {0} SET {3} = ? WHERE {1} = ? AND {2} = ?;".format(
-                link_table, left_link_col, right_link_col, link_type_col
+            stmt = link_queries.statement(
+                "update_two_conditions", link_table, link_type_col, left_link_col, right_link_col
             )
             self.execute(stmt, (new_type, left_id, right_id))
 
+    def replace_generic_links_many(self, link_table, left_link_col, right_link_col, links, link_type=None, conn=None):
+        """
+        Set the entities linked to each of many left ids - in a single transaction, with one executemany per kind of
+        change, rather than several statements per link. See link_queries.replace_links_many.
+        Links of other types than link_type (if it's given) are left alone.
+        :param link_table:
+        :param left_link_col:
+        :param right_link_col:
+        :param links: Dictionary keyed with left ids and valued with ordered iterables of right ids
+        :param link_type: If provided, all the links will be set to this type
+        :param conn: Allows a connection with a transaction already open on it to be provided
+        :return:
+        """
+        if conn is None:
+            with self.db.driver_wrapper.write_transaction() as conn:
+                return self.replace_generic_links_many(
+                    link_table, left_link_col, right_link_col, links, link_type=link_type, conn=conn
+                )
+
+        type_col, priority_col = self._link_columns(link_table)
+        link_queries.replace_links_many(
+            conn, link_table, left_link_col, right_link_col, links, type_col, priority_col, link_type
+        )
+
     # Todo: primary_language table
     # Todo: Tests how this responds when you set the land_id to None - should be fine, but check
     def set_title_primary_language(self, title_id, lang_id):
@@ -2196,15 +2323,40 @@ class SQLiteDatabaseMacros(BaseMacros, SQLiteDatabaseCustomColumnMacros):
         :return:
         """
         if type_filter is None:
-            stmt = "SELECT {0} FROM {1} WHERE {2} = ?;".format(right_id_col, link_table, left_id_col)
+            stmt = link_queries.statement("select", link_table, right_id_col, left_id_col)
             return set(row[0] for row in self.execute(stmt, (left_id,)))
         else:
             link_type_col = "{0}_type".format(self.db.driver_wrapper.get_column_base(link_table))
-            stmt = "SELECT {0} FROM {1} WHERE {2} = ? AND {3} = ?;".format(
-                right_id_col, link_table, left_id_col, link_type_col
-            )
+            stmt = link_queries.statement("select_two_conditions", link_table, right_id_col, left_id_col, link_type_col)
             return set(row[0] for row in self.execute(stmt, (left_id, type_filter)))
 
+    def get_linked_ids_many(self, link_table, left_id_col, right_id_col, left_ids, type_filter=None, conn=None):
+        """
+        Return the ids linked to each of the given left_ids in the specified link table.
+        Reads IN_CHUNK_SIZE left ids per statement - rather than one statement per left id.
+        :param link_table:
+        :param left_id_col:
+        :param right_id_col:
+        :param left_ids:
+        :param type_filter: If it's specified (not None) then only entries with the given type will be returned
+        :param conn: Allows a connection to be provided - e.g. one with a write transaction open on it
+        :return: Dictionary keyed with the left ids and valued with sets of the right ids linked to them
+        """
+        read_conn = conn if conn is not None else self.db.driver_wrapper.get_connection()
+        try:
+            return link_queries.linked_ids_many(
+                read_conn,
+                link_table,
+                left_id_col,
+                right_id_col,
+                left_ids,
+                type_col=self._link_type_col(link_table),
+                type_filter=type_filter,
+            )
+        finally:
+            if conn is None:
+                read_conn.close()
+
     # Todo: Not actually file macros..
     # - FILE MACROS
     def read_creator_with_sort_and_link(self):
@@ -0,0 +1,135 @@
+"""
+Performance profiles for the SQLite DatabaseDriver - sets of PRAGMAs applied to every connection.
+
+"wal" (the default) puts the database in write-ahead-log mode - so readers on other threads (the MaintenanceBot, the
+MetadataBackup thread, the main cache) no longer block the writer, or each other.
+With WAL, synchronous=NORMAL is still safe against corruption (a power cut can lose the last few commits, but not damage
+the database) and saves an fsync on every commit.
+
+"legacy" puts the database back in rollback journal mode (journal_mode=DELETE - SQLite's default) and otherwise leaves
+SQLite at its defaults - for databases on filesystems which don't support the shared memory WAL needs (e.g. some network
+shares). The journal mode has to be set explicitly - it's stored in the database file, so a database which was once
+opened with "wal" would otherwise stay in WAL mode.
+"""
+
+from __future__ import print_function
+
+
+# Values SQLite reports back when queried - so the applied profile can be checked
+_SYNCHRONOUS_VALUES = {"OFF": 0, "NORMAL": 1, "FULL": 2, "EXTRA": 3}
+_TEMP_STORE_VALUES = {"DEFAULT": 0, "FILE": 1, "MEMORY": 2}
+
+
+class PerformanceProfile(object):
+    """
+    A named set of PRAGMAs.
+    Values of None leave the SQLite default in place.
+    """
+
+    def __init__(
+        self,
+        name,
+        journal_mode=None,
+        synchronous=None,
+        temp_store=None,
+        cache_size=None,
+        mmap_size=None,
+        busy_timeout=None,
+        checkpoint_interval=None,
+    ):
+        """
+        :param name:
+        :param journal_mode: e.g. "WAL" - persistent, stored in the database file
+        :param synchronous: "OFF", "NORMAL", "FULL" or "EXTRA"
+        :param temp_store: "DEFAULT", "FILE" or "MEMORY"
+        :param cache_size: Pages if positive, KiB if negative
+        :param mmap_size: Bytes of the database to memory map
+        :param busy_timeout: Milliseconds to wait on a locked database before giving up
+        :param checkpoint_interval: Seconds between passive WAL checkpoints - None or 0 to leave checkpointing entirely
+                                    to SQLite
+        """
+        self.name = name
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.temp_store = temp_store
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.busy_timeout = busy_timeout
+        self.checkpoint_interval = checkpoint_interval
+
+    @property
+    def is_wal(self):
+        return self.journal_mode is not None and self.journal_mode.upper() == "WAL"
+
+    def pragmas(self):
+        """
+        Returns a list of (pragma, value) tuples - the PRAGMAs this profile sets.
+        :return:
+        """
+        pragmas = []
+        for pragma in ("busy_timeout", "journal_mode", "synchronous", "temp_store", "cache_size", "mmap_size"):
+            value = getattr(self, pragma)
+            if value is not None:
+                pragmas.append((pragma, value))
+        return pragmas
+
+    def apply(self, conn):
+        """
+        Apply the profile to a connection.
+        :param conn:
+        :return:
+        """
+        for pragma, value in self.pragmas():
+            conn.execute("PRAGMA {} = {}".format(pragma, value)).fetchall()
+
+    @staticmethod
+    def _expected(pragma, value):
+        if pragma == "journal_mode":
+            return value.lower()
+        if pragma == "synchronous":
+            return _SYNCHRONOUS_VALUES[value.upper()]
+        if pragma == "temp_store":
+            return _TEMP_STORE_VALUES[value.upper()]
+        return value
+
+    def verify(self, conn):
+        """
+        Read back the PRAGMAs on the given connection.
+        :param conn:
+        :return: Dictionary of the PRAGMAs which don't have the value the profile asked for - keyed with the pragma and
+                 valued with a tuple of (expected, actual)
+        """
+        mismatches = dict()
+        for pragma, value in self.pragmas():
+            actual = conn.execute("PRAGMA {}".format(pragma)).fetchone()
+            actual = actual[0] if actual else None
+            expected = self._expected(pragma, value)
+            if actual != expected:
+                mismatches[pragma] = (expected, actual)
+        return mismatches
+
+
+def build_performance_profile(name, cache_size=None, mmap_size=None, checkpoint_interval=None):
+    """
+    Build one of the named performance profiles.
+    :param name: "wal" or "legacy"
+    :param cache_size:
+    :param mmap_size:
+    :param checkpoint_interval:
+    :return:
+    """
+    name = name.lower()
+    if name == "legacy":
+        return PerformanceProfile(name="legacy", journal_mode="DELETE")
+    elif name == "wal":
+        return PerformanceProfile(
+            name="wal",
+            journal_mode="WAL",
+            synchronous="NORMAL",
+            temp_store="MEMORY",
+            cache_size=cache_size,
+            mmap_size=mmap_size,
+            busy_timeout=10000,
+            checkpoint_interval=checkpoint_interval,
+        )
+    raise ValueError("Unknown SQLite performance profile: {}".format(name))
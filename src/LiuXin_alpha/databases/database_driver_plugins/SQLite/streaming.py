@@ -0,0 +1,157 @@
+"""
+Streaming reads for the SQLite DatabaseDriver.
+
+Rows are read fetch_size at a time from a cursor dedicated to the stream - so a full table scan runs in constant memory.
+Rows come back either as the plain tuples sqlite3 produces, or as StreamedRows - which share a single RowHeader per
+stream and only convert a value when it's asked for.
+"""
+
+from __future__ import print_function
+
+
+DEFAULT_FETCH_SIZE = 500
+
+
+class RowHeader(object):
+    """
+    Column names (and the value converter) shared by every row in a stream.
+    """
+
+    __slots__ = ("columns", "index", "convert")
+
+    def __init__(self, columns, convert=None):
+        """
+        :param columns: The column names - in the order they appear in the rows
+        :param convert: Called on a value when it's read from a row - None to return the value as it is
+        """
+        self.columns = tuple(columns)
+        self.index = dict((column, i) for i, column in enumerate(self.columns))
+        self.convert = convert
+
+
+class StreamedRow(object):
+    """
+    Read only, dict like view of a single row from a stream.
+    """
+
+    __slots__ = ("_header", "_values")
+
+    def __init__(self, header, values):
+        self._header = header
+        self._values = values
+
+    def __getitem__(self, column):
+        value = self._values[self._header.index[column]]
+        convert = self._header.convert
+        return value if convert is None else convert(value)
+
+    def get(self, column, default=None):
+        if column not in self._header.index:
+            return default
+        return self[column]
+
+    def __contains__(self, column):
+        return column in self._header.index
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        return iter(self._header.columns)
+
+    def keys(self):
+        return list(self._header.columns)
+
+    def items(self):
+        return [(column, self[column]) for column in self._header.columns]
+
+    @property
+    def values_tuple(self):
+        """
+        The raw, unconverted values.
+        :return:
+        """
+        return self._values
+
+    def as_dict(self):
+        """
+        Convert every value and return them as a row_dict.
+        :return:
+        """
+        return dict(self.items())
+
+    def __repr__(self):
+        return "StreamedRow({!r})".format(self.as_dict())
+
+
+def stream_cursor(conn, stmt, values=(), fetch_size=DEFAULT_FETCH_SIZE, header=None):
+    """
+    Yield the results of a statement - reading fetch_size rows at a time from a cursor of its own.
+    The connection is closed (returned to the pool, for pooled connections) when the stream is exhausted or closed.
+    :param conn:
+    :param stmt:
+    :param values:
+    :param fetch_size:
+    :param header: If provided rows are yielded as StreamedRows using it - if not as tuples
+    :return:
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(stmt, values)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            if header is None:
+                for row in rows:
+                    yield row
+            else:
+                for row in rows:
+                    yield StreamedRow(header, row)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def stream_keyset(get_connection, table, id_column, columns, fetch_size=DEFAULT_FETCH_SIZE, header=None):
+    """
+    Yield every row of a table in id order - reading fetch_size rows per statement, and releasing the connection
+    between statements.
+    For rollback journal databases - where a cursor left open on a reader would hold a SHARED lock and block writes
+    (including writes made by whatever is consuming the stream).
+    :param get_connection: Called for a connection for each statement
+    :param table:
+    :param id_column:
+    :param columns: The columns to return
+    :param fetch_size:
+    :param header: If provided rows are yielded as StreamedRows using it - if not as tuples
+    :return:
+    """
+    # The id is read first - to page on - and stripped off before the row is yielded
+    select = "SELECT {0}, {1} FROM {2}".format(id_column, ", ".join(columns), table)
+    first_stmt = "{0} ORDER BY {1} LIMIT ?;".format(select, id_column)
+    next_stmt = "{0} WHERE {1} > ? ORDER BY {1} LIMIT ?;".format(select, id_column)
+
+    last_id = None
+    while True:
+        conn = get_connection()
+        try:
+            if last_id is None:
+                rows = conn.execute(first_stmt, (fetch_size,)).fetchall()
+            else:
+                rows = conn.execute(next_stmt, (last_id, fetch_size)).fetchall()
+        finally:
+            conn.close()
+
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        for row in rows:
+            if header is None:
+                yield row[1:]
+            else:
+                yield StreamedRow(header, row[1:])
+
+        if len(rows) < fetch_size:
+            break
@@ -0,0 +1,231 @@
+"""
+Set based recomputation of the derived columns of the titles_aggregate table.
+
+The titles to update are loaded into a temp table - then each derived column is read for every one of them with a
+single statement joined against it, and written back with a single executemany. So the cost of an update is a handful
+of statements however many titles are dirty - rather than a handful of queries per title.
+
+Runs on the connection it's given - so it can be called inside the write transaction of the caller.
+titles_aggregate_handler is the maintenance bot's handler for dirtied titles - it runs on the writer of the database.
+"""
+
+from __future__ import print_function
+
+from collections import OrderedDict
+
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.tree_queries import TREE_DEPTH_LIMIT
+
+
+DIRTY_TITLES_TABLE = "temp.ta_dirty_titles"
+
+# Titles recomputed at a time in a full rebuild - bounds the memory used on large libraries
+REBUILD_CHUNK_SIZE = 5000
+
+# Set valued columns - (column, statement returning (title_id, value) for every dirty title)
+TAG_SET_COLUMNS = (
+    (
+        "ta_tags",
+        "SELECT l.tag_title_link_title_id, t.tag FROM tag_title_links AS l "
+        "JOIN {dirty} AS d ON d.title_id = l.tag_title_link_title_id "
+        "JOIN tags AS t ON t.tag_id = l.tag_title_link_tag_id;",
+    ),
+    (
+        "ta_creators_tags",
+        "SELECT l.creator_title_link_title_id, t.tag FROM creator_title_links AS l "
+        "JOIN {dirty} AS d ON d.title_id = l.creator_title_link_title_id "
+        "JOIN creator_tag_links AS ctl ON ctl.creator_tag_link_creator_id = l.creator_title_link_creator_id "
+        "JOIN tags AS t ON t.tag_id = ctl.creator_tag_link_tag_id;",
+    ),
+    (
+        # Tags on the series the title is in - and on every series above those in the series tree
+        "ta_series_tags",
+        "WITH RECURSIVE title_series(title_id, series_id, depth) AS ("
+        "SELECT l.series_title_link_title_id, l.series_title_link_series_id, 0 FROM series_title_links AS l "
+        "JOIN {dirty} AS d ON d.title_id = l.series_title_link_title_id "
+        "UNION "
+        "SELECT ts.title_id, s.series_parent, ts.depth + 1 FROM title_series AS ts "
+        "JOIN series AS s ON s.series_id = ts.series_id "
+        "WHERE s.series_parent IS NOT NULL AND ts.depth < :depth_limit"
+        ") "
+        "SELECT ts.title_id, t.tag FROM title_series AS ts "
+        "JOIN series_tag_links AS stl ON stl.series_tag_link_series_id = ts.series_id "
+        "JOIN tags AS t ON t.tag_id = stl.series_tag_link_tag_id;",
+    ),
+)
+
+# Tree valued columns - (column, linked table, id column, parent column, display column, link table, link prefix)
+# Each linked item is rendered as the path from the root of its tree down to it - "root:child:item" - and the items
+# joined with " & " in link priority order
+TREE_PATH_COLUMNS = (
+    ("ta_series_aggregate", "series", "series_id", "series_parent", "series", "series_title_links", "series_title_link"),
+    ("ta_genre_aggregate", "genres", "genre_id", "genre_parent", "genre", "genre_title_links", "genre_title_link"),
+    (
+        "ta_publishers",
+        "publishers",
+        "publisher_id",
+        "publisher_parent",
+        "publisher",
+        "publisher_title_links",
+        "publisher_title_link",
+    ),
+)
+
+IDENTIFIERS_STMT = (
+    "SELECT l.identifier_title_link_title_id, i.identifier_type, i.identifier FROM identifier_title_links AS l "
+    "JOIN {dirty} AS d ON d.title_id = l.identifier_title_link_title_id "
+    "JOIN identifiers AS i ON i.identifier_id = l.identifier_title_link_identifier_id;"
+)
+
+DERIVED_COLUMNS = (
+    tuple(column for column, _ in TAG_SET_COLUMNS)
+    + tuple(spec[0] for spec in TREE_PATH_COLUMNS)
+    + ("ta_identifiers",)
+)
+
+
+def tree_path_stmt(table, id_column, parent_column, display_column, link_table, link_prefix):
+    """
+    Statement returning (title_id, path) for every item of the given tree table linked to a dirty title.
+    Paths come back in link priority order for each title. Bind :depth_limit.
+    :param table:
+    :param id_column:
+    :param parent_column:
+    :param display_column: Column rendered for each node in the path
+    :param link_table:
+    :param link_prefix: e.g. "series_title_link"
+    :return:
+    """
+    item_column = "{}_{}".format(link_prefix, id_column)
+    return (
+        "WITH RECURSIVE chain(title_id, priority, link_id, node_id, path, depth) AS ("
+        "SELECT l.{prefix}_title_id, l.{prefix}_priority, l.rowid, t.{id_col}, t.{display}, 0 FROM {link_table} AS l "
+        "JOIN {dirty} AS d ON d.title_id = l.{prefix}_title_id "
+        "JOIN {table} AS t ON t.{id_col} = l.{item_col} "
+        "UNION ALL "
+        "SELECT chain.title_id, chain.priority, chain.link_id, p.{id_col}, p.{display} || ':' || chain.path, "
+        "chain.depth + 1 FROM chain "
+        "JOIN {table} AS c ON c.{id_col} = chain.node_id "
+        "JOIN {table} AS p ON p.{id_col} = c.{parent_col} "
+        "WHERE chain.depth < :depth_limit"
+        ") "
+        # Only the end of each chain - the full path from the root
+        "SELECT chain.title_id, chain.path FROM chain "
+        "WHERE NOT EXISTS ("
+        "SELECT 1 FROM {table} AS c JOIN {table} AS p ON p.{id_col} = c.{parent_col} WHERE c.{id_col} = chain.node_id"
+        ") OR chain.depth >= :depth_limit "
+        "ORDER BY chain.title_id, chain.priority, chain.link_id;"
+    ).format(
+        table=table,
+        id_col=id_column,
+        parent_col=parent_column,
+        display=display_column,
+        link_table=link_table,
+        prefix=link_prefix,
+        item_col=item_column,
+        dirty=DIRTY_TITLES_TABLE,
+    )
+
+
+def _load_dirty_titles(conn, title_ids):
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS ta_dirty_titles (title_id INTEGER PRIMARY KEY);")
+    conn.execute("DELETE FROM {};".format(DIRTY_TITLES_TABLE))
+    conn.executemany(
+        "INSERT OR IGNORE INTO {} (title_id) VALUES (?);".format(DIRTY_TITLES_TABLE),
+        ((title_id,) for title_id in title_ids),
+    )
+
+
+def _write_column(conn, column, values, adapt):
+    if not values:
+        return
+    conn.executemany(
+        "UPDATE titles_aggregate SET {} = ? WHERE ta_title_id = ?;".format(column),
+        ((adapt(value) if adapt is not None else value, title_id) for title_id, value in values.items()),
+    )
+
+
+def update_titles_aggregate(conn, title_ids, adapt_set=None, adapt_dict=None):
+    """
+    Recompute every derived column of titles_aggregate for the given titles.
+    Titles without a row in titles_aggregate are given one. Columns with nothing to aggregate are set to NULL.
+    :param conn: Connection to write with - a transaction should be open on it
+    :param title_ids: Ids from the titles table
+    :param adapt_set: Called on set values before they're written - None to leave it to the registered sqlite3 adapter
+    :param adapt_dict: Called on dict values before they're written - None to leave it to the registered adapter
+    :return: The number of titles updated
+    """
+    _load_dirty_titles(conn, title_ids)
+    try:
+        count = conn.execute("SELECT COUNT(*) FROM {};".format(DIRTY_TITLES_TABLE)).fetchone()[0]
+        if not count:
+            return 0
+
+        conn.execute(
+            "INSERT OR IGNORE INTO titles_aggregate (ta_title_id) SELECT title_id FROM {};".format(DIRTY_TITLES_TABLE)
+        )
+        conn.execute(
+            "UPDATE titles_aggregate SET {} WHERE ta_title_id IN (SELECT title_id FROM {});".format(
+                ", ".join("{} = NULL".format(column) for column in DERIVED_COLUMNS), DIRTY_TITLES_TABLE
+            )
+        )
+        params = {"depth_limit": TREE_DEPTH_LIMIT}
+
+        for column, stmt in TAG_SET_COLUMNS:
+            values = OrderedDict()
+            for title_id, tag in conn.execute(stmt.format(dirty=DIRTY_TITLES_TABLE), params):
+                values.setdefault(title_id, set()).add(tag)
+            _write_column(conn, column, values, adapt_set)
+
+        for spec in TREE_PATH_COLUMNS:
+            paths = OrderedDict()
+            for title_id, path in conn.execute(tree_path_stmt(*spec[1:]), params):
+                paths.setdefault(title_id, []).append(path)
+            _write_column(conn, spec[0], OrderedDict((k, " & ".join(v)) for k, v in paths.items()), None)
+
+        identifiers = OrderedDict()
+        for title_id, id_type, identifier in conn.execute(IDENTIFIERS_STMT.format(dirty=DIRTY_TITLES_TABLE)):
+            identifiers.setdefault(title_id, dict()).setdefault(id_type.upper().strip(), set()).add(identifier)
+        _write_column(conn, "ta_identifiers", identifiers, adapt_dict)
+
+        return count
+    finally:
+        conn.execute("DELETE FROM {};".format(DIRTY_TITLES_TABLE))
+
+
+def rebuild_titles_aggregate(conn, adapt_set=None, adapt_dict=None, chunk_size=REBUILD_CHUNK_SIZE):
+    """
+    Recompute titles_aggregate for every title in the library - and drop rows for titles which no longer exist.
+    Titles are done chunk_size at a time - so memory use doesn't grow with the size of the library.
+    :param conn: Connection to write with - a transaction should be open on it
+    :param adapt_set:
+    :param adapt_dict:
+    :param chunk_size:
+    :return: The number of titles updated
+    """
+    conn.execute("DELETE FROM titles_aggregate WHERE ta_title_id NOT IN (SELECT title_id FROM titles);")
+    chunk_size = max(chunk_size, 1)
+    count = 0
+    last_id = None
+    while True:
+        if last_id is None:
+            rows = conn.execute("SELECT title_id FROM titles ORDER BY title_id LIMIT ?;", (chunk_size,)).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT title_id FROM titles WHERE title_id > ? ORDER BY title_id LIMIT ?;", (last_id, chunk_size)
+            ).fetchall()
+        if not rows:
+            return count
+        title_ids = [row[0] for row in rows]
+        count += update_titles_aggregate(conn, title_ids, adapt_set=adapt_set, adapt_dict=adapt_dict)
+        last_id = title_ids[-1]
+
+
+def titles_aggregate_handler(db, row_ids):
+    """
+    Maintenance bot handler for dirtied titles_aggregate rows - runs inside the write transaction for the batch.
+    :param db: The Database - the rows are written on the writer connection of its driver
+    :param row_ids: Ids of titles
+    :return:
+    """
+    with db.driver_wrapper.write_transaction() as conn:
+        update_titles_aggregate(conn, row_ids)
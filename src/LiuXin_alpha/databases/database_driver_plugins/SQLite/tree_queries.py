@@ -0,0 +1,89 @@
+"""
+Recursive CTE statements for tables which hold a tree - each row pointing at its parent row through a "_parent" column.
+
+An ancestor chain, a whole subtree or the root of every row comes back from a single WITH RECURSIVE statement - rather
+than the one query per node which walking the tree from Python costs.
+"""
+
+from __future__ import print_function
+
+
+# Recursion stops this many levels down (or up) - a cycle in the parent column would otherwise never terminate
+TREE_DEPTH_LIMIT = 10000
+
+
+def _select_columns(alias, columns):
+    return ", ".join("{}.{}".format(alias, column) for column in columns)
+
+
+def ancestors_stmt(table, id_column, parent_column, columns):
+    """
+    Statement for the ancestor chain of a row - the row itself, its parent, its grandparent ... up to the root.
+    Rows come back root first. Bind the row id, then the depth limit.
+    A parent which doesn't point at a row in the table (NULL, "None", a deleted row) ends the chain.
+    :param table:
+    :param id_column:
+    :param parent_column:
+    :param columns: Columns to return for each row in the chain
+    :return:
+    """
+    return (
+        "WITH RECURSIVE chain(node_id, depth) AS ("
+        "SELECT {id_col}, 0 FROM {table} WHERE {id_col} = ? "
+        "UNION ALL "
+        "SELECT t.{parent_col}, chain.depth + 1 FROM {table} AS t JOIN chain ON t.{id_col} = chain.node_id "
+        "WHERE t.{parent_col} IS NOT NULL AND chain.depth < ?"
+        ") "
+        "SELECT {columns} FROM chain JOIN {table} AS t ON t.{id_col} = chain.node_id ORDER BY chain.depth DESC;"
+    ).format(table=table, id_col=id_column, parent_col=parent_column, columns=_select_columns("t", columns))
+
+
+def subtree_stmt(table, id_column, parent_column, columns):
+    """
+    Statement for the subtree rooted at a row - the row itself and every row beneath it.
+    Rows come back breadth first - the row, then its children, then its grandchildren ...
+    Bind the row id, then the depth limit.
+    :param table:
+    :param id_column:
+    :param parent_column:
+    :param columns: Columns to return for each row in the subtree
+    :return:
+    """
+    return (
+        "WITH RECURSIVE subtree(node_id, depth) AS ("
+        "SELECT {id_col}, 0 FROM {table} WHERE {id_col} = ? "
+        "UNION ALL "
+        "SELECT t.{id_col}, subtree.depth + 1 FROM {table} AS t JOIN subtree ON t.{parent_col} = subtree.node_id "
+        "WHERE subtree.depth < ?"
+        ") "
+        "SELECT {columns} FROM subtree JOIN {table} AS t ON t.{id_col} = subtree.node_id "
+        "ORDER BY subtree.depth, t.{id_col};"
+    ).format(table=table, id_col=id_column, parent_col=parent_column, columns=_select_columns("t", columns))
+
+
+def roots_stmt(table, id_column, parent_column, columns):
+    """
+    Statement pairing every row in the table with the root of its tree.
+    Returns (row id, root id, *columns of the root) for each row. Bind the depth limit.
+    Rows caught in a cycle have no root - so are not returned.
+    :param table:
+    :param id_column:
+    :param parent_column:
+    :param columns: Columns to return from the root row
+    :return:
+    """
+    return (
+        "WITH RECURSIVE tree(node_id, root_id, depth) AS ("
+        "SELECT t.{id_col}, t.{id_col}, 0 FROM {table} AS t "
+        "WHERE NOT EXISTS (SELECT 1 FROM {table} AS p WHERE p.{id_col} = t.{parent_col}) "
+        "UNION ALL "
+        "SELECT t.{id_col}, tree.root_id, tree.depth + 1 FROM {table} AS t JOIN tree ON t.{parent_col} = tree.node_id "
+        "WHERE tree.depth < ?"
+        ") "
+        "SELECT tree.node_id, tree.root_id{columns} FROM tree JOIN {table} AS r ON r.{id_col} = tree.root_id;"
+    ).format(
+        table=table,
+        id_col=id_column,
+        parent_col=parent_column,
+        columns="".join(", r.{}".format(column) for column in columns),
+    )
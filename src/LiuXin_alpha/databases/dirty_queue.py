@@ -0,0 +1,311 @@
+"""
+Coalescing queue of dirtied records - feeds the maintenance bot.
+
+A record dirtied again while it's still waiting to be processed is only queued once - so a bulk edit which touches
+the same rows many times costs one pass over each row, and the queue is bounded by the number of distinct rows.
+Consumers block on the queue (rather than polling it) - so an idle library costs no CPU.
+
+DirtyQueueWorker is the consumer - a thread which drains the queue in batches, handing each batch to the handlers for
+the dirtied tables inside a single write transaction. The maintenance bot is one.
+"""
+
+from __future__ import print_function
+
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+
+from LiuXin_alpha.utils.logging import default_log
+
+
+# Batches kept to work out the throughput from
+THROUGHPUT_WINDOW = 20
+
+
+class DirtyQueue(object):
+    """
+    Thread safe, coalescing FIFO of dirtied records - e.g. (table, row_id) tuples.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        """
+        :param clock: Returns the current time in seconds - used to measure lag and throughput
+        """
+        self._clock = clock
+        self._cond = threading.Condition()
+        # Keyed with the record and valued with the time it was first dirtied - in the order they were dirtied
+        self._pending = OrderedDict()
+        self._closed = False
+
+        self.dirtied_count = 0
+        self.coalesced_count = 0
+        self.processed_count = 0
+        self.last_batch_lag = 0.0
+        # (records, seconds taken) for the last few batches
+        self._recent_batches = deque(maxlen=THROUGHPUT_WINDOW)
+
+    def __len__(self):
+        with self._cond:
+            return len(self._pending)
+
+    def qsize(self):
+        return len(self)
+
+    def empty(self):
+        return not len(self)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def put(self, record, block=True, timeout=None):
+        """
+        Queue a dirtied record - if it's already waiting to be processed this does nothing.
+        Never blocks - block and timeout are accepted so this can be used where a Queue.Queue was.
+        :param record: Must be hashable
+        :param block:
+        :param timeout:
+        :return:
+        """
+        with self._cond:
+            self.dirtied_count += 1
+            if record in self._pending:
+                self.coalesced_count += 1
+                return
+            self._pending[record] = self._clock()
+            self._cond.notify()
+
+    def get_batch(self, max_size, max_wait=0.0, timeout=None):
+        """
+        Wait for dirtied records, then take up to max_size of them (oldest first).
+        Once there's a record, waits up to max_wait seconds for the batch to fill - so records dirtied in a burst are
+        processed together.
+        :param max_size: Most records to return
+        :param max_wait: Seconds to wait for more records after the first one
+        :param timeout: Seconds to wait for the first record - None to wait until there is one, or the queue is closed
+        :return: List of records - empty if the timeout expired, or the queue was closed, with nothing queued
+        """
+        max_size = max(max_size, 1)
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._pending or self._closed, timeout=timeout):
+                return []
+
+            if max_wait > 0 and len(self._pending) < max_size:
+                deadline = self._clock() + max_wait
+                while not self._closed and len(self._pending) < max_size:
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+            batch = []
+            oldest = None
+            while self._pending and len(batch) < max_size:
+                record, dirtied_at = self._pending.popitem(last=False)
+                batch.append(record)
+                if oldest is None:
+                    oldest = dirtied_at
+            if oldest is not None:
+                self.last_batch_lag = self._clock() - oldest
+            return batch
+
+    def batch_done(self, count, elapsed):
+        """
+        Record that a batch has been processed - for the throughput metric.
+        :param count: Records in the batch
+        :param elapsed: Seconds it took to process
+        :return:
+        """
+        with self._cond:
+            self.processed_count += count
+            self._recent_batches.append((count, elapsed))
+
+    def close(self):
+        """
+        Wake every consumer - get_batch will return whatever is left, and then empty lists, from now on.
+        :return:
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def lag(self):
+        """
+        Seconds the oldest waiting record has been waiting - 0 if the queue is empty.
+        :return:
+        """
+        with self._cond:
+            if not self._pending:
+                return 0.0
+            return self._clock() - next(iter(self._pending.values()))
+
+    def throughput(self):
+        """
+        Records processed per second of processing time - over the last few batches.
+        :return:
+        """
+        with self._cond:
+            count = sum(batch[0] for batch in self._recent_batches)
+            elapsed = sum(batch[1] for batch in self._recent_batches)
+        return count / elapsed if elapsed > 0 else 0.0
+
+    def metrics(self):
+        """
+        Snapshot of the state of the queue.
+        :return: Dictionary of depth, lag (of the oldest waiting record), last_batch_lag, throughput, dirtied, coalesced
+                 and processed
+        """
+        with self._cond:
+            depth = len(self._pending)
+            dirtied, coalesced, processed = self.dirtied_count, self.coalesced_count, self.processed_count
+            last_batch_lag = self.last_batch_lag
+        return {
+            "depth": depth,
+            "lag": self.lag(),
+            "last_batch_lag": last_batch_lag,
+            "throughput": self.throughput(),
+            "dirtied": dirtied,
+            "coalesced": coalesced,
+            "processed": processed,
+        }
+
+
+def group_by_table(batch):
+    """
+    Group a batch of (table, row_id) records by table - keeping the order the tables and rows were dirtied in.
+    :param batch:
+    :return: OrderedDict keyed with the table and valued with a list of row ids
+    """
+    grouped = OrderedDict()
+    for table, row_id in batch:
+        grouped.setdefault(table, []).append(row_id)
+    return grouped
+
+
+class DirtyQueueWorker(threading.Thread):
+    """
+    Drains a DirtyQueue of (table, row_id) records in batches - each batch grouped by table and handed to the handlers
+    registered for those tables, inside a single write transaction on the database.
+    """
+
+    def __init__(self, db, queue, batch_size=500, batch_wait=0.25, handlers=None):
+        """
+        :param db: Must provide driver_wrapper.write_transaction() - held by weak reference where possible
+        :param queue: The DirtyQueue to drain
+        :param batch_size: Most records processed in a single transaction
+        :param batch_wait: Seconds to wait for a batch to fill once a record has been dirtied
+        :param handlers: Keyed with the table name and valued with a callable taking (db, row_ids)
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        try:
+            self.__db = weakref.ref(db)
+        except TypeError:
+            self.__db = db
+        self.keep_running = True
+
+        self.main_table_queue = queue
+        self.batch_size = max(batch_size, 1)
+        self.batch_wait = max(batch_wait, 0.0)
+
+        # Keyed with the table name and valued with a callable which takes (db, row_ids) - and does the work needed
+        # on the dirtied rows of that table
+        self.table_handlers = dict(handlers or {})
+
+        # Tables whose handler has raised - their records in that batch were not processed
+        self.failed_count = 0
+
+    @property
+    def db(self):
+        return self.__db() if isinstance(self.__db, weakref.ref) else self.__db
+
+    def register_handler(self, table, handler):
+        """
+        Set the callable which processes dirtied rows from the given table.
+        :param table:
+        :param handler: Called with (db, row_ids) - inside the write transaction for the batch
+        :return:
+        """
+        self.table_handlers[table] = handler
+
+    def metrics(self):
+        """
+        Queue depth, lag and throughput for the queue - and the number of failed handler calls.
+        :return:
+        """
+        metrics = self.main_table_queue.metrics()
+        metrics["failed"] = self.failed_count
+        return metrics
+
+    def stop(self):
+        """
+        Stop the thread once it's finished the batch it's working on.
+        :return:
+        """
+        self.keep_running = False
+        # Wake the thread if it's waiting for work
+        self.main_table_queue.close()
+
+    def run(self):
+        while self.keep_running:
+            # Blocks until something is dirtied - the worker costs nothing while the library is idle
+            batch = self.main_table_queue.get_batch(self.batch_size, max_wait=self.batch_wait)
+            if not batch:
+                if self.main_table_queue.closed:
+                    break
+                continue
+            start = time.monotonic()
+            try:
+                self.process_batch(batch)
+            except Exception as e:
+                # process_batch deals with failing handlers - so this is the database itself failing. Log it and
+                # keep draining, rather than leaving records to pile up behind a dead thread
+                err_str = "DirtyQueueWorker - unable to process a batch of dirtied records"
+                default_log.log_variables(err_str, "ERROR", ("batch_size", len(batch)), ("error", e))
+            self.main_table_queue.batch_done(len(batch), time.monotonic() - start)
+
+    def process_batch(self, batch):
+        """
+        Dispatch a batch of dirtied records to the handlers for their tables - all in a single write transaction.
+        If a handler raises, the transaction is rolled back and each table is retried in a transaction of its own - so
+        one failing handler only loses the records for its table.
+        :param batch: List of (table, row_id) records
+        :return:
+        """
+        grouped = group_by_table(batch)
+        handled = [(table, row_ids) for table, row_ids in grouped.items() if table in self.table_handlers]
+        if not handled:
+            return
+
+        db = self.db
+        if db is None:
+            return
+        try:
+            with db.driver_wrapper.write_transaction():
+                for table, row_ids in handled:
+                    self.table_handlers[table](db, row_ids)
+            return
+        except Exception as e:
+            if len(handled) == 1:
+                self._handler_failed(handled[0][0], handled[0][1], e)
+                return
+
+        for table, row_ids in handled:
+            try:
+                with db.driver_wrapper.write_transaction():
+                    self.table_handlers[table](db, row_ids)
+            except Exception as e:
+                self._handler_failed(table, row_ids, e)
+
+    def _handler_failed(self, table, row_ids, error):
+        """
+        Log a handler which has raised - and count it.
+        :param table:
+        :param row_ids:
+        :param error:
+        :return:
+        """
+        self.failed_count += 1
+        err_str = "DirtyQueueWorker - handler for dirtied table failed - its rows in this batch were not processed"
+        default_log.log_variables(err_str, "ERROR", ("table", table), ("row_ids", row_ids), ("error", error))
@@ -0,0 +1,138 @@
+"""
+Maintained index used to detect duplicate books when adding - so has_book and find_identical_books are lookups rather
+than scans of the whole library.
+
+Books are indexed by lower cased title, by fuzzy title and by (lower cased) author. The index is kept up to date by
+the cache as books are created, changed and removed.
+"""
+
+from __future__ import print_function
+
+from collections import defaultdict
+
+
+class DuplicateIndex(object):
+    """
+    Title and author maps for every book in the library.
+    """
+
+    def __init__(self, title_key, fuzzy_key, author_key):
+        """
+        :param title_key: Called on a title for the has_book key (e.g. icu_lower)
+        :param fuzzy_key: Called on a title for the find_identical_books key (e.g. fuzzy_title)
+        :param author_key: Called on an author name for the author key (e.g. icu_lower)
+        """
+        self.title_key = title_key
+        self.fuzzy_key = fuzzy_key
+        self.author_key = author_key
+
+        self.title_map = defaultdict(set)
+        self.fuzzy_title_map = defaultdict(set)
+        self.author_map = defaultdict(set)
+
+        # Keyed with the book id and valued with the keys it's currently stored under - so it can be moved
+        self.book_title_keys = dict()
+        self.book_author_keys = dict()
+
+    def __contains__(self, book_id):
+        return book_id in self.book_title_keys or book_id in self.book_author_keys
+
+    def __len__(self):
+        return len(set(self.book_title_keys) | set(self.book_author_keys))
+
+    def add_book(self, book_id, title, authors):
+        """
+        Add a book to the index (or replace its entries, if it's already there).
+        :param book_id:
+        :param title:
+        :param authors: Iterable of author names
+        :return:
+        """
+        self.set_title(book_id, title)
+        self.set_authors(book_id, authors)
+
+    def set_title(self, book_id, title):
+        """
+        Index a book under a (new) title.
+        :param book_id:
+        :param title: None to remove the book from the title maps
+        :return:
+        """
+        self._discard_title(book_id)
+        if not title:
+            return
+        keys = (self.title_key(title), self.fuzzy_key(title))
+        self.title_map[keys[0]].add(book_id)
+        self.fuzzy_title_map[keys[1]].add(book_id)
+        self.book_title_keys[book_id] = keys
+
+    def set_authors(self, book_id, authors):
+        """
+        Index a book under (new) authors.
+        :param book_id:
+        :param authors: Iterable of author names
+        :return:
+        """
+        self._discard_authors(book_id)
+        keys = frozenset(self.author_key(author) for author in authors if author)
+        for key in keys:
+            self.author_map[key].add(book_id)
+        self.book_author_keys[book_id] = keys
+
+    def discard_books(self, book_ids):
+        """
+        Remove books from the index.
+        :param book_ids:
+        :return:
+        """
+        for book_id in book_ids:
+            self._discard_title(book_id)
+            self._discard_authors(book_id)
+
+    def _discard_title(self, book_id):
+        keys = self.book_title_keys.pop(book_id, None)
+        if keys is not None:
+            _discard_from(self.title_map, keys[0], book_id)
+            _discard_from(self.fuzzy_title_map, keys[1], book_id)
+
+    def _discard_authors(self, book_id):
+        for key in self.book_author_keys.pop(book_id, ()):
+            _discard_from(self.author_map, key, book_id)
+
+    def has_title(self, title):
+        """
+        Is there a book with this title (compared case insensitively) in the index?
+        :param title:
+        :return:
+        """
+        if not title:
+            return False
+        return self.title_key(title).strip() in self.title_map
+
+    def find_identical(self, title, authors):
+        """
+        Books which have a superset of the given authors and the same fuzzy title.
+        :param title:
+        :param authors: Iterable of author names - no authors matches no books
+        :return: Set of book ids
+        """
+        author_keys = set(self.author_key(author) for author in authors if author)
+        if not author_keys or not title:
+            return set()
+
+        found = set(self.fuzzy_title_map.get(self.fuzzy_key(title), ()))
+        # Intersect with the smallest author sets first - found is usually empty, or a single book, after one or two
+        for key in sorted(author_keys, key=lambda k: len(self.author_map.get(k, ()))):
+            if not found:
+                break
+            found &= self.author_map.get(key, set())
+        return found
+
+
+def _discard_from(key_map, key, book_id):
+    books = key_map.get(key)
+    if books is None:
+        return
+    books.discard(book_id)
+    if not books:
+        del key_map[key]
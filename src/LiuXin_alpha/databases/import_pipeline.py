@@ -0,0 +1,314 @@
+"""
+Staged pipeline for recursive imports.
+
+Directory discovery -> metadata extraction and hashing -> deduplication -> database insertion.
+
+Discovery walks the tree on a thread of its own, metadata is read (and the files hashed) in a process pool, and every
+database write happens on the calling thread - the single writer. The stages are joined by bounded queues, so a slow
+stage holds back the ones feeding it rather than letting work pile up in memory.
+
+Books are still added one import_book call (and so one transaction) at a time - import_book copies the files into the
+library, which a database rollback couldn't undo. What the pipeline takes off the writer is the reading and hashing.
+"""
+
+from __future__ import print_function
+
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from typing import Callable, Optional, Union
+
+from LiuXin_alpha.databases.adding import find_books_in_directory
+from LiuXin_alpha.preferences import preferences
+from LiuXin_alpha.utils.storage.hashes.file_hashing import FileHasher
+from LiuXin_alpha.utils.storage.hashes.file_hashing import HashCache
+
+
+# Results collected for the writer at a time - the pool works ahead on the next batch while one is being written
+WRITE_BATCH_SIZE = 50
+
+# The hasher for this process - each worker process makes its own
+_file_hasher = None
+_file_hasher_lock = threading.Lock()
+
+
+def file_hasher() -> FileHasher:
+    """
+    The FileHasher used by hash_file in this process.
+    Digests are cached in the file given by the import_hash_cache_path preference - so unchanged files aren't read
+    again by later imports, or by other workers. If it's not set, they're cached in memory for the life of the process.
+
+    :return:
+    """
+    global _file_hasher
+    with _file_hasher_lock:
+        if _file_hasher is None:
+            cache_path = preferences.parse("import_hash_cache_path", "str", "") or ":memory:"
+            _file_hasher = FileHasher(("sha256",), cache=HashCache(cache_path))
+        return _file_hasher
+
+
+def hash_file(path: Union[str, os.PathLike[str]]) -> str:
+    """
+    SHA-256 of the contents of a file - streamed, so memory use doesn't depend on the size of the file.
+    Files which haven't changed (same path, size and mtime) since they were last hashed aren't read again.
+
+    :param path:
+    :return:
+    """
+    return file_hasher().hash_file(path)["sha256"]
+
+
+def read_book(formats: list[str]):
+    """
+    Read the metadata for a book and hash its files - run in the worker processes.
+
+    :param formats: The files which make up the book
+    :return: (mi, formats, hashes)
+    """
+    from LiuXin.metadata.meta import metadata_from_formats
+
+    return metadata_from_formats(formats), formats, tuple(hash_file(path) for path in formats)
+
+
+class _DirectoryDone(object):
+    """
+    Passed down the pipeline after the last book from a directory - so progress can be reported per directory.
+    """
+
+    __slots__ = ("dirpath",)
+
+    def __init__(self, dirpath):
+        self.dirpath = dirpath
+
+
+class _Completed(object):
+    """
+    Stands in for a future for items which didn't need any work from the pool.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
+
+    def cancel(self):
+        return False
+
+
+class _DiscoveryDone(object):
+    """
+    Put on the queue when discovery has finished - carrying the exception which stopped it, if there was one.
+    """
+
+    __slots__ = ("error",)
+
+    def __init__(self, error=None):
+        self.error = error
+
+
+class ImportPipeline(object):
+    """
+    Imports every book found under a directory - using as many cores as there are workers.
+    """
+
+    def __init__(
+        self,
+        db,
+        single_book_per_directory: bool = True,
+        callback: Optional[Callable[[str], Optional[bool]]] = None,
+        added_ids: Optional[set[int]] = None,
+        compiled_rules=(),
+        workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        write_batch_size: int = WRITE_BATCH_SIZE,
+        read_book_impl: Callable = read_book,
+    ):
+        """
+        :param db: The database to import into - must provide has_book and import_book
+        :param single_book_per_directory: Should each directory be treated as a single book?
+        :param callback: Called with the title of each book as it's added, and with "" after each directory. As with
+                         the per-directory imports - if it returns True for a title the rest of that directory is
+                         skipped, if it returns True for "" the import is aborted.
+        :param added_ids: The ids of the added books are added to this set
+        :param compiled_rules: Rules to include/exclude certain file types
+        :param workers: Processes to read metadata in - defaults to the import_workers preference (0 for one per
+                        CPU). 1 reads metadata on the calling thread, without a pool.
+        :param queue_size: Books which can be waiting between stages - defaults to the import_queue_size preference
+        :param write_batch_size: Results collected for the writer at a time
+        :param read_book_impl: Reads (mi, formats, hashes) for a list of files - must be picklable if workers > 1
+        """
+        self.db = db
+        self.single_book_per_directory = single_book_per_directory
+        self.callback = callback
+        self.added_ids = added_ids
+        self.compiled_rules = compiled_rules
+
+        if workers is None:
+            workers = preferences.parse("import_workers", "int", 0)
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        if queue_size is None:
+            queue_size = preferences.parse("import_queue_size", "int", 256)
+        self.queue_size = max(queue_size, 1)
+        self.write_batch_size = max(write_batch_size, 1)
+        self.read_book_impl = read_book_impl
+
+        self._abort = threading.Event()
+        self._seen_hashes = set()
+        # Set when the callback asks for the rest of the current directory to be skipped
+        self._skip_directory = False
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # - STAGE 1 - DISCOVERY
+
+    def _discover(self, root, books_queue):
+        """
+        Walk the tree - putting the formats of each book found (and a marker after each directory) on the queue.
+        Runs on the discovery thread. Blocks when the queue is full - which is the back-pressure on this stage.
+        :param root:
+        :param books_queue:
+        :return:
+        """
+        error = None
+        try:
+            for dirpath, _, _ in os.walk(root):
+                # One file per format - import_book takes a flat list of paths (with lists of files for each format
+                # it would fail in splitext). The rules apply whether or not there's one book per directory.
+                books = find_books_in_directory(
+                    dirpath, self.single_book_per_directory, compiled_rules=self.compiled_rules, single_fmt=True
+                )
+                for formats in books:
+                    if not self._put(books_queue, formats):
+                        return
+                    if self.single_book_per_directory:
+                        break
+                if not self._put(books_queue, _DirectoryDone(dirpath)):
+                    return
+        except Exception as e:
+            error = e
+        finally:
+            self._put(books_queue, _DiscoveryDone(error), force=True)
+
+    def _put(self, books_queue, item, force=False):
+        """
+        Put an item on the queue - giving up if the import is aborted while waiting for space.
+        :param books_queue:
+        :param item:
+        :param force: Wait for space even after an abort
+        :return: False if the import was aborted
+        """
+        while force or not self._abort.is_set():
+            try:
+                books_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # - STAGES 2 TO 4 - EXTRACTION, DEDUPLICATION AND INSERTION
+
+    def run(self, root: Union[str, os.PathLike[str]]):
+        """
+        Import every book under root.
+        :param root:
+        :return duplicates: (mi, formats) for every book which was not added because it was a duplicate
+        """
+        root = os.path.abspath(root)
+        books_queue = queue.Queue(maxsize=self.queue_size)
+        discovery = threading.Thread(target=self._discover, args=(root, books_queue), name="ImportDiscovery")
+        discovery.daemon = True
+
+        executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        duplicates = []
+        pending = deque()
+        discovery_done = None
+
+        discovery.start()
+        try:
+            while True:
+                # Keep the pool fed - up to queue_size books in flight between discovery and the writer. Only wait on
+                # discovery when there's nothing else to do.
+                while discovery_done is None and len(pending) < self.queue_size:
+                    try:
+                        item = books_queue.get(block=not pending)
+                    except queue.Empty:
+                        break
+                    if isinstance(item, _DiscoveryDone):
+                        discovery_done = item
+                    elif isinstance(item, _DirectoryDone):
+                        pending.append(_Completed(item))
+                    elif executor is not None:
+                        pending.append(executor.submit(self.read_book_impl, item))
+                    else:
+                        pending.append(_Completed(self.read_book_impl(item)))
+
+                if not pending:
+                    if discovery_done is not None:
+                        break
+                    continue
+
+                batch = []
+                while pending and len(batch) < self.write_batch_size:
+                    batch.append(pending.popleft().result())
+                if self._write_batch(batch, duplicates):
+                    self._abort.set()
+                    break
+
+            if discovery_done is not None and discovery_done.error is not None:
+                raise discovery_done.error
+        finally:
+            self._abort.set()
+            for future in pending:
+                future.cancel()
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+            # Unblock the discovery thread if it's waiting for space on the queue
+            while discovery.is_alive():
+                try:
+                    books_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            discovery.join()
+
+        return duplicates
+
+    def _write_batch(self, batch, duplicates):
+        """
+        Deduplicate and add a batch of read books - on the calling thread, the single writer.
+        :param batch: Results from read_book (and _DirectoryDone markers), in the order they were found
+        :param duplicates: Books which are not added are appended to this
+        :return: True if the callback asked for the import to be aborted
+        """
+        for result in batch:
+            if isinstance(result, _DirectoryDone):
+                self._skip_directory = False
+                if callable(self.callback) and self.callback(""):
+                    return True
+                continue
+
+            mi, formats, hashes = result
+            if mi.title is None or self._skip_directory:
+                continue
+
+            # The same files turning up twice in the drop - or a book which is already in the library
+            if hashes and self._seen_hashes.issuperset(hashes):
+                duplicates.append((mi, formats))
+                continue
+            self._seen_hashes.update(hashes)
+            if self.db.has_book(mi):
+                duplicates.append((mi, formats))
+                continue
+
+            book_id = self.db.import_book(mi, formats)
+            if self.added_ids is not None:
+                self.added_ids.add(book_id)
+            if callable(self.callback) and self.callback(mi.title):
+                self._skip_directory = True
+        return False
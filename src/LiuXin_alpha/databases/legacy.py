@@ -553,6 +553,7 @@ class LibraryDatabase(object):
         callback=None,
         added_ids=None,
         compiled_rules=(),
+        workers=None,
     ):
         """
         Recursively import - walk a tree and import any directory that looks like a book.
@@ -561,6 +562,7 @@ class LibraryDatabase(object):
         :param callback: Callback to notify another process about the progress
         :param added_ids:
         :param compiled_rules: Apply rules to the import process - filter book titles
+        :param workers: Processes to read metadata with - defaults to the import_workers preference
         :return:
         """
         return recursive_import(
@@ -570,6 +572,7 @@ class LibraryDatabase(object):
             callback=callback,
             added_ids=added_ids,
             compiled_rules=compiled_rules,
+            workers=workers,
         )
 
     def add_catalog(self, path, title):
@@ -21,7 +21,6 @@
 # 4) Update some fields of the database which are two laborious or involvved to easily update with triggers.
 
 import pprint
-import queue as Queue
 import time
 import threading
 import weakref
@@ -32,11 +31,16 @@ from typing import Iterable, Optional
 
 from LiuXin_alpha.constants import VERBOSE_DEBUG
 from LiuXin_alpha.databases.database import Database
+from LiuXin_alpha.databases.dirty_queue import DirtyQueue, DirtyQueueWorker
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.titles_aggregate import rebuild_titles_aggregate
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.titles_aggregate import titles_aggregate_handler
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.titles_aggregate import update_titles_aggregate
 
 # from LiuXin.databases.database import DatabasePing
 # from LiuXin.databases.row import Row
 
 from LiuXin_alpha.errors import InputIntegrityError
+from LiuXin_alpha.preferences import preferences
 
 from LiuXin_alpha.utils.language_tools.lx_name_manip import author_to_author_sort
 
@@ -68,14 +72,11 @@ class Maintainer(DatabaseMaintainerAPI):
         """
         super().__init__(db=db)
 
-        self.main_table_dirtied_queue = Queue.Queue()
-        self.interlink_dirtied_queue = Queue.Queue()
+        # Coalescing - a row dirtied repeatedly before the bot gets to it is only processed once
+        # Changed interlinks are queued here too - as the rows at either end of them
+        self.main_table_dirtied_queue = DirtyQueue()
 
-        self.maintainer = MaintenanceBot(
-            db=self.db,
-            dirtied_main_queue=self.main_table_dirtied_queue,
-            dirtied_interlink_queue=self.interlink_dirtied_queue,
-        )
+        self.maintainer = MaintenanceBot(db=self.db, dirtied_main_queue=self.main_table_dirtied_queue)
         self.maintainer.start()
 
     def dirty_record(self, table: str, row_id: int) -> None:
@@ -105,6 +106,8 @@ class Maintainer(DatabaseMaintainerAPI):
         Notify the maintenance bot that an interlink record has been changed.
 
         Used for updating the books_aggregate table when stuff happens to the relevant other tables.
+        Both linked rows are dirtied - so the change is coalesced and drained with every other dirtied record, by the
+        handlers for the two tables.
         :param update_type:
         :param table1:
         :param table2:
@@ -112,7 +115,8 @@ class Maintainer(DatabaseMaintainerAPI):
         :param table2_id:
         :return:
         """
-        self.interlink_dirtied_queue.put((update_type, table1, table2, table1_id, table2_id))
+        self.main_table_dirtied_queue.put((table1, table1_id), block=False)
+        self.main_table_dirtied_queue.put((table2, table2_id), block=False)
 
     def clean(self, table: str, item_ids: Iterable[int]) -> None:
         """
@@ -200,56 +204,49 @@ class Maintainer(DatabaseMaintainerAPI):
 # ----------------------------------------------------------------------------------------------------------------------
 
 
-class MaintenanceBot(threading.Thread, MaintenanceBotAPI):
+class MaintenanceBot(DirtyQueueWorker, MaintenanceBotAPI):
     """
     Continuously checks the database and generates some of the computationally expensive derived quantities.
 
     As an alternative to using triggers - for things which can be done later.
+    Draining the queue of dirtied records is done by DirtyQueueWorker.
     """
 
     def __init__(
         self,
         db: Database,
-        dirtied_main_queue,
-        dirtied_interlink_queue,
-        interval: int = 2,
+        dirtied_main_queue: DirtyQueue,
+        batch_size: Optional[int] = None,
+        batch_wait: Optional[float] = None,
         scheduling_interval: float = 0.5,
     ) -> None:
         """
         The Maintenance bot exist to do maintenance work to the database.
 
         :param db:
-        :param dirtied_main_queue:
-        :param dirtied_interlink_queue:
-        :param interval:
+        :param dirtied_main_queue: (table, row_id) records for the bot to work through
+        :param batch_size: Most records processed in a single transaction - defaults to the maintenance_batch_size
+                           preference
+        :param batch_wait: Seconds to wait for a batch to fill once a record has been dirtied - defaults to the
+                           maintenance_batch_wait_ms preference
         :param scheduling_interval:
         """
-
-        threading.Thread.__init__(self)
-        self.daemon = True
-        try:
-            self.__db = weakref.ref(db)
-        except TypeError:
-            # Hopefully thrown as we already have a weakref to the db
-            self.__db = db
-        self.keep_running = True
-
-        # The queues used to instruct the class to do stuff
-        self.main_table_queue = dirtied_main_queue
-        self.interlink_queue = dirtied_interlink_queue
+        if batch_size is None:
+            batch_size = preferences.parse("maintenance_batch_size", "int", 500)
+        if batch_wait is None:
+            batch_wait = preferences.parse("maintenance_batch_wait_ms", "int", 250) / 1000.0
+        DirtyQueueWorker.__init__(
+            self,
+            db=db,
+            queue=dirtied_main_queue,
+            batch_size=batch_size,
+            batch_wait=batch_wait,
+            handlers={"titles_aggregate": titles_aggregate_handler},
+        )
 
         # Controls the behavior of the thread
-        self.interval = interval
         self.scheduling_interval = scheduling_interval
 
-    def stop(self) -> None:
-        """
-        Preform thread shutdown.
-
-        :return:
-        """
-        self.keep_running = False
-
     def rename_item(
             self,
             item_id: int,
@@ -276,401 +273,44 @@ class MaintenanceBot(threading.Thread, MaintenanceBotAPI):
 
             pass
 
-    def run(self):
-        while self.keep_running:
-
-            try:
-                time.sleep(self.interval)  # Limit to one record to update every two seconds
-                try:
-                    table, row_id = self.main_table_queue.get_nowait()
-                except Queue.Empty:
-                    continue
-                print("table", table, "row_id", row_id)
-            except Exception as e:
-                debug_str = "Happens during interpreter shutdown - MetadataBackupThread has exited as expected"
-                default_log.log_exception(debug_str, e, "DEBUG")
-                break
-
-            if not self.keep_running:
-                break
-
 
 # ----------------------------------------------------------------------------------------------------------------------
-# - TRIGGERS TO UPDATE THE TITLES_AGGREGATE TABLE - INTENDED TO BE RUN IN A SEPERATE THREAD
+# - TITLES_AGGREGATE - RECOMPUTED IN BATCHES BY THE MAINTENANCE BOT
 # ----------------------------------------------------------------------------------------------------------------------
 
 
-def run_ta_updates(ta_row_id_list, database_driver):
+def run_ta_updates(ta_row_id_list, database):
     """
-    Launches the ta_trigger thread.
+    Recompute the titles_aggregate rows for the given titles - in a single write transaction on the database.
 
-    :param ta_row_id_list:
-    :param database:
+    :param ta_row_id_list: Ids of titles
+    :param database: Database to update
     :return:
     """
-    ta_row_id_list = deepcopy(ta_row_id_list)
-    database = Database()
-    ta_trigger_thread = threading.Thread(name="ta_update_thread", target=ta_trigger, args=(ta_row_id_list, database))
-    ta_trigger_thread.setDaemon(True)
-    LiuXin_debug_print("run_ta_update starting")
-    ta_trigger_thread.start()
-    LiuXin_debug_print("run_ta_update away")
+    with database.driver_wrapper.write_transaction() as conn:
+        update_titles_aggregate(conn, ta_row_id_list)
 
 
 def ta_trigger(ta_row_id_list, database):
     """
-    Takes a list of ta_row_ids. Fills in the derived quantities which have not already been filled in.
+    Takes a list of ta_row_ids. Recomputes every derived quantity for them - with a few set based statements.
     :param ta_row_id_list:
     :param database:
     :return:
     """
     if VERBOSE_DEBUG:
         LiuXin_debug_print("ta_trigger_started.")
-
-    populate_ta_creators_tags(ta_row_id_list, database)
-    populate_ta_title_tags(ta_row_id_list, database)
-    populate_ta_series_tags(ta_row_id_list, database)
-    populate_ta_series_aggregate(ta_row_id_list, database)
-    populate_ta_genre_aggregate(ta_row_id_list, database)
-    populate_ta_identifiers_aggregate(ta_row_id_list, database)
-    populate_ta_publishers_aggregate(ta_row_id_list, database)
-
-
-# Implements the logic of a trigger in Python.
-# While much less efficient, does allow for multi-threading.
-# Which should hopefully make it faster/allow it to be done later
-def populate_ta_creators_tags(ta_row_id_list, database):
-    """
-    Populates the ta_creators_tags field.
-    Meant to be run in a separate thread, so as to not way the database down further with more triggers.
-    :param ta_row_id_list: A list of title/ta ids
-    :return None: All changes are made internally to the database.
-    """
-    # If the database is None, using the default database
-    if database is None:
-        database = Database()
-    ta_row_id_list = deepcopy(ta_row_id_list)
-
-    # This should be the id of a title in the titles table.
-    # - use it to find all the creator ids associated with this title.
-    # - then find all the tags associated to those creators.
-    # - put all of them in a single set, and write that set out to the database
-    for title_row_id in ta_row_id_list:
-
-        # Accumulating the creators linked to the title
-        creator_title_row_dicts = database.search_table_row_dict(
-            table="creator_title_links",
-            column="creator_title_link_title_id",
-            search_term=title_row_id,
-        )
-        creator_ids = set()
-        for link_row_dict in creator_title_row_dicts:
-            creator_ids.add(link_row_dict["creator_title_link_creator_id"])
-
-        # Accumulating the tags linked to all those creators
-        tags = set()
-        for creator_id in creator_ids:
-
-            tag_ids = set()
-            creator_tag_row_dicts = database.search_table_row_dict(
-                table="creator_tag_links",
-                column="creator_tag_link_creator_id",
-                search_term=creator_id,
-            )
-
-            for creator_tag_link in creator_tag_row_dicts:
-                tag_ids.add(creator_tag_link["creator_tag_link_tag_id"])
-
-            for tag_id in tag_ids:
-                tag_row_dict = database.get_row_from_id(table="tags", row_id=tag_id, row_dict_return=True)
-                tags.add(tag_row_dict["tag"])
-
-        ta_update_dict = {"ta_title_id": title_row_id, "ta_creators_tags": tags}
-        database.update_row_dict(ta_update_dict)
-
-
-# Populates a list of the tags associated to a title
-def populate_ta_title_tags(ta_row_id_list, database):
-    """
-    Takes a list of title_ids - searches the database for tags linked to those titles. Builds a set of all these tags
-    and updates the ta_tags column with them.
-    :param ta_row_id_list:
-    :param database:
-    :return:
-    """
-    if database is None:
-        database = Database()
-    ta_row_id_list = deepcopy(ta_row_id_list)
-
-    # Should be a list of ids of a title in the titles table
-    # - use it to find all the tags associated with this title
-    # - build a set of these tags and write it to the database
-    for title_row_id in ta_row_id_list:
-
-        tag_ids = set()
-        tag_title_row_dicts = database.search_table_row_dict(
-            table="tag_title_links",
-            column="tag_title_link_title_id",
-            search_term=title_row_id,
-        )
-        for tag_title_link in tag_title_row_dicts:
-            tag_ids.add(tag_title_link["tag_title_link_tag_id"])
-
-        tags = set()
-        for tag_id in tag_ids:
-            tag_row_dict = database.get_row_from_id(table="tags", row_id=tag_id, row_dict_return=True)
-            tags.add(tag_row_dict["tag"])
-
-        ta_update_dict = {"ta_title_id": title_row_id, "ta_tags": tags}
-        database.update_row_dict(ta_update_dict)
-
-
-def populate_ta_series_tags(ta_row_id_list, database):
-    """
-    Populates the ta_series_tags column.
-    This is populated by scanning all the series above this one in the series tree - finding all the tags assocated with
-    them and building a set of all of them.
-    :param ta_row_id_list:
-    :param database:
-    :return:
-    """
-    if database is None:
-        database = Database()
-    ta_row_id_list = deepcopy(ta_row_id_list)
-
-    # Should be a list of ids to the titles table
-    # - uses it to find the liner row index associated with every series associated to the title
-    # - builds a set of these tags and writes them into the database
-    for title_row_id in ta_row_id_list:
-
-        # Builds a collection of all series_ids associated with this title_row_id
-        series_ids = set()
-        series_title_link_dicts = database.search_table_row_dict(
-            table="series_title_links",
-            column="series_title_link_title_id",
-            search_term=title_row_id,
-        )
-        for link_dict in series_title_link_dicts:
-            series_ids.add(link_dict["series_title_link_series_id"])
-
-        # Uses those series ids to build a linear list of rows back to the root series. Gets the ids of every series in
-        # that linear list - these will be used to populate the full tags fields
-        all_series_ids = set()
-        for series_id in series_ids:
-            all_series_ids.add(series_id)
-            current_series_row_dict = database.get_row_from_id(table="series", row_id=series_id)
-            linear_row_list = database.get_linear_row_index(start_row=current_series_row_dict, row_dict_return=True)
-            for series_row in linear_row_list:
-                all_series_ids.add(series_row["series_id"])
-
-        # Iterates through the series_ids and collects all the tag_ids associated with them
-        tag_ids = set()
-        for series_id in all_series_ids:
-
-            series_tag_link_dicts = database.search_table_row_dict(
-                table="series_tag_links",
-                column="series_tag_link_series_id",
-                search_term=series_id,
-            )
-            for link in series_tag_link_dicts:
-                tag_ids.add(link["series_tag_link_tag_id"])
-
-        # Takes the tag_ids and retrieves the actual tags - saves them in a set and updates the database
-        tags = set()
-        for tag_id in tag_ids:
-            tag_row = database.get_row_from_id(table="tags", row_id=tag_id, row_dict_return=True)
-            tags.add(tag_row["tag"])
-
-        # If there are no tags set, then there is no reason to continue
-        if tags:
-            ta_update_dict = {"ta_title_id": title_row_id, "ta_series_tags": tags}
-            database.update_row_dict(ta_update_dict)
+    run_ta_updates(ta_row_id_list, database)
 
 
-def populate_ta_series_aggregate(ta_row_id_list, database):
+def rebuild_ta(database):
     """
-    Builds a series aggregate - a string containing all the series the title row associated with that id is linked to.
-    :param ta_row_id_list: A list of title_ids in the title_aggregate table to update
+    Recompute titles_aggregate for the entire library - for after bulk changes, or if the table has drifted.
     :param database:
-    :return None: Changes are made purely internally to the database
+    :return: The number of titles updated
     """
-    if database is None:
-        database = Database()
-    ta_row_id_list = deepcopy(ta_row_id_list)
-
-    # Should be a list of ids in the title table
-    # - Gets a string representation of every series tree the title is linked to. Puts them together to produce a
-    # representation of every series the title is linked to
-    for title_row_id in ta_row_id_list:
-
-        series_title_link_dicts = database.search_table_row_dict(
-            table="series_title_links",
-            column="series_title_link_title_id",
-            search_term=title_row_id,
-        )
-        series_title_link_dicts = sorted(series_title_link_dicts, key=lambda x: x["series_title_link_priority"])
-
-        series_ids = []
-        for link_dict in series_title_link_dicts:
-            series_ids.append(link_dict["series_title_link_series_id"])
-
-        series_reps = []
-        for series_id in series_ids:
-
-            series_row_dict = database.get_row_from_id(table="series", row_id=series_id, row_dict_return=True)
-            series_linear_column_list = database.get_linear_index_of_columns(
-                start_row=series_row_dict, display_column="series"
-            )
-            series_linear_str = ":".join(series_linear_column_list)
-            series_reps.append(series_linear_str)
-
-        full_series_str = " & ".join(series_reps)
-
-        if full_series_str:
-            ta_update_dict = {
-                "ta_title_id": title_row_id,
-                "ta_series_aggregate": full_series_str,
-            }
-            database.update_row_dict(ta_update_dict)
-
-
-def populate_ta_genre_aggregate(ta_row_id_list, database):
-    """
-    Builds a genre aggregate - the genre table has a tree like structure with genres and sub genres. Additionally
-    :param ta_row_id_list:
-    :param database:
-    :return:
-    """
-    if database is None:
-        database = Database()
-    ta_row_id_list = deepcopy(ta_row_id_list)
-    # Should be a list of the ides in the title table
-    # - Produces a string representation of every genre tree that the title is linked to (ordered by priority)
-    # - Then updates the given title_ids in the title aggregate table with that information
-    for title_row_id in ta_row_id_list:
-
-        genre_title_link_dicts = database.search_table_row_dict(
-            table="genre_title_links",
-            column="genre_title_link_title_id",
-            search_term=title_row_id,
-        )
-        genre_title_link_dicts = sorted(genre_title_link_dicts, key=lambda x: x["genre_title_link_priority"])
-
-        genre_ids = []
-        for link_dict in genre_title_link_dicts:
-            genre_ids.append(link_dict["genre_title_link_genre_id"])
-
-        genre_reps = []
-        for genre_id in genre_ids:
-            genre_row_dict = database.get_row_from_id(table="genres", row_id=genre_id, row_dict_return=True)
-            genre_linear_column_list = database.get_linear_index_of_columns(
-                start_row=genre_row_dict, display_column="genre"
-            )
-            genre_linear_str = ":".join(genre_linear_column_list)
-            genre_reps.append(genre_linear_str)
-
-        full_genre_str = " & ".join(genre_reps)
-
-        if full_genre_str:
-            ta_update_dict = {
-                "ta_title_id": title_row_id,
-                "ta_genre_aggregate": full_genre_str,
-            }
-            database.update_row_dict(ta_update_dict)
-
-
-def populate_ta_identifiers_aggregate(ta_row_id_list, database):
-    """
-    Builds a genre aggregate - the genre table has a tree like structure with genres and sub genres. Additionally
-    :param ta_row_id_list:
-    :param database:
-    :return:
-    """
-    if database is None:
-        database = Database()
-    ta_row_id_list = deepcopy(ta_row_id_list)
-
-    # - Searchs the identifier_title link table for any instance of the given title_id
-    # - filters the results and converts them into a dictionary
-    # - writes the dictionary back out to the database
-    for title_id in ta_row_id_list:
-
-        identifier_ids = set()
-        id_title_links = database.search_table_row_dict(
-            table="identifier_title_links",
-            column="identifier_title_link_title_id",
-            search_term=title_id,
-        )
-        for link_row in id_title_links:
-            identifier_ids.add(link_row["identifier_title_link_identifier_id"])
-
-        title_ids_dict = dict()
-        for identifier_id in identifier_ids:
-            identifier_row_dict = database.get_row_from_id(
-                table="identifiers", row_id=identifier_id, row_dict_return=True
-            )
-            identifier_type = deepcopy(identifier_row_dict["identifier_type"])
-            identifier_type = identifier_type.upper().strip()
-            if identifier_type not in title_ids_dict:
-                title_ids_dict[identifier_type] = set()
-                title_ids_dict[identifier_type].add(identifier_row_dict["identifier"])
-            else:
-                title_ids_dict[identifier_type].add(identifier_row_dict["identifier"])
-
-        if title_ids_dict:
-            ta_update_dict = {
-                "ta_title_id": title_id,
-                "ta_identifiers": title_ids_dict,
-            }
-            database.update_row_dict(ta_update_dict)
-
-
-def populate_ta_publishers_aggregate(ta_row_id_list, database):
-    """
-    Builds a genre aggregate - the genre table has a tree like structure with genres and sub genres. Additionally
-    :param ta_row_id_list:
-    :param database:
-    :return:
-    """
-    if database is None:
-        database = Database()
-    ta_row_id_list = deepcopy(ta_row_id_list)
-    # Should be a list of the ides in the title table
-    # - Produces a string representation of every publisher tree that the title is linked to (ordered by priority)
-    # - Then updates the given title_ids in the title aggregate table with that information
-    for title_row_id in ta_row_id_list:
-
-        publisher_title_link_dicts = database.search_table_row_dict(
-            table="publisher_title_links",
-            column="publisher_title_link_title_id",
-            search_term=title_row_id,
-        )
-        publisher_title_link_dicts = sorted(
-            publisher_title_link_dicts,
-            key=lambda x: x["publisher_title_link_priority"],
-        )
-
-        publisher_ids = []
-        for link_dict in publisher_title_link_dicts:
-            publisher_ids.append(link_dict["publisher_title_link_publisher_id"])
-
-        publisher_reps = []
-        for publisher_id in publisher_ids:
-            publisher_row_dict = database.get_row_from_id(table="publishers", row_id=publisher_id, row_dict_return=True)
-            publisher_linear_column_list = database.get_linear_index_of_columns(
-                start_row=publisher_row_dict, display_column="publisher"
-            )
-            publisher_linear_str = ":".join(publisher_linear_column_list)
-            publisher_reps.append(publisher_linear_str)
-
-        full_publisher_str = " & ".join(publisher_reps)
-
-        if full_publisher_str:
-            ta_update_dict = {
-                "ta_title_id": title_row_id,
-                "ta_publishers": full_publisher_str,
-            }
-            database.update_row_dict(ta_update_dict)
+    with database.driver_wrapper.write_transaction() as conn:
+        return rebuild_titles_aggregate(conn)
 
 
 def ensure_creators_sort(creator_rows):
@@ -1131,8 +771,9 @@ def find_duplicates(db, table, column, comparison="nocase"):
     else:
         comparison_func = comparison
 
-    for table_row in db.driver_wrapper.get_all_rows(table=table):
-        table_id_column = db.driver_wrapper.get_id_column(table=table)
+    # Stream just the two columns needed - rather than building a row_dict for every row in the table
+    table_id_column = db.driver_wrapper.get_id_column(table=table)
+    for table_row in db.driver_wrapper.stream_rows(table=table, columns=(table_id_column, column)):
         row_id = table_row[table_id_column]
         row_value = table_row[column]
         hashed_row_value = comparison_func(row_value)
@@ -0,0 +1,163 @@
+"""
+A cache of search results which knows the fields each query read.
+
+The search cache used to hold the last 50 queries - and was emptied whenever an edit touched more than a handful of
+books. Each entry here records the fields the parse read (the locations Parser.get_matches was asked about), so when
+the fields a write changed are known only the queries which read them need to go - the results of every other query
+can't have changed. The cache is bounded by an estimate of the memory its results take, not by a count of entries.
+"""
+
+from __future__ import print_function
+
+import sys
+import threading
+from collections import OrderedDict
+
+from typing import Iterable, Optional
+
+
+# Recorded for queries which read every field ("all", composite columns ...) - invalidated by any change
+ALL_FIELDS = "all"
+
+
+def result_nbytes(query, result):
+    """
+    An estimate of the memory an entry holds - the set (its table), the ids not shared with the rest of the cache, and
+    the query.
+    """
+    return sys.getsizeof(result) + 28 * len(result) + sys.getsizeof(query)
+
+
+class ResultCache(object):
+    """
+    LRU cache of query -> set of book ids - with the fields read to get the result.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        """
+        :param max_bytes: Evict the least recently used entries to keep (an estimate of) the memory held under this
+        """
+        self.max_bytes = max_bytes
+        # Query -> [result, fields, nbytes]
+        self._entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, query):
+        with self._lock:
+            return query in self._entries
+
+    def __iter__(self):
+        """
+        (query, result) pairs - most recently used last.
+        """
+        with self._lock:
+            return iter([(query, entry[0]) for query, entry in self._entries.items()])
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # - LOOKUP
+
+    def get(self, query, default=None):
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(query)
+            return entry[0]
+
+    def fields(self, query):
+        """
+        The fields read to get the cached result for a query - None if it isn't cached.
+        """
+        with self._lock:
+            entry = self._entries.get(query)
+            return None if entry is None else entry[1]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # - MAINTENANCE
+
+    def add(self, query, result, fields: Iterable[str] = (ALL_FIELDS,)):
+        """
+        Cache the result of a query.
+        :param query:
+        :param result: Set of book ids
+        :param fields: The fields read to get the result
+        :return:
+        """
+        nbytes = result_nbytes(query, result)
+        with self._lock:
+            self._pop(query)
+            if nbytes > self.max_bytes:
+                self.evictions += 1
+                return
+            self._entries[query] = [result, frozenset(fields), nbytes]
+            self.nbytes += nbytes
+            self._evict()
+
+    def resized(self, query):
+        """
+        Note that a cached result has been changed in place - so its size is worked out again.
+        """
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is not None:
+                nbytes = result_nbytes(query, entry[0])
+                self.nbytes += nbytes - entry[2]
+                entry[2] = nbytes
+                self._evict()
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self._entries:
+            query, entry = self._entries.popitem(last=False)
+            self.nbytes -= entry[2]
+            self.evictions += 1
+
+    def _pop(self, query):
+        entry = self._entries.pop(query, None)
+        if entry is not None:
+            self.nbytes -= entry[2]
+        return entry
+
+    def pop(self, query, default=None):
+        with self._lock:
+            entry = self._pop(query)
+            return default if entry is None else entry[0]
+
+    def invalidate(self, fields: Optional[Iterable[str]] = None):
+        """
+        Drop the results which read any of the fields.
+        :param fields: The changed fields - None to drop everything
+        :return: The number of entries dropped
+        """
+        with self._lock:
+            if fields is None:
+                dropped = list(self._entries)
+            else:
+                fields = frozenset(fields) | {ALL_FIELDS}
+                dropped = [query for query, entry in self._entries.items() if not fields.isdisjoint(entry[1])]
+            for query in dropped:
+                self._pop(query)
+            self.invalidations += len(dropped)
+            return len(dropped)
+
+    def clear(self):
+        self.invalidate()
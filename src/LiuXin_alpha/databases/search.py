@@ -12,6 +12,11 @@ from functools import partial
 from LiuXin.constants import preferred_encoding
 
 from LiuXin.databases.utils import force_to_bool
+from LiuXin_alpha.preferences import preferences
+
+from LiuXin_alpha.databases.result_cache import ALL_FIELDS, ResultCache
+from LiuXin_alpha.databases.search_index import SearchIndex
+from LiuXin_alpha.databases.search_values import SearchValues, compiled_regex
 
 from LiuXin.utils.config.config_base import prefs
 from LiuXin.utils.date import parse_date, UNDEFINED_DATE, now, dt_as_local
@@ -62,14 +67,14 @@ def _matchkind(query):
 matchkind = _matchkind
 
 
-def _match(query, value, matchkind, use_primary_find_in_search=True):
+def _matcher(query, matchkind, use_primary_find_in_search=True):
     """
-    Generates matches based on the query.
+    Builds the test for a single (already lower cased) value against the query - so the work which only depends on
+    the query (splitting off hierarchical forms, compiling regexes) is done once, not once per value.
     :param query:
-    :param value:
     :param matchkind: CONTAINS, REGEXP or EQUALS
     :param use_primary_find_in_search:
-    :return:
+    :return: Callable taking a lower cased value - True if it matches
     """
     if query.startswith(".."):
         query = query[1:]
@@ -78,37 +83,68 @@ def _match(query, value, matchkind, use_primary_find_in_search=True):
     else:
         internal_match_ok = False
 
-    for t in value:
-        # ignore regexp exceptions, required because search-ahead tries before typing is finished
-        try:
-            t = icu_lower(t)
-            if matchkind == EQUALS_MATCH:
-                if internal_match_ok:
-                    if query == t:
-                        return True
-                    comps = [c.strip() for c in t.split(".") if c.strip()]
-                    for comp in comps:
-                        if sq == comp:
-                            return True
-                elif query[0] == ".":
-                    if t.startswith(query[1:]):
-                        ql = len(query) - 1
-                        if (len(t) == ql) or (t[ql : ql + 1] == "."):
-                            return True
-                elif query == t:
-                    return True
-            elif matchkind == REGEXP_MATCH:
-                if re.search(query, t, re.I | re.UNICODE):
+    if matchkind == EQUALS_MATCH:
+        if internal_match_ok:
+
+            def test(t):
+                if query == t:
                     return True
-            elif matchkind == CONTAINS_MATCH:
-                if use_primary_find_in_search:
-                    if primary_contains(query, t):
+                for comp in t.split("."):
+                    if sq and sq == comp.strip():
                         return True
-                elif query in t:
-                    return True
-        except re.error:
-            pass
+                return False
+
+        elif query.startswith("."):
+            parent = query[1:]
+            ql = len(parent)
 
+            def test(t):
+                return t.startswith(parent) and (len(t) == ql or t[ql : ql + 1] == ".")
+
+        else:
+
+            def test(t):
+                return query == t
+
+    elif matchkind == REGEXP_MATCH:
+        # ignore regexp exceptions, required because search-ahead tries before typing is finished
+        pat = compiled_regex(query)
+        if pat is None:
+            return lambda t: False
+        search = pat.search
+
+        def test(t):
+            return search(t) is not None
+
+    elif matchkind == CONTAINS_MATCH:
+        if use_primary_find_in_search:
+
+            def test(t):
+                return bool(primary_contains(query, t))
+
+        else:
+
+            def test(t):
+                return query in t
+
+    else:
+        return lambda t: False
+    return test
+
+
+def _match(query, value, matchkind, use_primary_find_in_search=True):
+    """
+    Generates matches based on the query.
+    :param query:
+    :param value:
+    :param matchkind: CONTAINS, REGEXP or EQUALS
+    :param use_primary_find_in_search:
+    :return:
+    """
+    test = _matcher(query, matchkind, use_primary_find_in_search=use_primary_find_in_search)
+    for t in value:
+        if test(icu_lower(t)):
+            return True
     return False
 
 
@@ -572,8 +608,14 @@ class Parser(SearchQueryParser):  # {{{
         virtual_fields,
         lookup_saved_search,
         parse_cache,
+        search_index=None,
+        search_values=None,
     ):
         self.dbcache, self.all_book_ids = dbcache, all_book_ids
+        self.search_index = search_index
+        self.search_values = search_values
+        # The fields read by the last parse - so cached results can be dropped when they change
+        self.fields_read = set()
         self.all_search_locations = frozenset(locations)
         self.grouped_search_terms = gst
         self.date_search, self.num_search = date_search, num_search
@@ -613,8 +655,44 @@ class Parser(SearchQueryParser):  # {{{
         for x in ():
             yield x, set()
 
+    def searchable_items_table(self, location):
+        """
+        The table of a field whose searchable values are the items in its id_map - so the folded values can be cached
+        per item, and matched once each.
+        :param location:
+        :return: The table - or None if the field's values have to be read through iter_searchable_values
+        """
+        if self.search_values is None or location in self.virtual_fields:
+            return None
+        field = self.dbcache.fields.get(location)
+        if field is None or not getattr(field, "searchable_items", False):
+            return None
+        table = field.table
+        if not hasattr(table, "id_map") or not hasattr(table, "col_book_map"):
+            return None
+        return table
+
+    def index_candidates(self, location, query, matchkind):
+        """
+        Narrow the candidates for a text search with the inverted index for the location - if it has one.
+        :param location:
+        :param query: The query - as returned by _matchkind
+        :param matchkind:
+        :return: The books which might match - or None if they can't be narrowed
+        """
+        if self.search_index is None or location not in self.search_index:
+            return None
+        if matchkind == REGEXP_MATCH or location in self.dbcache.composites:
+            return None
+        read_all = partial(self.field_iter, location, self.dbcache._all_book_ids(type=set))
+        index = self.search_index.field_index(location, read_all)
+        if matchkind == EQUALS_MATCH:
+            return index.equals_candidates(query)
+        return index.contains_candidates(query[1:] if query.startswith("..") else query)
+
     def parse(self, *args, **kwargs):
         self.virtual_field_used = False
+        self.fields_read = set()
         return SearchQueryParser.parse(self, *args, **kwargs)
 
     def get_matches(self, location, query, candidates=None, allow_recursion=True):
@@ -685,6 +763,9 @@ class Parser(SearchQueryParser):  # {{{
                         pass
                 return matches
 
+        # Composite columns are rendered from other fields - so could depend on any of them
+        self.fields_read.add(ALL_FIELDS if location in self.dbcache.composites else location)
+
         upf = prefs["use_primary_find_in_search"]
 
         if location in self.field_metadata:
@@ -834,12 +915,29 @@ class Parser(SearchQueryParser):  # {{{
                 if location in ["cover", "covers"]:
                     continue
 
-                for val, book_ids in self.field_iter(location, current_candidates):
+                search_candidates = current_candidates
+                narrowed = self.index_candidates(location, q, matchkind)
+                if narrowed is not None:
+                    search_candidates = current_candidates.intersection(narrowed)
+                    if not search_candidates:
+                        continue
+
+                test = _matcher(q, matchkind, use_primary_find_in_search=upf)
+                table = self.searchable_items_table(location)
+                if table is not None:
+                    matches |= self.search_values.matching_books(
+                        location, table.id_map, table.col_book_map, test, search_candidates
+                    )
+                    continue
+
+                for val, book_ids in self.field_iter(location, search_candidates):
                     if val is not None:
                         if isinstance(val, basestring):
                             val = (val,)
-                        if _match(q, val, matchkind, use_primary_find_in_search=upf):
-                            matches |= book_ids
+                        for t in val:
+                            if test(icu_lower(t)):
+                                matches |= book_ids
+                                break
 
         return matches
 
@@ -937,7 +1035,8 @@ class Search(object):
     Represents a search of the database.
     """
 
-    MAX_CACHE_UPDATE = 50
+    # Most (changed books * cached queries) to patch the cached results for - rather than dropping them
+    MAX_CACHE_UPDATE = 5000
 
     def __init__(self, db, opt_name, all_search_locations=()):
         self.all_search_locations = all_search_locations
@@ -946,8 +1045,16 @@ class Search(object):
         self.bool_search = BooleanSearch()
         self.keypair_search = KeyPairSearch()
         self.saved_searches = SavedSearchQueries(db, opt_name)
-        self.cache = LRUCache()
+        self.cache = ResultCache(max_bytes=preferences.parse("search_cache_mb", "int", 64) * 1024 * 1024)
         self.parse_cache = LRUCache(limit=100)
+        # Inverted indexes narrowing text searches on these fields - see search_index
+        try:
+            index_fields = preferences["search_index_fields"]
+        except KeyError:
+            index_fields = ()
+        self.search_index = SearchIndex(index_fields or ())
+        # Case folded values of the items of each field searched - see search_values
+        self.search_values = SearchValues(icu_lower)
 
     def get_saved_searches(self):
         return self.saved_searches
@@ -958,12 +1065,33 @@ class Search(object):
             self.parse_cache.clear()
         self.all_search_locations = newlocs
 
-    def update_or_clear(self, dbcache, book_ids=None):
-        if book_ids and (len(book_ids) * len(self.cache)) <= self.MAX_CACHE_UPDATE:
+    def update_or_clear(self, dbcache, book_ids=None, fields=None):
+        """
+        Bring the caches up to date after a change.
+        :param dbcache:
+        :param book_ids: The changed books - everything is dropped if None
+        :param fields: The changed fields - if None, every cached result is patched for the books
+        :return:
+        """
+        if not book_ids:
+            self.search_index.clear()
+            self.search_values.invalidate()
+            self.clear_caches()
+            return
+
+        self.search_index.update_books(book_ids, partial(self._searchable_values, dbcache), fields=fields)
+        if fields is not None:
+            # The results of queries which didn't read any of the fields can't have changed
+            self.cache.invalidate(fields)
+        elif (len(book_ids) * len(self.cache)) <= self.MAX_CACHE_UPDATE:
             self.update_caches(dbcache, book_ids)
         else:
             self.clear_caches()
 
+    @staticmethod
+    def _searchable_values(dbcache, field, book_ids):
+        return dbcache.fields[field].iter_searchable_values(dbcache._get_proxy_metadata, book_ids)
+
     def clear_caches(self):
         self.cache.clear()
 
@@ -976,8 +1104,10 @@ class Search(object):
 
     def discard_books(self, book_ids):
         book_ids = set(book_ids)
+        self.search_index.discard_books(book_ids)
         for query, result in self.cache:
             result.difference_update(book_ids)
+            self.cache.resized(query)
 
     def _update_caches(self, sqp, book_ids):
         book_ids = sqp.all_book_ids = set(book_ids)
@@ -992,6 +1122,7 @@ class Search(object):
                 result.difference_update(book_ids - matches)
                 # add books that now match but did not before
                 result.update(matches)
+                self.cache.resized(query)
         for query in remove:
             self.cache.pop(query)
 
@@ -1010,6 +1141,8 @@ class Search(object):
             virtual_fields,
             self.saved_searches.lookup,
             self.parse_cache,
+            search_index=self.search_index,
+            search_values=self.search_values,
         )
 
     def __call__(self, dbcache, query, search_restriction, virtual_fields=None, book_ids=None):
@@ -1042,10 +1175,12 @@ class Search(object):
             query = query.decode("utf-8")
 
         query = query.strip()
+        looked_up = False
         if book_ids is None and query and not search_restriction:
             cached = self.cache.get(query)
             if cached is not None:
                 return cached
+            looked_up = True
 
         restricted_ids = all_book_ids = dbcache._all_book_ids(type=set)
         if search_restriction and search_restriction.strip():
@@ -1054,7 +1189,7 @@ class Search(object):
                 sqp.all_book_ids = all_book_ids if book_ids is None else book_ids
                 restricted_ids = sqp.parse(search_restriction)
                 if not sqp.virtual_field_used and sqp.all_book_ids is all_book_ids:
-                    self.cache.add(search_restriction.strip(), restricted_ids)
+                    self.cache.add(search_restriction.strip(), restricted_ids, sqp.fields_read)
             else:
                 restricted_ids = cached
                 if book_ids is not None:
@@ -1065,7 +1200,7 @@ class Search(object):
         if not query:
             return restricted_ids
 
-        if restricted_ids is all_book_ids:
+        if restricted_ids is all_book_ids and not looked_up:
             cached = self.cache.get(query)
             if cached is not None:
                 return cached
@@ -1074,7 +1209,7 @@ class Search(object):
         result = sqp.parse(query)
 
         if not sqp.virtual_field_used and sqp.all_book_ids is all_book_ids:
-            self.cache.add(query, result)
+            self.cache.add(query, result, sqp.fields_read)
 
         return result
 
@@ -0,0 +1,259 @@
+"""
+Inverted indexes over the values of searchable fields - used to narrow the candidates for a search.
+
+Searching a text field used to mean matching the query against the value of every candidate book. For each indexed
+field this keeps
+    - the case folded values of each book
+    - trigram -> the values containing the trigram (for contains searches)
+    - token -> the values containing the token (for equals searches - including the hierarchical forms)
+so the books which can possibly match are found from the postings. The index is only a filter - the books it returns
+are still checked against the query in full - so it never has to reproduce the matching rules exactly. It just must
+never miss a book which would have matched.
+
+Values which are not plain ASCII once folded could match in ways the folding doesn't capture (primary collation
+treats many accented letters as their base letter) - so they're never filtered out.
+"""
+
+from __future__ import print_function
+
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+
+from typing import Callable, Iterable, Optional
+
+
+_TOKEN_PAT = re.compile(r"\w+", re.UNICODE)
+
+
+def fold(value):
+    """
+    Case fold a value - and strip any accents.
+    :param value:
+    :return:
+    """
+    if value.isascii():
+        return value.lower()
+    value = unicodedata.normalize("NFKD", value.casefold())
+    return "".join(c for c in value if not unicodedata.combining(c))
+
+
+def trigrams(value):
+    """
+    The distinct three character substrings of a value.
+    """
+    return {value[i : i + 3] for i in range(len(value) - 2)}
+
+
+def tokens(value):
+    """
+    The distinct words in a value.
+    """
+    return set(_TOKEN_PAT.findall(value))
+
+
+class FieldIndex(object):
+    """
+    Trigram and token postings for the values of a single field.
+    """
+
+    def __init__(self):
+        # Folded value -> the books with it
+        self.value_books = dict()
+        # Book id -> its folded values
+        self.book_values = dict()
+        self.trigram_values = defaultdict(set)
+        self.token_values = defaultdict(set)
+        # Folded values which aren't ASCII - and so are never filtered out
+        self.unindexed = set()
+
+    def __len__(self):
+        return len(self.value_books)
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # - MAINTENANCE
+
+    def _add_value(self, value):
+        if not value.isascii():
+            self.unindexed.add(value)
+            return
+        for trigram in trigrams(value):
+            self.trigram_values[trigram].add(value)
+        for token in tokens(value):
+            self.token_values[token].add(value)
+
+    def _remove_value(self, value):
+        if value in self.unindexed:
+            self.unindexed.discard(value)
+            return
+        for postings, keys in ((self.trigram_values, trigrams(value)), (self.token_values, tokens(value))):
+            for key in keys:
+                values = postings.get(key)
+                if values is not None:
+                    values.discard(value)
+                    if not values:
+                        del postings[key]
+
+    def add(self, value, book_ids):
+        """
+        Note that the books have the value.
+        :param value: Raw (not folded) value
+        :param book_ids:
+        :return:
+        """
+        if not value:
+            return
+        folded = fold(value)
+        books = self.value_books.get(folded)
+        if books is None:
+            books = self.value_books[folded] = set()
+            self._add_value(folded)
+        books.update(book_ids)
+        for book_id in book_ids:
+            self.book_values.setdefault(book_id, set()).add(folded)
+
+    def discard_books(self, book_ids):
+        """
+        Remove the books from the index.
+        :param book_ids:
+        :return:
+        """
+        for book_id in book_ids:
+            for folded in self.book_values.pop(book_id, ()):
+                books = self.value_books.get(folded)
+                if books is None:
+                    continue
+                books.discard(book_id)
+                if not books:
+                    del self.value_books[folded]
+                    self._remove_value(folded)
+
+    def set_books(self, book_ids, searchable_values):
+        """
+        Replace the values of some books.
+        :param book_ids: The books to replace - books which no longer have a value are dropped from the index
+        :param searchable_values: Iterable of (value, book_ids) for the books - as iter_searchable_values gives
+        :return:
+        """
+        book_ids = set(book_ids)
+        self.discard_books(book_ids)
+        for value, value_book_ids in searchable_values:
+            for v in _values(value):
+                self.add(v, book_ids.intersection(value_book_ids))
+
+    # ------------------------------------------------------------------------------------------------------------------
+    # - LOOKUP
+
+    def _books_for(self, values):
+        books = set()
+        for value in values:
+            books.update(self.value_books.get(value, ()))
+        return books
+
+    def _intersect(self, postings, keys):
+        values = None
+        for key in sorted(keys, key=lambda k: len(postings.get(k, ()))):
+            found = postings.get(key)
+            if not found:
+                return set()
+            values = set(found) if values is None else values.intersection(found)
+            if not values:
+                break
+        return values
+
+    def contains_candidates(self, query):
+        """
+        Books which might contain the query.
+        :param query:
+        :return: Set of book ids - or None if the index can't narrow the search (short or non ASCII queries)
+        """
+        query = fold(query)
+        if len(query) < 3 or not query.isascii():
+            return None
+        values = {value for value in self._intersect(self.trigram_values, trigrams(query)) if query in value}
+        return self._books_for(values | self.unindexed)
+
+    def equals_candidates(self, query):
+        """
+        Books which might have a value equal to the query - or, for the hierarchical forms (.parent and ..child), a
+        value with a component equal to it.
+        :param query: The query - with the leading = removed
+        :return: Set of book ids - or None if the index can't narrow the search
+        """
+        query = fold(query.lstrip("."))
+        query_tokens = tokens(query)
+        if not query_tokens or not query.isascii():
+            return None
+        return self._books_for(self._intersect(self.token_values, query_tokens) | self.unindexed)
+
+
+def _values(value):
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        return (value,)
+    return [v for v in value if isinstance(v, str)]
+
+
+class SearchIndex(object):
+    """
+    A FieldIndex for each of a set of fields - built the first time each field is searched.
+    """
+
+    def __init__(self, fields: Iterable[str] = ()):
+        """
+        :param fields: The fields to index
+        """
+        self.fields = frozenset(fields)
+        self._indexes = dict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, field):
+        return field in self.fields
+
+    def field_index(self, field: str, read_all: Callable) -> Optional[FieldIndex]:
+        """
+        The index for a field - building it if needed.
+        :param field:
+        :param read_all: Called for an iterable of (value, book_ids) covering every book - if the index needs building
+        :return: None if the field isn't indexed
+        """
+        if field not in self.fields:
+            return None
+        with self._lock:
+            index = self._indexes.get(field)
+            if index is None:
+                index = FieldIndex()
+                for value, book_ids in read_all():
+                    for v in _values(value):
+                        index.add(v, book_ids)
+                self._indexes[field] = index
+            return index
+
+    def update_books(self, book_ids, read: Callable, fields: Optional[Iterable[str]] = None):
+        """
+        Re-read the values of some books for every index which has been built.
+        :param book_ids:
+        :param read: Called with (field, book_ids) for an iterable of (value, book_ids) for the books
+        :param fields: The fields which changed - if known, only their indexes are re-read
+        :return:
+        """
+        book_ids = set(book_ids)
+        with self._lock:
+            for field, index in self._indexes.items():
+                if fields is None or field in fields:
+                    index.set_books(book_ids, read(field, book_ids))
+
+    def discard_books(self, book_ids):
+        book_ids = set(book_ids)
+        with self._lock:
+            for index in self._indexes.values():
+                index.discard_books(book_ids)
+
+    def clear(self):
+        """
+        Drop every index - they're built again as they're needed.
+        """
+        with self._lock:
+            self._indexes.clear()
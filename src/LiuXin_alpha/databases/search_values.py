@@ -0,0 +1,155 @@
+"""
+Pre-normalized values for text searches on fields backed by an item table (tags, series, publishers ...).
+
+Matching a text query used to lower case every stored value on every query - and to recompile regexes for each value.
+For fields where the values live in the table's id_map (item id -> value) this keeps
+    - item id -> (raw value, folded value) for each field - built the first time the field is searched
+    - the compiled regex for each recent query
+and matches each item once, only then mapping the matching items to their books through col_book_map. Previously
+every item's books were intersected with the candidates before its value was even looked at.
+
+Cached entries are checked against the raw value in the id_map before use - so a renamed item is folded again without
+the cache having to be told. Invalidation is only needed to free memory when items go away (or the library reloads).
+"""
+
+from __future__ import print_function
+
+import re
+import threading
+from functools import lru_cache
+
+from typing import Callable, Optional
+
+
+# The number of compiled regexes to keep around - search-ahead runs a new query for every key press
+REGEX_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=REGEX_CACHE_SIZE)
+def compiled_regex(query):
+    """
+    The compiled (case insensitive) regex for a query.
+    :param query:
+    :return: None if the query isn't a valid regex - search-ahead runs queries before typing has finished
+    """
+    try:
+        return re.compile(query, re.I | re.UNICODE)
+    except re.error:
+        return None
+
+
+class FoldedValues(object):
+    """
+    Item id -> folded value for a single field.
+    """
+
+    def __init__(self, fold: Callable):
+        """
+        :param fold: Called with a raw value for the folded form to match against
+        """
+        self.fold = fold
+        # Item id -> (raw value, folded value)
+        self._entries = dict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def matching_items(self, id_map, predicate: Callable):
+        """
+        The items whose folded value matches - folding any values which are new (or have changed) as it goes.
+        :param id_map: Item id -> raw value
+        :param predicate: Called with a folded value - True if it matches
+        :return: List of item ids
+        """
+        matched = []
+        fold = self.fold
+        with self._lock:
+            entries = self._entries
+            if len(entries) > len(id_map):
+                # Items have been removed since the cache was filled
+                for item_id in [item_id for item_id in entries if item_id not in id_map]:
+                    del entries[item_id]
+            for item_id, raw in id_map.items():
+                entry = entries.get(item_id)
+                if entry is None or (entry[0] is not raw and entry[0] != raw):
+                    entry = entries[item_id] = (raw, fold(raw) if raw is not None else None)
+                folded = entry[1]
+                if folded is not None and predicate(folded):
+                    matched.append(item_id)
+        return matched
+
+    def invalidate(self, item_ids=None):
+        """
+        Drop cached values.
+        :param item_ids: The items to drop - all of them if None
+        :return:
+        """
+        with self._lock:
+            if item_ids is None:
+                self._entries.clear()
+            else:
+                for item_id in item_ids:
+                    self._entries.pop(item_id, None)
+
+
+def books_for_items(item_ids, col_book_map, candidates):
+    """
+    The candidate books linked to any of the items.
+    :param item_ids:
+    :param col_book_map: Item id -> the ids of the books linked to it
+    :param candidates:
+    :return:
+    """
+    books = set()
+    for item_id in item_ids:
+        books.update(col_book_map.get(item_id, ()))
+    return books.intersection(candidates) if books else books
+
+
+class SearchValues(object):
+    """
+    FoldedValues for each field which has been searched.
+    """
+
+    def __init__(self, fold: Callable):
+        self.fold = fold
+        self._fields = dict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, field):
+        return field in self._fields
+
+    def field_values(self, field: str) -> FoldedValues:
+        """
+        The folded values for a field - an empty cache (filled by matching_items) if the field hasn't been searched.
+        """
+        with self._lock:
+            values = self._fields.get(field)
+            if values is None:
+                values = self._fields[field] = FoldedValues(self.fold)
+            return values
+
+    def matching_books(self, field: str, id_map, col_book_map, predicate: Callable, candidates) -> set:
+        """
+        The candidate books with a value for the field which matches.
+        :param field:
+        :param id_map: Item id -> raw value
+        :param col_book_map: Item id -> book ids
+        :param predicate: Called with a folded value - True if it matches
+        :param candidates:
+        :return:
+        """
+        item_ids = self.field_values(field).matching_items(id_map, predicate)
+        return books_for_items(item_ids, col_book_map, candidates)
+
+    def invalidate(self, fields: Optional[tuple] = None):
+        """
+        Drop the cached values for some fields - or for every field if None.
+        """
+        with self._lock:
+            if fields is None:
+                self._fields.clear()
+            else:
+                for field in fields:
+                    self._fields.pop(field, None)
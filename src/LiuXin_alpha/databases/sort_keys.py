@@ -0,0 +1,280 @@
+"""
+Cached sort key columns for sorting the books in the cache.
+
+Working out the sort key for a book (icu collation, series handling, language specific title sorts ...) is the slow
+part of sorting - so it's done once per book per field. Each key is reduced to a dense rank (equal keys share a rank,
+and ranks are in the same order as the keys) which is kept in a SortKeyColumn for the field.
+
+Sorting is then a matter of gathering the ranks for the books being sorted - and sorting on the integer ranks with
+numpy.lexsort (or a tuple key sort, if numpy isn't available) - with no sort key calculated or compared at all.
+
+Columns are invalidated per field (and per book) as the fields are written to - the keys for invalidated books are
+worked out again the next time the field is sorted on.
+"""
+
+from __future__ import print_function
+
+import threading
+from bisect import bisect_left
+
+from typing import Callable, Iterable, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# New distinct keys inserted into the sorted keys one by one - more than this are merged in a single pass
+INSERT_LIMIT = 1000
+
+
+def dense_ranks(keys):
+    """
+    Rank the keys - equal keys share a rank, and the ranks run from 0 with no gaps.
+    :param keys: List of sort keys
+    :return: (ranks, distinct) - the rank of each key, and the distinct keys in sorted order
+    """
+    ranks = [0] * len(keys)
+    distinct = []
+    for position in sorted(range(len(keys)), key=keys.__getitem__):
+        key = keys[position]
+        if not distinct or distinct[-1] < key:
+            distinct.append(key)
+        ranks[position] = len(distinct) - 1
+    return ranks, distinct
+
+
+def merge_distinct(old, new):
+    """
+    Merge two sorted lists of distinct keys.
+    :param old:
+    :param new:
+    :return: (merged, old_positions, new_positions) - old_positions is None if no keys were added to old (so every key
+             in old keeps its position)
+    """
+    if len(new) <= INSERT_LIMIT:
+        merged = list(old)
+        inserted = []
+        new_positions = []
+        for key in new:
+            # new is sorted - so each key goes in after the last one
+            position = bisect_left(merged, key, new_positions[-1] if new_positions else 0)
+            if position == len(merged) or key < merged[position]:
+                merged.insert(position, key)
+                inserted.append(position)
+            new_positions.append(position)
+        if not inserted:
+            return merged, None, new_positions
+
+        is_new = bytearray(len(merged))
+        for position in inserted:
+            is_new[position] = 1
+        old_positions = [position for position, flag in enumerate(is_new) if not flag]
+        return merged, old_positions, new_positions
+
+    merged, old_positions, new_positions = [], [], []
+    i = j = 0
+    while i < len(old) and j < len(new):
+        if old[i] < new[j]:
+            old_positions.append(len(merged))
+            merged.append(old[i])
+            i += 1
+        elif new[j] < old[i]:
+            new_positions.append(len(merged))
+            merged.append(new[j])
+            j += 1
+        else:
+            old_positions.append(len(merged))
+            new_positions.append(len(merged))
+            merged.append(old[i])
+            i += 1
+            j += 1
+    for key in old[i:]:
+        old_positions.append(len(merged))
+        merged.append(key)
+    for key in new[j:]:
+        new_positions.append(len(merged))
+        merged.append(key)
+    return merged, (old_positions if len(merged) != len(old) else None), new_positions
+
+
+class SortKeyColumn(object):
+    """
+    The rank of the sort key of each book for one field.
+
+    With numpy the ranks are held in an array indexed by book id (-1 for books without a rank) - so the ranks for a
+    sort are gathered with a single indexing operation. Otherwise they're held in a dict.
+    """
+
+    def __init__(self):
+        self._distinct = []
+        self._ranks = None
+        self.invalidate()
+
+    def __len__(self):
+        if np is None:
+            return len(self._ranks)
+        return int(np.count_nonzero(self._ranks >= 0))
+
+    def invalidate(self, book_ids=None):
+        """
+        Forget the sort keys of some books - they'll be worked out again next time they're needed.
+        :param book_ids: None for all of them
+        :return:
+        """
+        if book_ids is None:
+            self._distinct = []
+            self._ranks = dict() if np is None else np.full(0, -1, dtype=np.int64)
+        elif np is None:
+            for book_id in book_ids:
+                self._ranks.pop(book_id, None)
+        else:
+            ids = np.asarray(list(book_ids), dtype=np.int64)
+            ids = ids[(ids >= 0) & (ids < len(self._ranks))]
+            self._ranks[ids] = -1
+
+    def ranks(self, book_ids, key_func_factory):
+        """
+        The ranks for the given books.
+        :param book_ids: Sequence of book ids - a numpy array of them, if numpy is available
+        :param key_func_factory: Called (only if there are books with keys to work out) for a function which returns
+                                 the sort key for a book id - e.g. a partial of the field's sort_keys_for_books
+        :return: The ranks - in the order of the book ids (as an array, if numpy is available)
+        """
+        if np is None:
+            needed = list({book_id: None for book_id in book_ids if book_id not in self._ranks})
+            if needed:
+                self._add(needed, key_func_factory())
+            return list(map(self._ranks.__getitem__, book_ids))
+
+        if len(book_ids) and book_ids.max() >= len(self._ranks):
+            grown = np.full(int(book_ids.max()) + 1, -1, dtype=np.int64)
+            grown[: len(self._ranks)] = self._ranks
+            self._ranks = grown
+        ranks = self._ranks[book_ids]
+        missing = ranks < 0
+        if missing.any():
+            self._add(np.unique(book_ids[missing]).tolist(), key_func_factory())
+            ranks = self._ranks[book_ids]
+        return ranks
+
+    def _add(self, book_ids, key_func):
+        new_ranks, new_distinct = dense_ranks([key_func(book_id) for book_id in book_ids])
+        merged, old_positions, new_positions = merge_distinct(self._distinct, new_distinct)
+        self._distinct = merged
+
+        if np is None:
+            if old_positions is not None:
+                # Keys were added - so the existing ranks shift up past them
+                self._ranks = {book_id: old_positions[rank] for book_id, rank in self._ranks.items()}
+            for book_id, rank in zip(book_ids, new_ranks):
+                self._ranks[book_id] = new_positions[rank]
+            return
+
+        if old_positions is not None:
+            known = self._ranks >= 0
+            self._ranks[known] = np.asarray(old_positions, dtype=np.int64)[self._ranks[known]]
+        self._ranks[np.asarray(book_ids, dtype=np.int64)] = np.asarray(new_positions, dtype=np.int64)[new_ranks]
+
+
+def argsort_ranks(rank_columns, orders):
+    """
+    Positions which sort the rows - most significant column first.
+    Stable - rows with equal ranks in every column keep their order.
+    :param rank_columns: Rank lists (or arrays) - all the same length, with no negative ranks
+    :param orders: 1 for ascending, -1 for descending - for each column
+    :return: The positions - as an array, if numpy is available
+    """
+    if np is None:
+        if len(rank_columns) == 1:
+            ranks, order = rank_columns[0], orders[0]
+            return sorted(range(len(ranks)), key=ranks.__getitem__, reverse=order < 0)
+        rows = list(zip(*[[rank * order for rank in ranks] for ranks, order in zip(rank_columns, orders)]))
+        return sorted(range(len(rows)), key=rows.__getitem__)
+
+    columns = []
+    for ranks, order in zip(rank_columns, orders):
+        ranks = np.asarray(ranks, dtype=np.int64)
+        top = int(ranks.max()) if len(ranks) else 0
+        columns.append((top - ranks if order < 0 else ranks, top + 1))
+
+    # Pack the columns into a single key if they fit - one stable argsort is much faster than a lexsort
+    span = 1
+    for _, size in columns:
+        span *= size
+    if span < 2**62:
+        packed = np.zeros(len(columns[0][0]), dtype=np.int64)
+        for ranks, size in columns:
+            packed *= size
+            packed += ranks
+        return np.argsort(packed, kind="stable")
+    # lexsort takes the most significant key last
+    return np.lexsort([ranks for ranks, _ in reversed(columns)])
+
+
+class SortEngine(object):
+    """
+    Sorts books on any number of fields - keeping a SortKeyColumn for each field sorted on.
+    Book ids must be non-negative integers.
+    """
+
+    def __init__(self):
+        self.columns = dict()
+        self._lock = threading.Lock()
+
+    def invalidate(self, fields: Optional[Iterable[str]] = None, book_ids: Optional[Iterable[int]] = None):
+        """
+        Forget cached sort keys.
+        :param fields: Fields to invalidate - None for all of them
+        :param book_ids: Books to invalidate - None for all of them
+        :return:
+        """
+        if book_ids is not None:
+            book_ids = tuple(book_ids)
+        with self._lock:
+            if fields is None:
+                columns = list(self.columns.values())
+            else:
+                columns = [self.columns[field] for field in fields if field in self.columns]
+            for column in columns:
+                column.invalidate(book_ids)
+
+    def ranks(self, field: Optional[str], book_ids, key_func_factory: Optional[Callable], cache: bool = True):
+        """
+        Ranks of the sort keys of the given books for a field.
+        :param field: Name of the field - None to sort on the book ids themselves
+        :param book_ids: Sequence of book ids - a numpy array of them, if numpy is available
+        :param key_func_factory: Called for a function giving the sort key of a book
+        :param cache: Keep the ranks - False for fields whose values can change without being written (composites,
+                      virtual fields ...)
+        :return:
+        """
+        if field is None:
+            return book_ids
+        if not cache:
+            key_func = key_func_factory()
+            return dense_ranks([key_func(book_id) for book_id in (book_ids if np is None else book_ids.tolist())])[0]
+        with self._lock:
+            column = self.columns.get(field)
+            if column is None:
+                column = self.columns[field] = SortKeyColumn()
+            return column.ranks(book_ids, key_func_factory)
+
+    def sort(self, book_ids, columns):
+        """
+        Sort the books.
+        :param book_ids: Iterable of book ids
+        :param columns: List of (field, ascending, key_func_factory, cache) - most significant first. See ranks.
+        :return: List of the sorted book ids
+        """
+        book_ids = list(book_ids)
+        if not columns or not book_ids:
+            return book_ids
+        ids = book_ids if np is None else np.asarray(book_ids, dtype=np.int64)
+        rank_columns = [self.ranks(field, ids, factory, cache) for field, _, factory, cache in columns]
+        orders = [1 if ascending else -1 for _, ascending, _, _ in columns]
+        positions = argsort_ranks(rank_columns, orders)
+        if np is None:
+            return [book_ids[position] for position in positions]
+        return ids[positions].tolist()
@@ -0,0 +1,117 @@
+"""
+In memory adjacency index for tables which hold a tree (series, folders, genres ...).
+
+Built from the (id, parent id) pairs of a table in one read - after which ancestor chains, children and subtrees are
+dictionary lookups rather than database queries.
+The index is a snapshot - it has to be kept up to date (with set_parent and discard) or rebuilt after the tree changes.
+"""
+
+from __future__ import print_function
+
+from collections import defaultdict, deque
+
+
+class TreeIndex(object):
+    """
+    Parent and children maps for every node in a tree table.
+    """
+
+    def __init__(self, pairs=()):
+        """
+        :param pairs: Iterable of (node id, parent id) - parent id None (or anything which is not a node in the tree)
+                      for roots
+        """
+        self.parents = dict()
+        self.children = defaultdict(set)
+        for node_id, parent_id in pairs:
+            self.set_parent(node_id, parent_id)
+
+    def __contains__(self, node_id):
+        return node_id in self.parents
+
+    def __len__(self):
+        return len(self.parents)
+
+    def set_parent(self, node_id, parent_id):
+        """
+        Add a node to the index - or move it (and so its subtree) under a new parent.
+        :param node_id:
+        :param parent_id: None to make the node a root
+        :return:
+        """
+        old_parent = self.parents.get(node_id)
+        if old_parent is not None:
+            self.children[old_parent].discard(node_id)
+        self.parents[node_id] = parent_id
+        if parent_id is not None:
+            self.children[parent_id].add(node_id)
+
+    def discard(self, node_id):
+        """
+        Remove a node from the index. Its children are left pointing at it - so become roots of their own subtrees.
+        :param node_id:
+        :return:
+        """
+        if node_id not in self.parents:
+            return
+        parent_id = self.parents.pop(node_id)
+        if parent_id is not None:
+            self.children[parent_id].discard(node_id)
+
+    def get_parent(self, node_id):
+        """
+        The parent of a node - None if it's a root.
+        :param node_id:
+        :return:
+        """
+        parent_id = self.parents[node_id]
+        return parent_id if parent_id in self.parents else None
+
+    def get_children(self, node_id):
+        """
+        The immediate children of a node.
+        :param node_id:
+        :return:
+        """
+        return set(self.children.get(node_id, ()))
+
+    def ancestors(self, node_id):
+        """
+        The ancestor chain of a node - root first, ending with the node itself.
+        :param node_id:
+        :return:
+        """
+        chain = [node_id]
+        seen = {node_id}
+        parent_id = self.get_parent(node_id)
+        while parent_id is not None and parent_id not in seen:
+            chain.append(parent_id)
+            seen.add(parent_id)
+            parent_id = self.get_parent(parent_id)
+        chain.reverse()
+        return chain
+
+    def root(self, node_id):
+        """
+        The root of the tree the node is in.
+        :param node_id:
+        :return:
+        """
+        return self.ancestors(node_id)[0]
+
+    def subtree(self, node_id):
+        """
+        Ids of the node and every node beneath it - breadth first.
+        :param node_id:
+        :return:
+        """
+        found = [node_id]
+        seen = {node_id}
+        queue = deque(found)
+        while queue:
+            for child_id in sorted(self.children.get(queue.popleft(), ())):
+                if child_id not in seen:
+                    seen.add(child_id)
+                    found.append(child_id)
+                    queue.append(child_id)
+        return found
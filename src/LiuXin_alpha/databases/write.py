@@ -1042,11 +1042,7 @@ class BaseWriter(object):
         """
         # Update the db link table - remove all the links to the book
         if deleted:
-            # Todo: This also doesn't seem to work - at all - needs to be fixed
-            # db.macros.break_generic_link(table.link_table, table.link_table_bt_id_column, ((k,) for k in deleted))
-            # db.macros.break_generic_link(table.link_table, table.link_table_bt_id_column, (k for k in deleted))
-            for del_id in deleted:
-                db.macros.break_generic_link(table.link_table, table.link_table_bt_id_column, del_id)
+            db.macros.break_generic_links_many(table.link_table, table.link_table_bt_id_column, deleted)
 
         if updated:
             if is_custom_series:
@@ -1203,11 +1199,7 @@ class BaseWriter(object):
         """
         # Update the db link table - remove all the links to the book
         if deleted:
-            # Todo: This also doesn't seem to work - at all
-            # db.macros.break_generic_link(table.link_table, table.link_table_bt_id_column, ((k,) for k in deleted))
-            # db.macros.break_generic_link(table.link_table, table.link_table_bt_id_column, (k for k in deleted))
-            for del_id in deleted:
-                db.macros.break_generic_link(table.link_table, table.link_table_bt_id_column, del_id)
+            db.macros.break_generic_links_many(table.link_table, table.link_table_bt_id_column, deleted)
 
         if updated:
             if is_custom_series:
@@ -1221,12 +1213,36 @@ class BaseWriter(object):
 
             # Lock the database to stop anything else from writing to it while doing the update
             with db.lock:
-                # Todo: This macro just won't work in this form
-                # db.macros.break_generic_link(table.link_table, table.link_table_bt_id_column,
-                #                              (book_id for book_id in iterkeys(updated)))
+                # Books with lists of items are written in one go - a handful of statements for all of them, rather than
+                # several per link
+                bulk_updated = dict(
+                    (book_id, item_ids)
+                    for book_id, item_ids in iteritems(updated)
+                    if isinstance(item_ids, (set, list, tuple))
+                )
+                if bulk_updated:
+                    try:
+                        db.macros.replace_generic_links_many(
+                            link_table=table.link_table,
+                            left_link_col=table.link_table_bt_id_column,
+                            right_link_col=table.link_table_table_id_column,
+                            links=bulk_updated,
+                            link_type=link_type,
+                        )
+                    except DatabaseIntegrityError:
+                        # A constraint on the link table has been hit (e.g. an item is already linked to the book with a
+                        # different type) - the transaction has been rolled back - fall back to linking one at a time
+                        bulk_updated = dict()
+
+                # Type dicts are handled with one recursive call per type - rather than one per book and type
+                typed_updated = defaultdict(dict)
+                typed_cleared = defaultdict(list)
 
                 for book_id, item_id in iteritems(updated):
 
+                    if book_id in bulk_updated:
+                        continue
+
                     title_row = db.get_row_from_id("titles", row_id=book_id)
 
                     # Todo: With how the data is currently being used, this should never be triggered
@@ -1340,29 +1356,35 @@ class BaseWriter(object):
 
                         for local_link_type, link_vals in iteritems(item_id):
                             if link_vals is not None:
-                                self.do_generic_many_to_many_db_update(
-                                    db,
-                                    table=table,
-                                    field=field,
-                                    is_custom_series=is_custom_series,
-                                    updated={book_id: link_vals},
-                                    deleted=set(),
-                                    clean_before_write=clean_before_write,
-                                    link_type=local_link_type,
-                                )
+                                typed_updated[local_link_type][book_id] = link_vals
                             else:
-                                db.macros.break_generic_link(
-                                    link_table=table.link_table,
-                                    link_col=table.link_table_bt_id_column,
-                                    remove_id=book_id,
-                                    link_type=local_link_type,
-                                )
+                                typed_cleared[local_link_type].append(book_id)
 
                     else:
                         err_str = "Cannot parse item_id to update"
                         err_str = default_log.log_variables(err_str, "ERROR", ("item_id", item_id))
                         raise NotImplementedError(err_str)
 
+                for local_link_type, typed_book_ids in iteritems(typed_cleared):
+                    db.macros.break_generic_links_many(
+                        link_table=table.link_table,
+                        link_col=table.link_table_bt_id_column,
+                        remove_ids=typed_book_ids,
+                        link_type=local_link_type,
+                    )
+
+                for local_link_type, typed_vals in iteritems(typed_updated):
+                    self.do_generic_many_to_many_db_update(
+                        db,
+                        table=table,
+                        field=field,
+                        is_custom_series=is_custom_series,
+                        updated=typed_vals,
+                        deleted=set(),
+                        clean_before_write=clean_before_write,
+                        link_type=local_link_type,
+                    )
+
         return None, None
 
     def _do_vals_to_ids(
@@ -2226,11 +2248,7 @@ class ManyToOneWriter(BaseWriter):
         """
         # Update the db link table - remove all the links to the book
         if deleted:
-            # Todo: Neither of these forms seem to actually work - fix this
-            # db.macros.break_generic_link(table.link_table, table.link_table_bt_id_column, ((k,) for k in deleted))
-            # db.macros.break_generic_link(table.link_table, table.link_table_bt_id_column, (k for k in deleted))
-            for del_id in deleted:
-                db.macros.break_generic_link(table.link_table, table.link_table_bt_id_column, del_id)
+            db.macros.break_generic_links_many(table.link_table, table.link_table_bt_id_column, deleted)
 
         if updated:
             if is_custom_series:
@@ -2245,8 +2263,34 @@ class ManyToOneWriter(BaseWriter):
             # Lock the database to stop anything else from writing to it while doing the update
             with db.lock:
 
+                # Books being linked to a single item are all written together - in one transaction
+                bulk_updated = dict(
+                    (book_id, book_val) for book_id, book_val in iteritems(updated) if isinstance(book_val, int)
+                )
+                if bulk_updated:
+                    try:
+                        with db.driver_wrapper.write_transaction() as conn:
+                            # About to write new links - so all old links - regardless of type - must be broken
+                            db.macros.break_generic_links_many(
+                                table.link_table, table.link_table_bt_id_column, bulk_updated.keys(), conn=conn
+                            )
+                            db.macros.make_generic_links_many(
+                                link_table=table.link_table,
+                                left_link_col=table.link_table_bt_id_column,
+                                right_link_col=table.link_table_table_id_column,
+                                id_pairs=iteritems(bulk_updated),
+                                link_type=link_type,
+                                conn=conn,
+                            )
+                    except DatabaseIntegrityError:
+                        # Rolled back - fall back to linking one at a time
+                        bulk_updated = dict()
+
                 for book_id, book_val in iteritems(updated):
 
+                    if book_id in bulk_updated:
+                        continue
+
                     if isinstance(book_val, int):
 
                         # About to write a new link - so all old links - regardless of type - must be broken
@@ -3960,18 +4004,19 @@ class ManyToManyWriter(BaseWriter):
         :param is_authors:
         :return:
         """
-        db.macros.break_generic_link(table.link_table, table.link_table_bt_id_column, tuple(k for k in deleted))
-
         vals = tuple((book_id, val) for book_id, vals in iteritems(updated) for val in vals)
 
-        db.macros.break_generic_link(table.link_table, table.link_table_bt_id_column, tuple(k for k in updated))
+        with db.driver_wrapper.write_transaction() as conn:
+            db.macros.break_generic_links_many(table.link_table, table.link_table_bt_id_column, deleted, conn=conn)
+            db.macros.break_generic_links_many(table.link_table, table.link_table_bt_id_column, updated, conn=conn)
 
-        db.macros.make_generic_link_no_priority(
-            table.link_table,
-            table.link_table_table_id_column,
-            table.link_table_bt_id_column,
-            id_pairs=vals,
-        )
+            db.macros.make_generic_link_no_priority(
+                table.link_table,
+                table.link_table_table_id_column,
+                table.link_table_bt_id_column,
+                id_pairs=vals,
+                conn=conn,
+            )
 
     @staticmethod
     def language_many_many_db_clean_links(db, table, deleted):
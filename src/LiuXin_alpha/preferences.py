@@ -483,6 +483,38 @@ class Preferences:
 
         self.set("DatabasePing", "database_id", str(uuid.uuid4()))
         self.type_set("DatabasePing", "run_ta_update_after_each_change", False, val_type="bool")
+        # Reuse long-lived connections to the database - rather than opening a new one for every call
+        self.type_set("DatabasePing", "pool_connections", True, val_type="bool")
+        # Set of PRAGMAs applied to each connection
+        # wal - write-ahead-log, synchronous=NORMAL, temp_store=MEMORY - readers don't block the writer
+        # legacy - SQLite defaults (rollback journal) - for filesystems which can't support WAL
+        self.set("DatabasePing", "performance_profile", "wal")
+        # Page cache for each connection - negative values are in KiB, positive in pages
+        self.type_set("DatabasePing", "sqlite_cache_size", -65536, val_type="int")
+        # Bytes of the database file to memory map - 0 to disable
+        self.type_set("DatabasePing", "sqlite_mmap_size", 268435456, val_type="int")
+        # Seconds between passive checkpoints of the write-ahead log - 0 leaves it entirely to SQLite
+        self.type_set("DatabasePing", "wal_checkpoint_interval", 300, val_type="int")
+        # Rows read from the database at a time when streaming rows (e.g. full table scans)
+        self.type_set("DatabasePing", "stream_fetch_size", 500, val_type="int")
+        # Most dirtied records the maintenance bot processes in a single transaction
+        self.type_set("DatabasePing", "maintenance_batch_size", 500, val_type="int")
+        # Milliseconds the maintenance bot waits for a batch to fill once a record has been dirtied
+        self.type_set("DatabasePing", "maintenance_batch_wait_ms", 250, val_type="int")
+        # Dirtied books the metadata backup writes OPFs for at a time
+        self.type_set("DatabasePing", "metadata_backup_batch_size", 200, val_type="int")
+        # Processes rendering OPFs for the metadata backup - 1 renders them on the backup thread, 0 for one per CPU
+        self.type_set("DatabasePing", "metadata_backup_workers", 1, val_type="int")
+        # Threads writing OPF files for the metadata backup
+        self.type_set("DatabasePing", "metadata_backup_io_workers", 4, val_type="int")
+        # Percentage of the time the metadata backup may spend working - it pauses between batches to stay under it
+        self.type_set("DatabasePing", "metadata_backup_duty_cycle", 50, val_type="int")
+        # Hold the maps of the plain cache tables in numpy arrays - far less memory on large libraries (needs numpy)
+        self.type_set("DatabasePing", "numpy_tables", False, val_type="bool")
+        # Text fields with an inverted index to narrow searches on them - e.g. ("title", "authors", "tags")
+        self.type_set("DatabasePing", "search_index_fields", (), val_type="tuple")
+        # Memory (in MiB) the cached search results may take - least recently used results are dropped past it
+        self.type_set("DatabasePing", "search_cache_mb", 64, val_type="int")
         self.set("DatabasePing", "library_path", "default")
 
         # DatabasePing debug preferences
@@ -494,6 +526,10 @@ class Preferences:
             False,
             val_type="bool",
         )
+        # Record VM instructions, wall time and rows returned for every statement - off by default as it's expensive
+        self.type_set("DatabasePing Debug", "sql_instrumentation", False, val_type="bool")
+        # Charge VM instructions to the running statement every this many instructions
+        self.type_set("DatabasePing Debug", "sql_instrumentation_sample_interval", 1000, val_type="int")
 
         # Folder preferences
         self.add_section("Folders")
@@ -513,6 +549,12 @@ class Preferences:
         self.type_set("Import", "fill_from_first_folder_store", False, val_type="bool")
         self.type_set("Import", "group_creators", True, val_type="bool")
         self.type_set("Import", "retry_limit", 5, val_type="int")
+        # Processes reading metadata during a recursive import - 0 for one per CPU
+        self.type_set("Import", "import_workers", 0, val_type="int")
+        # Books which can be waiting between the stages of a recursive import
+        self.type_set("Import", "import_queue_size", 256, val_type="int")
+        # File caching the hashes of imported files - so unchanged files aren't hashed again. Blank to cache in memory
+        self.type_set("Import", "import_hash_cache_path", "", val_type="str")
         #: Auto increment series index
         # The algorithm used to assign a book added to an existing series a series number.
         # New series numbers assigned using this tweak are always integer values, except
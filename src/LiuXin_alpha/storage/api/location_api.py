@@ -79,6 +79,10 @@ class StoreLocationMixinAPI(ABC):
     def as_store_key(self) -> str:
         """Canonical key used by the backend (often a POSIX-ish path string)."""
 
+    def local_path(self) -> str | None:
+        """Path of this Location on the local filesystem - None for stores which aren't on local disk."""
+        return None
+
 
     # ---- Path-like semantics (PurePosix-ish) ----
 
@@ -500,15 +504,91 @@ class _AsyncLoopThread:
         self._loop.call_soon_threadsafe(self._loop.stop)
 
 
+# Data moved across a bridge per hop - small reads are served from (and small writes gathered into) a buffer on the
+# caller's side of the bridge, rather than each costing a trip to the other thread. 0 to pass every call straight across
+DEFAULT_BRIDGE_CHUNK_SIZE = 64 * 1024
+
+# Items handed from a sync iterator to async code per hop
+DEFAULT_BRIDGE_ITER_BATCH = 256
+
+# A part-filled batch is handed over once it's been waiting this long - so slow iterators still stream
+DEFAULT_BRIDGE_ITER_DELAY_S = 0.05
+
+
+def _join(chunks: list[Any]) -> Any:
+    return "".join(chunks) if isinstance(chunks[0], str) else b"".join(chunks)
+
+
+class _ReadBuffer:
+    """
+    Data read across a bridge but not yet handed out - bytes or str, whichever the file reads.
+    """
+    def __init__(self) -> None:
+        self._data: Any = None
+        self._pos = 0
+
+    def __len__(self) -> int:
+        return 0 if self._data is None else len(self._data) - self._pos
+
+    def feed(self, chunk: Any) -> None:
+        if not chunk:
+            return
+        if self._data is None or self._pos >= len(self._data):
+            self._data, self._pos = chunk, 0
+        else:
+            self._data, self._pos = self._data[self._pos:] + chunk, 0
+
+    def take(self, n: int, empty: Any = None) -> Any:
+        """
+        Hand out up to n items - all of them for n < 0 - or empty if nothing was ever read.
+        """
+        if self._data is None:
+            return empty
+        end = len(self._data) if n < 0 else min(self._pos + n, len(self._data))
+        out = self._data[self._pos:end]
+        self._pos = end
+        return out
+
+    def line_end(self, limit: int = -1) -> int:
+        """
+        How much to take for the next line - -1 if the buffer doesn't hold a whole line (or limit items).
+        """
+        if self._data is None:
+            return -1
+        newline = "\n" if isinstance(self._data, str) else b"\n"
+        found = self._data.find(newline, self._pos)
+        size = found + 1 - self._pos if found >= 0 else -1
+        if limit is not None and limit >= 0 and (size > limit or (size < 0 and len(self) >= limit)):
+            return limit
+        return size
+
+
 class _SyncFileFromAsync:
     """
     A sync file-like wrapper over an async file object + its async context manager.
+
+    Reads fetch (at least) chunk_size at a time and writes are gathered until chunk_size is waiting - so line
+    iteration and small reads and writes don't each wait on the loop thread.
+    Files opened for update ("+" modes) aren't read ahead of - so the file position stays where writes expect it.
     """
-    def __init__(self, runner: _AsyncLoopThread, async_cm: Any, afile: Any) -> None:
+    def __init__(
+        self,
+        runner: _AsyncLoopThread,
+        async_cm: Any,
+        afile: Any,
+        chunk_size: int = DEFAULT_BRIDGE_CHUNK_SIZE,
+        mode: str = "r",
+    ) -> None:
         self._runner = runner
         self._cm = async_cm
         self._afile = afile
         self._closed = False
+        self._chunk_size = max(int(chunk_size), 0)
+        self._read_ahead = 0 if "+" in mode else self._chunk_size
+        self._empty: Any = b"" if "b" in mode else ""
+        self._rbuf = _ReadBuffer()
+        self._wbuf: list[Any] = []
+        self._wlen = 0
 
     def __enter__(self) -> "_SyncFileFromAsync":
         return self
@@ -517,22 +597,116 @@ class _SyncFileFromAsync:
         if self._closed:
             return None
         self._closed = True
-        return self._runner.run(self._cm.__aexit__(exc_type, exc, tb))
+        return self._runner.run(self._finish(exc_type, exc, tb))
+
+    def __iter__(self) -> "_SyncFileFromAsync":
+        return self
+
+    def __next__(self) -> Any:
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
 
     def close(self) -> None:
         if self._closed:
             return
         self._closed = True
-        self._runner.run(self._cm.__aexit__(None, None, None))
+        self._runner.run(self._finish(None, None, None))
+
+    async def _finish(self, exc_type: Any, exc: Any, tb: Any) -> bool | None:
+        # Pending writes and the close in the one hop
+        try:
+            await self._awrite_pending()
+        finally:
+            result = await self._cm.__aexit__(exc_type, exc, tb)
+        return result
+
+    async def _awrite_pending(self) -> None:
+        if self._wbuf:
+            data = _join(self._wbuf)
+            self._wbuf, self._wlen = [], 0
+            await self._afile.write(data)
+
+    async def _aread_at_least(self, want: int) -> Any:
+        chunks = []
+        got = 0
+        while got < want:
+            chunk = await self._afile.read(want - got)
+            if not chunk:
+                if not chunks:
+                    return chunk
+                break
+            chunks.append(chunk)
+            got += len(chunk)
+        return _join(chunks)
+
+    async def _areadline_unbuffered(self, limit: int) -> Any:
+        readline = getattr(self._afile, "readline", None)
+        if readline is not None:
+            return await readline(limit)
+        # One item at a time (so nothing is read past the line) - but all in one hop
+        chunks = []
+        while limit < 0 or len(chunks) < limit:
+            chunk = await self._afile.read(1)
+            if not chunk:
+                if not chunks:
+                    return chunk
+                break
+            chunks.append(chunk)
+            if chunk in ("\n", b"\n"):
+                break
+        return _join(chunks)
+
+    def _write_pending(self) -> None:
+        if self._wbuf:
+            self._runner.run(self._awrite_pending())
 
     def flush(self) -> None:
-        self._runner.run(self._afile.flush())
+        async def flush() -> None:
+            await self._awrite_pending()
+            await self._afile.flush()
+
+        self._runner.run(flush())
 
     def read(self, n: int = -1) -> Any:
-        return self._runner.run(self._afile.read(n))
+        self._write_pending()
+        if n is None or n < 0:
+            rest = self._runner.run(self._afile.read(-1))
+            return self._rbuf.take(-1, empty=rest[:0]) + rest
+        if len(self._rbuf) >= n:
+            return self._rbuf.take(n, empty=self._empty)
+        data = self._runner.run(self._aread_at_least(max(n - len(self._rbuf), self._read_ahead)))
+        self._rbuf.feed(data)
+        return self._rbuf.take(n, empty=data)
+
+    def readline(self, limit: int = -1) -> Any:
+        self._write_pending()
+        if not self._read_ahead:
+            return self._runner.run(self._areadline_unbuffered(-1 if limit is None else limit))
+        while True:
+            end = self._rbuf.line_end(limit)
+            if end >= 0:
+                return self._rbuf.take(end)
+            data = self._runner.run(self._aread_at_least(self._read_ahead))
+            if not data:
+                return self._rbuf.take(-1, empty=data)
+            self._rbuf.feed(data)
+
+    def readlines(self) -> list[Any]:
+        return list(self)
 
     def write(self, data: Any) -> int:
-        return self._runner.run(self._afile.write(data))
+        if not self._chunk_size:
+            return self._runner.run(self._afile.write(data))
+        if not isinstance(data, (str, bytes)):
+            # Copied - the caller is free to reuse its buffer once write returns
+            data = bytes(data)
+        self._wbuf.append(data)
+        self._wlen += len(data)
+        if self._wlen >= self._chunk_size:
+            self._write_pending()
+        return len(data)
 
 
 async def _to_thread(fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
@@ -540,35 +714,68 @@ async def _to_thread(fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
     return await asyncio.to_thread(fn, *args, **kwargs)
 
 
-async def _aiter_from_sync_iter(iter_fn: Callable[[], Iterator[T]]) -> AsyncIterator[T]:
+async def _aiter_from_sync_iter(
+    iter_fn: Callable[[], Iterator[T]],
+    batch_size: int = DEFAULT_BRIDGE_ITER_BATCH,
+    max_delay_s: float = DEFAULT_BRIDGE_ITER_DELAY_S,
+) -> AsyncIterator[T]:
     """
     Stream a sync iterator into async without materializing the whole list.
+
+    Items are handed across in batches of batch_size (or whatever has gathered in max_delay_s) - one hop per batch,
+    rather than one per item. A part-filled batch is collected from the async side - so it isn't held back while the
+    iterator is blocked producing the next item.
     """
     loop = asyncio.get_running_loop()
-    q: asyncio.Queue[object] = asyncio.Queue()
-    SENTINEL = object()
-    EXC = object()
+    ready = asyncio.Event()
+    lock = threading.Lock()
+    stop = threading.Event()
+    batch_size = max(int(batch_size), 1)
+    # Items produced but not yet handed over - and how the iterator finished, once it has
+    pending: list[T] = []
+    finished = False
+    error: BaseException | None = None
 
     def worker() -> None:
+        nonlocal finished, error
         try:
             for item in iter_fn():
-                loop.call_soon_threadsafe(q.put_nowait, item)
+                with lock:
+                    pending.append(item)
+                    full = len(pending) >= batch_size
+                if full:
+                    loop.call_soon_threadsafe(ready.set)
+                if stop.is_set():
+                    return
         except BaseException as e:  # propagate into async generator
-            loop.call_soon_threadsafe(q.put_nowait, (EXC, e))
+            error = e
         finally:
-            loop.call_soon_threadsafe(q.put_nowait, SENTINEL)
+            with lock:
+                finished = True
+            loop.call_soon_threadsafe(ready.set)
 
     task = asyncio.create_task(asyncio.to_thread(worker))
 
     try:
         while True:
-            item = await q.get()
-            if item is SENTINEL:
+            try:
+                await asyncio.wait_for(ready.wait(), max_delay_s)
+            except asyncio.TimeoutError:
+                pass
+            ready.clear()
+            with lock:
+                batch = pending[:]
+                del pending[:]
+                done = finished
+            for item in batch:
+                yield item
+            if done:
+                if error is not None:
+                    raise error
                 break
-            if isinstance(item, tuple) and len(item) == 2 and item[0] is EXC:
-                raise cast(BaseException, item[1])
-            yield cast(T, item)
     finally:
+        # Stop the worker early if we're abandoned part way
+        stop.set()
         await task
 
 
@@ -576,9 +783,20 @@ class _AsyncFileFromSync:
     """
     Async file wrapper over a sync file object using to_thread for operations.
     Implements your AsyncTextFile/AsyncBinaryFile Protocol shape.
+
+    Reads fetch (at least) chunk_size at a time and writes are gathered until chunk_size is waiting - so line
+    iteration and small reads and writes don't each cost a worker thread hop.
+    Files opened for update ("+" modes) aren't read ahead of - so the file position stays where writes expect it.
     """
-    def __init__(self, f: Any) -> None:
+    def __init__(self, f: Any, chunk_size: int = DEFAULT_BRIDGE_CHUNK_SIZE, mode: str = "r") -> None:
         self._f = f
+        self._chunk_size = max(int(chunk_size), 0)
+        self._read_ahead = 0 if "+" in mode else self._chunk_size
+        self._empty: Any = b"" if "b" in mode else ""
+        self._rbuf = _ReadBuffer()
+        self._wbuf: list[Any] = []
+        self._wlen = 0
+        self._closed = False
 
     async def __aenter__(self) -> "_AsyncFileFromSync":
         return self
@@ -587,34 +805,133 @@ class _AsyncFileFromSync:
         await self.close()
         return None
 
+    def __aiter__(self) -> "_AsyncFileFromSync":
+        return self
+
+    async def __anext__(self) -> Any:
+        line = await self.readline()
+        if not line:
+            raise StopAsyncIteration
+        return line
+
+    def _take_pending(self) -> Any:
+        if not self._wbuf:
+            return None
+        data = _join(self._wbuf)
+        self._wbuf, self._wlen = [], 0
+        return data
+
+    def _write_then(self, data: Any, fn: Callable[[], T] | None = None) -> T | None:
+        # Runs in the worker thread - pending writes, then whatever was waiting on them
+        if data is not None:
+            self._f.write(data)
+        return fn() if fn is not None else None
+
+    async def _write_pending(self) -> None:
+        data = self._take_pending()
+        if data is not None:
+            await _to_thread(self._f.write, data)
+
+    def _read_at_least(self, want: int) -> Any:
+        chunks = []
+        got = 0
+        while got < want:
+            chunk = self._f.read(want - got)
+            if not chunk:
+                if not chunks:
+                    return chunk
+                break
+            chunks.append(chunk)
+            got += len(chunk)
+        return _join(chunks)
+
+    def _read_line_chunks(self) -> Any:
+        # Chunks until one ends a line (or the file does)
+        chunks = []
+        while True:
+            chunk = self._f.read(self._read_ahead)
+            if not chunk:
+                if not chunks:
+                    return chunk
+                return _join(chunks)
+            chunks.append(chunk)
+            if ("\n" if isinstance(chunk, str) else b"\n") in chunk:
+                return _join(chunks)
+
     async def read(self, n: int = -1) -> Any:
-        return await _to_thread(self._f.read, n)
+        await self._write_pending()
+        if n is None or n < 0:
+            rest = await _to_thread(self._f.read, -1)
+            return self._rbuf.take(-1, empty=rest[:0]) + rest
+        if len(self._rbuf) >= n:
+            return self._rbuf.take(n, empty=self._empty)
+        data = await _to_thread(self._read_at_least, max(n - len(self._rbuf), self._read_ahead))
+        self._rbuf.feed(data)
+        return self._rbuf.take(n, empty=data)
+
+    async def readline(self, limit: int = -1) -> Any:
+        await self._write_pending()
+        if not self._read_ahead:
+            return await _to_thread(self._f.readline, -1 if limit is None else limit)
+        end = self._rbuf.line_end(limit)
+        if end < 0:
+            data = await _to_thread(self._read_line_chunks)
+            if not data:
+                return self._rbuf.take(-1, empty=data)
+            self._rbuf.feed(data)
+            end = self._rbuf.line_end(limit)
+        return self._rbuf.take(end)
+
+    async def readlines(self) -> list[Any]:
+        return [line async for line in self]
 
     async def write(self, data: Any) -> int:
-        return await _to_thread(self._f.write, data)
+        if not self._chunk_size:
+            return await _to_thread(self._f.write, data)
+        if not isinstance(data, (str, bytes)):
+            # Copied - the caller is free to reuse its buffer once write returns
+            data = bytes(data)
+        self._wbuf.append(data)
+        self._wlen += len(data)
+        if self._wlen >= self._chunk_size:
+            await self._write_pending()
+        return len(data)
 
     async def flush(self) -> None:
-        await _to_thread(self._f.flush)
+        await _to_thread(self._write_then, self._take_pending(), self._f.flush)
 
     async def close(self) -> None:
-        await _to_thread(self._f.close)
+        if self._closed:
+            return
+        self._closed = True
+
+        def close() -> None:
+            try:
+                self._write_then(self._take_pending())
+            finally:
+                self._f.close()
+
+        await _to_thread(close)
 
 
 class _AsyncOpenFromSync:
     """
     Async context manager that opens a sync file in a thread, then wraps it.
     """
-    def __init__(self, opener: Callable[[], Any]) -> None:
+    def __init__(self, opener: Callable[[], Any], chunk_size: int = DEFAULT_BRIDGE_CHUNK_SIZE, mode: str = "r") -> None:
         self._opener = opener
-        self._f: Any | None = None
+        self._chunk_size = chunk_size
+        self._mode = mode
+        self._file: _AsyncFileFromSync | None = None
 
     async def __aenter__(self) -> _AsyncFileFromSync:
-        self._f = await _to_thread(self._opener)
-        return _AsyncFileFromSync(self._f)
+        f = await _to_thread(self._opener)
+        self._file = _AsyncFileFromSync(f, chunk_size=self._chunk_size, mode=self._mode)
+        return self._file
 
     async def __aexit__(self, exc_type: Any, exc: Any, tb: Any) -> bool | None:
-        if self._f is not None:
-            await _to_thread(self._f.close)
+        if self._file is not None:
+            await self._file.close()
         return None
 
 
@@ -632,6 +949,9 @@ class AsyncNativePretendSyncLocation(StoreLocationMixinAPI, ABC):
     """
     _runner = _AsyncLoopThread()
 
+    # Data moved to / from the loop thread per hop by open() files - see _SyncFileFromAsync
+    bridge_chunk_size: int = DEFAULT_BRIDGE_CHUNK_SIZE
+
     # --- you implement these natively ---
     @abstractmethod
     async def aexists(self) -> bool: ...
@@ -723,7 +1043,7 @@ class AsyncNativePretendSyncLocation(StoreLocationMixinAPI, ABC):
         # Open immediately (pathlib-like), returning a sync wrapper.
         async_cm = self.aopen(mode=mode, buffering=buffering, encoding=encoding, errors=errors, newline=newline)
         afile = self._runner.run(async_cm.__aenter__())
-        return _SyncFileFromAsync(self._runner, async_cm, afile)
+        return _SyncFileFromAsync(self._runner, async_cm, afile, chunk_size=self.bridge_chunk_size, mode=mode)
 
 
 # =========================================================
@@ -736,6 +1056,11 @@ class SyncNativePretendAsyncLocation(StoreLocationMixinAPI):
     Async methods are derived via asyncio.to_thread + streaming iterator bridge.
     """
 
+    # Data moved to / from the worker thread per hop by aopen() files - see _AsyncFileFromSync
+    bridge_chunk_size: int = DEFAULT_BRIDGE_CHUNK_SIZE
+    # Items handed over per hop by aiterdir / aglob / arglob - see _aiter_from_sync_iter
+    bridge_iter_batch: int = DEFAULT_BRIDGE_ITER_BATCH
+
     # --- you implement these natively ---
     @abstractmethod
     def exists(self) -> bool: ...
@@ -814,20 +1139,22 @@ class SyncNativePretendAsyncLocation(StoreLocationMixinAPI):
         await _to_thread(self.touch, mode, exist_ok)
 
     async def aiterdir(self) -> AsyncIterator[Self]:
-        async for item in _aiter_from_sync_iter(self.iterdir):
+        async for item in _aiter_from_sync_iter(self.iterdir, self.bridge_iter_batch):
             yield item
 
     async def aglob(self, pattern: str) -> AsyncIterator[Self]:
-        async for item in _aiter_from_sync_iter(lambda: self.glob(pattern)):
+        async for item in _aiter_from_sync_iter(lambda: self.glob(pattern), self.bridge_iter_batch):
             yield item
 
     async def arglob(self, pattern: str) -> AsyncIterator[Self]:
-        async for item in _aiter_from_sync_iter(lambda: self.rglob(pattern)):
+        async for item in _aiter_from_sync_iter(lambda: self.rglob(pattern), self.bridge_iter_batch):
             yield item
 
     def aopen(self, mode: str = "r", buffering: int = -1,
               encoding: str | None = None, errors: str | None = None, newline: str | None = None) -> Any:
         # Return an async context manager that opens the sync file in a thread.
         return _AsyncOpenFromSync(
-            lambda: self.open(mode=mode, buffering=buffering, encoding=encoding, errors=errors, newline=newline)
+            lambda: self.open(mode=mode, buffering=buffering, encoding=encoding, errors=errors, newline=newline),
+            chunk_size=self.bridge_chunk_size,
+            mode=mode,
         )
@@ -189,3 +189,6 @@ class OnDiskUnmanagedStoreLocation(SyncNativePretendAsyncLocation):
 
     def as_store_key(self) -> str:
         return str(self._loc_path)
+
+    def local_path(self) -> str | None:
+        return str(self._loc_path)
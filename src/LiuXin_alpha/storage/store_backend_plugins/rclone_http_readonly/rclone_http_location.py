@@ -9,7 +9,8 @@ from typing import Any, Dict, Iterator, Self
 
 from LiuXin_alpha.storage.api.location_api import SyncNativePretendAsyncLocation
 
-from .rclone_utils import run_rclone_json, run_rclone, which_rclone
+from .rclone_range_reader import RcloneRangeReader
+from .rclone_utils import read_rclone_range, run_rclone_json, run_rclone, which_rclone
 
 
 class _RcloneCatStream(io.RawIOBase):
@@ -106,9 +107,15 @@ class RcloneHttpReadOnlyStoreLocation(SyncNativePretendAsyncLocation):
 
     def _rel_posix(self) -> str:
         # Tokens are already normalized by StoreLocationMixinAPI, but we join here.
-        toks = [t for t in self._normalized_tokens() if t not in (".", "")]
+        toks = [t for t in self._tokens if t not in (".", "")]
         return "/".join(toks)
 
+    def _listing_cache(self) -> Any:
+        return getattr(self.store, "listing_cache", None)
+
+    def _daemon(self) -> Any:
+        return getattr(self.store, "daemon", None)
+
     def _join(self, rel: str) -> str:
         base = self._fs_root()
         if not rel:
@@ -132,6 +139,21 @@ class RcloneHttpReadOnlyStoreLocation(SyncNativePretendAsyncLocation):
     # --- stat / existence ---
 
     def _stat_blob(self) -> Dict[str, Any] | None:
+        # Answered from the listing of the parent directory, if the store caches listings.
+        cache = self._listing_cache()
+        if cache is not None:
+            try:
+                return cache.entry(self._rel_posix())
+            except Exception:
+                return None
+
+        daemon = self._daemon()
+        if daemon is not None:
+            try:
+                return daemon.stat(self._fs_root(), self._rel_posix())
+            except Exception:
+                return None
+
         # rclone lsjson --stat returns a JSON object; raises on missing.
         p = self._rclone_path()
         try:
@@ -179,6 +201,19 @@ class RcloneHttpReadOnlyStoreLocation(SyncNativePretendAsyncLocation):
     # --- traversal ---
 
     def iterdir(self) -> Iterator[Self]:
+        cache = self._listing_cache()
+        if cache is not None:
+            kids = cache.children(self._rel_posix())
+            if kids is None:
+                raise FileNotFoundError(self._rclone_path())
+            for name in list(kids):
+                yield self.joinpath(name)  # type: ignore[return-value]
+            return
+        if self._daemon() is not None:
+            for it in self.store.lsjson(self._rel_posix(), False):
+                if it.get("Name"):
+                    yield self.joinpath(it["Name"])  # type: ignore[return-value]
+            return
         items = run_rclone_json(
             ["lsjson", self._rclone_dir()],
             rclone_exe=getattr(self.store, "options", None).rclone_exe if getattr(self.store, "options", None) else "rclone",
@@ -199,14 +234,24 @@ class RcloneHttpReadOnlyStoreLocation(SyncNativePretendAsyncLocation):
                 yield child
 
     def rglob(self, pattern: str) -> Iterator[Self]:
-        items = run_rclone_json(
-            ["lsjson", "-R", self._rclone_dir()],
-            rclone_exe=getattr(self.store, "options", None).rclone_exe if getattr(self.store, "options", None) else "rclone",
-            extra_args=getattr(self.store, "options", None).rclone_args if getattr(self.store, "options", None) else (),
-            env=getattr(self.store, "options", None).env if getattr(self.store, "options", None) else None,
-            timeout_s=getattr(self.store, "options", None).timeout_s if getattr(self.store, "options", None) else 60.0,
-            check=True,
-        ) or []
+        cache = self._listing_cache()
+        if cache is not None:
+            for path, _ in cache.walk(self._rel_posix()):
+                rel = pathlib.PurePosixPath(path)
+                if rel.match(pattern):
+                    yield self.joinpath(*rel.parts)  # type: ignore[return-value]
+            return
+        if self._daemon() is not None:
+            items = self.store.lsjson(self._rel_posix(), True)
+        else:
+            items = run_rclone_json(
+                ["lsjson", "-R", self._rclone_dir()],
+                rclone_exe=getattr(self.store, "options", None).rclone_exe if getattr(self.store, "options", None) else "rclone",
+                extra_args=getattr(self.store, "options", None).rclone_args if getattr(self.store, "options", None) else (),
+                env=getattr(self.store, "options", None).env if getattr(self.store, "options", None) else None,
+                timeout_s=getattr(self.store, "options", None).timeout_s if getattr(self.store, "options", None) else 60.0,
+                check=True,
+            ) or []
         base = self._rel_posix()
         for it in items:
             path = it.get("Path") or it.get("Name") or ""
@@ -239,6 +284,59 @@ class RcloneHttpReadOnlyStoreLocation(SyncNativePretendAsyncLocation):
 
     # --- IO ---
 
+    def _ranged_reads(self, opts: Any) -> bool:
+        """Should this file be opened with a RcloneRangeReader - see RcloneBackendOptions.seekable_reads."""
+        seekable = getattr(opts, "seekable_reads", None)
+        if seekable is None:
+            # Without the daemon every range fetched would be an `rclone cat` process of its own - stream instead
+            return self._daemon() is not None
+        return bool(seekable)
+
+    def _range_reader(self, opts: Any) -> RcloneRangeReader | None:
+        """
+        A seekable reader of this file - fetching ranges through the daemon, or with `rclone cat`.
+        None if the remote doesn't know the size of the file (Size is -1 or missing) - it has to be streamed.
+        """
+        blob = self._stat_blob()
+        if not blob:
+            raise FileNotFoundError(self._rclone_path())
+        if blob.get("IsDir", False):
+            raise IsADirectoryError(self._rclone_path())
+        size = blob.get("Size")
+        if size is None or int(size) < 0:
+            return None
+
+        daemon = self._daemon()
+        if daemon is not None:
+            fs, rel = self._fs_root(), self._rel_posix()
+
+            def fetch(offset: int, count: int) -> bytes:
+                with daemon.open(fs, rel, offset=offset, count=count) as f:
+                    return f.read()
+
+        else:
+            path = self._rclone_path()
+
+            def fetch(offset: int, count: int) -> bytes:
+                return read_rclone_range(
+                    path,
+                    offset,
+                    count,
+                    rclone_exe=opts.rclone_exe,
+                    extra_args=opts.rclone_args,
+                    env=opts.env,
+                    timeout_s=opts.timeout_s,
+                )
+
+        return RcloneRangeReader(
+            fetch,
+            int(size),
+            name=self._rclone_path(),
+            block_size=opts.read_block_size,
+            cache_bytes=opts.read_cache_bytes,
+            read_ahead_blocks=opts.read_ahead_blocks,
+        )
+
     def open(
         self,
         mode: str = "r",
@@ -253,6 +351,24 @@ class RcloneHttpReadOnlyStoreLocation(SyncNativePretendAsyncLocation):
         binary = "b" in mode
 
         opts = getattr(self.store, "options", None)
+        raw = self._range_reader(opts) if self._ranged_reads(opts) else None
+        if raw is not None:
+            if binary:
+                return io.BufferedReader(raw)
+            return io.TextIOWrapper(
+                io.BufferedReader(raw), encoding=encoding or "utf-8", errors=errors or "strict", newline=newline
+            )
+
+        daemon = self._daemon()
+        if daemon is not None:
+            # Streamed over the daemon's pooled connections - no process per read
+            raw = daemon.open(self._fs_root(), self._rel_posix())
+            if binary:
+                return io.BufferedReader(raw)
+            return io.TextIOWrapper(
+                io.BufferedReader(raw), encoding=encoding or "utf-8", errors=errors or "strict", newline=newline
+            )
+
         rclone_exe = getattr(opts, "rclone_exe", "rclone")
         rclone_args = list(getattr(opts, "rclone_args", ()))
         env = getattr(opts, "env", None)
@@ -9,6 +9,15 @@ from LiuXin_alpha.utils.logging.event_logs.in_memory_list import InMemoryEventLo
 
 from .rclone_utils import run_rclone_json, run_rclone
 from .rclone_http_single_file import RcloneHttpReadOnlySingleFile
+from .rclone_listing_cache import RcloneListingCache
+from .rclone_rcd import RcloneDaemon
+from .rclone_range_reader import DEFAULT_BLOCK_SIZE, DEFAULT_CACHE_BYTES, DEFAULT_READ_AHEAD_BLOCKS
+
+# Seconds in memory listings are trusted for - unless RcloneBackendOptions.listing_cache_ttl_s says otherwise
+DEFAULT_LISTING_CACHE_TTL_S = 300.0
+
+# Stands in for a listing_cache_ttl_s which wasn't given - it then depends on whether the listings are persisted
+_DEFAULT_TTL: Any = object()
 
 
 @dataclass
@@ -17,6 +26,36 @@ class RcloneBackendOptions:
     rclone_args: Sequence[str] = ()
     env: Dict[str, str] | None = None
     timeout_s: float | None = 60.0
+    # Answer stat / exists / listings from cached `lsjson` listings - see rclone_listing_cache
+    listing_cache: bool = True
+    # Seconds a cached listing is trusted for - None to trust them until invalidated. If it isn't given, in memory
+    # listings are trusted for DEFAULT_LISTING_CACHE_TTL_S, and persisted ones until invalidated - a persisted cache is
+    # there to spare a restart re-listing the remote, which it wouldn't if its listings had expired by then
+    listing_cache_ttl_s: float | None = _DEFAULT_TTL
+    # Persist the listings here, so they survive a restart - None to keep them in memory only
+    listing_cache_path: str | None = None
+    # List the whole remote with one `lsjson -R` the first time anything is asked for
+    listing_prefetch_tree: bool = False
+    # Start one `rclone rcd` at startup and make every listing, stat and read through its HTTP API - see rclone_rcd
+    daemon: bool = False
+    # Requests made to the daemon at once
+    daemon_max_connections: int = 8
+    # Times the daemon is restarted after dying - before giving up
+    daemon_max_restarts: int = 3
+    # Open files seekably, fetching only the ranges read (rather than streaming each file from the start) - see
+    # rclone_range_reader. None does so only while the daemon is running - without it each range fetched is an
+    # `rclone cat` process of its own. Files of unknown size are always streamed.
+    seekable_reads: bool | None = None
+    # Bytes fetched at a time by a seekable read - and the unit they're cached in
+    read_block_size: int = DEFAULT_BLOCK_SIZE
+    # Bytes of fetched blocks kept per open file
+    read_cache_bytes: int = DEFAULT_CACHE_BYTES
+    # The most blocks read ahead of sequential reads
+    read_ahead_blocks: int = DEFAULT_READ_AHEAD_BLOCKS
+
+    def __post_init__(self) -> None:
+        if self.listing_cache_ttl_s is _DEFAULT_TTL:
+            self.listing_cache_ttl_s = None if self.listing_cache_path else DEFAULT_LISTING_CACHE_TTL_S
 
 
 class RcloneHttpReadOnlyStorageBackend(StorageBackendAPI):
@@ -41,11 +80,95 @@ class RcloneHttpReadOnlyStorageBackend(StorageBackendAPI):
         super().__init__(url=url, name=name, uuid=uuid)
         self.options = options or RcloneBackendOptions()
         self._event_log = InMemoryEventLog()
+        self.daemon: RcloneDaemon | None = None
+        if self.options.daemon:
+            self.daemon = RcloneDaemon(
+                rclone_exe=self.options.rclone_exe,
+                extra_args=self.options.rclone_args,
+                env=self.options.env,
+                max_connections=self.options.daemon_max_connections,
+                max_restarts=self.options.daemon_max_restarts,
+                timeout_s=self.options.timeout_s,
+            )
+        self.listing_cache: RcloneListingCache | None = None
+        if self.options.listing_cache:
+            self.listing_cache = RcloneListingCache(
+                self.lsjson,
+                ttl_s=self.options.listing_cache_ttl_s,
+                persist_path=self.options.listing_cache_path,
+                root_key=url,
+                prefetch_tree=self.options.listing_prefetch_tree,
+            )
+
+    def _join(self, rel: str) -> str:
+        """The rclone path of a path relative to the root of the store."""
+        if not rel:
+            return self.url
+        if self.url.endswith(":"):
+            return f"{self.url}{rel}"
+        return f"{self.url.rstrip('/')}/{rel}"
+
+    def rel_from_url(self, file_url: str) -> str | None:
+        """The path of a file url relative to the root of the store - None if it's not in the store."""
+        root = self.url if self.url.endswith(":") else self.url.rstrip("/") + "/"
+        if file_url.rstrip("/") == self.url.rstrip("/"):
+            return ""
+        if not file_url.startswith(root):
+            return None
+        return file_url[len(root) :].strip("/")
+
+    def lsjson(self, rel_dir: str, recursive: bool) -> list[dict[str, Any]]:
+        """List a directory with `rclone lsjson` (or the daemon) - the lister for the listing cache.
+
+        :param rel_dir: The directory - relative to the root of the store
+        :param recursive: List everything under the directory, not just its children
+        :return: `lsjson` items - with paths relative to the directory
+        """
+        if self.daemon is not None:
+            items = self.daemon.list(self.url, rel_dir, recursive=recursive)
+            # rc paths are relative to the root of the fs - lsjson's to the directory listed
+            prefix = rel_dir.strip("/") + "/" if rel_dir.strip("/") else ""
+            for item in items:
+                path = item.get("Path") or ""
+                if prefix and path.startswith(prefix):
+                    item["Path"] = path[len(prefix) :]
+            return items
+        path = self._join(rel_dir)
+        if not path.endswith((":", "/")):
+            path += "/"
+        args = ["lsjson", "-R", path] if recursive else ["lsjson", path]
+        return (
+            run_rclone_json(
+                args,
+                rclone_exe=self.options.rclone_exe,
+                extra_args=self.options.rclone_args,
+                env=self.options.env,
+                timeout_s=self.options.timeout_s,
+                check=True,
+            )
+            or []
+        )
+
+    def invalidate_listings(self, file_url: str | None = None) -> None:
+        """Forget cached listings - of a path (and everything under it) or, by default, all of them.
+
+        Call this when the remote has been changed behind our back.
+        """
+        if self.listing_cache is None:
+            return
+        if file_url is None:
+            self.listing_cache.invalidate()
+            return
+        rel = self.rel_from_url(file_url)
+        self.listing_cache.invalidate(rel if rel is not None else None)
 
     def url_to_name(self, url: str) -> str:
         return safe_path_to_name(url)
 
     def startup(self) -> None:
+        if self.daemon is not None:
+            self.daemon.start()
+            return
         # Validate rclone exists and is runnable.
         run_rclone(
             ["version"],
@@ -65,14 +188,17 @@ class RcloneHttpReadOnlyStorageBackend(StorageBackendAPI):
         good = "unknown"
         try:
             # List root (non-recursive) to prove we can read.
-            run_rclone_json(
-                ["lsjson", "--max-depth", "1", self.url],
-                rclone_exe=self.options.rclone_exe,
-                extra_args=self.options.rclone_args,
-                env=self.options.env,
-                timeout_s=self.options.timeout_s,
-                check=True,
-            )
+            if self.daemon is not None:
+                self.daemon.list(self.url)
+            else:
+                run_rclone_json(
+                    ["lsjson", "--max-depth", "1", self.url],
+                    rclone_exe=self.options.rclone_exe,
+                    extra_args=self.options.rclone_args,
+                    env=self.options.env,
+                    timeout_s=self.options.timeout_s,
+                    check=True,
+                )
             cs.read = True
             cs.sundry = True
             good = "ok (read-only)"
@@ -97,7 +223,29 @@ class RcloneHttpReadOnlyStorageBackend(StorageBackendAPI):
     def status(self) -> StorageBackendStatus:
         return self.self_test()
 
+    def shutdown(self) -> None:
+        """Stop the daemon (if there is one) and persist the listing cache (if it's persisted)."""
+        if self.daemon is not None:
+            self.daemon.stop()
+        if self.listing_cache is not None and self.listing_cache.persist_path:
+            self.listing_cache.save()
+
     def file_exists(self, file_url: str) -> bool:
+        rel = self.rel_from_url(file_url) if self.listing_cache is not None else None
+        if rel is not None:
+            try:
+                return self.listing_cache.entry(rel) is not None
+            except Exception as e:
+                self._event_log.put(f"file_exists listing failed: {e!r}")
+                return False
+        if self.daemon is not None and rel is None:
+            rel = self.rel_from_url(file_url)
+        if self.daemon is not None and rel is not None:
+            try:
+                return self.daemon.stat(self.url, rel) is not None
+            except Exception as e:
+                self._event_log.put(f"file_exists stat failed: {e!r}")
+                return False
         try:
             run_rclone_json(
                 ["lsjson", "--stat", file_url],
@@ -131,7 +279,12 @@ class RcloneHttpReadOnlyStorageBackend(StorageBackendAPI):
         raise PermissionError("HTTP backend is read-only")
 
     def iter(self) -> Iterator[RcloneHttpReadOnlySingleFile]:
-        # Iterate all files in the store.
+        # Iterate all files in the store - one recursive listing, which also fills the listing cache.
+        if self.listing_cache is not None:
+            for rel, blob in self.listing_cache.walk(""):
+                if not blob["IsDir"]:
+                    yield self.get_file(self._join(rel))
+            return
         items = run_rclone_json(
             ["lsjson", "-R", "--files-only", self.url],
             rclone_exe=self.options.rclone_exe,
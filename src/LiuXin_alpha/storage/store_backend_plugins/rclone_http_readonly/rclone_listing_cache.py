@@ -0,0 +1,328 @@
+"""Directory listing cache for rclone remotes.
+
+Every stat / exists / is_file / is_dir on an rclone location used to fork `rclone lsjson --stat` - so
+`if p.is_file(): p.stat()` ran rclone twice. This keeps the `lsjson` listings of directories in memory instead, and
+answers those questions from them:
+
+- a directory is listed once (one `lsjson` call), and the stat of any of its children answered from that listing
+- a whole tree can be listed in one `lsjson -R` call - every directory in it is then known
+- missing paths under a listed directory are known to be missing without asking rclone again
+- listings expire after a TTL, and can be dropped explicitly (`invalidate`)
+- optionally, listings are persisted to disk - so a restart doesn't have to re-list a large remote (the backend then
+  trusts them until invalidated, unless given a TTL - persisted listings keep the time they were made, so a TTL
+  shorter than the downtime would expire them all)
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, Sequence
+
+# Bump when the layout of the persisted cache changes - older files are then ignored
+CACHE_FORMAT_VERSION = 1
+
+# Called with (relative directory, recursive) - returns the `rclone lsjson` items for the directory
+Lister = Callable[[str, bool], Sequence[Dict[str, Any]]]
+
+# What's kept for each entry - (is_dir, size, mod_time)
+Entry = tuple[bool, int, str]
+
+
+def split_rel(rel: str) -> tuple[str, str]:
+    """Split a relative posix path into (parent, name) - the parent of a top level entry is ""."""
+    if "/" in rel:
+        parent, name = rel.rsplit("/", 1)
+        return parent, name
+    return "", rel
+
+
+def join_rel(parent: str, name: str) -> str:
+    return f"{parent}/{name}" if parent else name
+
+
+def entry_blob(rel: str, entry: Entry) -> Dict[str, Any]:
+    """The `lsjson` style dict for an entry."""
+    is_dir, size, mod_time = entry
+    return {"Path": rel, "Name": split_rel(rel)[1], "Size": size, "ModTime": mod_time, "IsDir": is_dir}
+
+
+def _entry_from_item(item: Dict[str, Any]) -> Entry:
+    is_dir = bool(item.get("IsDir", False))
+    size = item.get("Size")
+    return is_dir, int(size if size is not None else -1), item.get("ModTime") or ""
+
+
+class RcloneListingCache:
+    """Cached `rclone lsjson` listings of a remote - keyed by directory, relative to the store root.
+
+    Thread safe. Listings are made while holding the lock - so concurrent lookups in a directory which hasn't been
+    listed yet wait for the one listing, rather than each making their own.
+    """
+
+    def __init__(
+        self,
+        lister: Lister,
+        *,
+        ttl_s: float | None = 300.0,
+        persist_path: str | None = None,
+        root_key: str = "",
+        prefetch_tree: bool = False,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        """
+        :param lister: Lists a directory - see Lister
+        :param ttl_s: Seconds a listing is trusted for - None to trust them until invalidated
+        :param persist_path: File to persist listings to (and load them from) - None to keep them in memory only
+        :param root_key: Identifies the remote - a persisted cache for a different remote is ignored
+        :param prefetch_tree: List the whole remote with one `lsjson -R` the first time anything is asked for
+        :param clock: Wall clock time (listing times are persisted, so this can't be monotonic)
+        """
+        self._lister = lister
+        self.ttl_s = ttl_s
+        self.persist_path = persist_path
+        self.root_key = root_key
+        self.prefetch_tree = prefetch_tree
+        self._clock = clock
+
+        # Relative directory -> (time listed, name -> Entry)
+        self._dirs: dict[str, tuple[float, dict[str, Entry]]] = {}
+        # Relative directory -> time listed - directories whose whole tree has been listed
+        self._trees: dict[str, float] = {}
+        self._lock = threading.RLock()
+
+        # Calls made to the lister
+        self.listings = 0
+
+        if persist_path:
+            self.load()
+
+    # --- freshness ---
+
+    def _is_fresh(self, listed_at: float) -> bool:
+        return self.ttl_s is None or self._clock() - listed_at <= self.ttl_s
+
+    def _fresh_children(self, rel_dir: str) -> dict[str, Entry] | None:
+        listing = self._dirs.get(rel_dir)
+        if listing is None or not self._is_fresh(listing[0]):
+            return None
+        return listing[1]
+
+    def _tree_is_fresh(self, rel_dir: str) -> bool:
+        """Has a tree containing the directory been listed (recently enough)?"""
+        while True:
+            listed_at = self._trees.get(rel_dir)
+            if listed_at is not None and self._is_fresh(listed_at):
+                return True
+            if not rel_dir:
+                return False
+            rel_dir = split_rel(rel_dir)[0]
+
+    def _known_missing(self, rel_dir: str) -> bool:
+        """Is the directory known not to exist - from the listing of one of its ancestors?"""
+        parts = rel_dir.split("/") if rel_dir else []
+        # The deepest ancestor with a fresh listing
+        for depth in range(len(parts) - 1, -1, -1):
+            ancestor = "/".join(parts[:depth])
+            kids = self._fresh_children(ancestor)
+            if kids is None:
+                continue
+            # Walk back down while the listings are known
+            for i in range(depth, len(parts)):
+                entry = kids.get(parts[i])
+                if entry is None or not entry[0]:
+                    return True
+                kids = self._fresh_children("/".join(parts[: i + 1]))
+                if kids is None:
+                    return False
+            return False
+        return False
+
+    # --- listing ---
+
+    def _list(self, rel_dir: str, recursive: bool) -> None:
+        items = self._lister(rel_dir, recursive) or []
+        self.listings += 1
+        now = self._clock()
+
+        if not recursive:
+            kids = {}
+            for item in items:
+                name = item.get("Name") or split_rel(item.get("Path") or "")[1]
+                if name:
+                    kids[name] = _entry_from_item(item)
+            self._dirs[rel_dir] = (now, kids)
+            return
+
+        # Every directory in the tree gets a listing - even if it's empty
+        listings: dict[str, dict[str, Entry]] = {rel_dir: {}}
+        entries = []
+        for item in items:
+            path = item.get("Path") or item.get("Name")
+            if not path:
+                continue
+            rel = join_rel(rel_dir, path.strip("/"))
+            entry = _entry_from_item(item)
+            entries.append((rel, entry))
+            if entry[0]:
+                listings.setdefault(rel, {})
+        for rel, entry in entries:
+            parent, name = split_rel(rel)
+            listings.setdefault(parent, {})[name] = entry
+        for path, kids in listings.items():
+            self._dirs[path] = (now, kids)
+        self._trees[rel_dir] = now
+
+        if self.persist_path:
+            self.save()
+
+    def children(self, rel_dir: str = "") -> dict[str, Entry] | None:
+        """The entries in a directory - listing it if need be.
+
+        :param rel_dir: The directory - relative to the root of the store, posix style
+        :return: Name -> (is_dir, size, mod_time) - or None if the directory is known not to exist
+        """
+        rel_dir = rel_dir.strip("/")
+        with self._lock:
+            kids = self._fresh_children(rel_dir)
+            if kids is not None:
+                return kids
+            if self._known_missing(rel_dir) or self._tree_is_fresh(rel_dir):
+                return None
+            if self.prefetch_tree and not self._tree_is_fresh(""):
+                self._list("", recursive=True)
+                return self._fresh_children(rel_dir)
+            self._list(rel_dir, recursive=False)
+            return self._dirs[rel_dir][1]
+
+    def entry(self, rel: str) -> Dict[str, Any] | None:
+        """The `lsjson --stat` style dict for a path - or None if it doesn't exist.
+
+        :param rel: Relative to the root of the store, posix style - "" for the root itself
+        :return:
+        """
+        rel = rel.strip("/")
+        if not rel:
+            if self.children("") is None:
+                return None
+            return entry_blob("", (True, -1, ""))
+        parent, name = split_rel(rel)
+        kids = self.children(parent)
+        if kids is None:
+            return None
+        entry = kids.get(name)
+        return None if entry is None else entry_blob(rel, entry)
+
+    def walk(self, rel_dir: str = "") -> Iterator[tuple[str, Dict[str, Any]]]:
+        """Everything under a directory - listing the whole tree in one go if it hasn't been.
+
+        :param rel_dir:
+        :return: Iterator of (path relative to rel_dir, `lsjson` style dict)
+        """
+        rel_dir = rel_dir.strip("/")
+        with self._lock:
+            if not self._tree_is_fresh(rel_dir):
+                self._list(rel_dir, recursive=True)
+            found = []
+            stack = [rel_dir]
+            while stack:
+                current = stack.pop()
+                kids = self._fresh_children(current) or {}
+                for name, entry in kids.items():
+                    rel = join_rel(current, name)
+                    found.append((rel[len(rel_dir) + 1 :] if rel_dir else rel, entry_blob(rel, entry)))
+                    if entry[0]:
+                        stack.append(rel)
+        return iter(found)
+
+    # --- invalidation ---
+
+    def invalidate(self, rel: str | None = None) -> None:
+        """Drop cached listings - so they're read from the remote again when next needed.
+
+        :param rel: A path which has changed - the listings of it, everything under it and its parent are dropped. None
+                    to drop everything.
+        :return:
+        """
+        with self._lock:
+            if rel is None:
+                self._dirs.clear()
+                self._trees.clear()
+            else:
+                rel = rel.strip("/")
+                prefix = rel + "/"
+                parent = split_rel(rel)[0] if rel else None
+                for path in list(self._dirs):
+                    if path == rel or path == parent or (not rel or path.startswith(prefix)):
+                        del self._dirs[path]
+                for path in list(self._trees):
+                    # Trees above the path no longer cover it
+                    if path == rel or not rel or path.startswith(prefix) or not path or prefix.startswith(path + "/"):
+                        del self._trees[path]
+            if self.persist_path:
+                self.save()
+
+    # --- persistence ---
+
+    def save(self) -> None:
+        """Write the listings to persist_path - atomically, so a crash can't leave half a cache."""
+        if not self.persist_path:
+            return
+        with self._lock:
+            blob = {
+                "version": CACHE_FORMAT_VERSION,
+                "root": self.root_key,
+                "dirs": {path: [listed_at, kids] for path, (listed_at, kids) in self._dirs.items()},
+                "trees": dict(self._trees),
+            }
+            target_dir = os.path.dirname(os.path.abspath(self.persist_path))
+            os.makedirs(target_dir, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=target_dir, prefix=".rclone-listing-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    with gzip.GzipFile(fileobj=f, mode="wb", compresslevel=1) as gz:
+                        gz.write(json.dumps(blob, separators=(",", ":")).encode("utf-8"))
+                os.replace(tmp, self.persist_path)
+            except BaseException:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+
+    def load(self) -> bool:
+        """Read persisted listings - stale ones are kept, but re-listed when asked for.
+
+        :return: True if a cache was loaded
+        """
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return False
+        try:
+            with gzip.open(self.persist_path, "rb") as f:
+                blob = json.loads(f.read().decode("utf-8"))
+        except (OSError, ValueError, EOFError):
+            return False
+        if not isinstance(blob, dict) or blob.get("version") != CACHE_FORMAT_VERSION:
+            return False
+        if blob.get("root") != self.root_key:
+            return False
+        with self._lock:
+            self._dirs = {
+                path: (listed_at, {name: tuple(entry) for name, entry in kids.items()})
+                for path, (listed_at, kids) in blob.get("dirs", {}).items()
+            }
+            self._trees = dict(blob.get("trees", {}))
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "directories": len(self._dirs),
+                "entries": sum(len(kids) for _, kids in self._dirs.values()),
+                "trees": len(self._trees),
+                "listings": self.listings,
+            }
@@ -0,0 +1,192 @@
+"""Seekable reads of rclone objects - by fetching ranges of them, rather than streaming the whole object.
+
+`rclone cat` streams an object from the start, so reading the central directory at the end of an EPUB (a zip) or the
+trailer of a PDF meant transferring the whole file. RcloneRangeReader is a seekable raw stream which fetches only the
+blocks which are read:
+
+- blocks are fetched with a range request (`rclone cat --offset/--count`, or a Range GET from the daemon) - runs of
+  missing blocks in a single request
+- fetched blocks are kept in a small LRU cache, so jumping back and forth (as zipfile does) doesn't re-fetch them
+- sequential reads are detected, and read ahead of - the read-ahead doubling while the reads stay sequential
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+# Fetched at a time - and the unit blocks are cached in
+DEFAULT_BLOCK_SIZE = 256 * 1024
+
+# Cached per open file
+DEFAULT_CACHE_BYTES = 8 * 1024 * 1024
+
+# Most blocks read ahead of sequential reads
+DEFAULT_READ_AHEAD_BLOCKS = 8
+
+# Called with (offset, count) - returns the bytes of the object in that range (fewer at the end of the object)
+RangeFetcher = Callable[[int, int], bytes]
+
+
+class RcloneRangeReader(io.RawIOBase):
+    """A seekable, read only raw stream over an object - fetched a range at a time."""
+
+    def __init__(
+        self,
+        fetch: RangeFetcher,
+        size: int,
+        *,
+        name: str = "",
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        cache_bytes: int = DEFAULT_CACHE_BYTES,
+        read_ahead_blocks: int = DEFAULT_READ_AHEAD_BLOCKS,
+    ) -> None:
+        """
+        :param fetch: Fetches a range of the object - see RangeFetcher
+        :param size: The size of the object - which must be known (objects of unknown size have to be streamed)
+        :param name: For error messages and repr
+        :param block_size: Bytes fetched (and cached) at a time
+        :param cache_bytes: Bytes of blocks to keep - at least one fetch's worth are always kept
+        :param read_ahead_blocks: The most blocks to read ahead of sequential reads (0 to never read ahead)
+        """
+        super().__init__()
+        if int(size) < 0:
+            raise ValueError(f"Size of {name or 'the object'} is not known - it can't be read by range")
+        self._fetch = fetch
+        self.size = int(size)
+        self.name = name
+        self.block_size = max(int(block_size), 1)
+        self.read_ahead_blocks = max(int(read_ahead_blocks), 0)
+        self.cache_blocks = max(cache_bytes // self.block_size, self.read_ahead_blocks + 1, 1)
+
+        self._pos = 0
+        self._blocks: OrderedDict[int, bytes] = OrderedDict()
+        # Where the last read ended - and how far ahead to read if the next starts there
+        self._last_end = -1
+        self._ahead = 0
+        self._lock = threading.Lock()
+
+        # Totals - to see how much of the object has been transferred
+        self.requests = 0
+        self.bytes_fetched = 0
+
+    def __repr__(self) -> str:
+        return f"RcloneRangeReader({self.name!r}, size={self.size})"
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return False
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if self.closed:
+            raise ValueError("seek of closed file")
+        if whence == os.SEEK_SET:
+            pos = offset
+        elif whence == os.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == os.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if pos < 0:
+            raise OSError(22, "Invalid argument - negative seek position")
+        self._pos = pos
+        return pos
+
+    # --- blocks ---
+
+    def _load(self, first: int, last: int) -> None:
+        """
+        Make sure blocks first to last (inclusive) are cached - fetching runs of missing blocks together.
+        The cache isn't trimmed - so every block loaded is there to be read, however many there are. See _trim.
+        """
+        index = first
+        while index <= last:
+            if index in self._blocks:
+                self._blocks.move_to_end(index)
+                index += 1
+                continue
+            run_end = index
+            while run_end + 1 <= last and run_end + 1 not in self._blocks:
+                run_end += 1
+            offset = index * self.block_size
+            count = min((run_end + 1) * self.block_size, self.size) - offset
+            data = self._fetch(offset, count) if count > 0 else b""
+            self.requests += 1
+            self.bytes_fetched += len(data)
+            for i in range(index, run_end + 1):
+                start = (i - index) * self.block_size
+                self._blocks[i] = data[start : start + self.block_size]
+            index = run_end + 1
+
+    def _trim(self) -> None:
+        """Drop the least recently used blocks - down to cache_blocks."""
+        while len(self._blocks) > self.cache_blocks:
+            self._blocks.popitem(last=False)
+
+    def readinto(self, b) -> int:
+        if self.closed:
+            raise ValueError("read of closed file")
+        view = memoryview(b).cast("B")
+        with self._lock:
+            start = self._pos
+            end = min(start + len(view), self.size)
+            if end <= start:
+                return 0
+
+            first = start // self.block_size
+            last = (end - 1) // self.block_size
+            if start == self._last_end and self.read_ahead_blocks:
+                # Sequential - read further ahead each time, up to the limit
+                self._ahead = min(max(self._ahead * 2, 1), self.read_ahead_blocks)
+            else:
+                self._ahead = 0
+            if any(i not in self._blocks for i in range(first, last + 1)):
+                # Read ahead on a miss only - otherwise each read would fetch the one block past the last read ahead
+                fetch_last = min(last + self._ahead, (self.size - 1) // self.block_size)
+                self._load(first, fetch_last)
+            else:
+                for i in range(first, last + 1):
+                    self._blocks.move_to_end(i)
+
+            n = 0
+            pos = start
+            while pos < end:
+                index = pos // self.block_size
+                block = self._blocks[index]
+                offset = pos - index * self.block_size
+                chunk = block[offset : offset + (end - pos)]
+                if not chunk:
+                    # The object is shorter than we were told
+                    break
+                view[n : n + len(chunk)] = chunk
+                n += len(chunk)
+                pos += len(chunk)
+            # Reads bigger than the cache only hold on to their blocks until they've been copied out
+            self._trim()
+            self._pos = pos
+            self._last_end = pos
+            return n
+
+    def readall(self) -> bytes:
+        chunks = []
+        while True:
+            chunk = self.read(max(self.block_size, self.size - self._pos))
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+
+    def close(self) -> None:
+        self._blocks.clear()
+        super().close()
@@ -0,0 +1,410 @@
+"""A long-lived `rclone rcd` process - and a client for its HTTP API.
+
+Without it every listing, stat and read forks a fresh rclone (which then has to set up its own connections - and TLS
+sessions - to the remote). With it one rclone is started when the backend starts up and everything goes over its
+local HTTP API instead:
+
+- listings and stats are `operations/list` / `operations/stat` calls (the same items `lsjson` returns)
+- reads are GETs of `/[fs]/path` (served by `--rc-serve` - which also takes Range requests)
+- requests go over pooled keep-alive connections, at most `max_connections` at once - a read holds its connection (and
+  its place in that limit) until its stream is closed
+- if the process dies it's restarted (up to `max_restarts` times) and the request retried
+
+The API is bound to localhost, with random credentials passed through the environment (so they don't show up in the
+process list).
+"""
+
+from __future__ import annotations
+
+import base64
+import http.client
+import io
+import json
+import os
+import queue
+import secrets
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Mapping, Sequence
+from urllib.parse import quote
+
+from .rclone_utils import which_rclone
+
+
+class RcloneRcError(RuntimeError):
+    """An rc call failed - status is the HTTP status rclone answered with (404 for missing objects)."""
+
+    def __init__(self, message: str, status: int | None = None) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+def _free_port(host: str) -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((host, 0))
+        return s.getsockname()[1]
+
+
+class _DaemonStream(io.RawIOBase):
+    """The body of a GET from the daemon - its connection goes back to the pool when the body has been read.
+
+    Holds one of the daemon's connection slots until it's closed.
+    """
+
+    def __init__(
+        self, daemon: "RcloneDaemon", conn: http.client.HTTPConnection, response: Any, limit: int | None = None
+    ) -> None:
+        """
+        :param limit: Bytes to read at most - for servers which sent the whole object rather than the range
+        """
+        super().__init__()
+        self._daemon = daemon
+        self._conn = conn
+        self._response = response
+        self._remaining = limit
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b: Any) -> int:
+        if self._response is None or self._remaining == 0:
+            return 0
+        if self._remaining is not None and len(b) > self._remaining:
+            b = memoryview(b)[: self._remaining]
+        n = self._response.readinto(b)
+        if self._remaining is not None:
+            self._remaining -= n
+        return n
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            response, self._response = self._response, None
+            if response is not None:
+                try:
+                    if response.isclosed():
+                        # Read to the end - the connection can be used again
+                        self._daemon._checkin(self._conn)
+                    else:
+                        self._conn.close()
+                finally:
+                    self._daemon._slots.release()
+        finally:
+            super().close()
+
+
+class RcloneDaemon:
+    """A `rclone rcd` process, started on demand, and pooled connections to it."""
+
+    def __init__(
+        self,
+        *,
+        rclone_exe: str = "rclone",
+        extra_args: Sequence[str] | None = None,
+        env: Mapping[str, str] | None = None,
+        host: str = "127.0.0.1",
+        max_connections: int = 8,
+        max_restarts: int = 3,
+        startup_timeout_s: float = 15.0,
+        timeout_s: float | None = 60.0,
+    ) -> None:
+        """
+        :param rclone_exe:
+        :param extra_args: Passed to rclone before the rcd command (e.g. --config)
+        :param env:
+        :param host: Interface to bind the API to
+        :param max_connections: Requests made to the daemon at once
+        :param max_restarts: Times the process is restarted after dying - before giving up
+        :param startup_timeout_s: How long to wait for the API to come up
+        :param timeout_s: Socket timeout for requests
+        """
+        self.rclone_exe = rclone_exe
+        self.extra_args = list(extra_args or ())
+        self.env = dict(env or {})
+        self.host = host
+        self.max_connections = max(int(max_connections), 1)
+        self.max_restarts = max_restarts
+        self.startup_timeout_s = startup_timeout_s
+        self.timeout_s = timeout_s
+
+        self.port: int | None = None
+        self.restarts = 0
+        self._proc: subprocess.Popen | None = None
+        # stderr goes to a file - a pipe nobody reads would fill up and stall a long running rclone
+        self._stderr: Any = None
+        self._auth = ""
+        self._lock = threading.RLock()
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+        self._pool: queue.LifoQueue[http.client.HTTPConnection] = queue.LifoQueue()
+        # Bumped on every (re)start - connections to an older process are dropped rather than pooled
+        self._generation = 0
+
+    # --- process ---
+
+    @property
+    def running(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def start(self) -> None:
+        """Start the daemon and wait for its API to answer."""
+        with self._lock:
+            if self.running:
+                return
+            self._drop_pool()
+            user, password = secrets.token_hex(8), secrets.token_hex(16)
+            self._auth = "Basic " + base64.b64encode(f"{user}:{password}".encode("ascii")).decode("ascii")
+            self.port = _free_port(self.host)
+
+            env = os.environ.copy()
+            env.update(self.env)
+            env["RCLONE_RC_USER"] = user
+            env["RCLONE_RC_PASS"] = password
+            cmd = [
+                which_rclone(self.rclone_exe),
+                *self.extra_args,
+                "rcd",
+                "--rc-addr",
+                f"{self.host}:{self.port}",
+                "--rc-serve",
+            ]
+            self._stderr = tempfile.TemporaryFile()
+            self._proc = subprocess.Popen(
+                cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=self._stderr, env=env
+            )
+            self._generation += 1
+            self._wait_until_up()
+
+    def _wait_until_up(self) -> None:
+        deadline = time.monotonic() + self.startup_timeout_s
+        while True:
+            if self._proc.poll() is not None:
+                self._stderr.seek(0)
+                err = self._stderr.read().decode(errors="ignore").strip()
+                rc = self._proc.returncode
+                self.stop()
+                raise RcloneRcError(f"rclone rcd exited during startup (rc={rc}): {err}")
+            # Not through the pool - requests waiting on a restart may be holding every slot
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout_s)
+            try:
+                headers = self._headers({"Content-Type": "application/json"})
+                conn.request("POST", "/rc/noop", body=b"{}", headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise RcloneRcError(f"rclone rcd answered rc/noop with {response.status}", response.status)
+                return
+            except (OSError, http.client.HTTPException):
+                if time.monotonic() > deadline:
+                    self.stop()
+                    raise RcloneRcError(f"rclone rcd didn't answer on port {self.port}")
+                time.sleep(0.05)
+            finally:
+                conn.close()
+
+    def _restart(self, generation: int) -> bool:
+        """Restart the daemon after a failed request - unless it's been restarted since, or too often."""
+        with self._lock:
+            if generation != self._generation and self.running:
+                return True
+            if self.running:
+                # It's alive - the failure was something else
+                return False
+            if self.restarts >= self.max_restarts:
+                return False
+            self.restarts += 1
+            self.start()
+            return True
+
+    def stop(self) -> None:
+        with self._lock:
+            self._drop_pool()
+            proc, self._proc = self._proc, None
+            if proc is None:
+                return
+            if proc.poll() is None:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+            if self._stderr is not None:
+                self._stderr.close()
+                self._stderr = None
+
+    # --- connections ---
+
+    def _drop_pool(self) -> None:
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                return
+            conn.close()
+
+    def _checkout(self) -> http.client.HTTPConnection:
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout_s)
+            conn._rclone_generation = self._generation  # type: ignore[attr-defined]
+        return conn
+
+    def _checkin(self, conn: http.client.HTTPConnection) -> None:
+        if getattr(conn, "_rclone_generation", None) == self._generation:
+            self._pool.put(conn)
+        else:
+            conn.close()
+
+    def _headers(self, extra: Mapping[str, str] | None = None) -> Dict[str, str]:
+        headers = {"Authorization": self._auth}
+        if extra:
+            headers.update(extra)
+        return headers
+
+    # --- requests ---
+
+    def _request(self, command: str, params: Mapping[str, Any], retry: bool = True) -> Dict[str, Any]:
+        body = json.dumps(dict(params)).encode("utf-8")
+        for attempt in (0, 1):
+            with self._slots:
+                generation = self._generation
+                conn = self._checkout()
+                try:
+                    conn.request(
+                        "POST", "/" + command, body=body, headers=self._headers({"Content-Type": "application/json"})
+                    )
+                    response = conn.getresponse()
+                    data = response.read()
+                    failure = None
+                except (OSError, http.client.HTTPException) as e:
+                    conn.close()
+                    failure = e
+                else:
+                    self._checkin(conn)
+            if failure is None:
+                break
+            # Restarted outside the slot - so the restart can't wait on requests waiting on it
+            if not (retry and attempt == 0 and self._restart(generation)):
+                raise failure
+
+        try:
+            blob = json.loads(data.decode("utf-8")) if data.strip() else {}
+        except ValueError:
+            blob = {"error": data.decode("utf-8", errors="ignore")}
+        if response.status != 200:
+            err_str = f"rclone rc {command} failed ({response.status}): {blob.get('error')}"
+            raise RcloneRcError(err_str, response.status)
+        return blob
+
+    def call(self, command: str, **params: Any) -> Dict[str, Any]:
+        """Make an rc call - starting the daemon first if it isn't running.
+
+        :param command: e.g. "operations/list"
+        :param params: The parameters of the call
+        :return: The JSON response
+        """
+        if not self.running and self._proc is None:
+            self.start()
+        return self._request(command, params)
+
+    def list(self, fs: str, remote: str = "", recursive: bool = False) -> list[Dict[str, Any]]:
+        """The `lsjson` items in a directory."""
+        return self.call("operations/list", fs=fs, remote=remote, opt={"recurse": recursive}).get("list") or []
+
+    def stat(self, fs: str, remote: str) -> Dict[str, Any] | None:
+        """The `lsjson --stat` item for a path - None if it doesn't exist."""
+        try:
+            return self.call("operations/stat", fs=fs, remote=remote).get("item")
+        except RcloneRcError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    def object_path(self, fs: str, remote: str) -> str:
+        return f"/[{quote(fs, safe=':,=/')}]/{quote(remote.strip('/'), safe='/')}"
+
+    def open(self, fs: str, remote: str, offset: int = 0, count: int | None = None) -> io.RawIOBase:
+        """Read an object - or a range of it.
+
+        :param fs: The rclone fs the object is in
+        :param remote: Its path in the fs
+        :param offset: Byte to start at
+        :param count: Bytes to read - None to read to the end
+        :return: A raw stream of the body - it holds one of the max_connections slots until it's closed, so close it (or
+                 use it as a context manager) to hand the connection back
+        """
+        if not self.running and self._proc is None:
+            self.start()
+        if count == 0:
+            return io.BytesIO(b"")  # type: ignore[return-value]
+        headers = {}
+        if offset or count is not None:
+            end = "" if count is None else str(offset + count - 1)
+            headers["Range"] = f"bytes={offset}-{end}"
+        path = self.object_path(fs, remote)
+
+        for attempt in (0, 1):
+            # The slot is held for as long as the body is being read - a stream releases it when it's closed
+            self._slots.acquire()
+            stream = None
+            try:
+                generation = self._generation
+                conn = self._checkout()
+                try:
+                    conn.request("GET", path, headers=self._headers(headers))
+                    response = conn.getresponse()
+                    failure = None
+                except (OSError, http.client.HTTPException) as e:
+                    conn.close()
+                    failure = e
+                else:
+                    stream = self._response_stream(conn, response, path, fs + remote, offset, count)
+            finally:
+                if not isinstance(stream, _DaemonStream):
+                    self._slots.release()
+            if failure is None:
+                return stream
+            # Restarted outside the slot - so the restart can't wait on requests waiting on it
+            if not (attempt == 0 and self._restart(generation)):
+                raise failure
+        raise RcloneRcError(f"rclone rc GET {path} failed")
+
+    def _response_stream(
+        self, conn: http.client.HTTPConnection, response: Any, path: str, name: str, offset: int, count: int | None
+    ) -> io.RawIOBase:
+        """The body of the response to a GET made by open - as a stream of the range asked for."""
+        if response.status == 404:
+            response.read()
+            self._checkin(conn)
+            raise FileNotFoundError(name)
+        if response.status == 416:
+            # Asked for a range past the end of the object
+            response.read()
+            self._checkin(conn)
+            return io.BytesIO(b"")  # type: ignore[return-value]
+        if response.status not in (200, 206):
+            data = response.read()
+            self._checkin(conn)
+            raise RcloneRcError(
+                f"rclone rc GET {path} failed ({response.status}): {data.decode(errors='ignore').strip()}",
+                response.status,
+            )
+        if response.status == 200 and (offset or count is not None):
+            # The range wasn't honoured - skip to the offset, and stop after count bytes
+            skip = offset
+            try:
+                while skip:
+                    chunk = response.read(min(skip, 1 << 20))
+                    if not chunk:
+                        break
+                    skip -= len(chunk)
+            except BaseException:
+                conn.close()
+                raise
+            return _DaemonStream(self, conn, response, limit=count)
+        return _DaemonStream(self, conn, response)
@@ -20,12 +20,20 @@ class RcloneResult:
     stderr: str
 
 
+# rclone_exe -> resolved path - so PATH isn't searched on every call
+_WHICH_CACHE: dict[str, str] = {}
+
+
 def which_rclone(exe: str = "rclone") -> str:
+    path = _WHICH_CACHE.get(exe)
+    if path is not None and os.access(path, os.X_OK):
+        return path
     path = shutil.which(exe)
     if not path:
         raise RcloneNotInstalledError(
             f"rclone executable not found (looked for {exe!r}). Install rclone or set rclone_exe."
         )
+    _WHICH_CACHE[exe] = path
     return path
 
 
@@ -88,3 +96,28 @@ def run_rclone_json(
         raise RuntimeError(
             f"Invalid JSON from rclone. Command: {' '.join(res.args)}\nSTDOUT:\n{res.stdout}\nSTDERR:\n{res.stderr}"
         ) from e
+
+
+def read_rclone_range(
+    path: str,
+    offset: int,
+    count: int,
+    *,
+    rclone_exe: str = "rclone",
+    extra_args: Sequence[str] | None = None,
+    env: Mapping[str, str] | None = None,
+    timeout_s: float | None = None,
+) -> bytes:
+    """Read `count` bytes of an object from `offset` - with `rclone cat --offset --count`."""
+    cmd = [which_rclone(rclone_exe), *(extra_args or ()), "cat", "--offset", str(offset), "--count", str(count), path]
+
+    merged_env = os.environ.copy()
+    if env:
+        merged_env.update(dict(env))
+
+    p = subprocess.run(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=merged_env, timeout=timeout_s, check=False
+    )
+    if p.returncode != 0:
+        raise OSError(f"rclone cat failed (rc={p.returncode}): {p.stderr.decode(errors='ignore').strip()}")
+    return p.stdout
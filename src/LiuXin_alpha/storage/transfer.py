@@ -0,0 +1,603 @@
+"""
+Moves files between stores - many at once, verified as they're copied, and resumable.
+
+Each file is copied to a ".part" file next to its destination, and renamed into place once it's complete.
+- local -> local copies are made by the kernel (copy_file_range, or sendfile) a large chunk at a time - the digest is
+  taken from the same chunk as it passes through the page cache, so each file is only read from disk once
+- any other pair of stores is streamed through one large reused buffer - hashed as it's read
+- files are copied concurrently by a pool of workers
+- a journal (SQLite) records every file started and finished - so an interrupted transfer picks up where it left off,
+  skipping finished files and appending to partial ones (once they've been checked against the start of the source)
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import errno
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, Optional
+
+from LiuXin_alpha.storage.api.location_api import StoreLocationMixinAPI
+
+# Bytes copied (and hashed) at a time
+DEFAULT_BUFFER_SIZE = 8 * 1024 * 1024
+
+# Files copied at once
+DEFAULT_WORKERS = 4
+
+# Jobs handed to the pool ahead of the workers, per worker - the rest are taken from the jobs iterable as they finish
+JOBS_AHEAD_PER_WORKER = 2
+
+# Files are copied to their destination with this appended - and renamed into place when complete
+PART_SUFFIX = ".part"
+
+# Errors meaning the kernel can't copy between these two files - fall back to the next method
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF}
+
+
+class TransferVerificationError(OSError):
+    """The bytes copied don't have the digest they were expected to have."""
+
+
+class TransferCancelled(Exception):
+    """The transfer was cancelled - partial files are kept, to be resumed."""
+
+
+@dataclasses.dataclass
+class TransferJob:
+    """
+    A file to copy - from a Location in one store to a Location in another.
+    """
+    source: StoreLocationMixinAPI
+    dest: StoreLocationMixinAPI
+    expected_digest: Optional[str] = None   # - If known, the copy fails unless its digest matches
+
+    @property
+    def key(self) -> str:
+        """Identifies the job in the journal - there's only ever one file copied to a destination."""
+        return self.dest.as_store_key()
+
+
+@dataclasses.dataclass
+class TransferResult:
+    """
+    What happened to a job.
+    """
+    job: TransferJob
+    status: str                         # - "copied", "skipped" (finished in an earlier run), "failed" or "cancelled"
+    bytes_copied: int = 0               # - Copied in this run - resumed files count only the bytes appended
+    digest: Optional[str] = None
+    resumed_from: int = 0               # - Offset the copy was resumed from
+    method: str = ""                    # - "copy_file_range", "sendfile" or "stream"
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status in ("copied", "skipped")
+
+
+@dataclasses.dataclass
+class JournalEntry:
+    """
+    A journal row - the source as it was when the copy was started, and how far the copy got.
+    """
+    key: str
+    source: str
+    size: int
+    mtime_ns: int
+    algo: str
+    status: str             # - "partial", "done" or "failed"
+    digest: Optional[str]
+    error: Optional[str]
+    updated: float
+
+
+class TransferJournal:
+    """
+    Persisted record of the files a transfer has started and finished.
+
+    Safe to use from multiple threads.
+    """
+
+    def __init__(self, db_path: str | os.PathLike[str] = ":memory:") -> None:
+        """
+        :param db_path: SQLite file to keep the journal in - ":memory:" for a journal which only lasts as long as this
+                        object (and so can't resume anything)
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.fspath(db_path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS transfers ("
+                "key TEXT PRIMARY KEY, "
+                "source TEXT NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "mtime_ns INTEGER NOT NULL, "
+                "algo TEXT NOT NULL, "
+                "status TEXT NOT NULL, "
+                "digest TEXT, "
+                "error TEXT, "
+                "updated REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[JournalEntry]:
+        """
+        The journal entry for a destination - None if nothing has ever been copied to it.
+
+        :param key:
+        :return:
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, source, size, mtime_ns, algo, status, digest, error, updated FROM transfers WHERE key = ?",
+                (key,),
+            ).fetchone()
+        return JournalEntry(*row) if row is not None else None
+
+    def _put(self, entry: JournalEntry) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transfers (key, source, size, mtime_ns, algo, status, digest, error, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                dataclasses.astuple(entry),
+            )
+
+    def start(self, key: str, source: str, size: int, mtime_ns: int, algo: str) -> None:
+        """
+        Record that a copy has been started - of the source as it is now.
+
+        :param key:
+        :param source:
+        :param size:
+        :param mtime_ns:
+        :param algo:
+        :return:
+        """
+        self._put(JournalEntry(key, source, size, mtime_ns, algo, "partial", None, None, time.time()))
+
+    def finish(self, key: str, digest: Optional[str]) -> None:
+        """
+        Record that a copy has been completed (and verified).
+
+        :param key:
+        :param digest:
+        :return:
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE transfers SET status = 'done', digest = ?, error = NULL, updated = ? WHERE key = ?",
+                (digest, time.time(), key),
+            )
+
+    def fail(self, key: str, error: str) -> None:
+        """
+        Record that a copy has failed - it'll be started again from scratch.
+
+        :param key:
+        :param error:
+        :return:
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE transfers SET status = 'failed', error = ?, updated = ? WHERE key = ?",
+                (error, time.time(), key),
+            )
+
+    def entries(self, status: Optional[str] = None) -> list[JournalEntry]:
+        """
+        Every entry in the journal - or those with the given status.
+
+        :param status:
+        :return:
+        """
+        sql = "SELECT key, source, size, mtime_ns, algo, status, digest, error, updated FROM transfers"
+        with self._lock:
+            if status is None:
+                rows = self._conn.execute(sql + " ORDER BY key").fetchall()
+            else:
+                rows = self._conn.execute(sql + " WHERE status = ? ORDER BY key", (status,)).fetchall()
+        return [JournalEntry(*row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "TransferJournal":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def plan_tree(
+    source_root: StoreLocationMixinAPI, dest_root: StoreLocationMixinAPI, pattern: str = "*"
+) -> Iterator[TransferJob]:
+    """
+    Jobs copying every file under one Location to the same place under another.
+
+    :param source_root:
+    :param dest_root:
+    :param pattern: Only copy files matching this (rglob) pattern
+    :return:
+    """
+    for source in source_root.rglob(pattern):
+        if source.name.endswith(PART_SUFFIX) or not source.is_file():
+            continue
+        yield TransferJob(source=source, dest=dest_root / source.relative_to(source_root).as_posix())
+
+
+def _readinto_full(stream, view: memoryview) -> int:
+    """
+    Fill view from stream - short only at the end of the stream.
+    """
+    got = 0
+    while got < len(view):
+        n = stream.readinto(view[got:])
+        if not n:
+            break
+        got += n
+    return got
+
+
+def _mtime_ns(stat: os.stat_result) -> int:
+    # Stores which build their own stat_result (from a listing) may not have set the nanosecond fields
+    mtime_ns = getattr(stat, "st_mtime_ns", None)
+    return int(mtime_ns) if mtime_ns is not None else int(stat.st_mtime * 1e9)
+
+
+class TransferEngine:
+    """
+    Copies files between stores - see the module docstring.
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        algo: Optional[str] = "sha256",
+        journal: Optional[TransferJournal] = None,
+        zero_copy: bool = True,
+        verify_dest: bool = False,
+        fsync: bool = False,
+        retries: int = 1,
+    ) -> None:
+        """
+        :param workers: Files copied at once
+        :param buffer_size: Bytes copied (and hashed) at a time
+        :param algo: hashlib algorithm the copies are hashed with - None to not hash them
+        :param journal: Resumes from (and records progress in) this journal - defaults to one in memory
+        :param zero_copy: Let the kernel copy between local files - rather than reading them into a buffer
+        :param verify_dest: Also read back what was written - from the page cache for local copies, else by reading
+                            the finished file again
+        :param fsync: Flush each file to disk before renaming it into place
+        :param retries: Times a failed copy is retried (from scratch)
+        """
+        if algo is not None:
+            hashlib.new(algo)  # Fail early on an unknown algorithm
+        self.workers = max(int(workers), 1)
+        self.buffer_size = max(int(buffer_size), 64 * 1024)
+        self.algo = algo
+        self.journal = journal if journal is not None else TransferJournal()
+        self.zero_copy = zero_copy
+        self.verify_dest = verify_dest
+        self.fsync = fsync
+        self.retries = max(int(retries), 0)
+
+        self._cancelled = threading.Event()
+        self._stats_lock = threading.Lock()
+        self.bytes_copied = 0
+        self.files_copied = 0
+
+    def cancel(self) -> None:
+        """
+        Stop every copy at its next chunk - partial files are kept, and resumed by the next transfer of them.
+
+        Cancels the transfer in progress - the next call to transfer starts afresh (so the engine can be reused).
+
+        :return:
+        """
+        self._cancelled.set()
+
+    def _new_hasher(self) -> Optional["hashlib._Hash"]:
+        return hashlib.new(self.algo) if self.algo is not None else None
+
+    def _check_cancelled(self) -> None:
+        if self._cancelled.is_set():
+            raise TransferCancelled()
+
+    # --- local -> local ---
+
+    def _copy_local(self, src_path: str, part_path: str, offset: int, size: int, hasher) -> tuple[int, str]:
+        """
+        Copy src_path to part_path from offset - letting the kernel copy if it can.
+
+        :return: Bytes copied, and the method used
+        """
+        method = "stream"
+        if self.zero_copy:
+            if hasattr(os, "copy_file_range"):
+                method = "copy_file_range"
+            elif hasattr(os, "sendfile"):
+                method = "sendfile"
+
+        buf = bytearray(self.buffer_size)
+        view = memoryview(buf)
+        check_buf = bytearray(self.buffer_size) if self.verify_dest else None
+
+        # Read back from when verifying what was written
+        flags = (os.O_RDWR if check_buf is not None else os.O_WRONLY) | os.O_CREAT | getattr(os, "O_CLOEXEC", 0)
+        src_fd = os.open(src_path, os.O_RDONLY | getattr(os, "O_CLOEXEC", 0))
+        try:
+            dst_fd = os.open(part_path, flags | (0 if offset else os.O_TRUNC), 0o666)
+            try:
+                pos = offset
+                while pos < size:
+                    self._check_cancelled()
+                    want = min(self.buffer_size, size - pos)
+                    n = None
+                    if method == "copy_file_range":
+                        try:
+                            n = os.copy_file_range(src_fd, dst_fd, want, pos, pos)
+                        except OSError as e:
+                            if e.errno not in _UNSUPPORTED_ERRNOS:
+                                raise
+                            method = "sendfile" if hasattr(os, "sendfile") else "stream"
+                            continue
+                    elif method == "sendfile":
+                        try:
+                            os.lseek(dst_fd, pos, os.SEEK_SET)
+                            n = os.sendfile(dst_fd, src_fd, pos, want)
+                        except OSError as e:
+                            if e.errno not in _UNSUPPORTED_ERRNOS:
+                                raise
+                            method = "stream"
+                            continue
+
+                    if n is None:
+                        # Through the buffer
+                        n = os.preadv(src_fd, [view[:want]], pos)
+                        written = 0
+                        while written < n:
+                            written += os.pwrite(dst_fd, view[written:n], pos + written)
+                    elif n and (hasher is not None or check_buf is not None):
+                        # Just copied - so this is read from the page cache, not the disk
+                        n = os.preadv(src_fd, [view[:n]], pos)
+                    if not n:
+                        break
+
+                    if hasher is not None:
+                        hasher.update(view[:n])
+                    if check_buf is not None:
+                        got = os.preadv(dst_fd, [memoryview(check_buf)[:n]], pos)
+                        if got != n or check_buf[:n] != buf[:n]:
+                            raise TransferVerificationError(f"{part_path} doesn't match {src_path} at {pos}")
+                    pos += n
+
+                if self.fsync:
+                    os.fsync(dst_fd)
+            finally:
+                os.close(dst_fd)
+        finally:
+            os.close(src_fd)
+        return pos - offset, method
+
+    # --- anything else ---
+
+    def _copy_stream(self, job: TransferJob, part: StoreLocationMixinAPI, offset: int, hasher) -> int:
+        """
+        Copy the source to part from offset - through one reused buffer.
+
+        :return: Bytes copied
+        """
+        buf = bytearray(self.buffer_size)
+        view = memoryview(buf)
+        copied = 0
+        with job.source.open("rb") as src:
+            if offset:
+                if src.seekable():
+                    src.seek(offset)
+                else:
+                    skip = offset
+                    while skip:
+                        n = src.readinto(view[: min(skip, self.buffer_size)])
+                        if not n:
+                            break
+                        skip -= n
+            with part.open("ab" if offset else "wb") as dst:
+                while True:
+                    self._check_cancelled()
+                    n = src.readinto(buf)
+                    if not n:
+                        break
+                    if hasher is not None:
+                        hasher.update(view[:n])
+                    dst.write(view[:n])
+                    copied += n
+                if self.fsync:
+                    dst.flush()
+                    fileno = getattr(dst, "fileno", None)
+                    if fileno is not None:
+                        os.fsync(fileno())
+        return copied
+
+    def _hash_part(self, part: StoreLocationMixinAPI, hasher) -> int:
+        """
+        Feed everything in a partial file to the hasher - to check what was written to it.
+        """
+        buf = bytearray(self.buffer_size)
+        view = memoryview(buf)
+        total = 0
+        with part.open("rb") as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    return total
+                if hasher is not None:
+                    hasher.update(view[:n])
+                total += n
+
+    def _part_matches(self, job: TransferJob, part: StoreLocationMixinAPI, offset: int, hasher) -> bool:
+        """
+        Check a partial file against the first offset bytes of the source - feeding the source to the hasher, so the
+        digest of the finished file is taken from the source throughout.
+
+        :return: True if the partial file can be appended to
+        """
+        src_buf, part_buf = bytearray(self.buffer_size), bytearray(self.buffer_size)
+        src_view, part_view = memoryview(src_buf), memoryview(part_buf)
+        pos = 0
+        with job.source.open("rb") as src, part.open("rb") as f:
+            while pos < offset:
+                self._check_cancelled()
+                want = min(self.buffer_size, offset - pos)
+                n = _readinto_full(src, src_view[:want])
+                if n != want or _readinto_full(f, part_view[:want]) != want or src_view[:n] != part_view[:n]:
+                    return False
+                if hasher is not None:
+                    hasher.update(src_view[:n])
+                pos += n
+        return True
+
+    # --- jobs ---
+
+    def _resume_offset(self, job: TransferJob, part: StoreLocationMixinAPI, size: int, mtime_ns: int) -> int:
+        """
+        How much of a partial file from an earlier run can be kept - 0 unless the source is unchanged since.
+        """
+        entry = self.journal.get(job.key)
+        if entry is None or entry.status != "partial" or (entry.size, entry.mtime_ns) != (size, mtime_ns):
+            return 0
+        if entry.algo != (self.algo or ""):
+            return 0
+        try:
+            part_size = part.stat().st_size
+        except FileNotFoundError:
+            return 0
+        return part_size if part_size <= size else 0
+
+    def transfer_one(self, job: TransferJob) -> TransferResult:
+        """
+        Copy a single file - skipping it if an earlier run finished it, and resuming it if an earlier run started it.
+
+        :param job:
+        :return:
+        """
+        try:
+            self._check_cancelled()
+            stat = job.source.stat()
+            size, mtime_ns = stat.st_size, _mtime_ns(stat)
+
+            entry = self.journal.get(job.key)
+            if (
+                entry is not None
+                and entry.status == "done"
+                and (entry.size, entry.mtime_ns) == (size, mtime_ns)
+                and job.dest.is_file()
+                and job.dest.stat().st_size == size
+            ):
+                return TransferResult(job=job, status="skipped", digest=entry.digest)
+
+            part = job.dest.with_name(job.dest.name + PART_SUFFIX)
+            job.dest.parent.mkdir(parents=True, exist_ok=True)
+            attempt = 0
+            while True:
+                try:
+                    return self._attempt(job, part, size, mtime_ns)
+                except (TransferCancelled, FileNotFoundError):
+                    raise
+                except OSError:
+                    attempt += 1
+                    if attempt > self.retries:
+                        part.unlink(missing_ok=True)
+                        raise
+                    part.unlink(missing_ok=True)
+                    # Stale "partial" entry - so the retry starts from scratch
+                    self.journal.fail(job.key, "retrying")
+        except TransferCancelled as e:
+            return TransferResult(job=job, status="cancelled", error=e)
+        except Exception as e:
+            self.journal.fail(job.key, f"{type(e).__name__}: {e}")
+            return TransferResult(job=job, status="failed", error=e)
+
+    def _attempt(self, job: TransferJob, part: StoreLocationMixinAPI, size: int, mtime_ns: int) -> TransferResult:
+        hasher = self._new_hasher()
+        offset = self._resume_offset(job, part, size, mtime_ns)
+        if offset and not self._part_matches(job, part, offset, hasher):
+            # Not a copy of the start of the source - so copy it again from the start
+            hasher, offset = self._new_hasher(), 0
+        if not offset:
+            self.journal.start(job.key, job.source.as_store_key(), size, mtime_ns, self.algo or "")
+
+        src_path, part_path = job.source.local_path(), part.local_path()
+        if src_path is not None and part_path is not None:
+            copied, method = self._copy_local(src_path, part_path, offset, size, hasher)
+        else:
+            copied, method = self._copy_stream(job, part, offset, hasher), "stream"
+            if self.verify_dest:
+                check = self._new_hasher()
+                self._hash_part(part, check)
+                if hasher is not None and check.hexdigest() != hasher.hexdigest():
+                    raise TransferVerificationError(f"{part.as_store_key()} doesn't match what was written to it")
+
+        if offset + copied != size:
+            raise TransferVerificationError(
+                f"{job.source.as_store_key()} changed during the copy - expected {size} bytes, got {offset + copied}"
+            )
+        digest = hasher.hexdigest() if hasher is not None else None
+        if job.expected_digest is not None and digest is not None and digest != job.expected_digest:
+            raise TransferVerificationError(
+                f"{job.source.as_store_key()} copied with digest {digest} - expected {job.expected_digest}"
+            )
+
+        part.replace(job.dest.as_posix())
+        self.journal.finish(job.key, digest)
+        with self._stats_lock:
+            self.bytes_copied += copied
+            self.files_copied += 1
+        return TransferResult(
+            job=job, status="copied", bytes_copied=copied, digest=digest, resumed_from=offset, method=method
+        )
+
+    def transfer(
+        self, jobs: Iterable[TransferJob], progress: Optional[Callable[[TransferResult], None]] = None
+    ) -> list[TransferResult]:
+        """
+        Copy many files - concurrently.
+
+        Jobs are taken from jobs as the workers get through them - so a long (or lazily planned) list of jobs isn't
+        queued up all at once.
+
+        :param jobs:
+        :param progress: Called with each result as it comes in (from a worker thread)
+        :return: A result for each job - in the order the jobs were given
+        """
+        # A cancel applies to the transfer it was made during
+        self._cancelled.clear()
+
+        def run(job: TransferJob) -> TransferResult:
+            result = self.transfer_one(job)
+            if progress is not None:
+                progress(result)
+            return result
+
+        results: dict[int, TransferResult] = {}
+        pending = {}
+
+        def collect(return_when: str) -> None:
+            done, _ = wait(pending, return_when=return_when)
+            for future in done:
+                results[pending.pop(future)] = future.result()
+
+        max_pending = self.workers * JOBS_AHEAD_PER_WORKER
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for index, job in enumerate(jobs):
+                if len(pending) >= max_pending:
+                    collect(FIRST_COMPLETED)
+                pending[executor.submit(run, job)] = index
+            collect(ALL_COMPLETED)
+        return [results[index] for index in range(len(results))]
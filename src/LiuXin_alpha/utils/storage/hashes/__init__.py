@@ -1,7 +1,11 @@
 from __future__ import annotations
 
 import hashlib
-from typing import Union
+import os
+from typing import BinaryIO, Union
+
+from LiuXin_alpha.utils.storage.hashes.file_hashing import DEFAULT_BUFFER_SIZE
+from LiuXin_alpha.utils.storage.hashes.file_hashing import update_from_stream
 
 BytesLike = Union[bytes, bytearray, memoryview]
 
@@ -33,13 +37,53 @@ def sane_hash(
     else:
         raise TypeError(f"Unsupported type: {type(data)!r} (expected str or bytes-like)")
 
+    h = _new_hash(algo)
+    h.update(b)
+    return h.hexdigest() if hexdigest else h.digest()
+
+
+def sane_hash_stream(
+    stream: BinaryIO,
+    algo: str = "sha256",
+    hexdigest: bool = True,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+) -> str | bytes:
+    """
+    Streaming counterpart of `sane_hash` - hash everything left in a binary stream, buffer_size bytes at a time.
+
+    Returns:
+        - hex string if hexdigest=True (default)
+        - raw digest bytes if hexdigest=False
+
+    Examples:
+        sane_hash_stream(io.BytesIO(b"abc")) == sane_hash(b"abc")
+    """
+    h = _new_hash(algo)
+    update_from_stream((h,), stream, buffer_size)
+    return h.hexdigest() if hexdigest else h.digest()
+
+
+def sane_hash_file(
+    path: Union[str, os.PathLike[str]],
+    algo: str = "sha256",
+    hexdigest: bool = True,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+) -> str | bytes:
+    """
+    Hash the contents of a file - without reading it all into memory.
+
+    Examples:
+        sane_hash_file("book.epub") == sane_hash(open("book.epub", "rb").read())
+    """
+    with open(path, "rb") as stream:
+        return sane_hash_stream(stream, algo=algo, hexdigest=hexdigest, buffer_size=buffer_size)
+
+
+def _new_hash(algo: str) -> hashlib._Hash:
     try:
-        h = hashlib.new(algo)
+        return hashlib.new(algo)
     except ValueError as e:
         raise ValueError(
             f"Unknown hash algorithm {algo!r}. "
             f"Try one of: {sorted(hashlib.algorithms_available)}"
-        ) from e
-
-    h.update(b)
-    return h.hexdigest() if hexdigest else h.digest()
\ No newline at end of file
+        ) from e
\ No newline at end of file
@@ -0,0 +1,264 @@
+"""
+Streaming file hashing - with a persisted cache, so unchanged files are never read twice.
+
+Files are read once, in large buffers (or through mmap), and every requested digest is updated from the same buffer.
+hashlib releases the GIL while hashing large buffers - so FileHasher hashes files concurrently in a thread pool.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterable, Optional, Sequence, Union
+
+PathType = Union[str, os.PathLike[str]]
+
+# Bytes read at a time
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+# Files at least this big are mapped rather than read - 0 to never use mmap
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+
+def _new_hashers(algos: Sequence[str]) -> dict[str, hashlib._Hash]:
+    try:
+        return {algo: hashlib.new(algo) for algo in algos}
+    except ValueError as e:
+        raise ValueError(
+            f"Unknown hash algorithm in {list(algos)!r}. Try one of: {sorted(hashlib.algorithms_available)}"
+        ) from e
+
+
+def update_from_stream(
+    hashers: Iterable[hashlib._Hash],
+    stream: BinaryIO,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+) -> None:
+    """
+    Read a binary stream to the end - updating every hasher from each buffer read.
+
+    :param hashers:
+    :param stream: Opened in binary mode
+    :param buffer_size: Bytes read at a time
+    :return:
+    """
+    hashers = list(hashers)
+    readinto = getattr(stream, "readinto", None)
+    if readinto is None:
+        for chunk in iter(lambda: stream.read(buffer_size), b""):
+            for hasher in hashers:
+                hasher.update(chunk)
+        return
+
+    # Read into the same buffer every time - rather than allocating a new bytes object per read
+    buf = bytearray(buffer_size)
+    view = memoryview(buf)
+    while True:
+        n = readinto(buf)
+        if not n:
+            break
+        for hasher in hashers:
+            hasher.update(view[:n])
+
+
+def stream_digests(
+    stream: BinaryIO,
+    algos: Sequence[str] = ("sha256",),
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+) -> dict[str, str]:
+    """
+    Read a binary stream to the end - computing every requested digest in the one pass.
+
+    :param stream: Opened in binary mode
+    :param algos: Names of hashlib algorithms
+    :param buffer_size: Bytes read at a time
+    :return: Hex digest for each algorithm
+    """
+    hashers = _new_hashers(algos)
+    update_from_stream(hashers.values(), stream, buffer_size)
+    return {algo: hasher.hexdigest() for algo, hasher in hashers.items()}
+
+
+def file_digests(
+    path: PathType,
+    algos: Sequence[str] = ("sha256",),
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    mmap_threshold: int = MMAP_THRESHOLD,
+) -> dict[str, str]:
+    """
+    Hash a file in one pass - computing every requested digest.
+
+    :param path:
+    :param algos: Names of hashlib algorithms
+    :param buffer_size: Bytes read at a time
+    :param mmap_threshold: Map files of at least this size instead of reading them - 0 to never map
+    :return: Hex digest for each algorithm
+    """
+    with open(path, "rb") as stream:
+        size = os.fstat(stream.fileno()).st_size
+        if mmap_threshold and size >= mmap_threshold:
+            hashers = _new_hashers(algos)
+            with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    for start in range(0, size, buffer_size):
+                        for hasher in hashers.values():
+                            hasher.update(view[start : start + buffer_size])
+                finally:
+                    view.release()
+            return {algo: hasher.hexdigest() for algo, hasher in hashers.items()}
+
+        return stream_digests(stream, algos=algos, buffer_size=buffer_size)
+
+
+def _stat_key(path: PathType, stat: os.stat_result) -> tuple[str, int, int, int]:
+    """
+    The cache key for a file - the digest is only reused while all of these are unchanged.
+    """
+    return os.path.abspath(os.fspath(path)), stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+class HashCache:
+    """
+    Persisted (path, size, mtime_ns, inode) -> digest index.
+
+    A digest is only returned while the file it was taken from is unchanged - so a stale entry is never used.
+    Safe to use from multiple threads.
+    """
+
+    def __init__(self, db_path: PathType = ":memory:") -> None:
+        """
+        :param db_path: SQLite file to keep the index in - ":memory:" for an index which only lasts as long as this
+                        object
+        """
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.fspath(db_path), check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS file_hashes ("
+                "path TEXT NOT NULL, "
+                "algo TEXT NOT NULL, "
+                "size INTEGER NOT NULL, "
+                "mtime_ns INTEGER NOT NULL, "
+                "inode INTEGER NOT NULL, "
+                "digest TEXT NOT NULL, "
+                "PRIMARY KEY (path, algo))"
+            )
+
+    def get(self, path: PathType, stat: os.stat_result, algos: Sequence[str]) -> dict[str, str]:
+        """
+        Cached digests for the file - only those taken from the file as it is now.
+
+        :param path:
+        :param stat: Current stat of the file
+        :param algos:
+        :return: Digest for each algorithm found - missing algorithms are left out
+        """
+        path_key, size, mtime_ns, inode = _stat_key(path, stat)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT algo, digest FROM file_hashes WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+                (path_key, size, mtime_ns, inode),
+            ).fetchall()
+        return {algo: digest for algo, digest in rows if algo in algos}
+
+    def put(self, path: PathType, stat: os.stat_result, digests: dict[str, str]) -> None:
+        """
+        Record digests taken from the file when it had the given stat.
+
+        :param path:
+        :param stat:
+        :param digests:
+        :return:
+        """
+        path_key, size, mtime_ns, inode = _stat_key(path, stat)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO file_hashes (path, algo, size, mtime_ns, inode, digest) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(path_key, algo, size, mtime_ns, inode, digest) for algo, digest in digests.items()],
+            )
+
+    def discard(self, path: PathType) -> None:
+        """
+        Forget every digest for the file.
+
+        :param path:
+        :return:
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM file_hashes WHERE path = ?", (os.path.abspath(os.fspath(path)),))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self) -> "HashCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class FileHasher:
+    """
+    Hashing service - one pass per file, concurrent across files, and cached.
+    """
+
+    def __init__(
+        self,
+        algos: Sequence[str] = ("sha256",),
+        cache: Optional[HashCache] = None,
+        workers: Optional[int] = None,
+        buffer_size: int = DEFAULT_BUFFER_SIZE,
+        mmap_threshold: int = MMAP_THRESHOLD,
+    ) -> None:
+        """
+        :param algos: Digests computed for every file
+        :param cache: If provided, digests are read from and recorded in it
+        :param workers: Threads used by hash_files - defaults to the ThreadPoolExecutor default
+        :param buffer_size:
+        :param mmap_threshold:
+        """
+        self.algos = tuple(algos)
+        _new_hashers(self.algos)  # Fail early on an unknown algorithm
+        self.cache = cache
+        self.workers = workers
+        self.buffer_size = buffer_size
+        self.mmap_threshold = mmap_threshold
+
+    def hash_file(self, path: PathType) -> dict[str, str]:
+        """
+        Digests for a single file - read from the cache if the file hasn't changed since it was last hashed.
+
+        :param path:
+        :return: Hex digest for each algorithm
+        """
+        if self.cache is None:
+            return file_digests(path, self.algos, self.buffer_size, self.mmap_threshold)
+
+        stat = os.stat(path)
+        digests = self.cache.get(path, stat, self.algos)
+        missing = [algo for algo in self.algos if algo not in digests]
+        if missing:
+            new_digests = file_digests(path, missing, self.buffer_size, self.mmap_threshold)
+            # Only trust the new digests if the file didn't change while it was being read
+            if _stat_key(path, os.stat(path)) == _stat_key(path, stat):
+                self.cache.put(path, stat, new_digests)
+            digests.update(new_digests)
+        return digests
+
+    def hash_files(self, paths: Iterable[PathType]) -> dict[PathType, dict[str, str]]:
+        """
+        Digests for many files - hashed concurrently.
+
+        :param paths:
+        :return: Keyed with each path, valued with the digests for it
+        """
+        paths = list(paths)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return dict(zip(paths, executor.map(self.hash_file, paths)))
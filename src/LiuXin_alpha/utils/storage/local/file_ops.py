@@ -15,7 +15,6 @@ from __future__ import print_function
 import re
 import os
 import time
-import hashlib
 import shutil
 import platform
 import ctypes
@@ -26,6 +25,7 @@ from copy import deepcopy
 from io import StringIO, BytesIO
 
 from LiuXin_alpha.utils.libraries.liuxin_six import six_unicode
+from LiuXin_alpha.utils.storage.hashes.file_hashing import file_digests
 
 # from LiuXin.utils.calibre.constants import iswindows, islinux
 
@@ -214,25 +214,15 @@ def file_hasher(file_in, block_size=64):
     """
     Receives a file path. Returns a hash for that file.
     Now with additional length, due to an observed collision in sha-512.
+    The file is read in binary mode, in large buffers - see utils.storage.hashes.file_hashing.
     :param file_in:
-    :param block_size:
+    :param block_size: Retained for compatibility - the file is read DEFAULT_BUFFER_SIZE bytes at a time
     :return file_hash:
     """
-    hasher = hashlib.sha512()  # Declaring this as a default causes hash return to be non-deterministic.
-
     size = file_size(file_in)
 
-    file_in_pointer = open(file_in, "r")
-
-    buf = file_in_pointer.read(block_size)
-    while len(buf) > 0:
-        hasher.update(buf)
-        buf = file_in_pointer.read(block_size)
-
-    file_in_pointer.close()
-
     # Honestly can't believe this is needed - but I've seen a hash collision, and so it is
-    return hasher.hexdigest() + six_unicode(size)
+    return file_digests(file_in, ("sha512",))["sha512"] + six_unicode(size)
 
 
 def get_files(folder_path):
@@ -5,10 +5,10 @@ Macros to get various properties of files more conveniently.
 
 
 import os
-import hashlib
 from copy import deepcopy
 
 from LiuXin_alpha.utils.libraries.liuxin_six import six_unicode
+from LiuXin_alpha.utils.storage.hashes.file_hashing import file_digests
 
 
 def get_file_name(file_path: str) -> str:
@@ -77,23 +77,15 @@ def get_file_hash(file_path: str, blocksize: int = 64) -> str:
     Receives a file path. Returns a hash for that file.
 
     Now with additional length, due to an observed collision in sha-512.
+    The file is read in binary mode, in large buffers - see utils.storage.hashes.file_hashing.
     :param file_path: A path to the file in question
-    :param blocksize:
+    :param blocksize: Retained for compatibility - the file is read DEFAULT_BUFFER_SIZE bytes at a time
     :return:
     """
-    hasher = hashlib.sha512()  # Declaring this as a default causes hash return to be non-deterministic.
-
     size = get_file_size(file_path)
-    file_in_pointer = open(file_path, "r")
-
-    buf = file_in_pointer.read(blocksize)
-    while len(buf) > 0:
-        hasher.update(buf)
-        buf = file_in_pointer.read(blocksize)
-
-    file_in_pointer.close()
+    digest = file_digests(file_path, ("sha512",))["sha512"]
 
-    return hasher.hexdigest() + six_unicode(
+    return digest + six_unicode(
         size
     )  # Honestly can't believe this is needed - but I've seen a hash collision, and so it is
     # Still don't actually believe it
@@ -165,8 +157,9 @@ def get_all_file_properties(path):
     properties["path"] = file_path
     properties["name"] = get_file_name(file_path)
     properties["extension"] = get_file_ext(file_path)
+    # Both hashes are the same function of the file - so only read it once
     properties["hash_1"] = get_file_hash(file_path)
-    properties["hash_2"] = get_file_hash(file_path)
+    properties["hash_2"] = properties["hash_1"]
     properties["size"] = get_file_size(file_path)
     properties["effective_size"] = deepcopy(properties["size"])
 
@@ -12,7 +12,7 @@ import time
 import uuid
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Any, Dict, Optional, Union
+from typing import Any, BinaryIO, Dict, Optional, Union
 
 
 class StorageIOSmokeTest:
@@ -150,13 +150,24 @@ class StorageIOSmokeTest:
                 pass
 
     def sha256_file(self, path: Path) -> str:
-        h = hashlib.sha256()
         with path.open("rb") as f:
-            while True:
-                b = f.read(self.chunk_size)
-                if not b:
-                    break
-                h.update(b)
+            return self.sha256_stream(f)
+
+    def sha256_stream(self, stream: BinaryIO) -> str:
+        """
+        SHA-256 of everything left in a binary stream - read chunk_size bytes at a time into a single buffer.
+
+        :param stream:
+        :return:
+        """
+        h = hashlib.sha256()
+        buf = bytearray(self.chunk_size)
+        view = memoryview(buf)
+        while True:
+            n = stream.readinto(buf)
+            if not n:
+                break
+            h.update(view[:n])
         return h.hexdigest()
 
     def _cleanup(self) -> None:
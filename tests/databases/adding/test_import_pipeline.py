@@ -0,0 +1,228 @@
+import hashlib
+import os
+import threading
+
+from LiuXin_alpha.databases import import_pipeline
+from LiuXin_alpha.databases.import_pipeline import ImportPipeline
+from LiuXin_alpha.databases.import_pipeline import hash_file
+from LiuXin_alpha.utils.storage.hashes import file_hashing
+
+
+class _Metadata(object):
+    def __init__(self, title):
+        self.title = title
+
+
+def _read_book(formats):
+    """
+    Stands in for metadata_from_formats - the title is the name of the first file.
+    """
+    title = os.path.splitext(os.path.basename(sorted(formats)[0]))[0]
+    return _Metadata(title), formats, tuple(hash_file(path) for path in formats)
+
+
+class _Database(object):
+    def __init__(self, titles=()):
+        self.titles = set(titles)
+        self.imported = []
+
+    def has_book(self, mi):
+        return mi.title in self.titles
+
+    def import_book(self, mi, formats):
+        self.titles.add(mi.title)
+        self.imported.append(mi.title)
+        return len(self.imported)
+
+
+def _make_tree(root, books):
+    for dirname, filename, content in books:
+        os.makedirs(os.path.join(root, dirname), exist_ok=True)
+        with open(os.path.join(root, dirname, filename), "wb") as stream:
+            stream.write(content)
+
+
+class TestImportPipeline:
+    """
+    The pipeline should add every book found - skipping duplicates and honouring the callback.
+    """
+
+    def test_import(self, tmp_path) -> None:
+        _make_tree(
+            str(tmp_path),
+            [
+                ("a", "alpha.epub", b"alpha"),
+                ("b", "beta.epub", b"beta"),
+                ("c", "gamma.epub", b"gamma"),
+                # Same file as alpha - under another name
+                ("d", "delta.epub", b"alpha"),
+                ("e", "epsilon.epub", b"epsilon"),
+            ],
+        )
+        db = _Database(titles=["epsilon"])
+        added_ids = set()
+
+        duplicates = ImportPipeline(db, added_ids=added_ids, workers=1, read_book_impl=_read_book).run(str(tmp_path))
+
+        assert sorted(db.imported) == ["alpha", "beta", "gamma"]
+        assert added_ids == {1, 2, 3}
+        assert sorted(mi.title for mi, formats in duplicates) == ["delta", "epsilon"]
+
+    def test_process_pool(self, tmp_path) -> None:
+        _make_tree(str(tmp_path), [(str(i), "book{}.epub".format(i), str(i).encode()) for i in range(20)])
+        db = _Database()
+
+        ImportPipeline(db, workers=2, queue_size=4, write_batch_size=3, read_book_impl=_read_book).run(str(tmp_path))
+
+        assert sorted(db.imported) == sorted("book{}".format(i) for i in range(20))
+
+    def test_callback_aborts(self, tmp_path) -> None:
+        _make_tree(str(tmp_path), [(str(i), "book{}.epub".format(i), str(i).encode()) for i in range(20)])
+        db = _Database()
+        seen = []
+
+        def callback(title):
+            seen.append(title)
+            return title == "" and len(db.imported) == 5
+
+        ImportPipeline(db, callback=callback, workers=1, queue_size=2, read_book_impl=_read_book).run(str(tmp_path))
+
+        assert len(db.imported) == 5
+        # Called with the title of each book added, and with "" after each directory (the root included) - aborting
+        # after the directory
+        assert seen.count("") == 6
+        assert seen[-2:] == [db.imported[-1], ""]
+
+    def test_after_an_abort(self, tmp_path) -> None:
+        _make_tree(str(tmp_path), [(str(i), "book{}.epub".format(i), str(i).encode()) for i in range(50)])
+        db = _Database()
+        added_ids = set()
+
+        pipeline = ImportPipeline(
+            db,
+            callback=lambda title: title == "" and len(db.imported) == 1,
+            added_ids=added_ids,
+            workers=2,
+            queue_size=2,
+            write_batch_size=1,
+            read_book_impl=_read_book,
+        )
+        duplicates = pipeline.run(str(tmp_path))
+
+        # Nothing is added after the abort - and the discovery thread and the pool have been shut down
+        assert len(db.imported) == 1
+        assert added_ids == {1}
+        assert duplicates == []
+        assert not any(thread.name == "ImportDiscovery" for thread in threading.enumerate())
+
+    def test_callback_skips_the_rest_of_the_directory(self, tmp_path) -> None:
+        _make_tree(
+            str(tmp_path),
+            [("a", "one.epub", b"one"), ("a", "two.epub", b"two"), ("b", "three.epub", b"three")],
+        )
+        db = _Database()
+
+        ImportPipeline(
+            db,
+            single_book_per_directory=False,
+            callback=lambda title: title != "",
+            workers=1,
+            read_book_impl=_read_book,
+        ).run(str(tmp_path))
+
+        # Only the first book found in each directory
+        assert len(db.imported) == 2
+        assert "three" in db.imported
+
+
+class TestHashFile:
+    """
+    Files shouldn't be read again until they change.
+    """
+
+    def test_unchanged_files_are_not_reread(self, tmp_path, monkeypatch) -> None:
+        monkeypatch.setattr(import_pipeline, "_file_hasher", None)
+        reads = []
+
+        def file_digests(path, *args, **kwargs):
+            reads.append(os.path.basename(path))
+            return real_file_digests(path, *args, **kwargs)
+
+        real_file_digests = file_hashing.file_digests
+        monkeypatch.setattr(file_hashing, "file_digests", file_digests)
+
+        path = tmp_path / "one.epub"
+        path.write_bytes(b"one")
+        assert hash_file(str(path)) == hashlib.sha256(b"one").hexdigest()
+        assert hash_file(str(path)) == hashlib.sha256(b"one").hexdigest()
+        assert reads == ["one.epub"]
+
+        path.write_bytes(b"changed")
+        os.utime(str(path), ns=(0, 10**9))
+        assert hash_file(str(path)) == hashlib.sha256(b"changed").hexdigest()
+        assert reads == ["one.epub", "one.epub"]
+
+
+class TestImportPipelineDiscovery:
+    """
+    Books should be found as the per-directory imports find them - one file per format, with the rules applied.
+    """
+
+    def test_multiple_books_per_directory(self, tmp_path) -> None:
+        _make_tree(
+            str(tmp_path),
+            [
+                ("a", "one.epub", b"one epub"),
+                ("a", "one.mobi", b"one mobi"),
+                ("a", "two.epub", b"two"),
+                ("b", "three.epub", b"three"),
+            ],
+        )
+        db = _Database()
+        formats_read = []
+
+        def read_book_impl(formats):
+            formats_read.append(sorted(os.path.basename(path) for path in formats))
+            return _read_book(formats)
+
+        ImportPipeline(
+            db, single_book_per_directory=False, workers=1, read_book_impl=read_book_impl
+        ).run(str(tmp_path))
+
+        assert sorted(db.imported) == ["one", "three", "two"]
+        # Flat lists of paths - as import_book expects
+        assert sorted(formats_read) == [["one.epub", "one.mobi"], ["three.epub"], ["two.epub"]]
+
+    def test_single_book_per_directory(self, tmp_path) -> None:
+        _make_tree(str(tmp_path), [("a", "one.epub", b"one epub"), ("a", "one.mobi", b"one mobi")])
+        db = _Database()
+        formats_read = []
+
+        def read_book_impl(formats):
+            formats_read.append(formats)
+            return _read_book(formats)
+
+        ImportPipeline(db, workers=1, read_book_impl=read_book_impl).run(str(tmp_path))
+
+        assert db.imported == ["one"]
+        assert [sorted(os.path.basename(path) for path in formats) for formats in formats_read] == [
+            ["one.epub", "one.mobi"]
+        ]
+
+    def test_rules(self, tmp_path) -> None:
+        _make_tree(
+            str(tmp_path),
+            [("a", "one.epub", b"one"), ("a", "two.mobi", b"two"), ("b", "three.mobi", b"three")],
+        )
+        compiled_rules = ((lambda filename: filename.endswith(".mobi"), False),)
+
+        for single_book_per_directory, expected in ((True, ["one"]), (False, ["one"])):
+            db = _Database()
+            ImportPipeline(
+                db,
+                single_book_per_directory=single_book_per_directory,
+                compiled_rules=compiled_rules,
+                workers=1,
+                read_book_impl=_read_book,
+            ).run(str(tmp_path))
+            assert sorted(db.imported) == expected
@@ -0,0 +1,126 @@
+import sqlite3
+
+import pytest
+
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.bulk_insert import batch_rows
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.bulk_insert import insert_rows
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.bulk_insert import row_dict_values
+
+COLUMNS = ("tag", "tag_sort")
+
+
+def _make_conn(autoincrement=False):
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "CREATE TABLE tags (tag_id INTEGER PRIMARY KEY{}, tag TEXT UNIQUE, tag_sort TEXT)".format(
+            " AUTOINCREMENT" if autoincrement else ""
+        )
+    )
+    return conn
+
+
+def _tags(conn):
+    return dict(conn.execute("SELECT tag_id, tag FROM tags").fetchall())
+
+
+class _CountingConnection(object):
+    """
+    Counts the executemany calls made through it.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.executemany_calls = 0
+
+    def execute(self, *args):
+        return self.conn.execute(*args)
+
+    def executemany(self, *args):
+        self.executemany_calls += 1
+        return self.conn.executemany(*args)
+
+
+class TestInsertRows:
+    """
+    The ids returned should be the ids of the new rows, in the order the rows were given.
+    """
+
+    def test_ids_follow_the_maximum(self) -> None:
+        conn = _make_conn()
+        conn.execute("INSERT INTO tags (tag_id, tag) VALUES (5, 'existing')")
+
+        new_ids = insert_rows(conn, "tags", COLUMNS, [("a", "A"), ("b", "B"), ("c", "C")])
+
+        assert new_ids == [6, 7, 8]
+        assert _tags(conn) == {5: "existing", 6: "a", 7: "b", 8: "c"}
+
+    def test_ids_are_read_back_after_a_gap(self) -> None:
+        # AUTOINCREMENT tables carry on from the highest id ever used - not the current maximum
+        conn = _make_conn(autoincrement=True)
+        conn.executemany("INSERT INTO tags (tag) VALUES (?)", [("x",), ("y",), ("z",)])
+        conn.execute("DELETE FROM tags WHERE tag IN ('y', 'z')")
+
+        new_ids = insert_rows(conn, "tags", COLUMNS, [("a", "A"), ("b", "B")])
+
+        assert new_ids == [4, 5]
+        assert _tags(conn) == {1: "x", 4: "a", 5: "b"}
+
+    def test_chunks(self) -> None:
+        conn = _CountingConnection(_make_conn())
+        rows = (("tag {}".format(i), None) for i in range(10))
+
+        new_ids = insert_rows(conn, "tags", COLUMNS, rows, chunk_size=3)
+
+        assert new_ids == list(range(1, 11))
+        assert conn.executemany_calls == 4
+        assert _tags(conn.conn)[10] == "tag 9"
+
+    def test_bad_row(self) -> None:
+        conn = _make_conn()
+        with pytest.raises(ValueError):
+            insert_rows(conn, "tags", COLUMNS, [("a", "A"), ("b",)])
+        with pytest.raises(ValueError):
+            insert_rows(conn, "tags", COLUMNS, [], chunk_size=0)
+
+
+class TestBatchValidation:
+    """
+    Malformed batches should be rejected before anything is inserted.
+    """
+
+    def test_dict_batch(self) -> None:
+        columns, rows = batch_rows({"tag": ["a", "b"], "tag_sort": ["A", "B"]})
+        assert columns == COLUMNS
+        assert list(rows) == [("a", "A"), ("b", "B")]
+
+        with pytest.raises(ValueError):
+            batch_rows({"tag": ["a", "b"], "tag_sort": ["A"]})
+        with pytest.raises(ValueError):
+            batch_rows({"tag": ["a"]}, columns=("tag",))
+
+    def test_iterable_batch(self) -> None:
+        columns, rows = batch_rows([("a", "A")], columns=["tag", "tag_sort"])
+        assert columns == COLUMNS
+        assert list(rows) == [("a", "A")]
+
+        with pytest.raises(ValueError):
+            batch_rows([("a", "A")])
+
+    def test_row_dicts(self) -> None:
+        row_dicts = [
+            {"table": "tags", "tag_id": None, "tag": "a", "tag_sort": "A"},
+            {"tag_sort": "B", "tag": "b"},
+        ]
+        assert list(row_dict_values(row_dicts, COLUMNS, "tag_id")) == [("a", "A"), ("b", "B")]
+
+    def test_row_dicts_with_ids(self) -> None:
+        # Any row with an id - not just the first - would be an update
+        row_dicts = [{"tag": "a", "tag_sort": "A"}, {"tag_id": 3, "tag": "b", "tag_sort": "B"}]
+        with pytest.raises(ValueError):
+            list(row_dict_values(row_dicts, COLUMNS, "tag_id"))
+
+    def test_row_dicts_with_different_columns(self) -> None:
+        with pytest.raises(ValueError):
+            list(row_dict_values([{"tag": "a", "tag_sort": "A"}, {"tag": "b"}], COLUMNS, "tag_id"))
+        with pytest.raises(ValueError):
+            list(row_dict_values([{"tag": "a", "tag_sort": "A", "tag_note": "n"}], COLUMNS, "tag_id"))
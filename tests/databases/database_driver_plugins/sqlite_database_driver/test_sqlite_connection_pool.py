@@ -0,0 +1,143 @@
+import sqlite3
+import threading
+
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.connection_pool import SQLiteConnectionPool
+
+
+class _PoolableConnection(sqlite3.Connection):
+    """
+    Mirrors SQLite_Connection.close - pooled connections are handed back, rather than closed.
+    """
+
+    pool = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            sqlite3.Connection.close(self)
+
+
+def _make_pool(tmp_path):
+    db_path = str(tmp_path / "pool.db")
+
+    def factory():
+        return _PoolableConnection(db_path, check_same_thread=False)
+
+    return SQLiteConnectionPool(factory=factory)
+
+
+class TestSQLiteConnectionPool:
+    """
+    Tests for the connection pool used by the SQLite DatabaseDriver.
+    """
+
+    def test_reader_is_reused_within_a_thread(self, tmp_path) -> None:
+        pool = _make_pool(tmp_path)
+
+        first = pool.checkout()
+        first.close()
+        second = pool.checkout()
+
+        assert first is second
+        assert pool.stats.connections_opened == 1
+        assert pool.stats.read_checkouts == 2
+        pool.close_all()
+
+    def test_each_thread_gets_its_own_reader(self, tmp_path) -> None:
+        pool = _make_pool(tmp_path)
+        seen = []
+        # Keep every thread alive until they've all checked out - idents of exited threads can be reused
+        barrier = threading.Barrier(3)
+
+        def worker():
+            seen.append(pool.checkout())
+            barrier.wait(timeout=5)
+
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(set(id(conn) for conn in seen)) == 3
+        pool.close_all()
+
+    def test_writer_is_exclusive_until_closed(self, tmp_path) -> None:
+        pool = _make_pool(tmp_path)
+
+        writer = pool.checkout(write=True)
+        assert writer is not pool.checkout()
+
+        acquired = []
+
+        def other_writer():
+            conn = pool.checkout(write=True)
+            acquired.append(conn)
+            conn.close()
+
+        thread = threading.Thread(target=other_writer)
+        thread.start()
+        thread.join(timeout=0.2)
+        assert acquired == []
+
+        writer.close()
+        # A second close (legacy code paths do this) must not over-release the lock
+        writer.close()
+        thread.join(timeout=5)
+        assert acquired == [writer]
+        pool.close_all()
+
+    def test_close_all_really_closes(self, tmp_path) -> None:
+        pool = _make_pool(tmp_path)
+        reader = pool.checkout()
+        pool.checkout(write=True).close()
+        assert pool.size == 2
+
+        pool.close_all()
+
+        assert pool.size == 0
+        assert pool.stats.connections_closed == 2
+        try:
+            reader.execute("SELECT 1")
+        except sqlite3.ProgrammingError:
+            pass
+        else:
+            raise AssertionError("Connection should have been closed")
+
+    def test_writer_release_hook_runs_on_final_release(self, tmp_path) -> None:
+        released = []
+        db_path = str(tmp_path / "pool.db")
+        pool = SQLiteConnectionPool(
+            factory=lambda: _PoolableConnection(db_path, check_same_thread=False),
+            writer_release_hook=released.append,
+        )
+
+        outer = pool.checkout(write=True)
+        inner = pool.checkout(write=True)
+        inner.close()
+        assert released == []
+
+        outer.close()
+        assert released == [outer]
+        pool.close_all()
+
+    def test_open_transaction_is_rolled_back_on_final_release(self, tmp_path) -> None:
+        pool = _make_pool(tmp_path)
+        writer = pool.checkout(write=True)
+        writer.execute("CREATE TABLE t (x INTEGER)")
+        writer.commit()
+
+        # A failed legacy write which never committed or rolled back
+        outer = pool.checkout(write=True)
+        inner = pool.checkout(write=True)
+        inner.execute("INSERT INTO t VALUES (1)")
+        inner.close()
+        # Still inside the outer checkout - the transaction belongs to it
+        assert outer.in_transaction
+
+        outer.close()
+        writer.close()
+        assert not writer.in_transaction
+        assert pool.checkout().execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+        pool.close_all()
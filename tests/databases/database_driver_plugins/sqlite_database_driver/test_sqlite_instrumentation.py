@@ -0,0 +1,76 @@
+import sqlite3
+
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.instrumentation import ConnectionInstrument
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.instrumentation import InstrumentedConnectionMixin
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.instrumentation import StatementStatsRegistry
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.instrumentation import normalize_sql
+
+
+class _InstrumentedConnection(InstrumentedConnectionMixin, sqlite3.Connection):
+    pass
+
+
+def _make_conn(registry, sample_interval=10):
+    conn = sqlite3.connect(":memory:", factory=_InstrumentedConnection)
+    ConnectionInstrument(sample_interval=sample_interval, registry=registry).install(conn)
+    return conn
+
+
+class TestNormalizeSQL:
+    """
+    Statements which only differ by their values should be grouped together.
+    """
+
+    def test_literals_are_replaced(self) -> None:
+        assert normalize_sql("SELECT * FROM books WHERE book_id = 12") == "SELECT * FROM books WHERE book_id = ?"
+        assert normalize_sql("SELECT * FROM books WHERE title = 'It''s'") == "SELECT * FROM books WHERE title = ?"
+
+    def test_whitespace_and_in_lists_are_collapsed(self) -> None:
+        assert normalize_sql("SELECT  *\n FROM t WHERE id IN (?, ?,?);") == "SELECT * FROM t WHERE id IN (?, ...)"
+
+    def test_identifiers_with_digits_are_kept(self) -> None:
+        assert normalize_sql("SELECT col_2 FROM table3") == "SELECT col_2 FROM table3"
+
+
+class TestInstrumentedConnection:
+    """
+    Statements run through an instrumented connection should be recorded in the registry.
+    """
+
+    def test_rows_and_executions_are_recorded(self) -> None:
+        registry = StatementStatsRegistry()
+        conn = _make_conn(registry)
+
+        conn.execute("CREATE TABLE books (book_id INTEGER PRIMARY KEY, title TEXT)")
+        conn.executemany("INSERT INTO books (title) VALUES (?)", [("a",), ("b",), ("c",)])
+
+        for book_id in (1, 2):
+            rows = list(conn.execute("SELECT * FROM books WHERE book_id = ?", (book_id,)))
+            assert len(rows) == 1
+        assert len(conn.cursor().execute("SELECT * FROM books").fetchall()) == 3
+
+        stats = dict((entry["sql"], entry) for entry in registry.dump())
+        assert stats["SELECT * FROM books WHERE book_id = ?"]["executions"] == 2
+        assert stats["SELECT * FROM books WHERE book_id = ?"]["rows"] == 2
+        assert stats["SELECT * FROM books"]["rows"] == 3
+        assert stats["INSERT INTO books (title) VALUES (?)"]["executions"] == 1
+
+    def test_vm_ops_are_sampled(self) -> None:
+        registry = StatementStatsRegistry()
+        conn = _make_conn(registry, sample_interval=10)
+
+        conn.execute("WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 1000) SELECT sum(x) FROM c")
+
+        (entry,) = registry.dump()
+        assert entry["vm_ops"] > 1000
+        assert entry["vm_ops"] % 10 == 0
+        assert entry["wall_time"] > 0
+
+    def test_report_and_reset(self) -> None:
+        registry = StatementStatsRegistry()
+        conn = _make_conn(registry)
+        conn.execute("SELECT 1").fetchone()
+
+        assert "SELECT ?" in registry.format_report()
+        registry.reset()
+        assert registry.dump() == []
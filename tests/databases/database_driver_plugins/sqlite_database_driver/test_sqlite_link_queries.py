@@ -0,0 +1,95 @@
+import sqlite3
+
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.link_queries import IN_CHUNK_SIZE
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.link_queries import break_link_pairs_many
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.link_queries import linked_ids_many
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.link_queries import make_links_many
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.link_queries import replace_links_many
+
+LINK_COLUMNS = ("book_tag_links", "book_tag_link_book_id", "book_tag_link_tag_id")
+TYPE_COL = "book_tag_link_type"
+PRIORITY_COL = "book_tag_link_priority"
+
+
+def _make_conn(unique=True):
+    """
+    :param unique: Can a book be linked to a tag only once - if not, it can be linked to it once with each type
+    """
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "CREATE TABLE book_tag_links (book_tag_link_id INTEGER PRIMARY KEY, book_tag_link_book_id INT NULL, "
+        "book_tag_link_tag_id INT, book_tag_link_type TEXT, book_tag_link_priority INT, "
+        "UNIQUE(book_tag_link_book_id, book_tag_link_tag_id{}))".format("" if unique else ", book_tag_link_type")
+    )
+    return conn
+
+
+def _links(conn):
+    """
+    (book, tag, type) for every link - highest priority first.
+    """
+    return conn.execute(
+        "SELECT book_tag_link_book_id, book_tag_link_tag_id, book_tag_link_type FROM book_tag_links "
+        "ORDER BY book_tag_link_book_id, book_tag_link_priority DESC"
+    ).fetchall()
+
+
+class TestLinkedIdsMany:
+    """
+    Linked ids should be read a chunk of left ids at a time - the NULLs padding out the last chunk matching nothing.
+    """
+
+    def test_chunks_and_padding(self) -> None:
+        conn = _make_conn()
+        book_ids = list(range(1, 2 * IN_CHUNK_SIZE + 11))
+        make_links_many(conn, *LINK_COLUMNS, [(book_id, 10 * book_id) for book_id in book_ids], TYPE_COL, PRIORITY_COL)
+        # A link with a NULL left id - the padding must not pick it up
+        conn.execute("INSERT INTO book_tag_links (book_tag_link_book_id, book_tag_link_tag_id) VALUES (NULL, 99)")
+
+        linked = linked_ids_many(conn, *LINK_COLUMNS, book_ids + [100_000])
+        expected = {book_id: {book_id * 10} for book_id in book_ids}
+        expected[100_000] = set()
+        assert linked == expected
+        assert linked_ids_many(conn, *LINK_COLUMNS, []) == {}
+
+    def test_type_filter(self) -> None:
+        conn = _make_conn()
+        make_links_many(conn, *LINK_COLUMNS, [(1, 10), (2, 20)], TYPE_COL, PRIORITY_COL, link_type="a")
+        make_links_many(conn, *LINK_COLUMNS, [(1, 11)], TYPE_COL, PRIORITY_COL, link_type="b")
+
+        assert linked_ids_many(conn, *LINK_COLUMNS, [1, 2], type_col=TYPE_COL, type_filter="b") == {1: {11}, 2: set()}
+
+
+class TestBreakAndReplaceLinks:
+    """
+    Typed link changes should leave the links of every other type alone.
+    """
+
+    def test_break_pairs_of_a_type(self) -> None:
+        conn = _make_conn(unique=False)
+        make_links_many(conn, *LINK_COLUMNS, [(1, 10), (2, 20)], TYPE_COL, PRIORITY_COL, link_type="a")
+        make_links_many(conn, *LINK_COLUMNS, [(1, 10), (1, 11)], TYPE_COL, PRIORITY_COL, link_type="b")
+
+        break_link_pairs_many(conn, *LINK_COLUMNS, [(1, 10), (1, 11)], type_col=TYPE_COL, link_type="b")
+        assert sorted(_links(conn)) == [(1, 10, "a"), (2, 20, "a")]
+
+        break_link_pairs_many(conn, *LINK_COLUMNS, [(1, 10), (2, 20)])
+        assert _links(conn) == []
+
+    def test_replace_typed(self) -> None:
+        conn = _make_conn(unique=False)
+        make_links_many(conn, *LINK_COLUMNS, [(1, 10), (1, 12)], TYPE_COL, PRIORITY_COL, link_type="a")
+        make_links_many(conn, *LINK_COLUMNS, [(1, 10), (1, 11)], TYPE_COL, PRIORITY_COL, link_type="b")
+
+        replace_links_many(conn, *LINK_COLUMNS, {1: [13, 12]}, TYPE_COL, PRIORITY_COL, link_type="a")
+
+        # The a link to 10 is dropped, 12 kept (and re-prioritized) and 13 linked first - the b links are untouched
+        assert _links(conn) == [(1, 13, "a"), (1, 12, "a"), (1, 11, "b"), (1, 10, "b")]
+
+    def test_replace_untyped(self) -> None:
+        conn = _make_conn()
+        make_links_many(conn, *LINK_COLUMNS, [(1, 10), (1, 11), (2, 20)], TYPE_COL, PRIORITY_COL)
+
+        replace_links_many(conn, *LINK_COLUMNS, {1: [11, 10, 12], 2: []}, TYPE_COL, PRIORITY_COL)
+
+        assert _links(conn) == [(1, 11, None), (1, 10, None), (1, 12, None)]
@@ -0,0 +1,89 @@
+import sqlite3
+import threading
+
+import pytest
+
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.pragmas import build_performance_profile
+
+
+class TestPerformanceProfiles:
+    """
+    Tests for the PRAGMA sets applied to DatabaseDriver connections.
+    """
+
+    def test_wal_profile_is_applied_and_verified(self, tmp_path) -> None:
+        conn = sqlite3.connect(str(tmp_path / "wal.db"))
+        profile = build_performance_profile("wal", cache_size=-2048, mmap_size=0, checkpoint_interval=60)
+
+        profile.apply(conn)
+
+        assert profile.is_wal
+        assert profile.verify(conn) == {}
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        conn.close()
+
+    def test_verify_reports_mismatches(self, tmp_path) -> None:
+        conn = sqlite3.connect(str(tmp_path / "legacy.db"))
+        profile = build_performance_profile("wal", cache_size=-2048)
+
+        mismatches = profile.verify(conn)
+
+        assert mismatches["journal_mode"] == ("wal", "delete")
+        assert mismatches["synchronous"] == (1, 2)
+        conn.close()
+
+    def test_legacy_profile_leaves_wal(self, tmp_path) -> None:
+        db_path = str(tmp_path / "was_wal.db")
+        conn = sqlite3.connect(db_path)
+        build_performance_profile("wal").apply(conn)
+        conn.close()
+
+        profile = build_performance_profile("legacy")
+        assert profile.pragmas() == [("journal_mode", "DELETE")]
+        assert not profile.is_wal
+
+        conn = sqlite3.connect(db_path)
+        profile.apply(conn)
+        assert profile.verify(conn) == {}
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+        conn.close()
+
+    def test_unknown_profile(self) -> None:
+        with pytest.raises(ValueError):
+            build_performance_profile("turbo")
+
+    def test_wal_readers_do_not_block_the_writer(self, tmp_path) -> None:
+        db_path = str(tmp_path / "concurrent.db")
+        profile = build_performance_profile("wal")
+
+        writer = sqlite3.connect(db_path, check_same_thread=False)
+        profile.apply(writer)
+        writer.execute("CREATE TABLE books (book_id INTEGER PRIMARY KEY, title TEXT)")
+        writer.execute("INSERT INTO books (title) VALUES ('a')")
+        writer.commit()
+
+        # Hold a read transaction open on another connection
+        reader = sqlite3.connect(db_path, isolation_level=None)
+        profile.apply(reader)
+        reader.execute("BEGIN")
+        assert reader.execute("SELECT COUNT(*) FROM books").fetchone()[0] == 1
+
+        done = threading.Event()
+
+        def write():
+            writer.execute("INSERT INTO books (title) VALUES ('b')")
+            writer.commit()
+            done.set()
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join(timeout=5)
+
+        assert done.is_set()
+        # The reader keeps its snapshot until its transaction ends
+        assert reader.execute("SELECT COUNT(*) FROM books").fetchone()[0] == 1
+        reader.execute("COMMIT")
+        assert reader.execute("SELECT COUNT(*) FROM books").fetchone()[0] == 2
+
+        reader.close()
+        writer.close()
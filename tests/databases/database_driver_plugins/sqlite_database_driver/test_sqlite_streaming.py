@@ -0,0 +1,105 @@
+import sqlite3
+
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.streaming import RowHeader
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.streaming import StreamedRow
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.streaming import stream_cursor
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.streaming import stream_keyset
+
+
+class _TrackedConnection(sqlite3.Connection):
+    """
+    Records being closed - without actually closing (as a pooled connection would).
+    """
+
+    releases = 0
+
+    def close(self):
+        self.releases += 1
+
+
+def _make_conn(rows=25):
+    conn = sqlite3.connect(":memory:", factory=_TrackedConnection)
+    conn.execute("CREATE TABLE books (book_id INTEGER PRIMARY KEY, book_title TEXT, book_rating INTEGER)")
+    conn.executemany(
+        "INSERT INTO books (book_title, book_rating) VALUES (?, ?)",
+        [("Title {}".format(i), i % 5) for i in range(rows)],
+    )
+    return conn
+
+
+class TestStreamedRow:
+    """
+    StreamedRows should behave like read only row_dicts - converting values only when they're read.
+    """
+
+    def test_values_are_converted_lazily(self) -> None:
+        converted = []
+
+        def convert(value):
+            converted.append(value)
+            return str(value)
+
+        row = StreamedRow(RowHeader(("book_id", "book_title"), convert=convert), (1, "Title"))
+        assert converted == []
+
+        assert row["book_id"] == "1"
+        assert converted == [1]
+        assert row.values_tuple == (1, "Title")
+        assert row.as_dict() == {"book_id": "1", "book_title": "Title"}
+
+    def test_mapping_interface(self) -> None:
+        row = StreamedRow(RowHeader(("book_id", "book_title")), (1, "Title"))
+
+        assert "book_title" in row
+        assert row.get("missing", "default") == "default"
+        assert list(row) == ["book_id", "book_title"]
+        assert len(row) == 2
+
+
+class TestStreamCursor:
+    """
+    Rows should be read a chunk at a time from a dedicated cursor.
+    """
+
+    def test_all_rows_are_streamed_in_order(self) -> None:
+        conn = _make_conn()
+
+        rows = list(stream_cursor(conn, "SELECT book_id FROM books ORDER BY book_id", fetch_size=4))
+
+        assert rows == [(i,) for i in range(1, 26)]
+        assert conn.releases == 1
+
+    def test_records(self) -> None:
+        conn = _make_conn(rows=3)
+        header = RowHeader(("book_id", "book_title"))
+
+        rows = list(stream_cursor(conn, "SELECT book_id, book_title FROM books", fetch_size=2, header=header))
+
+        assert [row["book_title"] for row in rows] == ["Title 0", "Title 1", "Title 2"]
+
+    def test_connection_released_when_stream_is_abandoned(self) -> None:
+        conn = _make_conn()
+        rows = stream_cursor(conn, "SELECT book_id FROM books", fetch_size=4)
+
+        assert next(rows) == (1,)
+        rows.close()
+        assert conn.releases == 1
+
+
+class TestStreamKeyset:
+    """
+    Keyset paging should return every row once - releasing the connection between pages.
+    """
+
+    def test_pages_through_the_table(self) -> None:
+        conn = _make_conn()
+
+        rows = list(stream_keyset(lambda: conn, "books", "book_id", ("book_title",), fetch_size=10))
+
+        assert rows == [("Title {}".format(i),) for i in range(25)]
+        # Three pages - 10, 10 and a short page of 5
+        assert conn.releases == 3
+
+    def test_empty_table(self) -> None:
+        conn = _make_conn(rows=0)
+        assert list(stream_keyset(lambda: conn, "books", "book_id", ("book_title",), fetch_size=10)) == []
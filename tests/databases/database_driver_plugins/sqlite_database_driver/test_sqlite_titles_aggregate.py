@@ -0,0 +1,185 @@
+import sqlite3
+from contextlib import contextmanager
+
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.titles_aggregate import rebuild_titles_aggregate
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.titles_aggregate import titles_aggregate_handler
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.titles_aggregate import update_titles_aggregate
+from LiuXin_alpha.databases.dirty_queue import DirtyQueue, DirtyQueueWorker
+
+
+SCHEMA = """
+CREATE TABLE titles (title_id INTEGER PRIMARY KEY, title TEXT);
+CREATE TABLE titles_aggregate (
+    ta_title_id INTEGER PRIMARY KEY, ta_tags TEXT, ta_creators_tags TEXT, ta_series_tags TEXT,
+    ta_series_aggregate TEXT, ta_genre_aggregate TEXT, ta_publishers TEXT, ta_identifiers TEXT
+);
+CREATE TABLE tags (tag_id INTEGER PRIMARY KEY, tag TEXT);
+CREATE TABLE creators (creator_id INTEGER PRIMARY KEY, creator TEXT);
+CREATE TABLE series (series_id INTEGER PRIMARY KEY, series TEXT, series_parent INT NULL);
+CREATE TABLE genres (genre_id INTEGER PRIMARY KEY, genre TEXT, genre_parent INT NULL);
+CREATE TABLE publishers (publisher_id INTEGER PRIMARY KEY, publisher TEXT, publisher_parent INT NULL);
+CREATE TABLE identifiers (identifier_id INTEGER PRIMARY KEY, identifier_type TEXT, identifier TEXT);
+CREATE TABLE tag_title_links (tag_title_link_tag_id INT, tag_title_link_title_id INT);
+CREATE TABLE creator_title_links (creator_title_link_creator_id INT, creator_title_link_title_id INT);
+CREATE TABLE creator_tag_links (creator_tag_link_creator_id INT, creator_tag_link_tag_id INT);
+CREATE TABLE series_tag_links (series_tag_link_series_id INT, series_tag_link_tag_id INT);
+CREATE TABLE series_title_links (
+    series_title_link_series_id INT, series_title_link_title_id INT, series_title_link_priority INT
+);
+CREATE TABLE genre_title_links (
+    genre_title_link_genre_id INT, genre_title_link_title_id INT, genre_title_link_priority INT
+);
+CREATE TABLE publisher_title_links (
+    publisher_title_link_publisher_id INT, publisher_title_link_title_id INT, publisher_title_link_priority INT
+);
+CREATE TABLE identifier_title_links (identifier_title_link_identifier_id INT, identifier_title_link_title_id INT);
+"""
+
+
+def _adapt_set(values):
+    return ",".join(sorted(values))
+
+
+def _adapt_dict(values):
+    return ";".join("{}={}".format(key, _adapt_set(value)) for key, value in sorted(values.items()))
+
+
+def _make_conn():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(SCHEMA)
+    conn.executemany("INSERT INTO titles VALUES (?, ?)", [(1, "One"), (2, "Two"), (3, "Three")])
+    conn.executemany("INSERT INTO tags VALUES (?, ?)", [(1, "fantasy"), (2, "classic"), (3, "epic"), (4, "dragons")])
+    conn.execute("INSERT INTO creators VALUES (1, 'Author')")
+    conn.executemany(
+        "INSERT INTO series VALUES (?, ?, ?)", [(1, "Saga", None), (2, "Part", 1), (3, "Other", None)]
+    )
+    conn.executemany("INSERT INTO genres VALUES (?, ?, ?)", [(1, "Fiction", None), (2, "Fantasy", 1)])
+    conn.execute("INSERT INTO publishers VALUES (1, 'House', NULL)")
+    conn.executemany(
+        "INSERT INTO identifiers VALUES (?, ?, ?)", [(1, "isbn ", "123"), (2, "ISBN", "456"), (3, "asin", "B0")]
+    )
+
+    conn.executemany("INSERT INTO tag_title_links VALUES (?, ?)", [(1, 1), (2, 1), (2, 2)])
+    conn.execute("INSERT INTO creator_title_links VALUES (1, 1)")
+    conn.execute("INSERT INTO creator_tag_links VALUES (1, 2)")
+    conn.executemany("INSERT INTO series_tag_links VALUES (?, ?)", [(1, 3), (2, 4)])
+    conn.executemany("INSERT INTO series_title_links VALUES (?, ?, ?)", [(3, 1, 2), (2, 1, 1)])
+    conn.execute("INSERT INTO genre_title_links VALUES (2, 1, 1)")
+    conn.execute("INSERT INTO publisher_title_links VALUES (1, 2, 1)")
+    conn.executemany("INSERT INTO identifier_title_links VALUES (?, ?)", [(1, 1), (2, 1), (3, 1)])
+    return conn
+
+
+def _aggregate_row(conn, title_id):
+    cursor = conn.execute("SELECT * FROM titles_aggregate WHERE ta_title_id = ?", (title_id,))
+    columns = [description[0] for description in cursor.description]
+    row = cursor.fetchone()
+    return None if row is None else dict(zip(columns, row))
+
+
+class TestUpdateTitlesAggregate:
+    """
+    Every derived column should be recomputed for a batch of titles at once.
+    """
+
+    def test_update(self) -> None:
+        conn = _make_conn()
+        assert update_titles_aggregate(conn, [1, 2, 2], adapt_set=_adapt_set, adapt_dict=_adapt_dict) == 2
+
+        assert _aggregate_row(conn, 1) == {
+            "ta_title_id": 1,
+            "ta_tags": "classic,fantasy",
+            "ta_creators_tags": "classic",
+            "ta_series_tags": "dragons,epic",
+            "ta_series_aggregate": "Saga:Part & Other",
+            "ta_genre_aggregate": "Fiction:Fantasy",
+            "ta_publishers": None,
+            "ta_identifiers": "ASIN=B0;ISBN=123,456",
+        }
+        assert _aggregate_row(conn, 2)["ta_tags"] == "classic"
+        assert _aggregate_row(conn, 2)["ta_publishers"] == "House"
+        # Only the titles asked for are touched
+        assert _aggregate_row(conn, 3) is None
+
+    def test_stale_values_are_cleared(self) -> None:
+        conn = _make_conn()
+        update_titles_aggregate(conn, [1], adapt_set=_adapt_set, adapt_dict=_adapt_dict)
+
+        conn.execute("DELETE FROM tag_title_links WHERE tag_title_link_title_id = 1")
+        conn.execute("DELETE FROM series_title_links")
+        update_titles_aggregate(conn, [1], adapt_set=_adapt_set, adapt_dict=_adapt_dict)
+
+        row = _aggregate_row(conn, 1)
+        assert row["ta_tags"] is None
+        assert row["ta_series_aggregate"] is None
+        assert row["ta_creators_tags"] == "classic"
+
+    def test_empty_batch(self) -> None:
+        conn = _make_conn()
+        assert update_titles_aggregate(conn, []) == 0
+        assert conn.execute("SELECT COUNT(*) FROM titles_aggregate").fetchone()[0] == 0
+
+
+class TestRebuildTitlesAggregate:
+    """
+    A full rebuild should cover every title - in chunks - and drop rows for titles which are gone.
+    """
+
+    def test_rebuild(self) -> None:
+        conn = _make_conn()
+        conn.execute("INSERT INTO titles_aggregate (ta_title_id, ta_tags) VALUES (99, 'stale')")
+
+        assert rebuild_titles_aggregate(conn, adapt_set=_adapt_set, adapt_dict=_adapt_dict, chunk_size=2) == 3
+
+        ids = [row[0] for row in conn.execute("SELECT ta_title_id FROM titles_aggregate ORDER BY ta_title_id")]
+        assert ids == [1, 2, 3]
+        assert _aggregate_row(conn, 1)["ta_series_aggregate"] == "Saga:Part & Other"
+        assert _aggregate_row(conn, 3)["ta_tags"] is None
+
+
+class _DatabaseStandIn:
+    """
+    Just enough of a Database for the handler - a driver_wrapper whose write_transaction runs on one connection.
+    """
+
+    def __init__(self, conn) -> None:
+        self.conn = conn
+        self.driver_wrapper = self
+
+    @contextmanager
+    def write_transaction(self):
+        outermost = not self.conn.in_transaction
+        if outermost:
+            self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except Exception:
+            if outermost:
+                self.conn.rollback()
+            raise
+        if outermost:
+            self.conn.commit()
+
+
+class TestTitlesAggregateHandler:
+    """
+    Titles dirtied for the maintenance bot should have their aggregate rows recomputed by its handler.
+    """
+
+    def test_handler_through_the_bot(self, monkeypatch) -> None:
+        # The driver registers adapters for sets and dicts - the handler leaves writing them to those
+        monkeypatch.setitem(sqlite3.adapters, (set, sqlite3.PrepareProtocol), _adapt_set)
+        monkeypatch.setitem(sqlite3.adapters, (dict, sqlite3.PrepareProtocol), _adapt_dict)
+        conn = _make_conn()
+        conn.commit()
+        db = _DatabaseStandIn(conn)
+
+        worker = DirtyQueueWorker(db, DirtyQueue(), handlers={"titles_aggregate": titles_aggregate_handler})
+        worker.process_batch([("titles_aggregate", 1), ("titles_aggregate", 2)])
+
+        assert not conn.in_transaction
+        assert worker.failed_count == 0
+        assert _aggregate_row(conn, 1)["ta_tags"] == "classic,fantasy"
+        assert _aggregate_row(conn, 1)["ta_identifiers"] == "ASIN=B0;ISBN=123,456"
+        assert _aggregate_row(conn, 2)["ta_publishers"] == "House"
+        assert _aggregate_row(conn, 3) is None
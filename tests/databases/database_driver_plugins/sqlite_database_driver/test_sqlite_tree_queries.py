@@ -0,0 +1,105 @@
+import sqlite3
+
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.tree_queries import TREE_DEPTH_LIMIT
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.tree_queries import ancestors_stmt
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.tree_queries import roots_stmt
+from LiuXin_alpha.databases.database_driver_plugins.SQLite.tree_queries import subtree_stmt
+
+
+def _make_conn():
+    """
+    Two trees -
+    1 -> 2 -> 4
+      -> 3 -> 5 -> 6
+    7 -> 8
+    """
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "CREATE TABLE series (series_id INTEGER PRIMARY KEY, series TEXT, series_parent INT NULL, series_tree_id TEXT)"
+    )
+    conn.executemany(
+        "INSERT INTO series (series_id, series, series_parent) VALUES (?, ?, ?)",
+        [
+            (1, "one", None),
+            (2, "two", 1),
+            (3, "three", 1),
+            (4, "four", 2),
+            (5, "five", 3),
+            (6, "six", 5),
+            (7, "seven", None),
+            (8, "eight", 7),
+        ],
+    )
+    return conn
+
+
+def _run(conn, stmt, *values):
+    return conn.execute(stmt, values).fetchall()
+
+
+class TestAncestors:
+    """
+    The ancestor chain should come back root first, ending with the row itself.
+    """
+
+    def test_chain(self) -> None:
+        stmt = ancestors_stmt("series", "series_id", "series_parent", ("series_id", "series"))
+        rows = _run(_make_conn(), stmt, 6, TREE_DEPTH_LIMIT)
+        assert rows == [(1, "one"), (3, "three"), (5, "five"), (6, "six")]
+
+    def test_root_and_missing_rows(self) -> None:
+        conn = _make_conn()
+        stmt = ancestors_stmt("series", "series_id", "series_parent", ("series_id",))
+
+        assert _run(conn, stmt, 7, TREE_DEPTH_LIMIT) == [(7,)]
+        assert _run(conn, stmt, 100, TREE_DEPTH_LIMIT) == []
+        # Ids from row_dicts are unicode
+        assert _run(conn, stmt, "4", TREE_DEPTH_LIMIT) == [(1,), (2,), (4,)]
+
+    def test_cycle_terminates(self) -> None:
+        conn = _make_conn()
+        conn.execute("UPDATE series SET series_parent = 6 WHERE series_id = 1")
+        stmt = ancestors_stmt("series", "series_id", "series_parent", ("series_id",))
+
+        assert len(_run(conn, stmt, 6, 20)) == 21
+
+
+class TestSubtree:
+    """
+    The subtree should come back breadth first, starting with the row itself.
+    """
+
+    def test_subtree(self) -> None:
+        stmt = subtree_stmt("series", "series_id", "series_parent", ("series_id",))
+        conn = _make_conn()
+
+        assert _run(conn, stmt, 1, TREE_DEPTH_LIMIT) == [(1,), (2,), (3,), (4,), (5,), (6,)]
+        assert _run(conn, stmt, 3, TREE_DEPTH_LIMIT) == [(3,), (5,), (6,)]
+        assert _run(conn, stmt, 8, TREE_DEPTH_LIMIT) == [(8,)]
+        assert _run(conn, stmt, 100, TREE_DEPTH_LIMIT) == []
+
+
+class TestRoots:
+    """
+    Every row should be paired with the root of its tree.
+    """
+
+    def test_roots(self) -> None:
+        conn = _make_conn()
+        # A parent which points at nothing makes the row a root
+        conn.execute("INSERT INTO series (series_id, series, series_parent) VALUES (9, 'nine', 'None')")
+        stmt = roots_stmt("series", "series_id", "series_parent", ("series",))
+
+        roots = dict((row_id, (root_id, root)) for row_id, root_id, root in _run(conn, stmt, TREE_DEPTH_LIMIT))
+
+        assert roots == {
+            1: (1, "one"),
+            2: (1, "one"),
+            3: (1, "one"),
+            4: (1, "one"),
+            5: (1, "one"),
+            6: (1, "one"),
+            7: (7, "seven"),
+            8: (7, "seven"),
+            9: (9, "nine"),
+        }
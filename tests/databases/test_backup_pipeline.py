@@ -0,0 +1,343 @@
+import multiprocessing
+import os
+import weakref
+
+import pytest
+
+from LiuXin_alpha.databases.backup_pipeline import AdaptiveThrottle
+from LiuXin_alpha.databases.backup_pipeline import BackupEngine
+from LiuXin_alpha.databases.backup_pipeline import atomic_write
+
+
+class _Metadata(object):
+    def __init__(self, title):
+        self.title = title
+
+
+class _Proxy(object):
+    """
+    Ties a _Metadata to the cache, as ProxyMetadata does - and so can't be pickled.
+    """
+
+    def __init__(self, cache):
+        self._db = weakref.ref(cache)
+
+
+def _render(mi):
+    """
+    Stands in for metadata_to_opf.
+    """
+    if mi.title == "broken":
+        raise ValueError("Cannot render")
+    return "<opf>{}</opf>".format(mi.title).encode("utf-8")
+
+
+def _render_and_die(mi):
+    """
+    Kills the worker process it runs in - breaking the pool.
+    """
+    if multiprocessing.parent_process() is not None:
+        os._exit(1)
+    return _render(mi)
+
+
+class _Cache(object):
+    """
+    Stands in for the dirtied API of CalibreCache.
+    """
+
+    def __init__(self, titles, proxied=False):
+        """
+        :param proxied: Give the metadata a _proxy_metadata - as the real cache does
+        """
+        self.titles = dict(titles)
+        self.dirtied_cache = {book_id: sequence for sequence, book_id in enumerate(self.titles)}
+        self.written = dict()
+        self.clear_calls = 0
+        self.proxied = proxied
+        # Books which are still being created - they have no path yet
+        self.creating = set()
+
+    def get_dirtied_books(self, limit=None):
+        return sorted(self.dirtied_cache, key=self.dirtied_cache.get)[:limit]
+
+    def get_metadata_for_dump(self, book_id):
+        title = self.titles.get(book_id)
+        if title is None or book_id in self.creating:
+            return None, self.dirtied_cache.get(book_id)
+        mi = _Metadata(title)
+        if self.proxied:
+            mi._proxy_metadata = _Proxy(self)
+        return mi, self.dirtied_cache.get(book_id)
+
+    def has_id(self, book_id):
+        return book_id in self.titles
+
+    @property
+    def backend(self):
+        return self
+
+    def backup_paths_many(self, book_ids):
+        return {book_id: book_id for book_id in book_ids if book_id in self.titles}
+
+    def write_backup(self, path, raw):
+        # Paths are the book ids - see backup_paths_many
+        if self.titles[path] == "unwritable":
+            raise OSError("Disk full")
+        self.written[path] = raw
+
+    def requeue_dirtied(self, book_ids):
+        sequence = max(self.dirtied_cache.values()) + 1
+        for book_id in book_ids:
+            if book_id in self.dirtied_cache:
+                self.dirtied_cache[book_id] = sequence
+                sequence += 1
+
+    def clear_dirtied_many(self, book_id_sequence_map):
+        self.clear_calls += 1
+        for book_id, sequence in book_id_sequence_map.items():
+            if self.dirtied_cache.get(book_id) == sequence:
+                del self.dirtied_cache[book_id]
+
+
+class _BulkCache(_Cache):
+    """
+    A cache which can read a whole batch at once.
+    """
+
+    def __init__(self, titles, fail=False):
+        super(_BulkCache, self).__init__(titles)
+        self.fail = fail
+        self.bulk_calls = 0
+
+    def get_metadata_for_dump_many(self, book_ids):
+        self.bulk_calls += 1
+        if self.fail:
+            raise RuntimeError("Cannot read the batch")
+        return {book_id: _Cache.get_metadata_for_dump(self, book_id) for book_id in book_ids}
+
+    def get_metadata_for_dump(self, book_id):
+        if self.bulk_calls and not self.fail:
+            raise AssertionError("Read book by book")
+        return super(_BulkCache, self).get_metadata_for_dump(book_id)
+
+
+def _engine(cache, **kwargs):
+    kwargs.setdefault("render_workers", 1)
+    kwargs.setdefault("io_workers", 2)
+    return BackupEngine(cache, render=_render, **kwargs)
+
+
+class TestBackupEngine:
+    """
+    Dirtied books should be backed up a batch at a time - with their markers cleared together.
+    """
+
+    def test_batches(self) -> None:
+        cache = _Cache({book_id: "Book {}".format(book_id) for book_id in range(1, 8)})
+        engine = _engine(cache, batch_size=3)
+
+        assert engine.backup_batch() == 3
+        assert sorted(cache.written) == [1, 2, 3]
+        assert cache.clear_calls == 1
+
+        while engine.backup_batch():
+            pass
+        engine.close()
+
+        assert cache.written[7] == b"<opf>Book 7</opf>"
+        assert not cache.dirtied_cache
+        assert engine.stats()["written"] == 7
+
+    def test_failures(self) -> None:
+        cache = _Cache({1: "fine", 2: "broken", 3: "unwritable"})
+        # Book 4 has been deleted - there's nothing to write, but it should still be cleared
+        cache.dirtied_cache[4] = 10
+        results = []
+        engine = _engine(cache)
+
+        assert engine.backup_batch(callback=lambda book_id, mi, ok: results.append((book_id, ok))) == 4
+        engine.close()
+
+        assert sorted(results) == [(1, True), (2, False), (3, False), (4, False)]
+        # Write failures are retried later - render failures never will succeed
+        assert list(cache.dirtied_cache) == [3]
+        assert engine.stats()["failed"] == 2
+
+    def test_books_being_created_are_kept(self) -> None:
+        cache = _Cache({1: "one", 2: "two"})
+        cache.creating.add(1)
+        engine = _engine(cache)
+
+        engine.backup_batch()
+        assert sorted(cache.written) == [2]
+        assert list(cache.dirtied_cache) == [1]
+
+        # Backed up once it has a path
+        cache.creating.clear()
+        engine.backup_batch()
+        engine.close()
+        assert sorted(cache.written) == [1, 2]
+        assert not cache.dirtied_cache
+
+    def test_failing_books_do_not_starve_the_queue(self) -> None:
+        cache = _Cache({1: "unwritable", 2: "unwritable", 3: "three", 4: "four", 5: "five"})
+        engine = _engine(cache, batch_size=2)
+
+        # The failures go to the back of the queue - so the books behind them are still reached
+        for _ in range(3):
+            engine.backup_batch()
+        engine.close()
+
+        assert sorted(cache.written) == [3, 4, 5]
+        assert sorted(cache.dirtied_cache) == [1, 2]
+
+    def test_paths_are_read_once_per_batch(self) -> None:
+        cache = _Cache({1: "one", 2: "two", 3: "three"})
+        calls = []
+        read_paths = cache.backup_paths_many
+
+        def backup_paths_many(book_ids):
+            calls.append(list(book_ids))
+            return read_paths(book_ids)
+
+        cache.backup_paths_many = backup_paths_many
+        engine = _engine(cache)
+        assert engine.backup_batch() == 3
+        engine.close()
+
+        assert calls == [[1, 2, 3]]
+        assert sorted(cache.written) == [1, 2, 3]
+
+    def test_redirtied_books_are_kept(self) -> None:
+        cache = _Cache({1: "one"})
+        engine = _engine(cache)
+        original_render = engine.render
+
+        def render_and_redirty(mi):
+            cache.dirtied_cache[1] = 99
+            return original_render(mi)
+
+        engine.render = render_and_redirty
+        engine.backup_batch()
+        engine.close()
+
+        assert cache.dirtied_cache == {1: 99}
+
+    def test_no_clear(self) -> None:
+        cache = _Cache({1: "one"})
+        engine = _engine(cache)
+        engine.backup_batch([1], clear=False)
+        engine.close()
+        assert cache.written and cache.dirtied_cache
+
+    def test_bulk_read(self) -> None:
+        cache = _BulkCache({book_id: "Book {}".format(book_id) for book_id in range(1, 6)})
+        engine = _engine(cache, batch_size=5)
+        assert engine.backup_batch() == 5
+        engine.close()
+        assert cache.bulk_calls == 1
+        assert sorted(cache.written) == [1, 2, 3, 4, 5]
+
+        # The batch can't be read in one go - read book by book instead
+        cache = _BulkCache({1: "one", 2: "two"}, fail=True)
+        engine = _engine(cache)
+        assert engine.backup_batch() == 2
+        engine.close()
+        assert sorted(cache.written) == [1, 2]
+        assert not cache.dirtied_cache
+
+    def test_process_pool_and_atomic_writes(self, tmp_path) -> None:
+        cache = _Cache({1: "one", 2: "two"})
+        engine = _engine(cache, render_workers=2, path_for=lambda book_id: str(tmp_path / "{}.opf".format(book_id)))
+
+        assert engine.backup_batch() == 2
+        engine.close()
+
+        assert (tmp_path / "2.opf").read_bytes() == b"<opf>two</opf>"
+        assert sorted(os.listdir(str(tmp_path))) == ["1.opf", "2.opf"]
+
+    def test_process_pool_with_proxied_metadata(self) -> None:
+        cache = _Cache({1: "one", 2: "two", 3: "broken"}, proxied=True)
+        seen = []
+        engine = _engine(cache, render_workers=2)
+
+        assert engine.backup_batch(callback=lambda book_id, mi, ok: seen.append((book_id, mi, ok))) == 3
+        engine.close()
+
+        assert cache.written == {1: b"<opf>one</opf>", 2: b"<opf>two</opf>"}
+        assert not cache.dirtied_cache
+        # The metadata handed back still has its proxy
+        assert all(isinstance(mi._proxy_metadata, _Proxy) for _, mi, _ in seen)
+
+    def test_broken_process_pool(self) -> None:
+        cache = _Cache({1: "one", 2: "two"})
+        engine = BackupEngine(cache, render=_render_and_die, render_workers=2, io_workers=1)
+
+        # Rendered on the calling thread instead - nothing is cleared without being written
+        assert engine.backup_batch() == 2
+        engine.close()
+        assert sorted(cache.written) == [1, 2]
+        assert not cache.dirtied_cache
+
+    def test_process_pool_with_real_metadata(self) -> None:
+        pytest.importorskip("LiuXin")
+        from LiuXin.metadata.book.base import Metadata
+
+        from LiuXin_alpha.databases.backup_pipeline import render_opf
+        from LiuXin_alpha.databases.lazy import ProxyMetadata
+
+        class _FieldMetadata(dict):
+            def custom_field_keys(self):
+                return iter(())
+
+        cache = _Cache({1: "one"})
+        cache.formatter_template_cache = {}
+        cache.field_metadata = _FieldMetadata()
+
+        def get_metadata_for_dump(book_id):
+            # As Cache._get_metadata builds it
+            mi = Metadata(cache.titles[book_id])
+            mi._proxy_metadata = ProxyMetadata(cache, book_id, formatter=mi.formatter)
+            return mi, cache.dirtied_cache.get(book_id)
+
+        cache.get_metadata_for_dump = get_metadata_for_dump
+        engine = BackupEngine(cache, render=render_opf, render_workers=2, io_workers=1)
+        assert engine.backup_batch() == 1
+        engine.close()
+
+        assert b"one" in cache.written[1]
+        assert not cache.dirtied_cache
+
+
+class TestAtomicWrite:
+    """
+    The target should only ever be the old file or the new one.
+    """
+
+    def test_replace(self, tmp_path) -> None:
+        target = tmp_path / "metadata.opf"
+        target.write_bytes(b"old")
+        atomic_write(str(target), b"new")
+        assert target.read_bytes() == b"new"
+        assert os.listdir(str(tmp_path)) == ["metadata.opf"]
+
+    def test_failure_leaves_target(self, tmp_path) -> None:
+        target = tmp_path / "metadata.opf"
+        target.write_bytes(b"old")
+        with pytest.raises(TypeError):
+            atomic_write(str(target), "not bytes")
+        assert target.read_bytes() == b"old"
+        assert os.listdir(str(tmp_path)) == ["metadata.opf"]
+
+
+class TestAdaptiveThrottle:
+    """
+    Pauses should keep the work to the duty cycle - up to the cap.
+    """
+
+    def test_pause(self) -> None:
+        assert AdaptiveThrottle(duty_cycle=0.5).pause(0.2) == pytest.approx(0.2)
+        assert AdaptiveThrottle(duty_cycle=0.25).pause(0.2) == pytest.approx(0.6)
+        assert AdaptiveThrottle(duty_cycle=1.0).pause(5) == 0
+        assert AdaptiveThrottle(duty_cycle=0.1, max_pause=1.0).pause(5) == 1.0
@@ -0,0 +1,68 @@
+import pytest
+
+from LiuXin_alpha.databases.bulk_read import FieldColumns
+from LiuXin_alpha.databases.bulk_read import read_column
+
+
+class _Field(object):
+    """
+    A field whose for_book raises for unknown books - as the cache fields do.
+    """
+
+    def __init__(self, values):
+        self.values = values
+        self.calls = 0
+
+    def for_book(self, book_id, default_value=None):
+        self.calls += 1
+        if book_id not in self.values:
+            raise KeyError(book_id)
+        return self.values[book_id] or default_value
+
+
+class TestReadColumn:
+    """
+    Values should come back in book order - with the default for books without one.
+    """
+
+    def test_defaults(self) -> None:
+        field = _Field({1: "Dune", 2: "", 3: "Emma"})
+        assert read_column(field.for_book, [3, 4, 2, 1], default_value="Unknown") == [
+            "Emma",
+            "Unknown",
+            "Unknown",
+            "Dune",
+        ]
+        assert field.calls == 4
+
+    def test_other_errors_raise(self) -> None:
+        def for_book(book_id, default_value=None):
+            raise ValueError(book_id)
+
+        with pytest.raises(ValueError):
+            read_column(for_book, [1])
+        assert read_column(for_book, [1], default_value=0, errors=(ValueError,)) == [0]
+
+
+class TestFieldColumns:
+    """
+    Columns should stay aligned with the books - and be readable by book or by row.
+    """
+
+    def test_access(self) -> None:
+        columns = FieldColumns([10, 11, 12], {"title": ["A", "B", "C"]})
+        columns.add("tags", [("x",), (), ("y", "z")])
+
+        assert len(columns) == 3 and "tags" in columns and sorted(columns) == ["tags", "title"]
+        assert columns["title"] == ["A", "B", "C"]
+        assert columns.value("tags", 12) == ("y", "z")
+        assert columns.row(11) == {"title": "B", "tags": ()}
+        assert [book_id for book_id, row in columns.rows()] == [10, 11, 12]
+        assert columns.as_dict("title") == {10: "A", 11: "B", 12: "C"}
+        with pytest.raises(KeyError):
+            columns.row(13)
+
+    def test_misaligned(self) -> None:
+        columns = FieldColumns([10, 11])
+        with pytest.raises(ValueError):
+            columns.add("title", ["A"])
@@ -0,0 +1,84 @@
+"""
+Tests that the cached sort keys of a CalibreCache are dropped when a format's size is written - through a stand-in for the
+cache, its fields and its backend.
+"""
+
+from __future__ import annotations
+
+import threading
+from collections import defaultdict
+from types import SimpleNamespace
+
+import pytest
+
+# The cache needs the rest of LiuXin
+pytest.importorskip("LiuXin")
+
+from LiuXin_alpha.databases.caches.calibre import cache as cache_module  # noqa: E402
+from LiuXin_alpha.databases.sort_keys import SortEngine  # noqa: E402
+
+
+class _FormatsTable:
+    """
+    Records the size of each format of each book - update_fmt returns the largest, as the real table does.
+    """
+
+    def __init__(self, sizes):
+        self.sizes = {book_id: {"EPUB": size} for book_id, size in sizes.items()}
+
+    def update_fmt(self, book_id, fmt, fname, size, backend):
+        self.sizes[book_id][fmt] = size
+        return max(self.sizes[book_id].values())
+
+
+class _SizeTable:
+    def __init__(self, sizes):
+        self.book_col_map = dict(sizes)
+
+    def update_sizes(self, size_map):
+        self.book_col_map.update(size_map)
+
+
+def _stand_in(sizes, on_disk):
+    """
+    Just enough of a CalibreCache for format_metadata.
+    :param sizes: The sizes stored in the database
+    :param on_disk: The sizes the backend reads from the files
+    """
+    return SimpleNamespace(
+        format_metadata_cache=defaultdict(dict),
+        safe_read_lock=threading.RLock(),
+        write_lock=threading.RLock(),
+        fields={
+            "formats": SimpleNamespace(table=_FormatsTable(sizes)),
+            "size": SimpleNamespace(table=_SizeTable(sizes)),
+        },
+        backend=SimpleNamespace(format_metadata_from_loc=lambda loc: {"size": on_disk[loc.book_id]}),
+        _sort_engine=SortEngine(),
+    )
+
+
+def _sort_by_size(stand_in):
+    book_col_map = stand_in.fields["size"].table.book_col_map
+
+    def key_funcs():
+        return book_col_map.__getitem__
+
+    return stand_in._sort_engine.sort(sorted(book_col_map), [("size", True, key_funcs, True)])
+
+
+def test_sort_by_size_after_format_metadata(monkeypatch) -> None:
+    def loc_from_formats_field(field, book_id, fmt):
+        return SimpleNamespace(book_id=book_id, fmt_priority=fmt)
+
+    monkeypatch.setattr(cache_module, "loc_from_formats_field", loc_from_formats_field, raising=False)
+
+    stand_in = _stand_in(sizes={1: 10, 2: 20, 3: 30}, on_disk={1: 10, 2: 40, 3: 30})
+    assert _sort_by_size(stand_in) == [1, 2, 3]
+
+    format_metadata = cache_module.CalibreCache.format_metadata
+    format_metadata = getattr(format_metadata, "__wrapped__", format_metadata)
+    assert format_metadata(stand_in, 2, "EPUB", allow_cache=False, update_db=True) == {"size": 40}
+
+    assert stand_in.fields["size"].table.book_col_map[2] == 40
+    assert _sort_by_size(stand_in) == [1, 3, 2]
@@ -0,0 +1,132 @@
+import pytest
+
+from LiuXin_alpha.databases.category_cache import BookValueMap
+from LiuXin_alpha.databases.category_cache import CategoryEngine
+from LiuXin_alpha.databases.category_cache import CategoryRow
+from LiuXin_alpha.databases.category_cache import average_rating
+
+
+class _Table(object):
+    """
+    The maps of a many-many table.
+    """
+
+    def __init__(self, book_items, names):
+        self.id_map = dict(names)
+        self.set_books(book_items)
+
+    def set_books(self, book_items):
+        self.book_col_map = {book_id: tuple(items) for book_id, items in book_items.items() if items}
+        self.col_book_map = {}
+        for book_id, items in book_items.items():
+            for item_id in items:
+                self.col_book_map.setdefault(item_id, set()).add(book_id)
+
+
+class _Rows(object):
+    """
+    A make_row - counting the rows built.
+    """
+
+    def __init__(self, table, ratings):
+        self.table = table
+        self.ratings = ratings
+        self.built = []
+
+    def __call__(self, item_id, book_ids):
+        self.built.append(item_id)
+        name = self.table.id_map[item_id]
+        return CategoryRow(item_id, name, name, name.lower(), book_ids, average_rating(book_ids, self.ratings))
+
+
+def _counts(view):
+    return {row.name: len(ids) for row, ids, avg in view}
+
+
+TAGS = {1: "Fantasy", 2: "Horror", 3: "Poetry"}
+
+
+class TestCategoryEngine:
+    """
+    Rows should be built once - then only rebuilt for the items of books which change.
+    """
+
+    def test_incremental(self) -> None:
+        book_items = {10: [1], 11: [1, 2], 12: [2], 13: [3]}
+        table = _Table(book_items, TAGS)
+        ratings = {10: 4, 11: 2}
+        rows = _Rows(table, ratings)
+        engine = CategoryEngine()
+
+        view = engine.view("tags", table, rows, ratings)
+        assert _counts(view) == {"Fantasy": 2, "Horror": 2, "Poetry": 1}
+        assert {row.name: avg for row, ids, avg in view}["Fantasy"] == 3
+        assert len(rows.built) == 3
+
+        # Book 13 moves from Poetry to Fantasy - Fantasy is rebuilt, Poetry goes
+        engine.books_changed("tags", [13])
+        book_items[13] = [1]
+        table.set_books(book_items)
+        engine.books_changed("tags", [13])
+        assert _counts(engine.view("tags", table, rows, ratings)) == {"Fantasy": 3, "Horror": 2}
+        assert rows.built[3:] == [1]
+
+        # A rating changes - the items of the book in every field are rebuilt
+        ratings[12] = 5
+        engine.books_changed("rating", [12])
+        view = engine.view("tags", table, rows, ratings)
+        assert {row.name: avg for row, ids, avg in view}["Horror"] == 3.5
+        assert rows.built[4:] == [2]
+
+    def test_restricted(self) -> None:
+        table = _Table({10: [1], 11: [1, 2], 12: [2], 13: [3]}, TAGS)
+        ratings = {10: 4, 11: 2}
+        rows = _Rows(table, ratings)
+        engine = CategoryEngine()
+
+        view = engine.view("tags", table, rows, ratings, book_ids=frozenset((11, 13)))
+        assert _counts(view) == {"Fantasy": 1, "Horror": 1, "Poetry": 1}
+        assert {row.name: avg for row, ids, avg in view}["Fantasy"] == 2
+        assert engine.view("tags", table, rows, ratings, book_ids=[13, 11]) == view
+        assert engine.view("tags", table, rows, ratings, book_ids=frozenset()) == []
+
+        # Book 11 loses Fantasy - patched into the restricted view
+        engine.books_changed("tags", [11])
+        table.set_books({10: [1], 11: [2], 12: [2], 13: [3]})
+        engine.books_changed("tags", [11])
+        view = engine.view("tags", table, rows, ratings, book_ids=frozenset((11, 13)))
+        assert _counts(view) == {"Horror": 1, "Poetry": 1}
+        assert _counts(engine.view("tags", table, rows, ratings)) == {"Fantasy": 1, "Horror": 2, "Poetry": 1}
+        assert len(rows.built) == 5
+
+    def test_items_and_tables(self) -> None:
+        table = _Table({10: [1], 11: [2]}, TAGS)
+        rows = _Rows(table, {})
+        engine = CategoryEngine()
+        engine.view("tags", table, rows, {})
+
+        table.id_map[2] = "Terror"
+        engine.items_changed("tags", [2])
+        assert _counts(engine.view("tags", table, rows, {})) == {"Fantasy": 1, "Terror": 1}
+        assert rows.built == [1, 2, 2]
+
+        # A new table (e.g. after fixing its link table) - built from scratch
+        new_table = rows.table = _Table({10: [1, 2]}, TAGS)
+        assert _counts(engine.view("tags", new_table, rows, {})) == {"Fantasy": 1, "Horror": 1}
+        assert len(rows.built) == 5
+
+
+class TestBookValueMap:
+    """
+    Values should be looked up through the table maps - as book_value_map would have them.
+    """
+
+    def test_get(self) -> None:
+        table = _Table({10: [1, 2]}, TAGS)
+        values = BookValueMap(table, missing=lambda: ValueError("tags"))
+        assert values.get(10) == ("Fantasy", "Horror")
+        assert values.get(11, 0) == 0
+
+        table.book_col_map[12] = 7
+        with pytest.raises(ValueError):
+            values.get(12)
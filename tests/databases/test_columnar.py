@@ -0,0 +1,109 @@
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from LiuXin_alpha.databases.columnar import ColumnarDict
+from LiuXin_alpha.databases.columnar import ColumnarMultiMap
+from LiuXin_alpha.databases.columnar import columnar_map
+
+
+class TestColumnarDict:
+    """
+    Should behave as a dict - with the values interned in arrays.
+    """
+
+    def test_lookup(self) -> None:
+        mapping = ColumnarDict({3: "c", 1: "a", 2: "a"})
+
+        assert mapping[1] == "a" and mapping[3] == "c"
+        assert mapping.get(4) is None
+        assert 2 in mapping and 4 not in mapping
+        assert sorted(mapping) == [1, 2, 3]
+        assert len(mapping) == 3
+        assert mapping.distinct_values == 2
+        with pytest.raises(KeyError):
+            mapping[4]
+
+    def test_writes_and_compact(self) -> None:
+        mapping = ColumnarDict({1: "a", 2: "b"})
+        mapping[2] = "B"
+        mapping[5] = "e"
+        del mapping[1]
+
+        assert mapping.copy() == {2: "B", 5: "e"}
+        assert len(mapping) == 2
+        assert mapping.overlay_size == 3
+
+        mapping.compact()
+        assert mapping.overlay_size == 0
+        assert mapping.copy() == {2: "B", 5: "e"}
+        with pytest.raises(KeyError):
+            del mapping[1]
+
+    def test_non_int_keys_stay_in_overlay(self) -> None:
+        mapping = ColumnarDict({1: "a", "x": "b"})
+        mapping.compact()
+
+        assert mapping["x"] == "b"
+        assert mapping.overlay_size == 1
+        assert mapping.get_many([1, "x", 9], default="-") == ["a", "b", "-"]
+
+    def test_large_ids(self) -> None:
+        mapping = ColumnarDict({2**40: "big", 1: "small"})
+        assert mapping._ids.dtype == np.int64
+        assert mapping[2**40] == "big"
+        assert ColumnarDict({1: "a"})._ids.dtype == np.int32
+
+
+class TestColumnarMultiMap:
+    """
+    Collections of ids should be stored CSR style - and handed back as the container they went in as.
+    """
+
+    def test_lookup(self) -> None:
+        mapping = ColumnarMultiMap({2: (5, 6), 1: (4,), 3: ()})
+
+        assert mapping[1] == (4,)
+        assert mapping[2] == (5, 6)
+        assert mapping[3] == ()
+        assert mapping.lengths([2, 3, 9]) == [2, 0, 0]
+        assert mapping.get_many([3, 2, 9]) == [(), (5, 6), None]
+
+    def test_mutable_containers_are_materialized(self) -> None:
+        mapping = ColumnarMultiMap({1: {4, 5}}, container=set, default_factory=set)
+
+        mapping[1].add(6)
+        mapping[2].add(7)
+
+        assert mapping[1] == {4, 5, 6}
+        assert mapping[2] == {7}
+        mapping.compact()
+        assert mapping.copy() == {1: {4, 5, 6}, 2: {7}}
+
+    def test_nbytes(self) -> None:
+        mapping = ColumnarMultiMap({book_id: (1, 2, 3) for book_id in range(100)})
+        # ids and flat values as int32 - and one int64 offset per key
+        assert mapping.nbytes() == 100 * 4 + 101 * 8 + 300 * 4
+
+
+class TestColumnarMap:
+    """
+    The cache maps should be converted to the right array backed map - or left alone.
+    """
+
+    def test_conversion(self) -> None:
+        col_book_map = defaultdict(set, {1: {1, 2}})
+        converted = columnar_map(col_book_map)
+        assert isinstance(converted, ColumnarMultiMap)
+        assert converted.container is set
+        assert converted[9] == set()
+
+        assert isinstance(columnar_map({1: "a"}), ColumnarDict)
+        assert isinstance(columnar_map(defaultdict(set)), ColumnarMultiMap)
+
+    def test_left_alone(self) -> None:
+        nested = {1: {"isbn": "123"}}
+        mixed = {1: (1, 2), 2: "a"}
+        assert columnar_map(nested) is nested
+        assert columnar_map(mixed) is mixed
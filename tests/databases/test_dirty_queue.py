@@ -0,0 +1,192 @@
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from LiuXin_alpha.databases.dirty_queue import DirtyQueue, DirtyQueueWorker, group_by_table
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 100.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestDirtyQueue:
+    """
+    Dirtied records should be coalesced, and handed out in batches.
+    """
+
+    def test_duplicates_are_coalesced(self) -> None:
+        queue = DirtyQueue()
+        for _ in range(3):
+            queue.put(("books", 1))
+        queue.put(("books", 2), block=False)
+
+        assert len(queue) == 2
+        assert queue.get_batch(10) == [("books", 1), ("books", 2)]
+        assert queue.metrics()["coalesced"] == 2
+        assert queue.empty()
+
+        # Once taken, a record can be dirtied again
+        queue.put(("books", 1))
+        assert queue.get_batch(10) == [("books", 1)]
+
+    def test_batches_are_capped(self) -> None:
+        queue = DirtyQueue()
+        for row_id in range(25):
+            queue.put(("books", row_id))
+
+        assert [len(queue.get_batch(10)) for _ in range(3)] == [10, 10, 5]
+        assert queue.get_batch(10, timeout=0) == []
+
+    def test_consumer_blocks_until_dirtied(self) -> None:
+        queue = DirtyQueue()
+        batches = []
+        consumer = threading.Thread(target=lambda: batches.append(queue.get_batch(10)))
+        consumer.start()
+
+        time.sleep(0.05)
+        assert consumer.is_alive()
+        queue.put(("titles", 7))
+        consumer.join(timeout=5)
+
+        assert batches == [[("titles", 7)]]
+
+    def test_close_wakes_consumer(self) -> None:
+        queue = DirtyQueue()
+        batches = []
+        consumer = threading.Thread(target=lambda: batches.append(queue.get_batch(10, max_wait=10)))
+        consumer.start()
+
+        queue.close()
+        consumer.join(timeout=5)
+
+        assert not consumer.is_alive()
+        assert batches == [[]]
+
+    def test_metrics(self) -> None:
+        clock = FakeClock()
+        queue = DirtyQueue(clock=clock)
+        queue.put(("books", 1))
+        clock.now += 2
+        queue.put(("books", 2))
+        clock.now += 1
+
+        metrics = queue.metrics()
+        assert metrics["depth"] == 2
+        assert metrics["lag"] == 3
+
+        batch = queue.get_batch(10)
+        queue.batch_done(len(batch), 0.5)
+
+        metrics = queue.metrics()
+        assert metrics["depth"] == 0
+        assert metrics["lag"] == 0
+        assert metrics["last_batch_lag"] == 3
+        assert metrics["processed"] == 2
+        assert metrics["throughput"] == 4
+
+
+class _SQLiteStandIn:
+    """
+    Just enough of a Database for the worker - a driver_wrapper whose write_transaction nests, as the driver's does.
+    """
+
+    def __init__(self) -> None:
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.conn.execute("CREATE TABLE books (id INTEGER PRIMARY KEY, touched INTEGER DEFAULT 0)")
+        self.conn.executemany("INSERT INTO books (id) VALUES (?)", [(i,) for i in range(1, 6)])
+        self.conn.commit()
+        self.driver_wrapper = self
+
+    @contextmanager
+    def write_transaction(self):
+        outermost = not self.conn.in_transaction
+        if outermost:
+            self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.conn
+        except Exception:
+            if outermost:
+                self.conn.rollback()
+            raise
+        if outermost:
+            self.conn.commit()
+
+    def touched(self) -> dict:
+        return dict(self.conn.execute("SELECT id, touched FROM books"))
+
+
+def _touch_books(db, row_ids) -> None:
+    with db.driver_wrapper.write_transaction() as conn:
+        conn.executemany("UPDATE books SET touched = touched + 1 WHERE id = ?", [(i,) for i in row_ids])
+
+
+def _wait_until_processed(queue: DirtyQueue, count: int) -> None:
+    deadline = time.monotonic() + 5
+    while queue.metrics()["processed"] < count:
+        assert time.monotonic() < deadline, "worker didn't drain the queue"
+        time.sleep(0.01)
+
+
+class TestDirtyQueueWorker:
+    """
+    The worker should drain the queue into the handlers - and keep draining if a handler fails.
+    """
+
+    def test_batches_are_handled(self) -> None:
+        db = _SQLiteStandIn()
+        queue = DirtyQueue()
+        worker = DirtyQueueWorker(db, queue, batch_size=10, batch_wait=0.01, handlers={"books": _touch_books})
+        worker.start()
+        for row_id in (1, 2, 2, 3):
+            queue.put(("books", row_id))
+        queue.put(("no_handler", 1))
+
+        _wait_until_processed(queue, 4)
+        assert db.touched() == {1: 1, 2: 1, 3: 1, 4: 0, 5: 0}
+
+        worker.stop()
+        worker.join(timeout=5)
+        assert not worker.is_alive()
+
+    def test_failing_handler_does_not_stop_the_worker(self) -> None:
+        db = _SQLiteStandIn()
+        queue = DirtyQueue()
+
+        def broken(db, row_ids):
+            _touch_books(db, row_ids)
+            raise ValueError("broken handler")
+
+        worker = DirtyQueueWorker(
+            db, queue, batch_size=10, batch_wait=0.05, handlers={"books": _touch_books, "broken": broken}
+        )
+        worker.start()
+        queue.put(("broken", 1))
+        queue.put(("books", 4))
+        _wait_until_processed(queue, 2)
+
+        # The broken handler's writes were rolled back - the other table's were still made
+        assert db.touched() == {1: 0, 2: 0, 3: 0, 4: 1, 5: 0}
+        assert worker.metrics()["failed"] == 1
+
+        # And the worker is still draining
+        queue.put(("books", 5))
+        _wait_until_processed(queue, 3)
+        assert db.touched()[5] == 1
+        assert worker.is_alive()
+        worker.stop()
+        worker.join(timeout=5)
+
+
+class TestGroupByTable:
+    """
+    Batches should be split by table - in the order they were dirtied.
+    """
+
+    def test_group_by_table(self) -> None:
+        batch = [("books", 1), ("titles", 4), ("books", 2)]
+        assert list(group_by_table(batch).items()) == [("books", [1, 2]), ("titles", [4])]
@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+
+from LiuXin_alpha.databases.duplicate_index import DuplicateIndex
+
+
+def _fuzzy(title):
+    return " ".join(title.lower().replace("-", " ").split())
+
+
+def _make_index():
+    index = DuplicateIndex(title_key=str.lower, fuzzy_key=_fuzzy, author_key=str.lower)
+    index.add_book(1, "The Hobbit", ["J. R. R. Tolkien"])
+    index.add_book(2, "The  Hobbit", ["J. R. R. Tolkien", "Christopher Tolkien"])
+    index.add_book(3, "Dune", ["Frank Herbert"])
+    return index
+
+
+class TestDuplicateIndex:
+    """
+    has_book and find_identical_books checks should be answered from the index - and follow changes to the books.
+    """
+
+    def test_has_title(self) -> None:
+        index = _make_index()
+
+        assert index.has_title("the hobbit")
+        assert index.has_title("DUNE ")
+        assert not index.has_title("Emma")
+        assert not index.has_title("")
+
+    def test_find_identical(self) -> None:
+        index = _make_index()
+
+        assert index.find_identical("The Hobbit", ["j. r. r. tolkien"]) == {1, 2}
+        assert index.find_identical("the-hobbit", ["J. R. R. Tolkien", "Christopher Tolkien"]) == {2}
+        assert index.find_identical("The Hobbit", ["Frank Herbert"]) == set()
+        assert index.find_identical("The Hobbit", []) == set()
+
+    def test_updates(self) -> None:
+        index = _make_index()
+
+        index.set_title(3, "Dune Messiah")
+        assert not index.has_title("Dune")
+        assert index.find_identical("Dune Messiah", ["Frank Herbert"]) == {3}
+
+        index.set_authors(1, ["Someone Else"])
+        assert index.find_identical("The Hobbit", ["J. R. R. Tolkien"]) == {2}
+
+        index.discard_books([2, 3])
+        assert 2 not in index
+        assert len(index) == 1
+        assert not index.has_title("Dune Messiah")
+        assert index.find_identical("The Hobbit", ["Someone Else"]) == {1}
+
+
+class TestCacheDuplicateIndex:
+    """
+    A new book should be indexed under what the cache stored for it - not the metadata it was created from.
+    """
+
+    def test_new_books_are_indexed_under_the_stored_title(self) -> None:
+        pytest.importorskip("LiuXin")
+        from LiuXin_alpha.databases.caches.calibre.cache import CalibreCache
+
+        index = _make_index()
+        stand_in = SimpleNamespace(
+            _duplicate_index=index,
+            fields={
+                "title": SimpleNamespace(table=SimpleNamespace(book_col_map={4: "Emma"})),
+                "authors": SimpleNamespace(table=SimpleNamespace(book_col_map={4: (7,)}, id_map={7: "Jane Austen"})),
+            },
+        )
+
+        CalibreCache._index_new_book(stand_in, 4, SimpleNamespace(title="  emma (1815)", authors={"J. Austen": 0}))
+        assert index.has_title("emma")
+        assert not index.has_title("  emma (1815)")
+        assert index.find_identical("Emma", ["Jane Austen"]) == {4}
+
+        # Not read back yet - so indexed from the metadata
+        CalibreCache._index_new_book(stand_in, 5, SimpleNamespace(title="Persuasion", authors={"Jane Austen": 0}))
+        assert index.find_identical("Persuasion", ["Jane Austen"]) == {5}
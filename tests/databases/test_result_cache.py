@@ -0,0 +1,57 @@
+from LiuXin_alpha.databases.result_cache import ALL_FIELDS
+from LiuXin_alpha.databases.result_cache import ResultCache
+from LiuXin_alpha.databases.result_cache import result_nbytes
+
+
+class TestResultCache:
+    """
+    Entries should be dropped only when a field they read changes - or to stay under the memory limit.
+    """
+
+    def test_invalidate_by_field(self) -> None:
+        cache = ResultCache()
+        cache.add("rating:5", {1, 2}, ("rating",))
+        cache.add("tags:fantasy", {2, 3}, ("tags",))
+        cache.add("fantasy", {2, 3, 4}, (ALL_FIELDS,))
+        cache.add("series:=dune and tags:sf", {5}, ("series", "tags"))
+
+        assert cache.invalidate(("rating", "last_modified")) == 2
+        assert "rating:5" not in cache and "fantasy" not in cache
+        assert cache.get("tags:fantasy") == {2, 3}
+        assert cache.fields("series:=dune and tags:sf") == frozenset(("series", "tags"))
+
+        assert cache.invalidate(("tags",)) == 2
+        assert len(cache) == 0
+        assert cache.stats()["invalidations"] == 4
+
+    def test_counters(self) -> None:
+        cache = ResultCache()
+        cache.add("tags:fantasy", {1}, ("tags",))
+        assert cache.get("tags:fantasy") == {1}
+        assert cache.get("tags:horror") is None
+        stats = cache.stats()
+        assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+    def test_memory_limit(self) -> None:
+        small = set(range(10))
+        limit = 3 * result_nbytes("query 0", small)
+        cache = ResultCache(max_bytes=limit)
+        for i in range(3):
+            cache.add("query {}".format(i), set(small), ("tags",))
+        # Used most recently - so kept over query 1
+        cache.get("query 0")
+        cache.add("query 3", set(small), ("tags",))
+        assert [query for query, _ in cache] == ["query 2", "query 0", "query 3"]
+        assert cache.evictions == 1
+        assert cache.nbytes <= limit
+
+        # Grown in place past the limit - the least recently used go
+        result = cache.get("query 3")
+        result.update(range(10, 200))
+        cache.resized("query 3")
+        assert cache.nbytes <= limit
+        assert cache.evictions >= 2
+
+        # Too big to cache at all
+        cache.add("huge", set(range(10000)), ("tags",))
+        assert "huge" not in cache
@@ -0,0 +1,117 @@
+from LiuXin_alpha.databases.search_index import FieldIndex
+from LiuXin_alpha.databases.search_index import SearchIndex
+from LiuXin_alpha.databases.search_index import fold
+
+
+TAGS = {
+    1: ("Fiction.Fantasy", "Epic"),
+    2: ("Fiction.Science Fiction",),
+    3: ("Fantasy",),
+    4: ("Øresund",),
+    5: (),
+}
+
+
+def _searchable_values(books, book_ids=None):
+    """
+    (value, book_ids) pairs - as iter_searchable_values gives for a many-many field.
+    """
+    value_books = {}
+    for book_id, values in books.items():
+        if book_ids is not None and book_id not in book_ids:
+            continue
+        for value in values:
+            value_books.setdefault(value, set()).add(book_id)
+    return list(value_books.items())
+
+
+def _index(books=TAGS):
+    index = FieldIndex()
+    for value, book_ids in _searchable_values(books):
+        index.add(value, book_ids)
+    return index
+
+
+class TestFieldIndex:
+    """
+    Candidates should include every book which could match - and as few others as possible.
+    """
+
+    def test_contains(self) -> None:
+        index = _index()
+        # Book 4 has a value which isn't ASCII once folded (ø has no decomposition) - so is always a candidate
+        assert index.contains_candidates("fant") == {1, 3, 4}
+        assert index.contains_candidates("FICTION") == {1, 2, 4}
+        assert index.contains_candidates("xyz") == {4}
+        # Too short to narrow
+        assert index.contains_candidates("ep") is None
+
+    def test_equals(self) -> None:
+        index = _index()
+        assert index.equals_candidates("fantasy") == {1, 3, 4}
+        assert index.equals_candidates("..science fiction") == {2, 4}
+        assert index.equals_candidates("...") is None
+
+    def test_folding(self) -> None:
+        assert fold("Café") == "cafe"
+        assert fold("STRASSE") == "strasse"
+
+    def test_set_and_discard_books(self) -> None:
+        books = dict(TAGS)
+        index = _index(books)
+
+        books[3] = ("Horror",)
+        books[5] = ("Fantasy Horror",)
+        index.set_books({3, 5}, _searchable_values(books, {3, 5}))
+        assert index.contains_candidates("horror") == {3, 4, 5}
+        assert index.contains_candidates("fantasy") == {1, 4, 5}
+
+        index.discard_books({1, 4, 5})
+        assert index.contains_candidates("fantasy") == set()
+        assert "epic" not in index.value_books
+        assert not index.unindexed
+        assert "epi" not in index.trigram_values
+
+
+class TestSearchIndex:
+    """
+    Indexes should be built on first use - and only for the configured fields.
+    """
+
+    def test_build_and_update(self) -> None:
+        books = dict(TAGS)
+        reads = []
+
+        def read_all():
+            reads.append("all")
+            return _searchable_values(books)
+
+        search_index = SearchIndex(["tags"])
+        assert search_index.field_index("title", read_all) is None
+        assert search_index.field_index("tags", read_all).contains_candidates("epic") == {1, 4}
+        search_index.field_index("tags", read_all)
+        assert reads == ["all"]
+
+        books[2] = ("Epic",)
+        search_index.update_books([2], lambda field, book_ids: _searchable_values(books, book_ids))
+        assert search_index.field_index("tags", read_all).contains_candidates("epic") == {1, 2, 4}
+
+        search_index.discard_books([1])
+        assert search_index.field_index("tags", read_all).contains_candidates("epic") == {2, 4}
+
+        search_index.clear()
+        search_index.field_index("tags", read_all)
+        assert reads == ["all", "all"]
+
+    def test_book_added_after_build(self) -> None:
+        books = dict(TAGS)
+        search_index = SearchIndex(["tags"])
+        index = search_index.field_index("tags", lambda: _searchable_values(books))
+        assert index.equals_candidates("horror") == {4}
+
+        # As the cache does for a new book - through clear_search_caches
+        books[6] = ("Horror", "Epic")
+        search_index.update_books([6], lambda field, book_ids: _searchable_values(books, book_ids))
+        index = search_index.field_index("tags", lambda: _searchable_values(books))
+        assert index.equals_candidates("horror") == {4, 6}
+        assert index.contains_candidates("epic") == {1, 4, 6}
@@ -0,0 +1,82 @@
+from LiuXin_alpha.databases.search_values import FoldedValues
+from LiuXin_alpha.databases.search_values import SearchValues
+from LiuXin_alpha.databases.search_values import compiled_regex
+
+
+class _Fold(object):
+    """
+    str.lower - counting the values folded.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, value):
+        self.calls += 1
+        return value.lower()
+
+
+class TestCompiledRegex:
+    """
+    Regexes should be compiled once per query - and bad ones shouldn't raise.
+    """
+
+    def test_memoized(self) -> None:
+        pat = compiled_regex("fant.sy")
+        assert pat is compiled_regex("fant.sy")
+        assert pat.search("epic fantasy")
+        assert compiled_regex("fant(") is None
+
+
+class TestFoldedValues:
+    """
+    Values should be folded once - and again only if they change.
+    """
+
+    def test_folded_once(self) -> None:
+        fold = _Fold()
+        values = FoldedValues(fold)
+        id_map = {1: "Fantasy", 2: "Horror", 3: "Dark Fantasy", 4: None}
+        contains = lambda t: "fantasy" in t
+
+        assert values.matching_items(id_map, contains) == [1, 3]
+        assert values.matching_items(id_map, lambda t: t == "horror") == [2]
+        assert fold.calls == 3
+
+    def test_renames_and_removals(self) -> None:
+        fold = _Fold()
+        values = FoldedValues(fold)
+        id_map = {1: "Fantasy", 2: "Horror", 3: "Dark Fantasy"}
+        values.matching_items(id_map, bool)
+
+        id_map[2] = "Fantasy Horror"
+        del id_map[3]
+        assert values.matching_items(id_map, lambda t: "fantasy" in t) == [1, 2]
+        assert fold.calls == 4
+        assert len(values) == 2
+
+        values.invalidate([1])
+        values.matching_items(id_map, bool)
+        assert fold.calls == 5
+        values.invalidate()
+        assert len(values) == 0
+
+
+class TestSearchValues:
+    """
+    Matching items should be mapped to the candidate books linked to them.
+    """
+
+    def test_matching_books(self) -> None:
+        id_map = {1: "Fantasy", 2: "Horror", 3: "Dark Fantasy"}
+        col_book_map = {1: {10, 11}, 2: {11, 12}, 3: {13}}
+        search_values = SearchValues(str.lower)
+
+        contains = lambda t: "fantasy" in t
+        assert search_values.matching_books("tags", id_map, col_book_map, contains, {10, 11, 12, 13}) == {10, 11, 13}
+        assert search_values.matching_books("tags", id_map, col_book_map, contains, {11, 12}) == {11}
+        assert search_values.matching_books("tags", id_map, col_book_map, lambda t: False, {10}) == set()
+        assert "tags" in search_values
+
+        search_values.invalidate(("tags",))
+        assert "tags" not in search_values
@@ -0,0 +1,139 @@
+import random
+
+import pytest
+
+from LiuXin_alpha.databases import sort_keys
+from LiuXin_alpha.databases.sort_keys import SortEngine
+from LiuXin_alpha.databases.sort_keys import argsort_ranks
+from LiuXin_alpha.databases.sort_keys import dense_ranks
+from LiuXin_alpha.databases.sort_keys import merge_distinct
+
+
+class _KeyFuncs(object):
+    """
+    Sort key function factories over a dict of values - counting the keys worked out.
+    """
+
+    def __init__(self, values):
+        self.values = values
+        self.calls = 0
+
+    def __call__(self):
+        def key_func(book_id):
+            self.calls += 1
+            return self.values[book_id]
+
+        return key_func
+
+
+def _expected(book_ids, columns):
+    """
+    The sort the engine should match - a stable sort on each column, least significant first.
+    """
+    ordered = list(book_ids)
+    for values, ascending in reversed(columns):
+        ordered.sort(key=values.__getitem__, reverse=not ascending)
+    return ordered
+
+
+class TestDenseRanks:
+    """
+    Equal keys should share a rank - and the ranks should keep the order of the keys.
+    """
+
+    def test_ranks(self) -> None:
+        assert dense_ranks(["b", "a", "c", "a"]) == ([1, 0, 2, 0], ["a", "b", "c"])
+        assert dense_ranks([]) == ([], [])
+
+    @pytest.mark.parametrize("insert_limit", [0, 1000])
+    def test_merge(self, monkeypatch, insert_limit) -> None:
+        monkeypatch.setattr(sort_keys, "INSERT_LIMIT", insert_limit)
+
+        merged, old_positions, new_positions = merge_distinct([2, 4, 6], [1, 4, 7])
+        assert merged == [1, 2, 4, 6, 7]
+        assert old_positions == [1, 2, 3]
+        assert new_positions == [0, 2, 4]
+
+        assert merge_distinct([2, 4], [4]) == ([2, 4], None, [1])
+
+
+class TestArgsortRanks:
+    """
+    Columns too wide to pack into one key should fall back to a lexsort - with the same result.
+    """
+
+    def test_wide_columns(self) -> None:
+        big = [2**40, 5, 2**40, 7]
+        small = [1, 0, 0, 1]
+        expected = [2, 0, 3, 1]
+        assert list(argsort_ranks([big, small, big], [-1, 1, 1])) == expected
+        assert list(argsort_ranks([big, small], [-1, 1])) == expected
+
+
+class TestSortEngine:
+    """
+    Sorts should match a plain multi-key sort - and reuse the cached keys until invalidated.
+    """
+
+    @pytest.mark.parametrize("use_numpy", [True, False])
+    def test_multisort(self, monkeypatch, use_numpy) -> None:
+        if not use_numpy:
+            monkeypatch.setattr(sort_keys, "np", None)
+        rng = random.Random(4)
+        book_ids = list(range(1, 301))
+        rng.shuffle(book_ids)
+        series = {book_id: "Series {}".format(rng.randint(1, 10)) for book_id in book_ids}
+        index = {book_id: rng.randint(1, 5) / 2.0 for book_id in book_ids}
+        rating = {book_id: rng.randint(0, 5) for book_id in book_ids}
+
+        engine = SortEngine()
+        for order in ((True, True), (False, True), (True, False)):
+            columns = [
+                ("rating", order[0], _KeyFuncs(rating), True),
+                ("series", order[1], _KeyFuncs(series), True),
+                ("series_index", order[1], _KeyFuncs(index), True),
+            ]
+            expected = _expected(book_ids, [(rating, order[0]), (series, order[1]), (index, order[1])])
+            assert engine.sort(book_ids, columns) == expected
+
+    def test_keys_are_cached(self) -> None:
+        values = {book_id: book_id % 7 for book_id in range(100)}
+        key_funcs = _KeyFuncs(values)
+        engine = SortEngine()
+
+        engine.sort(range(100), [("rating", True, key_funcs, True)])
+        engine.sort(range(50), [("rating", False, key_funcs, True)])
+        assert key_funcs.calls == 100
+
+        # Not cached - worked out every time
+        engine.sort(range(10), [("marked", True, key_funcs, False)])
+        assert key_funcs.calls == 110
+
+    def test_invalidate(self) -> None:
+        values = {book_id: "b{}".format(book_id) for book_id in range(1, 6)}
+        key_funcs = _KeyFuncs(values)
+        engine = SortEngine()
+        assert engine.sort(range(1, 6), [("title", True, key_funcs, True)]) == [1, 2, 3, 4, 5]
+
+        # A new key - which has to be ranked between the existing ones
+        values[5] = "b1a"
+        values[1] = "b9"
+        engine.invalidate(("title",), [5, 1])
+        engine.invalidate(("authors",), [2])
+        assert engine.sort(range(1, 6), [("title", True, key_funcs, True)]) == [5, 2, 3, 4, 1]
+        assert key_funcs.calls == 7
+
+        values[2] = "a"
+        engine.invalidate()
+        assert engine.sort(range(1, 6), [("title", True, key_funcs, True)]) == [2, 5, 3, 4, 1]
+        assert key_funcs.calls == 12
+
+    def test_new_books_and_identity(self) -> None:
+        values = {book_id: -book_id for book_id in range(20)}
+        key_funcs = _KeyFuncs(values)
+        engine = SortEngine()
+
+        assert engine.sort(range(10), [("rating", True, key_funcs, True)]) == list(range(9, -1, -1))
+        assert engine.sort(range(20), [("rating", True, key_funcs, True)]) == list(range(19, -1, -1))
+        assert engine.sort([3, 1, 2], [(None, False, None, False)]) == [3, 2, 1]
+        assert engine.sort([3, 1, 2], []) == [3, 1, 2]
@@ -0,0 +1,58 @@
+from LiuXin_alpha.databases.tree_index import TreeIndex
+
+
+def _make_index():
+    """
+    1 -> 2 -> 4
+      -> 3 -> 5
+    6
+    """
+    return TreeIndex([(1, None), (2, 1), (3, 1), (4, 2), (5, 3), (6, None)])
+
+
+class TestTreeIndex:
+    """
+    Tree lookups should be answered from the in memory adjacency maps.
+    """
+
+    def test_lookups(self) -> None:
+        index = _make_index()
+
+        assert len(index) == 6
+        assert index.get_parent(4) == 2
+        assert index.get_parent(1) is None
+        assert index.get_children(1) == {2, 3}
+        assert index.ancestors(5) == [1, 3, 5]
+        assert index.root(4) == 1
+        assert index.root(6) == 6
+        assert index.subtree(1) == [1, 2, 3, 4, 5]
+        assert index.subtree(6) == [6]
+
+    def test_unknown_parents_are_roots(self) -> None:
+        # Parents from row_dicts which don't point at a row come through as "None"
+        index = TreeIndex([("1", "None"), ("2", "1")])
+
+        assert index.get_parent("1") is None
+        assert index.ancestors("2") == ["1", "2"]
+
+    def test_set_parent_moves_subtree(self) -> None:
+        index = _make_index()
+        index.set_parent(3, 6)
+
+        assert index.get_children(1) == {2}
+        assert index.subtree(6) == [6, 3, 5]
+        assert index.root(5) == 6
+
+    def test_discard(self) -> None:
+        index = _make_index()
+        index.discard(3)
+
+        assert 3 not in index
+        assert index.subtree(1) == [1, 2, 4]
+        assert index.root(5) == 5
+
+    def test_cycles_terminate(self) -> None:
+        index = TreeIndex([(1, 2), (2, 1)])
+
+        assert index.ancestors(1) == [2, 1]
+        assert index.subtree(1) == [1, 2]
@@ -0,0 +1,170 @@
+"""
+Tests the batched link updates of the many-many writer - against a sqlite link table, through stand-ins for the database
+and its macros.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+# The writers need the rest of LiuXin
+pytest.importorskip("LiuXin")
+
+from LiuXin.exceptions import DatabaseIntegrityError  # noqa: E402
+
+from LiuXin_alpha.databases import write  # noqa: E402
+from LiuXin_alpha.databases.database_driver_plugins.SQLite import link_queries  # noqa: E402
+
+LINK_TABLE, BOOK_COL, TAG_COL = "book_tag_links", "book_tag_link_book_id", "book_tag_link_tag_id"
+TYPE_COL, PRIORITY_COL = "book_tag_link_type", "book_tag_link_priority"
+
+
+class _Macros:
+    """
+    The link macros the writer uses - over the link_queries functions, as SQLiteDatabaseMacros is.
+    """
+
+    def __init__(self, db) -> None:
+        self.db = db
+        self.bulk_calls = 0
+
+    def break_generic_links_many(self, link_table, link_col, remove_ids, link_type=None, conn=None):
+        with self.db.driver_wrapper.write_transaction() as conn:
+            link_queries.break_links_many(conn, link_table, link_col, remove_ids, TYPE_COL, link_type)
+
+    def replace_generic_links_many(self, link_table, left_link_col, right_link_col, links, link_type=None, conn=None):
+        self.bulk_calls += 1
+        with self.db.driver_wrapper.write_transaction() as conn:
+            link_queries.replace_links_many(
+                conn, link_table, left_link_col, right_link_col, links, TYPE_COL, PRIORITY_COL, link_type
+            )
+
+    def get_linked_ids(self, link_table, left_id_col, right_id_col, left_id, type_filter=None):
+        with self.db.driver_wrapper.write_transaction() as conn:
+            linked = link_queries.linked_ids_many(
+                conn, link_table, left_id_col, right_id_col, [left_id], TYPE_COL, type_filter
+            )
+        return linked[left_id]
+
+    def reprioritize_link(self, link_table, left_link_col, right_link_col, left_id, right_id, new_type=None):
+        with self.db.driver_wrapper.write_transaction() as conn:
+            stmt = link_queries.statement("reprioritize", link_table, PRIORITY_COL, left_link_col, right_link_col)
+            conn.execute(stmt, (left_id, right_id))
+            if new_type is not None:
+                stmt = link_queries.statement(
+                    "update_two_conditions", link_table, TYPE_COL, left_link_col, right_link_col
+                )
+                conn.execute(stmt, (new_type, left_id, right_id))
+
+    def break_generic_single_link(self, link_table, left_link_col, right_link_col, left_id, right_id):
+        with self.db.driver_wrapper.write_transaction() as conn:
+            link_queries.break_link_pairs_many(conn, link_table, left_link_col, right_link_col, [(left_id, right_id)])
+
+
+class _Database:
+    """
+    Just enough of a Database for the writer - the rows are their ids.
+    """
+
+    def __init__(self) -> None:
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute(
+            "CREATE TABLE book_tag_links (book_tag_link_id INTEGER PRIMARY KEY, book_tag_link_book_id INT, "
+            "book_tag_link_tag_id INT, book_tag_link_type TEXT, book_tag_link_priority INT, "
+            "UNIQUE(book_tag_link_book_id, book_tag_link_tag_id))"
+        )
+        self.lock = threading.RLock()
+        self.driver_wrapper = self
+        self.macros = _Macros(self)
+
+    @contextmanager
+    def write_transaction(self):
+        outermost = not self.conn.in_transaction
+        self.conn.execute("BEGIN IMMEDIATE" if outermost else "SAVEPOINT nested")
+        try:
+            yield self.conn
+        except sqlite3.IntegrityError as e:
+            self.conn.execute("ROLLBACK" if outermost else "ROLLBACK TO nested")
+            if not outermost:
+                self.conn.execute("RELEASE nested")
+            raise DatabaseIntegrityError(str(e))
+        self.conn.execute("COMMIT" if outermost else "RELEASE nested")
+
+    def get_row_from_id(self, table, row_id):
+        return row_id
+
+    def interlink_rows(self, primary_row, secondary_row, type=None):
+        with self.write_transaction() as conn:
+            link_queries.make_links_many(
+                conn, LINK_TABLE, BOOK_COL, TAG_COL, [(primary_row, secondary_row)], TYPE_COL, PRIORITY_COL, type
+            )
+
+    def link(self, book_id, tag_id, link_type=None):
+        self.interlink_rows(book_id, tag_id, type=link_type)
+
+    def links(self):
+        """
+        (book, tag, type) for every link - highest priority first.
+        """
+        return self.conn.execute(
+            "SELECT book_tag_link_book_id, book_tag_link_tag_id, book_tag_link_type FROM book_tag_links "
+            "ORDER BY book_tag_link_book_id, book_tag_link_priority DESC"
+        ).fetchall()
+
+
+def _update(db, updated, deleted=(), link_type=None):
+    writer = object.__new__(write.BaseWriter)
+    table = SimpleNamespace(
+        name="tags", link_table=LINK_TABLE, link_table_bt_id_column=BOOK_COL, link_table_table_id_column=TAG_COL
+    )
+    field = SimpleNamespace(name="tags", metadata={})
+    writer.do_generic_many_to_many_db_update(
+        db, table=table, field=field, is_custom_series=False, updated=updated, deleted=set(deleted), link_type=link_type
+    )
+
+
+class TestManyToManyLinkUpdate:
+    """
+    Link updates should come out the same whether they're made in bulk or (after a constraint is hit) link by link.
+    """
+
+    def test_bulk(self) -> None:
+        db = _Database()
+        db.link(1, 10)
+        db.link(1, 11)
+        db.link(2, 20)
+
+        _update(db, {1: [12, 10], 2: []}, deleted=[3])
+
+        assert db.links() == [(1, 12, None), (1, 10, None)]
+
+    def test_integrity_error_falls_back_to_link_by_link(self) -> None:
+        db = _Database()
+        # Already linked with another type - so the bulk insert of a typed link hits the unique constraint
+        db.link(1, 10, "b")
+        db.link(1, 11, "a")
+
+        _update(db, {1: [12, 10]}, link_type="a")
+
+        assert db.macros.bulk_calls == 1
+        # The bulk changes were rolled back, and the update made one link at a time - 10 re-typed rather than duplicated
+        assert db.links() == [(1, 12, "a"), (1, 10, "a")]
+        assert not db.conn.in_transaction
+
+    def test_typed_clear_and_update(self) -> None:
+        """
+        Type dicts are batched by type - clearing a type for one book and setting it for another in the same update.
+        """
+        db = _Database()
+        db.link(1, 10, "b")
+        db.link(1, 11, "a")
+        db.link(2, 20, "b")
+
+        _update(db, {1: {"a": [12], "b": None}, 2: {"b": [21, 20]}})
+
+        assert db.links() == [(1, 12, "a"), (2, 21, "b"), (2, 20, "b")]
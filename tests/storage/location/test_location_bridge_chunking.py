@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import threading
+
+from LiuXin_alpha.storage.api import location_api
+from LiuXin_alpha.storage.api.location_api import _AsyncLoopThread
+from LiuXin_alpha.storage.store_backend_plugins.on_disk_unmanaged_drive.on_disk_unmanaged_location import (
+    OnDiskUnmanagedStoreLocation,
+)
+
+from .conftest import AsyncOnDiskLocation, fs_path
+
+LINES = [f"line {i} " + "x" * (i % 17) + "\n" for i in range(2000)]
+
+
+class _CountingRunner(_AsyncLoopThread):
+    """Counts the hops made to the loop thread."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.hops = 0
+
+    def run(self, coro):
+        self.hops += 1
+        return super().run(coro)
+
+
+class _CountedAsyncLocation(AsyncOnDiskLocation):
+    _runner = _CountingRunner()
+
+
+class TestSyncOverAsyncChunking:
+    """
+    Sync reads and writes of an async-native Location should cross to the loop thread a chunk at a time.
+    """
+
+    def test_lines_and_small_writes(self, store) -> None:
+        loc = _CountedAsyncLocation("lines.txt", store=store)
+        runner = _CountedAsyncLocation._runner
+        runner.hops = 0
+
+        with loc.open("w", encoding="utf-8", newline="\n") as f:
+            for line in LINES:
+                f.write(line)
+        with loc.open("r", encoding="utf-8") as f:
+            assert list(f) == LINES
+        assert fs_path(store, "lines.txt").read_text(encoding="utf-8") == "".join(LINES)
+        assert runner.hops < 20
+
+    def test_mixed_reads(self, store) -> None:
+        data = bytes(range(256)) * 1000 + b"\nlast line\n"
+        fs_path(store, "data.bin").write_bytes(data)
+        loc = AsyncOnDiskLocation("data.bin", store=store)
+        with loc.open("rb") as f:
+            assert f.read(10) == data[:10]
+            assert f.read(100_000) == data[10:100_010]
+            line = f.readline()
+            assert line == data[100_010 : data.index(b"\n", 100_010) + 1]
+            rest = f.read()
+            assert line + rest == data[100_010:]
+            assert f.read(5) == b""
+
+    def test_buffer_reuse_and_unbuffered(self, store) -> None:
+        class Unbuffered(AsyncOnDiskLocation):
+            bridge_chunk_size = 0
+
+        buf = bytearray(b"aaaa")
+        with AsyncOnDiskLocation("reuse.bin", store=store).open("wb") as f:
+            f.write(buf)
+            buf[:] = b"bbbb"
+            f.write(memoryview(buf))
+        assert fs_path(store, "reuse.bin").read_bytes() == b"aaaabbbb"
+
+        with Unbuffered("reuse.bin", store=store).open("rb") as f:
+            assert f.read(4) == b"aaaa"
+            assert f.readline() == b"bbbb"
+
+    def test_empty_reads(self, store) -> None:
+        fs_path(store, "empty.txt").write_text("text")
+        loc = AsyncOnDiskLocation("empty.txt", store=store)
+        with loc.open("rb") as f:
+            assert f.read(0) == b""
+        with loc.open("r", encoding="utf-8") as f:
+            assert f.read(0) == ""
+            assert f.read() == "text"
+
+    def test_update_mode_is_not_read_ahead(self, store) -> None:
+        fs_path(store, "update.txt").write_text("one\ntwo\nthree\n")
+        with AsyncOnDiskLocation("update.txt", store=store).open("r+b") as f:
+            assert f.readline() == b"one\n"
+            f.write(b"TWO\n")
+        assert fs_path(store, "update.txt").read_text() == "one\nTWO\nthree\n"
+
+
+class TestAsyncOverSyncChunking:
+    """
+    Async reads, writes and listings of a sync-native Location should cross to a worker thread in chunks and batches.
+    """
+
+    def test_lines_and_small_writes(self, store, monkeypatch) -> None:
+        loc = OnDiskUnmanagedStoreLocation("lines.txt", store=store)
+        hops = []
+        to_thread = location_api._to_thread
+
+        async def counting(fn, /, *args, **kwargs):
+            hops.append(fn)
+            return await to_thread(fn, *args, **kwargs)
+
+        monkeypatch.setattr(location_api, "_to_thread", counting)
+
+        async def go() -> list[str]:
+            async with loc.aopen("w", encoding="utf-8", newline="\n") as f:
+                for line in LINES:
+                    await f.write(line)
+            async with loc.aopen("r", encoding="utf-8") as f:
+                return [line async for line in f]
+
+        assert asyncio.run(go()) == LINES
+        assert fs_path(store, "lines.txt").read_text(encoding="utf-8") == "".join(LINES)
+        assert len(hops) < 20
+
+    def test_mixed_reads(self, store) -> None:
+        data = b"header\n" + bytes(range(256)) * 1000
+        fs_path(store, "data.bin").write_bytes(data)
+        loc = OnDiskUnmanagedStoreLocation("data.bin", store=store)
+
+        async def go() -> None:
+            async with loc.aopen("rb") as f:
+                assert await f.readline() == b"header\n"
+                assert await f.read(3) == data[7:10]
+                assert await f.read() == data[10:]
+                assert await f.read(3) == b""
+                assert await f.readline() == b""
+
+        asyncio.run(go())
+
+    def test_empty_reads(self, store) -> None:
+        fs_path(store, "empty.txt").write_text("text")
+        loc = OnDiskUnmanagedStoreLocation("empty.txt", store=store)
+
+        async def go() -> tuple:
+            async with loc.aopen("rb") as f:
+                empty_bytes = await f.read(0)
+            async with loc.aopen("r", encoding="utf-8") as f:
+                return empty_bytes, await f.read(0), await f.read()
+
+        assert asyncio.run(go()) == (b"", "", "text")
+
+    def test_part_batches_are_not_held_by_a_blocked_iterator(self) -> None:
+        release = threading.Event()
+
+        def items():
+            yield 1
+            yield 2
+            # Blocks until the items before it have arrived - True unless it gave up waiting
+            yield release.wait(5)
+
+        async def go() -> list[int]:
+            out = []
+            async for item in location_api._aiter_from_sync_iter(items, batch_size=100, max_delay_s=0.01):
+                out.append(item)
+                if len(out) == 2:
+                    out.append(release.is_set())
+                    release.set()
+            return out
+
+        assert asyncio.run(go()) == [1, 2, False, True]
+
+    def test_batched_iteration(self, store) -> None:
+        for i in range(600):
+            fs_path(store, "many", f"{i:04}.txt").parent.mkdir(exist_ok=True)
+            fs_path(store, "many", f"{i:04}.txt").write_text("x")
+        loc = OnDiskUnmanagedStoreLocation("many", store=store)
+
+        async def names() -> list[str]:
+            return sorted([p.name async for p in loc.aiterdir()])
+
+        assert asyncio.run(names()) == [f"{i:04}.txt" for i in range(600)]
+
+    def test_abandoned_iteration_stops_the_worker(self) -> None:
+        produced = itertools.count()
+
+        def items():
+            for i in range(10_000_000):
+                next(produced)
+                yield i
+
+        async def go() -> list[int]:
+            out = []
+            async for item in location_api._aiter_from_sync_iter(items, batch_size=100):
+                out.append(item)
+                if len(out) == 250:
+                    break
+            return out
+
+        assert asyncio.run(go()) == list(range(250))
+        assert next(produced) < 1_000_000
+
+    def test_errors_arrive_after_the_items_before_them(self) -> None:
+        def items():
+            yield 1
+            yield 2
+            raise ValueError("boom")
+
+        async def go() -> list[int]:
+            out = []
+            try:
+                async for item in location_api._aiter_from_sync_iter(items):
+                    out.append(item)
+            except ValueError:
+                out.append(-1)
+            return out
+
+        assert asyncio.run(go()) == [1, 2, -1]
@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import json
+import os
+import pathlib
+import stat
+import sys
+from dataclasses import dataclass
+
+import pytest
+
+from LiuXin_alpha.storage.store_backend_plugins.rclone_http_readonly.rclone_http_storage_backend import (
+    RcloneBackendOptions,
+    RcloneHttpReadOnlyStorageBackend,
+)
+
+
+# Stands in for rclone - serving the "fake:" remote from a local directory, and logging every call.
+FAKE_RCLONE = r'''
+import datetime
+import json
+import os
+import sys
+
+root = os.environ["FAKE_RCLONE_ROOT"]
+with open(os.environ["FAKE_RCLONE_LOG"], "a") as log:
+    log.write(json.dumps(sys.argv[1:]) + "\n")
+
+
+def local(path):
+    if not path.startswith("fake:"):
+        sys.stderr.write("unknown remote: " + path)
+        sys.exit(1)
+    return os.path.join(root, path[len("fake:"):].strip("/"))
+
+
+def item(full, rel):
+    st = os.stat(full)
+    is_dir = os.path.isdir(full)
+    mod_time = datetime.datetime.fromtimestamp(st.st_mtime, datetime.timezone.utc).isoformat()
+    return {
+        "Path": rel,
+        "Name": os.path.basename(rel),
+        "Size": -1 if is_dir else st.st_size,
+        "ModTime": mod_time.replace("+00:00", "Z"),
+        "IsDir": is_dir,
+    }
+
+
+args = sys.argv[1:]
+flags = {a for a in args if a.startswith("-")}
+options = {}
+positional = []
+i = 0
+while i < len(args):
+    if args[i] in ("--offset", "--count", "--max-depth"):
+        options[args[i]] = int(args[i + 1])
+        i += 2
+        continue
+    if not args[i].startswith("-"):
+        positional.append(args[i])
+    i += 1
+
+command = positional[0]
+if command == "version":
+    print("rclone v1.66.0-fake")
+elif command == "lsjson":
+    full = local(positional[1])
+    if not os.path.exists(full):
+        sys.stderr.write("directory not found")
+        sys.exit(3)
+    if "--stat" in flags:
+        print(json.dumps(item(full, os.path.basename(full))))
+        sys.exit(0)
+    max_depth = options.get("--max-depth", 1)
+    found = []
+    if "-R" in flags:
+        for dirpath, dirnames, filenames in os.walk(full):
+            for name in sorted(dirnames) + sorted(filenames):
+                path = os.path.join(dirpath, name)
+                found.append(item(path, os.path.relpath(path, full).replace(os.sep, "/")))
+    elif os.path.isdir(full):
+        for name in sorted(os.listdir(full)):
+            found.append(item(os.path.join(full, name), name))
+    if "--files-only" in flags:
+        found = [f for f in found if not f["IsDir"]]
+    print(json.dumps(found))
+elif command == "cat":
+    full = local(positional[1])
+    if not os.path.isfile(full):
+        sys.stderr.write("object not found")
+        sys.exit(3)
+    with open(full, "rb") as f:
+        f.seek(options.get("--offset", 0))
+        count = options.get("--count", -1)
+        sys.stdout.buffer.write(f.read(count if count >= 0 else -1))
+elif command == "rcd":
+    import base64
+    import http.server
+    from urllib.parse import unquote
+
+    host, port = [a for a in args if ":" in a and not a.startswith("-")][0].rsplit(":", 1)
+    auth = "Basic " + base64.b64encode(
+        (os.environ["RCLONE_RC_USER"] + ":" + os.environ["RCLONE_RC_PASS"]).encode()
+    ).decode()
+
+    def rc_items(remote, recurse):
+        full = local("fake:" + remote)
+        if not os.path.isdir(full):
+            return None
+        found = []
+        for dirpath, dirnames, filenames in os.walk(full):
+            for name in sorted(dirnames) + sorted(filenames):
+                path = os.path.join(dirpath, name)
+                found.append(item(path, os.path.relpath(path, root).replace(os.sep, "/")))
+            if not recurse:
+                break
+        return found
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, status, body, headers=()):
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in headers:
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def authorised(self):
+            with open(os.environ["FAKE_RCLONE_LOG"], "a") as log:
+                log.write(json.dumps(["rc", self.command, unquote(self.path)]) + "\n")
+            if self.headers.get("Authorization") != auth:
+                self.reply(401, b'{"error": "unauthorised"}')
+                return False
+            return True
+
+        def do_POST(self):
+            params = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            if not self.authorised():
+                return
+            command = self.path.strip("/")
+            if command == "rc/noop":
+                answer = {}
+            elif command == "operations/list":
+                found = rc_items(params.get("remote", ""), params.get("opt", {}).get("recurse"))
+                if found is None:
+                    return self.reply(404, b'{"error": "directory not found", "status": 404}')
+                answer = {"list": found}
+            elif command == "operations/stat":
+                full = local("fake:" + params.get("remote", ""))
+                answer = {"item": item(full, params.get("remote", "")) if os.path.exists(full) else None}
+            else:
+                return self.reply(404, b'{"error": "unknown command"}')
+            self.reply(200, json.dumps(answer).encode())
+
+        def do_GET(self):
+            if not self.authorised():
+                return
+            path = unquote(self.path)
+            fs, _, remote = path[2:].partition("]/")
+            full = local(fs + remote)
+            if not os.path.isfile(full):
+                return self.reply(404, b"not found")
+            with open(full, "rb") as f:
+                data = f.read()
+            ranged = self.headers.get("Range")
+            if not ranged:
+                return self.reply(200, data)
+            start, _, end = ranged[len("bytes="):].partition("-")
+            start = int(start)
+            end = min(int(end) if end else len(data) - 1, len(data) - 1)
+            if start >= len(data):
+                return self.reply(416, b"")
+            self.reply(206, data[start : end + 1], [("Content-Range", f"bytes {start}-{end}/{len(data)}")])
+
+    http.server.ThreadingHTTPServer((host, int(port)), Handler).serve_forever()
+else:
+    sys.stderr.write("unsupported command: " + command)
+    sys.exit(1)
+'''
+
+
+@dataclass
+class FakeRclone:
+    """A fake rclone executable, the directory its "fake:" remote is served from and the log of its calls."""
+
+    exe: str
+    root: pathlib.Path
+    log: pathlib.Path
+
+    def calls(self, command: str | None = None) -> list[list[str]]:
+        if not self.log.exists():
+            return []
+        calls = [json.loads(line) for line in self.log.read_text().splitlines()]
+        return [c for c in calls if command is None or command in c]
+
+    def options(self, **kwargs) -> RcloneBackendOptions:
+        return RcloneBackendOptions(rclone_exe=self.exe, env=self.env, **kwargs)
+
+    @property
+    def env(self) -> dict[str, str]:
+        return {"FAKE_RCLONE_ROOT": str(self.root), "FAKE_RCLONE_LOG": str(self.log)}
+
+    def backend(self, **kwargs) -> RcloneHttpReadOnlyStorageBackend:
+        return RcloneHttpReadOnlyStorageBackend(url="fake:", options=self.options(**kwargs))
+
+
+@pytest.fixture()
+def fake_rclone(tmp_path: pathlib.Path) -> FakeRclone:
+    """A fake rclone serving a small library."""
+    exe = tmp_path / "bin" / "rclone"
+    exe.parent.mkdir()
+    exe.write_text(f"#!{sys.executable}\n" + FAKE_RCLONE)
+    exe.chmod(exe.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+    root = tmp_path / "remote"
+    (root / "Author One" / "Book A").mkdir(parents=True)
+    (root / "Author One" / "Book A" / "book.epub").write_bytes(b"epub bytes")
+    (root / "Author One" / "Book A" / "cover.jpg").write_bytes(b"jpg")
+    (root / "Author Two" / "Book B").mkdir(parents=True)
+    (root / "Author Two" / "Book B" / "book.pdf").write_bytes(b"%PDF" + os.urandom(64))
+    (root / "empty").mkdir()
+    (root / "notes.txt").write_text("hello")
+    return FakeRclone(exe=str(exe), root=root, log=tmp_path / "rclone.log")
@@ -0,0 +1,199 @@
+"""
+Tests the rclone listing cache - on its own, and through the rclone backend and location with a fake rclone.
+"""
+
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from LiuXin_alpha.storage.store_backend_plugins.rclone_http_readonly.rclone_http_location import (
+    RcloneHttpReadOnlyStoreLocation,
+)
+from LiuXin_alpha.storage.store_backend_plugins.rclone_http_readonly.rclone_http_storage_backend import (
+    DEFAULT_LISTING_CACHE_TTL_S,
+)
+from LiuXin_alpha.storage.store_backend_plugins.rclone_http_readonly.rclone_listing_cache import RcloneListingCache
+
+
+TREE = {
+    "": [("a", True), ("top.txt", False)],
+    "a": [("b", True), ("one.txt", False)],
+    "a/b": [("two.txt", False)],
+}
+
+
+class _Lister:
+    """Lists TREE - counting the calls."""
+
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, bool]] = []
+
+    def __call__(self, rel_dir: str, recursive: bool) -> list[dict]:
+        self.calls.append((rel_dir, recursive))
+        if rel_dir not in TREE:
+            raise RuntimeError("directory not found")
+        items = []
+        stack = [(rel_dir, "")]
+        while stack:
+            path, prefix = stack.pop()
+            for name, is_dir in TREE[path]:
+                rel = f"{prefix}{name}"
+                items.append({"Path": rel, "Name": name, "Size": -1 if is_dir else 3, "IsDir": is_dir})
+                if recursive and is_dir:
+                    stack.append((f"{path}/{name}" if path else name, rel + "/"))
+        return items
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestRcloneListingCache:
+    """
+    Lookups should be answered from listings - with a listing per directory, or one for a whole tree.
+    """
+
+    def test_directory_listings(self) -> None:
+        lister = _Lister()
+        cache = RcloneListingCache(lister)
+
+        assert cache.entry("a/one.txt")["Size"] == 3
+        assert cache.entry("a/missing.txt") is None
+        assert cache.entry("a/b")["IsDir"] is True
+        assert lister.calls == [("a", False)]
+
+        # Missing directories under a listed one are known to be missing
+        assert cache.entry("a/nope/deeper/file.txt") is None
+        assert cache.children("a/one.txt") is None
+        assert lister.calls == [("a", False)]
+
+        assert sorted(cache.children("a/b")) == ["two.txt"]
+        assert lister.calls == [("a", False), ("a/b", False)]
+
+    def test_tree_listing(self) -> None:
+        lister = _Lister()
+        cache = RcloneListingCache(lister, prefetch_tree=True)
+
+        assert cache.entry("a/b/two.txt") is not None
+        assert cache.entry("top.txt") is not None
+        assert cache.entry("elsewhere/x") is None
+        assert sorted(path for path, _ in cache.walk("a")) == ["b", "b/two.txt", "one.txt"]
+        assert lister.calls == [("", True)]
+        assert cache.stats()["directories"] == 3
+
+    def test_ttl_and_invalidate(self) -> None:
+        lister = _Lister()
+        clock = _Clock()
+        cache = RcloneListingCache(lister, ttl_s=60, clock=clock)
+
+        cache.entry("a/one.txt")
+        clock.now += 30
+        cache.entry("a/one.txt")
+        assert len(lister.calls) == 1
+
+        clock.now += 31
+        cache.entry("a/one.txt")
+        assert len(lister.calls) == 2
+
+        cache.invalidate("a/one.txt")
+        cache.entry("a/one.txt")
+        assert len(lister.calls) == 3
+
+        list(cache.walk(""))
+        cache.invalidate("a/b")
+        # The tree no longer covers a/b - but the rest of it is still known
+        cache.entry("top.txt")
+        assert len(lister.calls) == 4
+        cache.entry("a/b/two.txt")
+        assert lister.calls[-1] == ("a/b", False)
+
+    def test_persistence(self, tmp_path) -> None:
+        path = str(tmp_path / "cache" / "listing.json.gz")
+        lister = _Lister()
+        cache = RcloneListingCache(lister, persist_path=path, root_key="remote:")
+        list(cache.walk(""))
+
+        restarted = RcloneListingCache(lister, persist_path=path, root_key="remote:")
+        assert restarted.entry("a/b/two.txt") is not None
+        assert len(lister.calls) == 1
+
+        # A cache for another remote isn't used
+        other = RcloneListingCache(lister, persist_path=path, root_key="other:")
+        other.entry("a/b/two.txt")
+        assert len(lister.calls) == 2
+
+
+class TestRcloneBackendListings:
+    """
+    The rclone backend and its locations should share one listing per directory - not run rclone per call.
+    """
+
+    def test_location_stats(self, fake_rclone) -> None:
+        backend = fake_rclone.backend()
+        book = RcloneHttpReadOnlyStoreLocation("Author One", "Book A", store=backend)
+
+        epub = book / "book.epub"
+        assert epub.is_file()
+        assert epub.stat().st_size == len(b"epub bytes")
+        assert epub.exists() and not epub.is_dir()
+        assert (book / "cover.jpg").is_file()
+        assert not (book / "missing.txt").exists()
+        assert sorted(p.name for p in book.iterdir()) == ["book.epub", "cover.jpg"]
+        assert len(fake_rclone.calls("lsjson")) == 1
+
+        assert backend.file_exists("fake:Author One/Book A/cover.jpg")
+        assert not backend.file_exists("fake:Author One/Book A/nothing.jpg")
+        assert len(fake_rclone.calls("lsjson")) == 1
+
+        with pytest.raises(FileNotFoundError):
+            list((book / "missing").iterdir())
+
+    def test_tree_and_persistence(self, fake_rclone, tmp_path) -> None:
+        path = str(tmp_path / "listing.json.gz")
+        backend = fake_rclone.backend(listing_prefetch_tree=True, listing_cache_path=path)
+        root = RcloneHttpReadOnlyStoreLocation(store=backend)
+
+        assert sorted(p.as_posix() for p in root.rglob("*.pdf")) == ["Author Two/Book B/book.pdf"]
+        assert (root / "Author Two" / "Book B" / "book.pdf").is_file()
+        assert (root / "empty").is_dir()
+        assert len(fake_rclone.calls("lsjson")) == 1
+
+        # A restarted backend lists nothing
+        restarted = fake_rclone.backend(listing_prefetch_tree=True, listing_cache_path=path)
+        assert (RcloneHttpReadOnlyStoreLocation("notes.txt", store=restarted)).is_file()
+        assert len(fake_rclone.calls("lsjson")) == 1
+
+        # Until told the remote has changed
+        (fake_rclone.root / "new.txt").write_text("new")
+        restarted.invalidate_listings()
+        assert (RcloneHttpReadOnlyStoreLocation("new.txt", store=restarted)).is_file()
+        assert len(fake_rclone.calls("lsjson")) == 2
+
+    def test_persisted_listings_outlive_the_default_ttl(self, fake_rclone, tmp_path) -> None:
+        path = str(tmp_path / "listing.json.gz")
+        assert fake_rclone.options().listing_cache_ttl_s == DEFAULT_LISTING_CACHE_TTL_S
+        assert fake_rclone.options(listing_cache_path=path).listing_cache_ttl_s is None
+        assert fake_rclone.options(listing_cache_path=path, listing_cache_ttl_s=60.0).listing_cache_ttl_s == 60.0
+
+        backend = fake_rclone.backend(listing_prefetch_tree=True, listing_cache_path=path)
+        assert (RcloneHttpReadOnlyStoreLocation("notes.txt", store=backend)).is_file()
+        backend.shutdown()
+
+        # Restarted long after the listing was made - it's still used
+        restarted = fake_rclone.backend(listing_prefetch_tree=True, listing_cache_path=path)
+        restarted.listing_cache._clock = lambda: time.time() + 10 * DEFAULT_LISTING_CACHE_TTL_S
+        assert (RcloneHttpReadOnlyStoreLocation("notes.txt", store=restarted)).is_file()
+        assert len(fake_rclone.calls("lsjson")) == 1
+
+    def test_without_cache(self, fake_rclone) -> None:
+        backend = fake_rclone.backend(listing_cache=False)
+        epub = RcloneHttpReadOnlyStoreLocation("Author One", "Book A", "book.epub", store=backend)
+        assert epub.is_file()
+        assert epub.stat().st_size == len(b"epub bytes")
+        assert len(fake_rclone.calls("--stat")) == 2
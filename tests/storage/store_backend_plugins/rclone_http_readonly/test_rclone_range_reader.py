@@ -0,0 +1,178 @@
+"""
+Tests seekable rclone reads - on their own, and through the rclone location with a fake rclone.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import zipfile
+
+import pytest
+
+from LiuXin_alpha.storage.store_backend_plugins.rclone_http_readonly.rclone_http_location import (
+    RcloneHttpReadOnlyStoreLocation,
+)
+from LiuXin_alpha.storage.store_backend_plugins.rclone_http_readonly.rclone_range_reader import RcloneRangeReader
+
+
+class _Fetcher:
+    """Serves ranges of some bytes - recording the ranges asked for."""
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.calls: list[tuple[int, int]] = []
+
+    def __call__(self, offset: int, count: int) -> bytes:
+        self.calls.append((offset, count))
+        return self.data[offset : offset + count]
+
+
+def _epub(path, padding: int) -> None:
+    """A zip with a big incompressible member - and a small one to read back."""
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        zf.writestr("OEBPS/images/big.bin", os.urandom(padding), compress_type=zipfile.ZIP_STORED)
+        zf.writestr("META-INF/container.xml", "<container/>")
+
+
+class TestRcloneRangeReader:
+    """
+    Only the blocks read should be fetched - each once, with sequential reads fetched ahead in bigger requests.
+    """
+
+    def test_seek_and_read(self) -> None:
+        data = os.urandom(10_000)
+        fetch = _Fetcher(data)
+        f = io.BufferedReader(RcloneRangeReader(fetch, len(data), block_size=1000), buffer_size=100)
+
+        f.seek(-10, os.SEEK_END)
+        assert f.read() == data[-10:]
+        f.seek(2500)
+        assert f.read(10) == data[2500:2510]
+        assert fetch.calls == [(9000, 1000), (2000, 1000)]
+
+        # Cached - no more fetches
+        f.seek(9995)
+        assert f.read(3) == data[9995:9998]
+        f.seek(2000)
+        assert f.read(5) == data[2000:2005]
+        assert len(fetch.calls) == 2
+
+        f.seek(20_000)
+        assert f.read() == b""
+
+    def test_read_ahead(self) -> None:
+        data = os.urandom(64_000)
+        fetch = _Fetcher(data)
+        raw = RcloneRangeReader(fetch, len(data), block_size=1000, cache_bytes=4000, read_ahead_blocks=8)
+        out = b""
+        while True:
+            chunk = raw.read(500)
+            if not chunk:
+                break
+            out += chunk
+        assert out == data
+        assert raw.bytes_fetched == len(data)
+        # Far fewer requests than blocks - the read-ahead grows while reads stay sequential
+        assert raw.requests < 15
+        assert max(count for _, count in fetch.calls) == 9000
+
+    def test_read_all_and_empty(self) -> None:
+        data = os.urandom(5000)
+        fetch = _Fetcher(data)
+        with io.BufferedReader(RcloneRangeReader(fetch, len(data), block_size=1000)) as f:
+            assert f.read() == data
+        assert fetch.calls == [(0, 5000)]
+
+        empty = _Fetcher(b"")
+        with io.BufferedReader(RcloneRangeReader(empty, 0)) as f:
+            assert f.read() == b""
+        assert empty.calls == []
+
+    def test_big_reads_keep_the_cache_size(self) -> None:
+        data = os.urandom(20_000)
+        raw = RcloneRangeReader(_Fetcher(data), len(data), block_size=1000, cache_bytes=4000, read_ahead_blocks=2)
+        assert raw.cache_blocks == 4
+
+        assert raw.readall() == data
+        raw.seek(0)
+        assert raw.read(15_000) == data[:15_000]
+        assert raw.cache_blocks == 4
+        assert len(raw._blocks) <= 4
+
+    def test_unknown_size(self) -> None:
+        with pytest.raises(ValueError):
+            RcloneRangeReader(_Fetcher(b"data"), -1)
+
+
+@pytest.mark.parametrize("daemon", [False, True])
+class TestRcloneSeekableOpen:
+    """
+    Reading the table of contents of a big book should transfer a few blocks of it - not the whole file.
+    """
+
+    def test_zip_metadata(self, fake_rclone, daemon) -> None:
+        _epub(fake_rclone.root / "big.epub", 2_000_000)
+        backend = fake_rclone.backend(daemon=daemon, seekable_reads=True, read_block_size=16 * 1024)
+        backend.startup()
+        try:
+            with RcloneHttpReadOnlyStoreLocation("big.epub", store=backend).open("rb") as f:
+                assert f.seekable()
+                with zipfile.ZipFile(f) as zf:
+                    assert "OEBPS/images/big.bin" in zf.namelist()
+                    assert zf.read("mimetype") == b"application/epub+zip"
+                    assert zf.read("META-INF/container.xml") == b"<container/>"
+                assert f.raw.bytes_fetched < 100_000
+        finally:
+            backend.shutdown()
+
+    def test_whole_and_text_reads(self, fake_rclone, daemon) -> None:
+        backend = fake_rclone.backend(daemon=daemon, seekable_reads=True)
+        backend.startup()
+        try:
+            book = RcloneHttpReadOnlyStoreLocation("Author Two", "Book B", "book.pdf", store=backend)
+            assert book.read_bytes() == (fake_rclone.root / "Author Two" / "Book B" / "book.pdf").read_bytes()
+            assert RcloneHttpReadOnlyStoreLocation("notes.txt", store=backend).read_text() == "hello"
+            with pytest.raises(FileNotFoundError):
+                RcloneHttpReadOnlyStoreLocation("missing.txt", store=backend).open("rb")
+            with pytest.raises(IsADirectoryError):
+                RcloneHttpReadOnlyStoreLocation("empty", store=backend).open("rb")
+        finally:
+            backend.shutdown()
+
+
+class TestRcloneReadMode:
+    """
+    Ranged reads should only be used where they're cheap - and where the size of the file is known.
+    """
+
+    @pytest.mark.parametrize("daemon", [False, True])
+    def test_default(self, fake_rclone, daemon) -> None:
+        backend = fake_rclone.backend(daemon=daemon)
+        backend.startup()
+        try:
+            with RcloneHttpReadOnlyStoreLocation("notes.txt", store=backend).open("rb") as f:
+                assert f.read() == b"hello"
+                # Without the daemon, each range would be an `rclone cat` of its own - so the file is streamed
+                assert isinstance(f.raw, RcloneRangeReader) is daemon
+        finally:
+            backend.shutdown()
+
+    @pytest.mark.parametrize("daemon", [False, True])
+    def test_unknown_size_is_streamed(self, fake_rclone, daemon, monkeypatch) -> None:
+        stat_blob = RcloneHttpReadOnlyStoreLocation._stat_blob
+
+        def unknown_size(self):
+            blob = stat_blob(self)
+            return dict(blob, Size=-1) if blob else blob
+
+        monkeypatch.setattr(RcloneHttpReadOnlyStoreLocation, "_stat_blob", unknown_size)
+        backend = fake_rclone.backend(daemon=daemon, seekable_reads=True)
+        backend.startup()
+        try:
+            with RcloneHttpReadOnlyStoreLocation("notes.txt", store=backend).open("rb") as f:
+                assert not isinstance(f.raw, RcloneRangeReader)
+                assert f.read() == b"hello"
+        finally:
+            backend.shutdown()
@@ -0,0 +1,101 @@
+"""
+Tests the rclone daemon mode - everything over one `rclone rcd`, with a fake rclone standing in for it.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import pytest
+
+from LiuXin_alpha.storage.store_backend_plugins.rclone_http_readonly.rclone_http_location import (
+    RcloneHttpReadOnlyStoreLocation,
+)
+
+
+@pytest.fixture()
+def daemon_backend(fake_rclone):
+    backend = fake_rclone.backend(daemon=True, daemon_max_connections=2)
+    backend.startup()
+    yield backend
+    backend.shutdown()
+
+
+class TestRcloneDaemon:
+    """
+    With a daemon running, listings, stats and reads shouldn't start any more rclone processes.
+    """
+
+    def test_no_process_per_call(self, fake_rclone, daemon_backend) -> None:
+        book = RcloneHttpReadOnlyStoreLocation("Author One", "Book A", store=daemon_backend)
+        assert sorted(p.name for p in book.iterdir()) == ["book.epub", "cover.jpg"]
+        assert (book / "book.epub").is_file()
+        assert (book / "book.epub").read_bytes() == b"epub bytes"
+        assert (book / "cover.jpg").read_bytes() == b"jpg"
+        assert daemon_backend.file_exists("fake:notes.txt")
+        assert not daemon_backend.file_exists("fake:missing.txt")
+        assert sorted(p.as_posix() for p in RcloneHttpReadOnlyStoreLocation(store=daemon_backend).rglob("*.pdf")) == [
+            "Author Two/Book B/book.pdf"
+        ]
+
+        processes = [c for c in fake_rclone.calls() if c[0] != "rc"]
+        assert [c[0] for c in processes] == ["rcd"]
+        assert fake_rclone.calls("GET")
+
+    def test_ranges_and_concurrency(self, fake_rclone, daemon_backend) -> None:
+        daemon = daemon_backend.daemon
+        data = (fake_rclone.root / "Author Two" / "Book B" / "book.pdf").read_bytes()
+        with daemon.open("fake:", "Author Two/Book B/book.pdf", offset=4, count=10) as f:
+            assert f.read() == data[4:14]
+        with daemon.open("fake:", "Author Two/Book B/book.pdf", offset=len(data) + 5) as f:
+            assert f.read() == b""
+        with pytest.raises(FileNotFoundError):
+            daemon.open("fake:", "nothing.pdf")
+
+        def read(_):
+            with daemon.open("fake:", "notes.txt") as f:
+                return f.read()
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            assert set(pool.map(read, range(30))) == {b"hello"}
+
+    def test_open_streams_hold_their_slots(self, daemon_backend) -> None:
+        daemon = daemon_backend.daemon
+        streams = [daemon.open("fake:", "notes.txt"), daemon.open("fake:", "Author One/Book A/book.epub")]
+
+        # Both slots are held by the open streams - a third read waits for one of them to be closed
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            third = pool.submit(lambda: daemon.open("fake:", "notes.txt").read())
+            with pytest.raises(FutureTimeout):
+                third.result(timeout=0.5)
+            assert streams[0].read() == b"hello"
+            streams[0].close()
+            assert third.result(timeout=10) == b"hello"
+
+        streams[1].close()
+        with pytest.raises(FileNotFoundError):
+            daemon.open("fake:", "nothing.pdf")
+        # Every slot was handed back - including those of the failed and the unclosed (but collected) streams
+        assert all(daemon._slots.acquire(blocking=False) for _ in range(daemon.max_connections))
+
+    def test_restart_on_crash(self, fake_rclone, daemon_backend) -> None:
+        daemon = daemon_backend.daemon
+        daemon._proc.kill()
+        daemon._proc.wait()
+
+        assert daemon.stat("fake:", "notes.txt")["Size"] == 5
+        assert daemon.restarts == 1
+        assert daemon.running
+        assert [c[0] for c in fake_rclone.calls() if c[0] != "rc"] == ["rcd", "rcd"]
+
+    def test_restarts_are_limited(self, fake_rclone) -> None:
+        backend = fake_rclone.backend(daemon=True, daemon_max_restarts=0)
+        backend.startup()
+        try:
+            backend.daemon._proc.kill()
+            backend.daemon._proc.wait()
+            with pytest.raises(OSError):
+                backend.daemon.stat("fake:", "notes.txt")
+        finally:
+            backend.shutdown()
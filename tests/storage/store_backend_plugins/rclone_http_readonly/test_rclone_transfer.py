@@ -0,0 +1,38 @@
+"""
+Tests copying out of an rclone store - with the transfer engine, into an on-disk store.
+"""
+
+from __future__ import annotations
+
+import hashlib
+
+from LiuXin_alpha.storage.store_backend_plugins.on_disk_unmanaged_drive.on_disk_unmanaged_location import (
+    OnDiskUnmanagedStoreLocation,
+)
+from LiuXin_alpha.storage.store_backend_plugins.on_disk_unmanaged_drive.on_disk_unmanaged_storage_backend import (
+    OnDiskUnmanagedStorageBackend,
+)
+from LiuXin_alpha.storage.store_backend_plugins.rclone_http_readonly.rclone_http_location import (
+    RcloneHttpReadOnlyStoreLocation,
+)
+from LiuXin_alpha.storage.transfer import TransferEngine, plan_tree
+
+
+class TestRcloneTransfer:
+    """
+    Files in an rclone store should stream into a local store - verified, and skipped on a second run.
+    """
+
+    def test_rclone_to_disk(self, fake_rclone, tmp_path) -> None:
+        (tmp_path / "local").mkdir()
+        dest = OnDiskUnmanagedStoreLocation(store=OnDiskUnmanagedStorageBackend(url=str(tmp_path / "local")))
+        source = RcloneHttpReadOnlyStoreLocation("Author Two", store=fake_rclone.backend())
+
+        engine = TransferEngine(workers=2)
+        results = engine.transfer(plan_tree(source, dest))
+        data = (fake_rclone.root / "Author Two" / "Book B" / "book.pdf").read_bytes()
+        assert [(r.status, r.method) for r in results] == [("copied", "stream")]
+        assert results[0].digest == hashlib.sha256(data).hexdigest()
+        assert (tmp_path / "local" / "Book B" / "book.pdf").read_bytes() == data
+
+        assert [r.status for r in engine.transfer(plan_tree(source, dest))] == ["skipped"]
@@ -0,0 +1,3 @@
+"""
+Tests for moving files between stores.
+"""
@@ -0,0 +1,194 @@
+"""
+Tests the transfer engine - copying trees of files between two on-disk stores.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import pathlib
+
+import pytest
+
+from LiuXin_alpha.storage.store_backend_plugins.on_disk_unmanaged_drive.on_disk_unmanaged_location import (
+    OnDiskUnmanagedStoreLocation,
+)
+from LiuXin_alpha.storage.store_backend_plugins.on_disk_unmanaged_drive.on_disk_unmanaged_storage_backend import (
+    OnDiskUnmanagedStorageBackend,
+)
+from LiuXin_alpha.storage.transfer import (
+    JOBS_AHEAD_PER_WORKER,
+    PART_SUFFIX,
+    TransferEngine,
+    TransferJob,
+    TransferJournal,
+    plan_tree,
+)
+
+
+@pytest.fixture()
+def stores(tmp_path: pathlib.Path):
+    """A source store with a small library in it - and an empty destination store."""
+    source_dir, dest_dir = tmp_path / "source", tmp_path / "dest"
+    files = {
+        "Author One/Book A/book.epub": os.urandom(300_000),
+        "Author One/Book A/cover.jpg": os.urandom(5_000),
+        "Author Two/Book B/book.pdf": os.urandom(1_000_000),
+        "Author Two/Book B/empty.txt": b"",
+        "notes.txt": b"hello",
+    }
+    for rel, data in files.items():
+        path = source_dir / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    dest_dir.mkdir()
+    source = OnDiskUnmanagedStoreLocation(store=OnDiskUnmanagedStorageBackend(url=str(source_dir)))
+    dest = OnDiskUnmanagedStoreLocation(store=OnDiskUnmanagedStorageBackend(url=str(dest_dir)))
+    return source, dest, dest_dir, files
+
+
+def _assert_copied(dest_dir: pathlib.Path, files: dict[str, bytes]) -> None:
+    for rel, data in files.items():
+        assert (dest_dir / rel).read_bytes() == data
+    assert not list(dest_dir.rglob("*" + PART_SUFFIX))
+
+
+class TestTransferEngine:
+    """
+    Every file should arrive intact, with its digest taken during the copy - and an interrupted run should resume.
+    """
+
+    @pytest.mark.parametrize("zero_copy", [True, False])
+    def test_copy_tree(self, stores, zero_copy) -> None:
+        source, dest, dest_dir, files = stores
+        engine = TransferEngine(workers=3, buffer_size=64 * 1024, zero_copy=zero_copy, verify_dest=True)
+        results = engine.transfer(plan_tree(source, dest))
+
+        assert all(r.status == "copied" for r in results)
+        assert len(results) == len(files)
+        _assert_copied(dest_dir, files)
+        for result in results:
+            data = files[result.job.source.as_posix()]
+            assert result.digest == hashlib.sha256(data).hexdigest()
+        assert engine.bytes_copied == sum(len(d) for d in files.values())
+        if not zero_copy:
+            assert {r.method for r in results} == {"stream"}
+
+    def test_stream_between_stores(self, stores) -> None:
+        """Locations which aren't on local disk are streamed through the buffer."""
+        source, dest, dest_dir, files = stores
+
+        class _NotLocal(OnDiskUnmanagedStoreLocation):
+            def local_path(self) -> str | None:
+                return None
+
+        remote = _NotLocal(store=source.store)
+        results = TransferEngine(buffer_size=64 * 1024, verify_dest=True).transfer(plan_tree(remote, dest))
+        assert {r.method for r in results} == {"stream"}
+        _assert_copied(dest_dir, files)
+
+    def test_resume(self, stores, tmp_path) -> None:
+        source, dest, dest_dir, files = stores
+        journal_path = tmp_path / "journal.sqlite"
+
+        # First run - cancelled once two files are done
+        engine = TransferEngine(workers=1, journal=TransferJournal(journal_path))
+        done = []
+
+        def progress(result):
+            done.append(result)
+            if len(done) == 2:
+                engine.cancel()
+
+        results = engine.transfer(plan_tree(source, dest), progress=progress)
+        assert [r.status for r in results].count("copied") == 2
+        assert {r.status for r in results[2:]} == {"cancelled"}
+        engine.journal.close()
+
+        # Half of the big file copied before the interruption
+        pdf = "Author Two/Book B/book.pdf"
+        journal = TransferJournal(journal_path)
+        stat = (source / pdf).stat()
+        key = (dest / pdf).as_store_key()
+        journal.start(key, (source / pdf).as_store_key(), stat.st_size, stat.st_mtime_ns, "sha256")
+        (dest_dir / pdf).parent.mkdir(parents=True, exist_ok=True)
+        (dest_dir / (pdf + PART_SUFFIX)).write_bytes(files[pdf][:400_000])
+
+        engine = TransferEngine(workers=2, journal=journal, buffer_size=64 * 1024)
+        results = {r.job.source.as_posix(): r for r in engine.transfer(plan_tree(source, dest))}
+        assert [r.status for r in results.values()].count("skipped") == 2
+        assert results[pdf].status == "copied"
+        assert results[pdf].resumed_from == 400_000
+        assert results[pdf].bytes_copied == len(files[pdf]) - 400_000
+        assert results[pdf].digest == hashlib.sha256(files[pdf]).hexdigest()
+        _assert_copied(dest_dir, files)
+        assert {e.status for e in journal.entries()} == {"done"}
+
+        # Changed sources are copied again
+        (pathlib.Path(source.store.url) / "notes.txt").write_bytes(b"changed")
+        results = engine.transfer(plan_tree(source, dest))
+        assert [r.job.source.as_posix() for r in results if r.status == "copied"] == ["notes.txt"]
+        assert (dest_dir / "notes.txt").read_bytes() == b"changed"
+
+    @pytest.mark.parametrize("zero_copy", [True, False])
+    def test_resume_from_a_corrupt_part(self, stores, zero_copy) -> None:
+        source, dest, dest_dir, files = stores
+        pdf = "Author Two/Book B/book.pdf"
+        engine = TransferEngine(buffer_size=64 * 1024, zero_copy=zero_copy)
+        stat = (source / pdf).stat()
+        key = (dest / pdf).as_store_key()
+        engine.journal.start(key, (source / pdf).as_store_key(), stat.st_size, stat.st_mtime_ns, "sha256")
+
+        # The right length - but not what's at the start of the source
+        corrupt = bytearray(files[pdf][:400_000])
+        corrupt[200_000] ^= 0xFF
+        (dest_dir / pdf).parent.mkdir(parents=True, exist_ok=True)
+        (dest_dir / (pdf + PART_SUFFIX)).write_bytes(bytes(corrupt))
+
+        result = engine.transfer_one(TransferJob(source=source / pdf, dest=dest / pdf))
+        assert result.status == "copied"
+        assert result.resumed_from == 0
+        assert result.digest == hashlib.sha256(files[pdf]).hexdigest()
+        assert (dest_dir / pdf).read_bytes() == files[pdf]
+
+    def test_reused_after_cancel(self, stores) -> None:
+        source, dest, dest_dir, files = stores
+        engine = TransferEngine(workers=1)
+        engine.cancel()
+        assert {r.status for r in engine.transfer(plan_tree(source, dest))} == {"copied"}
+
+        engine.transfer(plan_tree(source, dest), progress=lambda result: engine.cancel())
+        assert {r.status for r in engine.transfer(plan_tree(source, dest))} == {"skipped"}
+        _assert_copied(dest_dir, files)
+
+    def test_jobs_are_taken_as_they_are_needed(self, stores) -> None:
+        source, dest, dest_dir, files = stores
+        taken = []
+        ahead = []
+
+        def jobs():
+            for job in plan_tree(source, dest):
+                taken.append(job)
+                yield job
+
+        def progress(result):
+            # Jobs taken, but not yet finished
+            ahead.append(len(taken) - len(ahead) - 1)
+
+        results = TransferEngine(workers=1).transfer(jobs(), progress=progress)
+
+        assert [r.job for r in results] == taken
+        assert max(ahead) <= JOBS_AHEAD_PER_WORKER
+        _assert_copied(dest_dir, files)
+
+    def test_digest_mismatch(self, stores) -> None:
+        source, dest, dest_dir, files = stores
+        engine = TransferEngine(retries=2)
+        job = TransferJob(source=source / "notes.txt", dest=dest / "notes.txt", expected_digest="0" * 64)
+        result = engine.transfer_one(job)
+
+        assert result.status == "failed"
+        assert "expected" in str(result.error)
+        assert not (dest_dir / "notes.txt").exists()
+        assert not (dest_dir / ("notes.txt" + PART_SUFFIX)).exists()
+        assert engine.journal.get(job.key).status == "failed"
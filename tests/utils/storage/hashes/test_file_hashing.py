@@ -0,0 +1,95 @@
+import hashlib
+import io
+import os
+
+from LiuXin_alpha.utils.storage.hashes import sane_hash
+from LiuXin_alpha.utils.storage.hashes import sane_hash_file
+from LiuXin_alpha.utils.storage.hashes import sane_hash_stream
+from LiuXin_alpha.utils.storage.hashes.file_hashing import FileHasher
+from LiuXin_alpha.utils.storage.hashes.file_hashing import HashCache
+from LiuXin_alpha.utils.storage.hashes.file_hashing import file_digests
+from LiuXin_alpha.utils.storage.hashes.file_hashing import stream_digests
+
+
+DATA = b"This is a test and this should be a hash." * 1000
+
+
+class TestDigests:
+    """
+    Every requested digest should be computed in one pass - however the file is read.
+    """
+
+    def test_stream_digests(self) -> None:
+        digests = stream_digests(io.BytesIO(DATA), algos=("sha256", "md5"), buffer_size=7)
+
+        assert digests == {"sha256": hashlib.sha256(DATA).hexdigest(), "md5": hashlib.md5(DATA).hexdigest()}
+
+    def test_file_digests_read_and_mapped(self, tmp_path) -> None:
+        path = tmp_path / "book.epub"
+        path.write_bytes(DATA)
+        expected = {"sha512": hashlib.sha512(DATA).hexdigest()}
+
+        assert file_digests(path, ("sha512",), buffer_size=1000, mmap_threshold=0) == expected
+        assert file_digests(path, ("sha512",), buffer_size=1000, mmap_threshold=1) == expected
+
+    def test_empty_file(self, tmp_path) -> None:
+        path = tmp_path / "empty"
+        path.write_bytes(b"")
+
+        assert file_digests(path, mmap_threshold=1) == {"sha256": hashlib.sha256(b"").hexdigest()}
+
+    def test_sane_hash_counterparts(self, tmp_path) -> None:
+        path = tmp_path / "book.epub"
+        path.write_bytes(DATA)
+
+        assert sane_hash_stream(io.BytesIO(DATA), buffer_size=13) == sane_hash(DATA)
+        assert sane_hash_file(path, algo="blake2b", hexdigest=False) == sane_hash(DATA, algo="blake2b", hexdigest=False)
+
+
+class TestFileHasher:
+    """
+    Files should only be re-hashed when they change.
+    """
+
+    def test_cache(self, tmp_path, monkeypatch) -> None:
+        path = tmp_path / "book.epub"
+        path.write_bytes(DATA)
+        cache_path = tmp_path / "hashes.db"
+
+        with HashCache(cache_path) as cache:
+            assert FileHasher(algos=("sha256",), cache=cache).hash_file(path) == {
+                "sha256": hashlib.sha256(DATA).hexdigest()
+            }
+
+        # A new cache on the same file - the digest is read back without touching the file
+        reads = []
+        monkeypatch.setattr(
+            "LiuXin_alpha.utils.storage.hashes.file_hashing.file_digests",
+            lambda *args, **kwargs: reads.append(args) or {"sha256": "rehashed"},
+        )
+        with HashCache(cache_path) as cache:
+            hasher = FileHasher(algos=("sha256",), cache=cache)
+            assert hasher.hash_file(path) == {"sha256": hashlib.sha256(DATA).hexdigest()}
+            assert reads == []
+
+            # Changing the file invalidates the entry
+            path.write_bytes(DATA + b"more")
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+            assert hasher.hash_file(path) == {"sha256": "rehashed"}
+            assert len(reads) == 1
+
+    def test_hash_files(self, tmp_path) -> None:
+        paths = []
+        for i in range(10):
+            path = tmp_path / "book{}.epub".format(i)
+            path.write_bytes(DATA * i)
+            paths.append(path)
+
+        results = FileHasher(algos=("sha1", "sha256"), workers=4).hash_files(paths)
+
+        for i, path in enumerate(paths):
+            assert results[path] == {
+                "sha1": hashlib.sha1(DATA * i).hexdigest(),
+                "sha256": hashlib.sha256(DATA * i).hexdigest(),
+            }